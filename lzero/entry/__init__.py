@@ -4,4 +4,5 @@ from .train_muzero import train_muzero
 from .train_muzero_with_reward_model import train_muzero_with_reward_model
 from .eval_muzero import eval_muzero
 from .eval_muzero_with_gym_env import eval_muzero_with_gym_env
-from .train_muzero_with_gym_env import train_muzero_with_gym_env
\ No newline at end of file
+from .train_muzero_with_gym_env import train_muzero_with_gym_env
+from .train_muzero_offline import train_muzero_offline
\ No newline at end of file
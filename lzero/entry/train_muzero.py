@@ -1,5 +1,6 @@
 import logging
 import os
+from contextlib import nullcontext
 from functools import partial
 from typing import Optional, Tuple
 
@@ -13,7 +14,12 @@ from ding.rl_utils import get_epsilon_greedy_fn
 from ding.worker import BaseLearner
 from tensorboardX import SummaryWriter
 
-from lzero.entry.utils import log_buffer_memory_usage
+from lzero.entry.utils import log_buffer_memory_usage, log_buffer_server_stats
+from lzero.mcts.buffer.buffer_snapshot import get_snapshot_path
+from lzero.mcts.buffer.prefetch_sampler import PrefetchSampler
+from lzero.mcts.buffer.reanalyze_daemon import ReanalyzeDaemon
+from lzero.mcts.buffer.replay_buffer_server import connect_replay_buffer_server
+from lzero.mcts.buffer.segment_dataset import SegmentDatasetWriter
 from lzero.policy import visit_count_temperature
 from lzero.policy.random_policy import LightZeroRandomPolicy
 from lzero.worker import MuZeroCollector as Collector
@@ -94,6 +100,13 @@ def train_muzero(
     batch_size = policy_config.batch_size
     # specific game buffer for MCTS+RL algorithms
     replay_buffer = GameBuffer(policy_config)
+    # Shard the replay buffer across the processes of a replay buffer server, e.g. shared by all the DDP ranks.
+    buffer_server = None
+    if replay_buffer._cfg.buffer_server_num_shards > 0:
+        buffer_cfg = replay_buffer._cfg
+        assert not (buffer_cfg.use_prefetch_sampler or buffer_cfg.use_reanalyze_daemon or buffer_cfg.snapshot_path), \
+            'the replay buffer server does not support the prefetch sampler, the reanalyze daemon and the snapshots'
+        replay_buffer, buffer_server = connect_replay_buffer_server(GameBuffer, buffer_cfg, policy._target_model)
     collector = Collector(
         env=collector_env,
         policy=policy.collect_mode,
@@ -124,11 +137,64 @@ def train_muzero(
     # The purpose of collecting random data before training:
     # Exploration: Collecting random data helps the agent explore the environment and avoid getting stuck in a suboptimal policy prematurely.
     # Comparison: By observing the agent's performance during random action-taking, we can establish a baseline to evaluate the effectiveness of reinforcement learning algorithms.
-    if cfg.policy.random_collect_episode_num > 0:
+    # Resume the replay buffer of a previous run warm.
+    snapshot_path = replay_buffer._cfg.snapshot_path
+    if snapshot_path is not None and get_snapshot_path(snapshot_path) is not None:
+        replay_buffer.load_snapshot(snapshot_path)
+        logging.info(f'Restored the replay buffer from {snapshot_path}: {replay_buffer}')
+    elif cfg.policy.random_collect_episode_num > 0:
         random_collect(cfg.policy, policy, LightZeroRandomPolicy, collector, collector_env, replay_buffer)
 
+    # Prepare the next minibatches in a background thread while the learner is training.
+    sampler = None
+    if replay_buffer._cfg.use_prefetch_sampler:
+        sampler = PrefetchSampler(
+            replay_buffer,
+            policy,
+            batch_size,
+            prefetch_batch_num=replay_buffer._cfg.prefetch_batch_num,
+            max_staleness=replay_buffer._cfg.prefetch_max_staleness,
+            train_iter=learner.train_iter
+        )
+    # Refresh the stored policy targets in a background thread (MuZero Reanalyze), which shares the lock of the sampler.
+    reanalyze_daemon = None
+    if replay_buffer._cfg.use_reanalyze_daemon:
+        reanalyze_daemon = ReanalyzeDaemon(
+            replay_buffer,
+            policy,
+            budget=replay_buffer._cfg.reanalyze_daemon_budget,
+            sync_freq=replay_buffer._cfg.reanalyze_model_sync_freq,
+            train_iter=learner.train_iter,
+            lock=sampler.lock if sampler is not None else None
+        )
+    # Export the collected game segments for the offline training by ``train_muzero_offline``.
+    dataset_writer = None
+    if replay_buffer._cfg.dataset_path is not None:
+        dataset_writer = SegmentDatasetWriter(
+            replay_buffer._cfg.dataset_path,
+            shard_size=replay_buffer._cfg.dataset_shard_size,
+            compression=replay_buffer._cfg.dataset_compression,
+            obs_codec=replay_buffer._cfg.obs_codec,
+            # every DDP rank writes its own shards
+            writer_id=replay_buffer._cfg.dataset_writer_id
+            if replay_buffer._cfg.dataset_writer_id is not None else get_rank()
+        )
+    # All the accesses to the replay buffer must hold the lock of the sampler (or of the reanalyze daemon).
+    if sampler is not None:
+        buffer_lock = sampler.lock
+    elif reanalyze_daemon is not None:
+        buffer_lock = reanalyze_daemon.lock
+    else:
+        buffer_lock = nullcontext()
+    last_snapshot_iter = learner.train_iter
+
     while True:
-        log_buffer_memory_usage(learner.train_iter, replay_buffer, tb_logger)
+        if replay_buffer._cfg.buffer_server_num_shards > 0:
+            if tb_logger is not None:
+                log_buffer_server_stats(learner.train_iter, replay_buffer, tb_logger)
+        else:
+            with buffer_lock:
+                log_buffer_memory_usage(learner.train_iter, replay_buffer, tb_logger)
         collect_kwargs = {}
         # set temperature for visit count distributions according to the train_iter,
         # please refer to Appendix D in MuZero paper for details.
@@ -162,16 +228,24 @@ def train_muzero(
             # update_per_collect is None, then update_per_collect is set to the number of collected transitions multiplied by the model_update_ratio.
             collected_transitions_num = sum([len(game_segment) for game_segment in new_data[0]])
             update_per_collect = int(collected_transitions_num * cfg.policy.model_update_ratio)
-        # save returned new_data collected by the collector
-        replay_buffer.push_game_segments(new_data)
-        # remove the oldest data if the replay buffer is full.
-        replay_buffer.remove_oldest_data_to_fit()
+        if dataset_writer is not None:
+            # the game segments are exported before the buffer moves their observations into its store
+            dataset_writer.write(new_data)
+        with buffer_lock:
+            # save returned new_data collected by the collector
+            replay_buffer.push_game_segments(new_data)
+            # remove the oldest data if the replay buffer is full.
+            replay_buffer.remove_oldest_data_to_fit()
 
         # Learn policy from collected data.
         for i in range(update_per_collect):
             # Learner will train ``update_per_collect`` times in one iteration.
             if replay_buffer.get_num_of_transitions() > batch_size:
-                train_data = replay_buffer.sample(batch_size, policy)
+                if sampler is not None:
+                    train_data = sampler.sample(learner.train_iter)
+                else:
+                    with buffer_lock:
+                        train_data = replay_buffer.sample(batch_size, policy)
             else:
                 logging.warning(
                     f'The data in replay_buffer is not sufficient to sample a mini-batch: '
@@ -183,13 +257,36 @@ def train_muzero(
 
             # The core train steps for MCTS+RL algorithms.
             log_vars = learner.train(train_data, collector.envstep)
+            if reanalyze_daemon is not None:
+                reanalyze_daemon.sync_target_model(learner.train_iter)
 
             if cfg.policy.use_priority:
-                replay_buffer.update_priority(train_data, log_vars[0]['value_priority_orig'])
+                with buffer_lock:
+                    replay_buffer.update_priority(train_data, log_vars[0]['value_priority_orig'])
+
+        # Dump the replay buffer periodically, so that a crashed training can be resumed warm.
+        snapshot_freq = replay_buffer._cfg.snapshot_freq
+        if snapshot_path is not None and snapshot_freq is not None and \
+                learner.train_iter - last_snapshot_iter >= snapshot_freq:
+            with buffer_lock:
+                replay_buffer.save_snapshot(snapshot_path)
+            last_snapshot_iter = learner.train_iter
 
         if collector.envstep >= max_env_step or learner.train_iter >= max_train_iter:
             break
 
+    if sampler is not None:
+        sampler.close()
+    if reanalyze_daemon is not None:
+        reanalyze_daemon.close()
+    if snapshot_path is not None:
+        replay_buffer.save_snapshot(snapshot_path)
+    if dataset_writer is not None:
+        dataset_writer.close()
+    # stop the reanalyze workers of the buffer, or the connections of the replay buffer client
+    replay_buffer.close()
+    if buffer_server is not None:
+        buffer_server.close()
     # Learner's after_run hook.
     learner.call_hook('after_run')
     return policy
@@ -5,6 +5,8 @@ from pympler.asizeof import asizeof
 from tensorboardX import SummaryWriter
 from typing import Optional, Callable
 
+from lzero.mcts.buffer.ring_array import RingArray
+
 
 def random_collect(
         policy_cfg: 'EasyDict',  # noqa
@@ -54,6 +56,9 @@ def log_buffer_memory_usage(train_iter: int, buffer: "GameBuffer", writer: Summa
     writer.add_scalar('Buffer/num_of_transitions', len(buffer.game_segment_game_pos_look_up), train_iter)
 
     game_segment_buffer = buffer.game_segment_buffer
+    if isinstance(game_segment_buffer, RingArray):
+        # ``asizeof`` does not follow the references stored in the object array of the ring buffer.
+        game_segment_buffer = list(game_segment_buffer)
 
     # Calculate the amount of memory occupied by self.game_segment_buffer (in bytes).
     buffer_memory_usage = asizeof(game_segment_buffer)
@@ -64,6 +69,30 @@ def log_buffer_memory_usage(train_iter: int, buffer: "GameBuffer", writer: Summa
     # Record the memory usage of self.game_segment_buffer to TensorBoard.
     writer.add_scalar('Buffer/memory_usage/game_segment_buffer', buffer_memory_usage_mb, train_iter)
 
+    disk_store = getattr(buffer, '_disk_store', None)
+    if disk_store is not None:
+        # Record the RAM used by the LRU cache of the on-disk segment store and its hit rate.
+        writer.add_scalar('Buffer/memory_usage/disk_store_cache', disk_store._cached_bytes / (1024 * 1024), train_iter)
+        writer.add_scalar('Buffer/disk_store_cache_hit_rate', disk_store.hit_rate(), train_iter)
+
+    reanalyze_cache = getattr(buffer, '_reanalyze_cache', None)
+    if reanalyze_cache is not None:
+        # Record the number of the cached reanalyzed roots and the hit rate of the reanalysis cache.
+        writer.add_scalar('Buffer/reanalyze_cache_size', len(reanalyze_cache), train_iter)
+        writer.add_scalar('Buffer/reanalyze_cache_hit_rate', reanalyze_cache.hit_rate(), train_iter)
+
+    if buffer._cfg.get('use_reanalyze_daemon', False):
+        # Record the staleness (in seconds) of the stored targets and the number of the refreshed transitions.
+        mean_staleness, max_staleness = buffer.get_target_staleness()
+        writer.add_scalar('Buffer/target_staleness_mean', mean_staleness, train_iter)
+        writer.add_scalar('Buffer/target_staleness_max', max_staleness, train_iter)
+        writer.add_scalar('Buffer/num_of_refreshed_transitions', buffer.num_of_refreshed_transitions, train_iter)
+
+    if buffer._cfg.get('obs_codec', None) is not None:
+        # Record the compression ratio and the decoding time of the observations of the last sampled batch.
+        writer.add_scalar('Buffer/obs_codec_compression_ratio', buffer.obs_codec_stats['compression_ratio'], train_iter)
+        writer.add_scalar('Buffer/obs_codec_decode_time', buffer.obs_codec_stats['decode_time'], train_iter)
+
     # Get the amount of memory currently used by the process (in bytes).
     process = psutil.Process(os.getpid())
     process_memory_usage = process.memory_info().rss
@@ -73,3 +102,18 @@ def log_buffer_memory_usage(train_iter: int, buffer: "GameBuffer", writer: Summa
 
     # Record the memory usage of the process to TensorBoard.
     writer.add_scalar('Buffer/memory_usage/process', process_memory_usage_mb, train_iter)
+
+
+def log_buffer_server_stats(train_iter: int, client: "ReplayBufferClient", writer: SummaryWriter) -> None:
+    """
+    Overview:
+        Log the size and the throughputs of every shard of the replay buffer server to TensorBoard.
+    Arguments:
+        - train_iter (:obj:`int`): The current training iteration.
+        - client (:obj:`ReplayBufferClient`): The client of the replay buffer server.
+        - writer (:obj:`SummaryWriter`): The TensorBoard writer.
+    """
+    writer.add_scalar('Buffer/num_of_transitions', client.get_num_of_transitions(), train_iter)
+    for shard_id, stats in enumerate(client.get_stats()):
+        for key, value in stats.items():
+            writer.add_scalar(f'Buffer/shard_{shard_id}/{key}', value, train_iter)
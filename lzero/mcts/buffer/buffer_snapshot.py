@@ -0,0 +1,316 @@
+import copy
+import itertools
+import os
+import pickle
+import shutil
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from .columnar_game_segment import RaggedRows
+from .obs_codec import get_obs_codec
+
+# the version of the snapshot format, which is checked when a snapshot is loaded
+SNAPSHOT_VERSION = 1
+# the per-position arrays of the game segments, each of them is stored as one column per chunk
+SNAPSHOT_FIELDS = (
+    'obs_segment', 'action_segment', 'reward_segment', 'child_visit_segment', 'root_value_segment',
+    'improved_policy_probs', 'action_mask_segment', 'to_play_segment', 'chance_segment', 'root_sampled_actions'
+)
+# the fields which are always pickled, since the buffers use them as python lists
+SNAPSHOT_OBJECT_FIELDS = ('root_sampled_actions', )
+SNAPSHOT_COMPRESSIONS = (None, 'zlib', 'lz4', 'zstd')
+
+
+def save_snapshot(
+        buffer: Any,
+        path: str,
+        compression: Optional[str] = None,
+        num_workers: int = 4,
+        chunk_size: int = 256
+) -> None:
+    """
+    Overview:
+        Dump the game segments, the priorities and the counters of ``buffer`` to the directory ``path``, so that
+        ``load_snapshot`` can restore the buffer, e.g. to resume a training warm.
+        The game segments are split into chunks of ``chunk_size`` game segments. In every chunk, each array of
+        ``SNAPSHOT_FIELDS`` of all the game segments is concatenated into one raw binary column file, which is
+        optionally compressed, and the chunks are written by ``num_workers`` threads in parallel (the copies, the
+        compression and the file writes release the GIL). The remaining attributes of the game segments are pickled
+        without the arrays. The snapshot is written into a temporary directory, which replaces ``path`` at the end:
+        the previous snapshot is renamed aside first and only deleted after the rename of the new one, so a crash
+        during the dump always leaves a complete snapshot, see ``get_snapshot_path``.
+    .. note::
+        The buffer must not be modified during the dump, i.e. the lock of ``PrefetchSampler`` or ``ReanalyzeDaemon``
+        must be held by the caller.
+    Arguments:
+        - buffer (:obj:`GameBuffer`): The game buffer to dump.
+        - path (:obj:`str`): The directory of the snapshot.
+        - compression (:obj:`Optional[str]`): The compression of the column files, one of None, 'zlib', 'lz4' and \
+            'zstd', see ``obs_codec.py``.
+        - num_workers (:obj:`int`): The number of the threads which write the chunks.
+        - chunk_size (:obj:`int`): The number of game segments per chunk.
+    """
+    assert compression in SNAPSHOT_COMPRESSIONS, \
+        'unknown snapshot compression {}, should be one of {}'.format(compression, SNAPSHOT_COMPRESSIONS)
+    game_segments = list(buffer.game_segment_buffer)
+    priorities = _get_priorities(buffer)
+    ends = np.cumsum([len(game_segment) for game_segment in game_segments], dtype=np.int64)
+    starts = ends - np.array([len(game_segment) for game_segment in game_segments], dtype=np.int64)
+
+    path = path.rstrip(os.sep)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    chunks = [(i, min(i + chunk_size, len(game_segments))) for i in range(0, len(game_segments), chunk_size)]
+
+    def write_chunk(chunk_id: int) -> dict:
+        begin, end = chunks[chunk_id]
+        chunk_path = os.path.join(tmp_path, 'chunk_{:06d}'.format(chunk_id))
+        os.makedirs(chunk_path)
+        chunk_segments = game_segments[begin:end]
+        columns = {
+            field: _write_column(
+                os.path.join(chunk_path, field), [getattr(g, field, None) for g in chunk_segments], compression,
+                as_object=field in SNAPSHOT_OBJECT_FIELDS
+            )
+            for field in SNAPSHOT_FIELDS
+        }
+        columns['priorities'] = _write_column(
+            os.path.join(chunk_path, 'priorities'),
+            [priorities[s:e] for s, e in zip(starts[begin:end], ends[begin:end])], compression
+        )
+        # the game segments without the arrays, which keep e.g. their config and their class
+        skeletons = []
+        for game_segment in chunk_segments:
+            skeleton = copy.copy(game_segment)
+            for field in SNAPSHOT_FIELDS:
+                if getattr(game_segment, field, None) is not None:
+                    setattr(skeleton, field, None)
+            skeletons.append(skeleton)
+        with open(os.path.join(chunk_path, 'game_segments.pkl'), 'wb') as f:
+            pickle.dump(skeletons, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return {'num_of_game_segments': end - begin, 'columns': columns}
+
+    with ThreadPoolExecutor(max(num_workers, 1)) as executor:
+        chunk_metas = list(executor.map(write_chunk, range(len(chunks))))
+
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'buffer_type': type(buffer).__name__,
+        'obs_codec': buffer._cfg.obs_codec,
+        'compression': compression,
+        'chunks': chunk_metas,
+        'base_idx': buffer.base_idx,
+        'transition_base_idx': buffer.transition_base_idx,
+        'num_of_collected_episodes': buffer.num_of_collected_episodes,
+        'num_of_refreshed_transitions': buffer.num_of_refreshed_transitions,
+        'clear_time': buffer.clear_time,
+        'target_refresh_time': list(buffer._target_refresh_time.items()),
+    }
+    # the meta file is written last, so a snapshot with a meta file is complete
+    with open(os.path.join(tmp_path, 'meta.pkl'), 'wb') as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+    old_path = path + '.old'
+    # if ``path`` is missing, the previous dump crashed between the renames, and ``old_path`` is the last snapshot
+    if os.path.exists(path):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def get_snapshot_path(path: str) -> Optional[str]:
+    """
+    Overview:
+        Get the directory of the last complete snapshot dumped by ``save_snapshot`` to ``path``, i.e. ``path`` itself,
+        or the previous snapshot renamed aside if a dump crashed before its rename.
+    Arguments:
+        - path (:obj:`str`): The directory of the snapshot.
+    Returns:
+        - snapshot_path (:obj:`Optional[str]`): The directory of the complete snapshot, None if there is no one.
+    """
+    path = path.rstrip(os.sep)
+    for snapshot_path in [path, path + '.old']:
+        if os.path.exists(os.path.join(snapshot_path, 'meta.pkl')):
+            return snapshot_path
+    return None
+
+
+def load_snapshot(buffer: Any, path: str, num_workers: int = 4) -> None:
+    """
+    Overview:
+        Restore ``buffer`` from the snapshot dumped by ``save_snapshot`` in the directory ``path``. The current data of
+        the buffer is dropped. The chunks are read by ``num_workers`` threads in parallel, at most ``num_workers``
+        chunks ahead of the one being pushed, and the game segments are pushed again in their order with their saved
+        priorities, so all the storage modes of the buffer (e.g. ``use_ring_buffer``, ``use_priority_tree``,
+        ``use_vectorized_batch``, ``use_disk_store``) are supported, whichever mode the snapshot was dumped from.
+    Arguments:
+        - buffer (:obj:`GameBuffer`): The game buffer to restore.
+        - path (:obj:`str`): The directory of the snapshot.
+        - num_workers (:obj:`int`): The number of the threads which read the chunks.
+    """
+    snapshot_path = get_snapshot_path(path)
+    assert snapshot_path is not None, 'there is no complete snapshot in {}'.format(path)
+    path = snapshot_path
+    with open(os.path.join(path, 'meta.pkl'), 'rb') as f:
+        meta = pickle.load(f)
+    assert meta['version'] == SNAPSHOT_VERSION, 'unsupported snapshot version {}'.format(meta['version'])
+    assert meta['buffer_type'] == type(buffer).__name__, \
+        'the snapshot of {} can not be loaded into {}'.format(meta['buffer_type'], type(buffer).__name__)
+    # the frames are stored as they are, i.e. encoded by the ``obs_codec`` of the saved buffer
+    assert meta['obs_codec'] == buffer._cfg.obs_codec, \
+        'the snapshot with obs_codec={} can not be loaded into a buffer with obs_codec={}'.format(
+            meta['obs_codec'], buffer._cfg.obs_codec
+        )
+    compression = meta['compression']
+
+    def read_chunk(chunk_id: int) -> Tuple[List[Any], List[np.ndarray]]:
+        chunk_path = os.path.join(path, 'chunk_{:06d}'.format(chunk_id))
+        columns = meta['chunks'][chunk_id]['columns']
+        with open(os.path.join(chunk_path, 'game_segments.pkl'), 'rb') as f:
+            game_segments = pickle.load(f)
+        for field in SNAPSHOT_FIELDS:
+            values = _read_column(os.path.join(chunk_path, field), columns[field], compression)
+            for game_segment, value in zip(game_segments, values):
+                if value is not None:
+                    setattr(game_segment, field, value)
+        priorities = _read_column(os.path.join(chunk_path, 'priorities'), columns['priorities'], compression)
+        return game_segments, priorities
+
+    buffer._release_storage()
+    buffer._init_storage()
+    buffer.base_idx = meta['base_idx']
+    num_workers = max(num_workers, 1)
+    chunk_ids = iter(range(len(meta['chunks'])))
+    with ThreadPoolExecutor(num_workers) as executor:
+        # only a bounded number of decoded chunks is kept in memory besides the buffer
+        futures = deque(executor.submit(read_chunk, chunk_id) for chunk_id in itertools.islice(chunk_ids, num_workers))
+        while futures:
+            game_segments, priorities = futures.popleft().result()
+            futures.extend(executor.submit(read_chunk, chunk_id) for chunk_id in itertools.islice(chunk_ids, 1))
+            for game_segment, segment_priorities in zip(game_segments, priorities):
+                # the saved priorities of the invalid transitions are already 0
+                buffer._push_game_segment(
+                    game_segment, {
+                        'done': False,
+                        'unroll_plus_td_steps': 0,
+                        'priorities': segment_priorities
+                    }
+                )
+            del game_segments, priorities
+    buffer.transition_base_idx = meta['transition_base_idx']
+    buffer.num_of_collected_episodes = meta['num_of_collected_episodes']
+    buffer.num_of_refreshed_transitions = meta['num_of_refreshed_transitions']
+    buffer.clear_time = meta['clear_time']
+    buffer._target_refresh_time = OrderedDict(meta['target_refresh_time'])
+    for segment_index, refresh_time in buffer._target_refresh_time.items():
+        buffer._segment_refresh_time[segment_index - buffer.base_idx] = refresh_time
+
+
+def _get_priorities(buffer: Any) -> np.ndarray:
+    if buffer._priority_tree is not None:
+        return buffer._priority_tree.priorities()
+    if buffer._cfg.use_ring_buffer:
+        return buffer.game_pos_priorities.values()
+    return np.asarray(buffer.game_pos_priorities, dtype=np.float64)
+
+
+def _write_column(path: str, values: List[Any], compression: Optional[str], as_object: bool = False) -> dict:
+    """
+    Overview:
+        Write the arrays ``values`` of the game segments of a chunk into the column file ``path`` and return the
+        description of the column used by ``_read_column``. The arrays with the same dtype and item shape are
+        concatenated into one raw binary array, the rows of different lengths (``RaggedRows``) are stored as the
+        padded rows and their lengths, and the other values (e.g. the encoded frames) are pickled.
+    """
+    if all(value is None for value in values):
+        return {'kind': 'none', 'num_of_values': len(values)}
+    if as_object:
+        _write_bytes(path, pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL), compression)
+        return {'kind': 'object'}
+    if all(isinstance(value, RaggedRows) for value in values) and \
+            len(set((value.data.shape[1:], value.data.dtype) for value in values)) == 1:
+        data = np.concatenate([value.data for value in values])
+        lengths = np.concatenate([value.lengths for value in values])
+        return {
+            'kind': 'ragged',
+            'sizes': [len(value) for value in values],
+            'data': _write_array(path, data, compression),
+            'lengths': _write_array(path + '.lengths', lengths, compression),
+        }
+    arrays = [_as_array(value) for value in values]
+    if all(array is not None and array.dtype != object for array in arrays) and \
+            len(set((array.shape[1:], array.dtype) for array in arrays)) == 1:
+        return {
+            'kind': 'array',
+            'sizes': [len(array) for array in arrays],
+            'data': _write_array(path, np.concatenate(arrays), compression),
+        }
+    # materialize the frames of the observation store, which may be pickled by reference
+    values = [
+        np.asarray(value) if hasattr(value, '__array__') and not isinstance(value, (np.ndarray, RaggedRows)) else value
+        for value in values
+    ]
+    _write_bytes(path, pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL), compression)
+    return {'kind': 'object'}
+
+
+def _read_column(path: str, column: dict, compression: Optional[str]) -> List[Any]:
+    kind = column['kind']
+    if kind == 'none':
+        return [None] * column['num_of_values']
+    if kind == 'object':
+        return pickle.loads(_read_bytes(path, compression))
+    sections = np.cumsum(column['sizes'])[:-1]
+    data = np.split(_read_array(path, column['data'], compression), sections)
+    if kind == 'array':
+        return data
+    lengths = np.split(_read_array(path + '.lengths', column['lengths'], compression), sections)
+    return [RaggedRows(d, l) for d, l in zip(data, lengths)]
+
+
+def _as_array(value: Any) -> Optional[np.ndarray]:
+    if value is None or isinstance(value, RaggedRows):
+        return None
+    try:
+        array = np.asarray(value)
+    except ValueError:
+        # the rows of different lengths, e.g. ``root_sampled_actions``
+        return None
+    return array if array.ndim > 0 else None
+
+
+def _write_array(path: str, array: np.ndarray, compression: Optional[str]) -> dict:
+    array = np.ascontiguousarray(array)
+    if compression is None:
+        array.tofile(path)
+    else:
+        _write_bytes(path, array.data, compression)
+    return {'dtype': array.dtype.str, 'shape': array.shape}
+
+
+def _read_array(path: str, spec: dict, compression: Optional[str]) -> np.ndarray:
+    if compression is None:
+        # ``np.fromfile`` returns a writable array without an extra copy
+        array = np.fromfile(path, dtype=np.dtype(spec['dtype']))
+    else:
+        array = np.frombuffer(bytearray(_read_bytes(path, compression)), dtype=np.dtype(spec['dtype']))
+    return array.reshape(spec['shape'])
+
+
+def _write_bytes(path: str, data: Any, compression: Optional[str]) -> None:
+    if compression is not None:
+        data = get_obs_codec(compression).compress(bytes(data))
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _read_bytes(path: str, compression: Optional[str]) -> bytes:
+    with open(path, 'rb') as f:
+        data = f.read()
+    if compression is not None:
+        data = get_obs_codec(compression).decompress(data)
+    return data
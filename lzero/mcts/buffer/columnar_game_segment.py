@@ -0,0 +1,358 @@
+from typing import Any, Iterable, List, Optional, Union
+
+import numpy as np
+from easydict import EasyDict
+
+from .game_segment import GameSegment
+
+
+class SegmentColumn(object):
+    """
+    Overview:
+        A preallocated typed array which holds one column of ``ColumnarGameSegment``, e.g. the rewards or the child
+        visits of all the positions. The array is allocated at the first write, with the dtype and the item shape of the
+        first item, and the items are written in place. The capacity is doubled if it is exceeded, e.g. by the game
+        segments of the evaluator, which hold a whole episode.
+        The columns of 1-D items (e.g. the child visits) are ``ragged`` if their items may have different lengths, e.g.
+        the visit count distributions over the legal actions of board games. Their items are then padded with zeros to
+        the max length, and the length of every item is kept.
+    Interfaces:
+        ``__init__``, ``__len__``, ``append``, ``extend``, ``values``
+    """
+    __slots__ = ('_data', '_size', '_capacity', '_float', '_ragged', '_lengths')
+
+    def __init__(self, capacity: int, is_float: bool = False, ragged: bool = False) -> None:
+        """
+        Overview:
+            Initialize the ``SegmentColumn``.
+        Arguments:
+            - capacity (:obj:`int`): The number of preallocated items.
+            - is_float (:obj:`bool`): Whether the items are promoted to at least float32, e.g. the rewards, whose \
+                first item may be an integer.
+            - ragged (:obj:`bool`): Whether the items are 1-D arrays of different lengths.
+        """
+        self._data = None
+        self._size = 0
+        self._capacity = max(capacity, 1)
+        self._float = is_float
+        self._ragged = ragged
+        self._lengths = np.zeros(self._capacity, dtype=np.int64) if ragged else None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: Any) -> None:
+        if self._data is None:
+            self._allocate(value)
+        if self._size == self._capacity:
+            self._grow(2 * self._capacity)
+        self._write(self._size, value)
+        self._size += 1
+
+    def extend(self, values: Iterable) -> None:
+        for value in values:
+            self.append(value)
+
+    def values(self) -> Union[np.ndarray, 'RaggedRows']:
+        """
+        Overview:
+            Return a view of the written items, ``RaggedRows`` if the items of a ragged column have different lengths.
+        """
+        if self._data is None:
+            return np.empty(0)
+        if self._ragged and self._size > 0 and np.any(self._lengths[:self._size] != self._data.shape[1]):
+            return RaggedRows(self._data[:self._size], self._lengths[:self._size])
+        return self._data[:self._size]
+
+    def _allocate(self, value: Any) -> None:
+        if value is None or isinstance(value, (bytes, str)):
+            # the encoded frames (bytes), the strings of ``transform2string`` and the None action masks of the
+            # continuous action spaces are kept as python objects
+            self._data = np.empty(self._capacity, dtype=object)
+            self._ragged = False
+            return
+        value = np.asarray(value)
+        dtype = value.dtype
+        if self._float:
+            dtype = np.result_type(dtype, np.float32)
+        self._data = np.zeros((self._capacity, *value.shape), dtype=dtype)
+
+    def _grow(self, capacity: int, width: Optional[int] = None) -> None:
+        shape = (capacity, *self._data.shape[1:]) if width is None else (capacity, width)
+        data = np.zeros(shape, dtype=self._data.dtype) if self._data.dtype != object else np.empty(shape, dtype=object)
+        if width is None:
+            data[:self._size] = self._data[:self._size]
+        else:
+            data[:self._size, :self._data.shape[1]] = self._data[:self._size]
+        self._data = data
+        if self._ragged and capacity > len(self._lengths):
+            self._lengths = np.concatenate([self._lengths, np.zeros(capacity - len(self._lengths), dtype=np.int64)])
+        self._capacity = capacity
+
+    def _write(self, index: int, value: Any) -> None:
+        if self._data.dtype == object:
+            self._data[index] = value
+            return
+        value = np.asarray(value)
+        if self._ragged:
+            if len(value) > self._data.shape[1]:
+                self._grow(self._capacity, width=len(value))
+            self._data[index, :len(value)] = value
+            self._data[index, len(value):] = 0
+            self._lengths[index] = len(value)
+        else:
+            self._data[index] = value
+
+
+class RaggedRows(object):
+    """
+    Overview:
+        A view of the rows of different lengths of a ragged ``SegmentColumn``, which replaces the ``dtype=object``
+        arrays of ``GameSegment``, e.g. for the child visits of board games. The rows are read and written in place.
+    """
+    __slots__ = ('_data', '_lengths')
+
+    def __init__(self, data: np.ndarray, lengths: np.ndarray) -> None:
+        self._data = data
+        self._lengths = lengths
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def data(self) -> np.ndarray:
+        return self._data
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return self._lengths
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[np.ndarray, 'RaggedRows']:
+        if isinstance(index, slice):
+            return RaggedRows(self._data[index], self._lengths[index])
+        return self._data[index, :self._lengths[index]]
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        value = np.asarray(value)
+        assert len(value) <= self._data.shape[1], 'the row is longer than the preallocated rows'
+        self._data[index, :len(value)] = value
+        self._data[index, len(value):] = 0
+        self._lengths[index] = len(value)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class _ColumnField(object):
+    """
+    Overview:
+        The descriptor of a column of ``ColumnarGameSegment``, which reads the view of the written items of the
+        ``SegmentColumn`` kept in the slot ``_<name>``. After ``game_segment_to_array`` (or an assignment, e.g. by the
+        observation store of the buffer), the slot holds the array itself, which is returned as it is.
+    """
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self._slot = '_' + name
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        if instance is None:
+            return self
+        column = getattr(instance, self._slot)
+        return column.values() if isinstance(column, SegmentColumn) else column
+
+    def __set__(self, instance: Any, value: Any) -> None:
+        setattr(instance, self._slot, value)
+
+
+class ColumnarGameSegment(object):
+    """
+    Overview:
+        A columnar ``GameSegment`` with ``__slots__``, used by ``MuZeroCollector`` if ``use_columnar_game_segment`` is
+        True in the policy config. Instead of growing about ten python lists at every step and converting them in
+        ``game_segment_to_array``, every column is a ``SegmentColumn`` preallocated to the max size of the game segment
+        (see ``game_segment_to_array`` of ``GameSegment``), e.g. ``game_segment_length + frame_stack_num +
+        num_unroll_steps`` observations, and the transitions are written in place. ``game_segment_to_array`` only
+        freezes the columns into views, without copy, and the visit count distributions of different lengths of board
+        games are kept in a zero-padded typed array (``RaggedRows``) instead of a ``dtype=object`` array.
+        The interfaces and the attributes are the same as the ones of ``GameSegment``, except that
+        ``root_sampled_actions`` stays a list, as it is concatenated by ``SampledEfficientZeroGameBuffer``.
+    Interfaces:
+        ``__init__``, ``__len__``, ``reset``, ``pad_over``, ``is_full``, ``legal_actions``, ``append``, ``get_obs``,
+        ``get_unroll_obs``, ``zero_obs``, ``get_targets``, ``game_segment_to_array``, ``store_search_stats``
+    """
+    __slots__ = (
+        'action_space', 'game_segment_length', 'num_unroll_steps', 'td_steps', 'frame_stack_num', 'discount_factor',
+        'action_space_size', 'gray_scale', 'transform2string', 'obs_codec', 'sampled_algo', 'gumbel_algo',
+        'use_ture_chance_label_in_chance_encoder', 'zero_obs_shape', 'target_values', 'target_rewards',
+        'target_policies', 'root_sampled_actions', '_obs_segment', '_action_segment', '_reward_segment',
+        '_child_visit_segment', '_root_value_segment', '_action_mask_segment', '_to_play_segment',
+        '_improved_policy_probs', '_chance_segment', '__weakref__'
+    )
+    obs_segment = _ColumnField()
+    action_segment = _ColumnField()
+    reward_segment = _ColumnField()
+    child_visit_segment = _ColumnField()
+    root_value_segment = _ColumnField()
+    action_mask_segment = _ColumnField()
+    to_play_segment = _ColumnField()
+    improved_policy_probs = _ColumnField()
+    chance_segment = _ColumnField()
+
+    # the methods which only read the columns are shared with ``GameSegment``
+    get_unroll_obs = GameSegment.get_unroll_obs
+    zero_obs = GameSegment.zero_obs
+    get_obs = GameSegment.get_obs
+    get_targets = GameSegment.get_targets
+    is_full = GameSegment.is_full
+    legal_actions = GameSegment.legal_actions
+    _encode_obs = GameSegment._encode_obs
+    __len__ = GameSegment.__len__
+
+    def __init__(self, action_space: int, game_segment_length: int = 200, config: EasyDict = None) -> None:
+        """
+        Overview:
+            Init the ``ColumnarGameSegment`` according to the provided arguments, as ``GameSegment``.
+        Arguments:
+             action_space (:obj:`int`): action space
+            - game_segment_length (:obj:`int`): the transition number of one ``GameSegment`` block
+        """
+        self.action_space = action_space
+        self.game_segment_length = game_segment_length
+        self.num_unroll_steps = config.num_unroll_steps
+        self.td_steps = config.td_steps
+        self.frame_stack_num = config.model.frame_stack_num
+        self.discount_factor = config.discount_factor
+        self.action_space_size = config.model.action_space_size
+        self.gray_scale = config.gray_scale
+        self.transform2string = config.transform2string
+        self.obs_codec = config.get('obs_codec', None)
+        self.sampled_algo = config.sampled_algo
+        self.gumbel_algo = config.gumbel_algo
+        self.use_ture_chance_label_in_chance_encoder = config.use_ture_chance_label_in_chance_encoder
+
+        if isinstance(config.model.observation_shape, int) or len(config.model.observation_shape) == 1:
+            self.zero_obs_shape = config.model.observation_shape
+        elif len(config.model.observation_shape) == 3:
+            self.zero_obs_shape = (
+                config.model.observation_shape[-2], config.model.observation_shape[-1], config.model.image_channel
+            )
+
+        self.target_values = []
+        self.target_rewards = []
+        self.target_policies = []
+        self.root_sampled_actions = []
+        self._init_columns()
+
+    def _init_columns(self) -> None:
+        """
+        Overview:
+            Preallocate the columns, sized by the max number of items of a full game segment after ``pad_over``.
+        """
+        length, unroll, td = self.game_segment_length, self.num_unroll_steps, self.td_steps
+        self._obs_segment = SegmentColumn(length + self.frame_stack_num + unroll)
+        self._action_segment = SegmentColumn(length)
+        self._reward_segment = SegmentColumn(length + unroll + td - 1, is_float=True)
+        self._child_visit_segment = SegmentColumn(length + unroll, is_float=True, ragged=True)
+        self._root_value_segment = SegmentColumn(length + unroll + td, is_float=True)
+        self._action_mask_segment = SegmentColumn(length)
+        self._to_play_segment = SegmentColumn(length)
+        self._improved_policy_probs = SegmentColumn(length + unroll + td, is_float=True, ragged=True)
+        self._chance_segment = SegmentColumn(length + unroll + td - 1)
+
+    def append(
+            self,
+            action: np.ndarray,
+            obs: np.ndarray,
+            reward: np.ndarray,
+            action_mask: np.ndarray = None,
+            to_play: int = -1,
+            chance: int = 0,
+    ) -> None:
+        """
+        Overview:
+            Write a transition tuple, including a_t, o_{t+1}, r_{t}, action_mask_{t}, to_play_{t}, in place.
+        """
+        self._action_segment.append(action)
+        self._obs_segment.append(self._encode_obs(obs))
+        self._reward_segment.append(reward)
+        self._action_mask_segment.append(action_mask)
+        self._to_play_segment.append(to_play)
+        if self.use_ture_chance_label_in_chance_encoder:
+            self._chance_segment.append(chance)
+
+    def pad_over(
+            self, next_segment_observations: List, next_segment_rewards: List, next_segment_root_values: List,
+            next_segment_child_visits: List, next_segment_improved_policy: List = None, next_chances: List = None,
+    ) -> None:
+        """
+        Overview:
+            Write the (o_t, r_t, etc) of the next game segment, as ``GameSegment.pad_over``.
+        """
+        assert len(next_segment_observations) <= self.num_unroll_steps
+        assert len(next_segment_child_visits) <= self.num_unroll_steps
+        assert len(next_segment_root_values) <= self.num_unroll_steps + self.td_steps
+        assert len(next_segment_rewards) <= self.num_unroll_steps + self.td_steps - 1
+        if self.gumbel_algo:
+            assert len(next_segment_improved_policy) <= self.num_unroll_steps + self.td_steps
+
+        # the observations are copied into the preallocated array
+        self._obs_segment.extend(next_segment_observations)
+        self._reward_segment.extend(next_segment_rewards)
+        self._root_value_segment.extend(next_segment_root_values)
+        self._child_visit_segment.extend(next_segment_child_visits)
+        if self.gumbel_algo:
+            self._improved_policy_probs.extend(next_segment_improved_policy)
+        if self.use_ture_chance_label_in_chance_encoder:
+            self._chance_segment.extend(next_chances)
+
+    def store_search_stats(
+            self,
+            visit_counts: List,
+            root_value: List,
+            root_sampled_actions: List = None,
+            improved_policy: List = None,
+            idx: int = None
+    ) -> None:
+        """
+        Overview:
+            store the visit count distributions and value of the root node after MCTS.
+        """
+        sum_visits = sum(visit_counts)
+        if idx is None:
+            self._child_visit_segment.append([visit_count / sum_visits for visit_count in visit_counts])
+            self._root_value_segment.append(root_value)
+            if self.sampled_algo:
+                self.root_sampled_actions.append(root_sampled_actions)
+            if self.gumbel_algo:
+                self._improved_policy_probs.append(improved_policy)
+        else:
+            self.child_visit_segment[idx] = [visit_count / sum_visits for visit_count in visit_counts]
+            self.root_value_segment[idx] = root_value
+            self.improved_policy_probs[idx] = improved_policy
+
+    def game_segment_to_array(self) -> None:
+        """
+        Overview:
+            Freeze the columns into the views of their written items when the game segment is full, so the attributes
+            are the same numpy arrays as the ones of ``GameSegment.game_segment_to_array``, without copy. The child
+            visits (and the improved policies) of different lengths are kept as ``RaggedRows``.
+        """
+        for name in ColumnarGameSegment.__slots__:
+            column = getattr(self, name, None)
+            if isinstance(column, SegmentColumn):
+                setattr(self, name, column.values())
+
+    def reset(self, init_observations: np.ndarray) -> None:
+        """
+        Overview:
+            Initialize the game segment using ``init_observations``,
+            which is the previous ``frame_stack_num`` stacked frames.
+        Arguments:
+            - init_observations (:obj:`list`): list of the stack observations in the previous time steps.
+        """
+        self._init_columns()
+        self.root_sampled_actions = []
+        assert len(init_observations) == self.frame_stack_num
+        for observation in init_observations:
+            self._obs_segment.append(self._encode_obs(observation))
@@ -0,0 +1,213 @@
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from typing import Any, Optional, Tuple, Union
+
+import numpy as np
+
+
+class DiskSegmentStore(object):
+    """
+    Overview:
+        The on-disk storage of the observation frames and the targets of the game segments, used by ``GameBuffer`` if
+        ``use_disk_store`` is True. When a game segment is pushed, its large numeric arrays (see ``SPILL_FIELDS``) are
+        written to one ``.npy`` file per array and replaced by ``DiskArray`` handles, while the priorities, the look-up
+        table and the small per-transition arrays stay in RAM.
+        The arrays of the recently used (hot) game segments are kept in RAM by an LRU cache of at most ``cache_bytes``
+        bytes, and the others are read through ``np.memmap``, so the buffer can be much larger than the RAM: a cold
+        read only reads the indexed rows, and an array enters the cache when it is read in full or read again while
+        its memmap is still open.
+    Interfaces:
+        ``__init__``, ``spill``, ``load``, ``read``, ``remove``, ``close``, ``hit_rate``
+    """
+    SPILL_FIELDS = ('obs_segment', 'reward_segment', 'root_value_segment', 'child_visit_segment', 'improved_policy_probs')
+    # the max number of the memmaps of the cold arrays kept open
+    MAX_MEMMAPS = 1024
+
+    def __init__(self, directory: Optional[str] = None, cache_bytes: int = 2 ** 30) -> None:
+        """
+        Overview:
+            Initialize the ``DiskSegmentStore``.
+        Arguments:
+            - directory (:obj:`Optional[str]`): The directory of the segment files. If None, a temporary directory is \
+                created and removed when the store is released.
+            - cache_bytes (:obj:`int`): The max bytes of the arrays kept in RAM by the LRU cache.
+        """
+        self._finalizer = None
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='lightzero_replay_')
+            self._finalizer = weakref.finalize(self, shutil.rmtree, directory, True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._memmaps = OrderedDict()
+        self._next_segment_id = 0
+        self.hits, self.misses = 0, 0
+
+    def _path(self, segment_id: int, field: str) -> str:
+        return os.path.join(self.directory, '{}_{}.npy'.format(segment_id, field))
+
+    def spill(self, game_segment: Any) -> None:
+        """
+        Overview:
+            Write the arrays of ``game_segment`` in ``SPILL_FIELDS`` to the segment files and replace them with
+            ``DiskArray``. The object arrays (e.g. the child visits of board games) and the empty arrays stay in RAM.
+        Arguments:
+            - game_segment (:obj:`GameSegment`): The game segment which has been converted by ``game_segment_to_array``.
+        """
+        segment_id = self._next_segment_id
+        self._next_segment_id += 1
+        for field in self.SPILL_FIELDS:
+            array = getattr(game_segment, field, None)
+            if not isinstance(array, np.ndarray) or array.dtype == object or array.size == 0:
+                continue
+            np.save(self._path(segment_id, field), array)
+            setattr(game_segment, field, DiskArray(self, segment_id, field, array.shape, array.dtype))
+
+    def load(self, segment_id: int, field: str) -> np.ndarray:
+        """
+        Overview:
+            Return the whole array ``field`` of the game segment ``segment_id``, from the LRU cache if it is hot,
+            otherwise read it into RAM and put it into the cache.
+        """
+        key = (segment_id, field)
+        array = self._cache.get(key)
+        if array is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return array
+        self.misses += 1
+        return self._promote(key, self._memmap(key))
+
+    def read(self, segment_id: int, field: str, index: Union[int, slice, np.ndarray]) -> Any:
+        """
+        Overview:
+            Return ``array[index]`` of the array ``field`` of the game segment ``segment_id``. A cold array is read
+            through its memmap, which only reads the indexed rows from the file, unless it is read for the second time
+            while its memmap is open, i.e. it is becoming hot, in which case it is read into the cache.
+        """
+        key = (segment_id, field)
+        array = self._cache.get(key)
+        if array is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return array[index]
+        self.misses += 1
+        reread = key in self._memmaps
+        memmap = self._memmap(key)
+        if reread and memmap.nbytes <= self.cache_bytes:
+            return self._promote(key, memmap)[index]
+        value = memmap[index]
+        # copy the rows out of the memmap, which is not kept alive by the returned array
+        return np.array(value) if isinstance(value, np.ndarray) else value
+
+    def _memmap(self, key: Tuple[int, str]) -> np.ndarray:
+        memmap = self._memmaps.get(key)
+        if memmap is not None:
+            self._memmaps.move_to_end(key)
+            return memmap
+        memmap = np.load(self._path(*key), mmap_mode='r')
+        self._memmaps[key] = memmap
+        if len(self._memmaps) > self.MAX_MEMMAPS:
+            self._memmaps.popitem(last=False)
+        return memmap
+
+    def _promote(self, key: Tuple[int, str], memmap: np.ndarray) -> np.ndarray:
+        # the full in-RAM copy of the array, which is kept by the LRU cache if it fits
+        array = np.array(memmap)
+        array.flags.writeable = False
+        if array.nbytes <= self.cache_bytes:
+            self._memmaps.pop(key, None)
+            self._cache[key] = array
+            self._cached_bytes += array.nbytes
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= evicted.nbytes
+        return array
+
+    def remove(self, game_segment: Any) -> None:
+        """
+        Overview:
+            Delete the segment files of ``game_segment`` and drop its arrays from the cache.
+        """
+        for field in self.SPILL_FIELDS:
+            array = getattr(game_segment, field, None)
+            if isinstance(array, DiskArray) and array.store is self:
+                cached = self._cache.pop((array.segment_id, field), None)
+                if cached is not None:
+                    self._cached_bytes -= cached.nbytes
+                self._memmaps.pop((array.segment_id, field), None)
+                try:
+                    os.remove(self._path(array.segment_id, field))
+                except FileNotFoundError:
+                    pass
+
+    def close(self) -> None:
+        """
+        Overview:
+            Drop the cache and delete the segment files written by this store (and its temporary directory), e.g.
+            before the buffer storage is replaced. The store must not be used afterwards.
+        """
+        self._cache.clear()
+        self._cached_bytes = 0
+        self._memmaps.clear()
+        if self._finalizer is not None:
+            self._finalizer()
+            return
+        for segment_id in range(self._next_segment_id):
+            for field in self.SPILL_FIELDS:
+                try:
+                    os.remove(self._path(segment_id, field))
+                except FileNotFoundError:
+                    pass
+
+    def hit_rate(self) -> float:
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def __getstate__(self) -> dict:
+        # the other processes read the same segment files with an empty cache
+        return {'directory': self.directory, 'cache_bytes': self.cache_bytes}
+
+    def __setstate__(self, state: dict) -> None:
+        # the directory is owned by the store of the buffer
+        self._finalizer = None
+        self.directory = state['directory']
+        self.cache_bytes = state['cache_bytes']
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._memmaps = OrderedDict()
+        self._next_segment_id = 0
+        self.hits, self.misses = 0, 0
+
+
+class DiskArray(object):
+    """
+    Overview:
+        The handle of an array of a game segment stored by ``DiskSegmentStore``. It behaves like the read-only
+        ``np.ndarray`` of the array, which is loaded by the store on access.
+    """
+
+    def __init__(self, store: DiskSegmentStore, segment_id: int, field: str, shape: Tuple[int, ...], dtype: Any) -> None:
+        self.store = store
+        self.segment_id = segment_id
+        self.field = field
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, index: Union[int, slice, np.ndarray]) -> Any:
+        return self.store.read(self.segment_id, self.field, index)
+
+    def __iter__(self):
+        return iter(self.store.load(self.segment_id, self.field))
+
+    def __array__(self, dtype: Optional[Any] = None, copy: Optional[bool] = None) -> np.ndarray:
+        array = self.store.load(self.segment_id, self.field)
+        return array if dtype is None else array.astype(dtype, copy=False)
@@ -1,6 +1,7 @@
 import copy
 import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from typing import Any, List, Tuple, Optional, Union, TYPE_CHECKING
 
 import numpy as np
@@ -8,6 +9,16 @@ from ding.torch_utils.data_helper import to_list
 from ding.utils import BUFFER_REGISTRY
 from easydict import EasyDict
 
+from lzero.mcts.utils import prepare_observation
+from .buffer_snapshot import load_snapshot, save_snapshot
+from .disk_segment_store import DiskSegmentStore
+from .obs_codec import decode_obs_batch, get_obs_codec
+from .priority_tree import PriorityTree
+from .reanalyze_cache import ReanalyzeCache
+from .ring_array import FrameSlice, RingArray
+from .sampling_strategy import get_sampling_strategy
+from .shared_obs_arena import SharedObsArena
+
 if TYPE_CHECKING:
     from lzero.policy import MuZeroPolicy, EfficientZeroPolicy, SampledEfficientZeroPolicy, GumbelMuZeroPolicy
 
@@ -38,6 +49,130 @@ class GameBuffer(ABC, object):
         use_root_value=False,
         # (int) The number of samples required for mini inference.
         mini_infer_size=256,
+        # (bool) Whether to compute the value targets and the reanalyzed policy targets in one reanalysis, i.e. one
+        # initial inference of the deduplicated observations of both contexts and one batched MCTS of all the roots.
+        use_fused_reanalyze=False,
+        # (bool) Whether to index the transition priorities with a sum-tree (``PriorityTree``). It makes sampling and
+        # priority updates O(log N) and eviction O(k) instead of O(N), which matters for buffers with millions of transitions.
+        use_priority_tree=False,
+        # (bool) Whether to sample with replacement when ``use_priority_tree`` is True. If False, the exact
+        # without-replacement semantics of ``np.random.choice(..., replace=False)`` are kept.
+        priority_tree_sample_replace=False,
+        # (str) The sampling strategy (``SamplingStrategy``) which shapes the sampling distribution on top of the
+        # priorities, one of 'uniform' (ignore the priorities), 'per' (the priorities only), 'recency' (weight the
+        # recent transitions) and 'reanalyze_fresh_first' (weight the transitions with freshly computed targets, e.g.
+        # refreshed by ``ReanalyzeDaemon``). A ``SamplingStrategy`` instance can also be given.
+        sampling_strategy='per',
+        # (float) The half-life of the weights of 'recency', in fraction of the stored transitions, and of
+        # 'reanalyze_fresh_first', in seconds since the last refresh of the targets.
+        sampling_half_life=None,
+        # (float) The min weight of a transition in the 'recency' and 'reanalyze_fresh_first' strategies.
+        sampling_min_weight=0.01,
+        # (bool) Whether to store the game segments, priorities and transition look-up table in preallocated circular
+        # arrays (``RingArray``). Pushing and evicting data then cost O(game segment length) and never reallocate the
+        # whole buffer, which avoids the peak memory spikes of ``np.concatenate`` in ``remove_oldest_data_to_fit``.
+        use_ring_buffer=False,
+        # (int) The number of transitions preallocated in the ring buffer mode. If None, ``2 * replay_buffer_size`` is
+        # used, which leaves room for the data pushed before ``remove_oldest_data_to_fit`` is called.
+        ring_buffer_capacity=None,
+        # (bool) Whether to keep the observations and actions of all game segments in contiguous per-buffer arrays, so
+        # that ``_make_batch`` gathers the inputs of a whole minibatch by fancy indexing instead of a python loop over
+        # the samples. The game segments then reference slices of these arrays, so no extra copy is kept.
+        # Only effective in ``MuZeroGameBuffer`` and ``EfficientZeroGameBuffer``, and ignored if ``transform2string`` is True.
+        use_vectorized_batch=False,
+        # (bool) Whether to allocate the observation store of ``use_vectorized_batch`` in shared memory
+        # (``SharedObsArena``). The game segments then only reference their frames by offset, so the game segments and
+        # the reanalyze contexts are sent to other processes (e.g. the reanalyze workers) without pickling the frames.
+        use_shared_obs_store=False,
+        # (bool) Whether to deduplicate the frames in the observation store of ``use_vectorized_batch``. The stacked
+        # frames at the beginning of a game segment and the padded frames at its end are the same frames as the ones
+        # of the neighbouring game segments of the episode, so they are stored once and the game segments reference
+        # their frames by index (``FrameSlice``).
+        use_frame_dedup=False,
+        # (str) The name of the ``ObsCodec`` which encodes the observation frames of the game segments, one of
+        # 'zlib', 'lz4', 'zstd' (lossless), 'delta' (lossless, uint8 delta + zlib) and 'jpeg' (lossy). The frames of a
+        # sampled minibatch are decoded in one call. If None, the raw frames are stored. The observation store of
+        # ``use_vectorized_batch`` is not used with a codec.
+        obs_codec=None,
+        # (bool) Whether to store the observation frames and the targets of the game segments in memory-mapped segment
+        # files on disk (``DiskSegmentStore``), while the priorities and the indices are kept in RAM. It allows buffers
+        # larger than the RAM, e.g. for Atari. ``use_vectorized_batch`` is ignored in this mode.
+        use_disk_store=False,
+        # (str) The directory of the segment files. If None, a temporary directory is used and removed at exit.
+        disk_store_dir=None,
+        # (int) The max bytes of the arrays of the hot game segments kept in RAM by the LRU cache of the disk store.
+        disk_cache_bytes=2 ** 30,
+        # (bool) Whether to compute the n-step value targets (and the rewards / value prefixes) of the whole minibatch
+        # with numpy array operations instead of a python loop over every transition and every td step.
+        # The results are bit-identical to the loop. Only effective in the buffers of MuZero and EfficientZero variants.
+        use_vectorized_value_target=False,
+        # (bool) Whether to assemble the target policies of the whole minibatch by scattering the visit count
+        # distributions into one preallocated float32 array instead of building every target policy as a python list.
+        # Only effective in the buffers of MuZero and EfficientZero variants (except the reanalyzed target policies
+        # of Sampled EfficientZero).
+        use_vectorized_policy_target=False,
+        # (bool) Whether to prepare the next minibatches in a background thread (``PrefetchSampler``) while the learner
+        # is training. Only used in ``train_muzero``.
+        use_prefetch_sampler=False,
+        # (int) The number of minibatches prepared in advance by the ``PrefetchSampler``.
+        prefetch_batch_num=2,
+        # (int) The max number of train iterations that the target model weights used for reanalysis in the prefetched
+        # minibatches can lag behind. The staler minibatches are dropped.
+        prefetch_max_staleness=10,
+        # (int) The number of worker processes (``ReanalyzeWorkerPool``) which recompute the reanalyzed value and policy
+        # targets with a CPU copy of the target model. 0 means the targets are computed in the learner process.
+        reanalyze_num_workers=0,
+        # (int) Synchronize the target model of the reanalyze workers every ``reanalyze_model_sync_freq`` minibatches.
+        reanalyze_model_sync_freq=1,
+        # (int) The max number of reanalyzed roots (root value and visit count distribution) kept in the LRU cache,
+        # keyed by (game segment id, position, target model version), so the transitions sampled again before the next
+        # target model update are not searched again. 0 means no cache.
+        reanalyze_cache_size=0,
+        # (bool) Whether the reanalyzed policy targets are refreshed in the background by ``ReanalyzeDaemon`` (MuZero
+        # Reanalyze), which writes fresh root visit count distributions and root values back into the stored game
+        # segments, stalest first. ``sample`` then serves the stored policy targets without MCTS, i.e. as if
+        # ``reanalyze_ratio`` were 0.
+        use_reanalyze_daemon=False,
+        # (float) The max number of transitions per second refreshed by ``ReanalyzeDaemon``.
+        reanalyze_daemon_budget=1000.,
+        # (str) The directory of the buffer snapshot used by ``train_muzero``: the buffer is restored from it at start
+        # if it exists, and dumped to it at the end of the training. None means no snapshot.
+        snapshot_path=None,
+        # (int) The frequency (in train iterations) of the periodic dumps of the buffer snapshot during the training,
+        # e.g. the same as the frequency of the checkpoints. None means the snapshot is only dumped at the end.
+        snapshot_freq=None,
+        # (str) The compression of the column files of ``save_snapshot``, one of None, 'zlib', 'lz4' and 'zstd'.
+        snapshot_compression=None,
+        # (int) The number of the threads which write or read the chunks of a snapshot in parallel.
+        snapshot_num_workers=4,
+        # (int) The number of game segments per chunk of a snapshot.
+        snapshot_chunk_size=256,
+        # (str) The directory of the offline dataset which ``train_muzero`` exports the collected game segments to by
+        # ``SegmentDatasetWriter``, and which ``train_muzero_offline`` trains on. None means no export.
+        dataset_path=None,
+        # (int) The number of game segments per shard file of the offline dataset.
+        dataset_shard_size=256,
+        # (int) The id of the ``SegmentDatasetWriter`` of this process, which must be unique among the processes which
+        # export to the same ``dataset_path``, e.g. several collector nodes. None means the rank of the process.
+        dataset_writer_id=None,
+        # (str) The compression of the records of the offline dataset, one of None, 'zlib', 'lz4' and 'zstd'.
+        dataset_compression=None,
+        # (int) The number of game segments streamed from the offline dataset into the buffer by
+        # ``train_muzero_offline`` before each round of updates.
+        dataset_load_batch_size=64,
+        # (int) The number of the shard processes of ``ReplayBufferServer`` which hold the replay buffer of
+        # ``train_muzero`` instead of the train process, e.g. one buffer shared by all the ranks of a data-parallel
+        # training. 0 means no replay buffer server.
+        buffer_server_num_shards=0,
+        # (str) The transport of the replay buffer server, 'pipe' (local processes) or 'socket' (required by DDP).
+        buffer_server_transport='pipe',
+        # (str) The host of the shards of the socket transport, which must be reachable by all the ranks.
+        buffer_server_host='localhost',
+        # (int) Synchronize the target models of the shards every ``buffer_server_sync_freq`` minibatches.
+        buffer_server_sync_freq=1,
+        # (str) The device on which the shards compute the targets of their minibatches, e.g. 'cuda' for the models
+        # whose reanalysis is too slow on CPU. On 'cpu', every shard uses one thread.
+        buffer_server_device='cpu',
     )
 
     def __init__(self, cfg: dict):
@@ -51,21 +186,260 @@ class GameBuffer(ABC, object):
         default_config = self.default_config()
         default_config.update(cfg)
         self._cfg = default_config
-        self._cfg = cfg
         assert self._cfg.env_type in ['not_board_games', 'board_games']
         self.replay_buffer_size = self._cfg.replay_buffer_size
         self.batch_size = self._cfg.batch_size
         self._alpha = self._cfg.priority_prob_alpha
         self._beta = self._cfg.priority_prob_beta
+        strategy_kwargs = {'min_weight': self._cfg.sampling_min_weight}
+        if self._cfg.sampling_half_life is not None:
+            strategy_kwargs['half_life'] = self._cfg.sampling_half_life
+        self._sampling_strategy = get_sampling_strategy(self._cfg.sampling_strategy, **strategy_kwargs)
 
-        self.game_segment_buffer = []
-        self.game_pos_priorities = []
-        self.game_segment_game_pos_look_up = []
+        self._init_storage()
 
         self.keep_ratio = 1
         self.num_of_collected_episodes = 0
         self.base_idx = 0
         self.clear_time = 0
+        # the ``ReanalyzeWorkerPool``, which is started at the first ``sample`` if ``reanalyze_num_workers`` > 0
+        self._reanalyze_pool = None
+        # the LRU cache of the reanalyzed roots if ``reanalyze_cache_size`` > 0
+        self._reanalyze_cache = ReanalyzeCache(self._cfg.reanalyze_cache_size) \
+            if self._cfg.reanalyze_cache_size > 0 else None
+        # the compression ratio and the decoding time (in seconds) of the observations of the last decoded batch
+        self.obs_codec_stats = {'compression_ratio': 1., 'decode_time': 0.}
+        # the number of transitions whose targets are refreshed by ``ReanalyzeDaemon``
+        self.num_of_refreshed_transitions = 0
+
+    def _init_storage(self) -> None:
+        """
+        Overview:
+            Initialize the storage of game segments, the priorities and the look-up table from transition index to
+            (game segment index, position in game segment).
+        """
+        if self._cfg.use_ring_buffer:
+            capacity = self._cfg.ring_buffer_capacity or 2 * int(self.replay_buffer_size)
+            self.game_segment_buffer = RingArray(
+                max(capacity // self._cfg.get('game_segment_length', 200), 16), dtype=object
+            )
+            self.game_pos_priorities = RingArray(capacity, dtype=np.float64)
+            self.game_segment_game_pos_look_up = RingArray(capacity, shape=(2, ), dtype=np.int64)
+        else:
+            self.game_segment_buffer = []
+            self.game_pos_priorities = []
+            self.game_segment_game_pos_look_up = []
+        # NOTE: if ``use_priority_tree`` is True, the priorities are kept in ``self._priority_tree`` instead of
+        # ``self.game_pos_priorities``.
+        self._priority_tree = PriorityTree(int(self.replay_buffer_size), self._alpha) \
+            if self._cfg.use_priority_tree else None
+        # the number of transitions evicted so far, ``transition_base_idx + index`` is a stable global transition index
+        self.transition_base_idx = 0
+
+        # the contiguous per-buffer observation and action arrays, which are allocated at the first push
+        self._obs_store, self._action_store = None, None
+        # (global start, length) of the observations and actions of each game segment in the stores, and the smallest
+        # global index of the frames of the game segment
+        self._segment_store_index = RingArray(1024, shape=(5, ), dtype=np.int64)
+        # if ``use_frame_dedup`` is True, the global indices of the frames of all game segments, in which
+        # ``self._segment_store_index`` refers to the observations, and the indices of the frames which may start the
+        # next game segment of an episode, keyed by the hash of the ``frame_stack_num`` first frames
+        self._frame_index_store = RingArray(1024, dtype=np.int64)
+        self._frame_tails = {}
+        self._disk_store = DiskSegmentStore(self._cfg.disk_store_dir, self._cfg.disk_cache_bytes) \
+            if self._cfg.use_disk_store else None
+        # the time of the last refresh of the targets of every game segment (by global game segment index), i.e. of
+        # its collection or of its last reanalysis by ``ReanalyzeDaemon``, ordered from the stalest
+        self._target_refresh_time = OrderedDict()
+        # the same refresh times by relative game segment index, for the vectorized look-up in ``SamplingStrategy``
+        self._segment_refresh_time = RingArray(1024, dtype=np.float64)
+
+    def _release_storage(self) -> None:
+        """
+        Overview:
+            Release the shared memory of the observation store and the files of the disk store, before the storage is
+            replaced by ``_init_storage`` or the buffer is closed.
+        """
+        if isinstance(getattr(self, '_obs_store', None), SharedObsArena):
+            self._obs_store.close()
+        if getattr(self, '_disk_store', None) is not None:
+            self._disk_store.close()
+
+    @property
+    def _use_store(self) -> bool:
+        return self._cfg.use_vectorized_batch and not self._cfg.get('transform2string', False) \
+            and not self._cfg.use_disk_store and self._cfg.obs_codec is None
+
+    def _push_game_segment_to_store(self, game_segment: Any) -> None:
+        """
+        Overview:
+            Copy the observations and actions of ``game_segment`` into the per-buffer stores and let the game segment
+            reference the stored slices instead of its own arrays.
+        Arguments:
+            - game_segment (:obj:`GameSegment`): The game segment which has been converted by ``game_segment_to_array``.
+        """
+        obs = np.asarray(game_segment.obs_segment)
+        actions = np.asarray(game_segment.action_segment)
+        if self._obs_store is None:
+            capacity = self._cfg.ring_buffer_capacity or 2 * int(self.replay_buffer_size)
+            frames_per_transition = len(obs) / max(len(actions), 1)
+            obs_store_type = SharedObsArena if self._cfg.use_shared_obs_store else RingArray
+            self._obs_store = obs_store_type(
+                int(capacity * frames_per_transition) + len(obs), shape=obs.shape[1:], dtype=obs.dtype
+            )
+            self._action_store = RingArray(capacity, shape=actions.shape[1:], dtype=actions.dtype)
+        # the underlying arrays of the stores, which are replaced if the stores grow
+        obs_data, action_data = self._obs_store._data, self._action_store._data
+        action_start = self._action_store.base + len(self._action_store)
+        if self._cfg.use_frame_dedup:
+            frame_ids = self._push_frames_dedup(obs, len(actions))
+            obs_start = self._frame_index_store.base + len(self._frame_index_store)
+            self._frame_index_store.extend(frame_ids)
+            min_frame_id = frame_ids.min() if len(frame_ids) > 0 else self._obs_store.base + len(self._obs_store)
+        else:
+            obs_start = min_frame_id = self._obs_store.base + len(self._obs_store)
+            self._obs_store.extend(obs)
+            frame_ids = np.arange(obs_start, obs_start + len(obs))
+        self._action_store.extend(actions)
+        self._segment_store_index.append([obs_start, len(obs), action_start, len(actions), min_frame_id])
+        if self._cfg.use_shared_obs_store or self._cfg.use_frame_dedup:
+            # only reference the frames by global index, which is pickled without the frames in shared memory
+            game_segment.obs_segment = FrameSlice(self._obs_store, frame_ids)
+        else:
+            game_segment.obs_segment = self._obs_store.frames(obs_start, len(obs))
+        game_segment.action_segment = self._action_store.frames(action_start, len(actions))
+        if self._obs_store._data is not obs_data or self._action_store._data is not action_data:
+            self._repoint_store_views()
+
+    def _repoint_store_views(self) -> None:
+        """
+        Overview:
+            Let the stored game segments reference the slices of the current underlying arrays of the stores after a
+            store has grown, since their views would otherwise keep the previous arrays alive.
+        """
+        for game_segment, (obs_start, num_of_obs, action_start, num_of_actions, _) in zip(
+                self.game_segment_buffer, self._segment_store_index.values()):
+            if not isinstance(game_segment.obs_segment, FrameSlice):
+                game_segment.obs_segment = self._obs_store.frames(obs_start, num_of_obs)
+            game_segment.action_segment = self._action_store.frames(action_start, num_of_actions)
+
+    def _push_frames_dedup(self, obs: np.ndarray, num_of_actions: int) -> np.ndarray:
+        """
+        Overview:
+            Push the frames of a game segment into the observation store, except the leading frames which are the same
+            as the last frames of the previous game segment of the episode (i.e. its stacked frames and padded frames).
+        Arguments:
+            - obs (:obj:`np.ndarray`): The frames of the game segment.
+            - num_of_actions (:obj:`int`): The number of transitions of the game segment.
+        Returns:
+            - frame_ids (:obj:`np.ndarray`): The global indices of the frames of the game segment in the store.
+        """
+        stack = self._cfg.model.frame_stack_num
+        frame_ids = np.empty(len(obs), dtype=np.int64)
+        num_of_shared = 0
+        if len(obs) >= stack:
+            tail_ids = self._frame_tails.pop(hash(obs[:stack].tobytes()), None)
+            if tail_ids is not None and tail_ids.min() >= self._obs_store.base:
+                num = min(len(tail_ids), len(obs))
+                # compare the frames, the hash only selects the candidate
+                same = (self._obs_store.take(tail_ids[:num]) == obs[:num]).reshape(num, -1).all(axis=1)
+                num_of_shared = int(np.cumprod(same).sum())
+                frame_ids[:num_of_shared] = tail_ids[:num_of_shared]
+        new_start = self._obs_store.base + len(self._obs_store)
+        self._obs_store.extend(obs[num_of_shared:])
+        frame_ids[num_of_shared:] = np.arange(new_start, new_start + len(obs) - num_of_shared)
+        if len(obs) >= num_of_actions + stack:
+            # the frames from ``num_of_actions`` on are the first frames of the next game segment of the episode
+            self._frame_tails[hash(obs[num_of_actions:num_of_actions + stack].tobytes())] = frame_ids[num_of_actions:]
+        return frame_ids
+
+    def _remove_game_segments_from_store(self, num_of_game_segments: int) -> None:
+        """
+        Overview:
+            Drop the observations and actions of the ``num_of_game_segments`` oldest game segments from the stores.
+            With ``use_frame_dedup``, only the frames which are not referenced by the remaining game segments are
+            dropped.
+        """
+        store_index = self._segment_store_index[:num_of_game_segments]
+        num_of_obs, num_of_actions = int(store_index[:, 1].sum()), int(store_index[:, 3].sum())
+        self._action_store.popleft(num_of_actions)
+        self._segment_store_index.popleft(num_of_game_segments)
+        if not self._cfg.use_frame_dedup:
+            self._obs_store.popleft(num_of_obs)
+            return
+        self._frame_index_store.popleft(num_of_obs)
+        if len(self._segment_store_index) > 0:
+            self._obs_store.popleft(self._segment_store_index.values()[:, 4].min() - self._obs_store.base)
+        else:
+            self._obs_store.popleft(len(self._obs_store))
+        base = self._obs_store.base
+        self._frame_tails = {key: ids for key, ids in self._frame_tails.items() if ids.min() >= base}
+
+    def _prepare_obs_batch(self, obs_list: List[Any]) -> np.ndarray:
+        """
+        Overview:
+            Decode the stacked observations of a batch (if ``obs_codec`` is not None) in one call and convert them into
+            the input format of the model by ``prepare_observation``.
+        Arguments:
+            - obs_list (:obj:`List[Any]`): The stacked observations, which are returned by \
+                ``GameSegment.get_unroll_obs(..., decode=False)``.
+        """
+        if self._cfg.obs_codec is not None and len(obs_list) > 0:
+            start_time = time.time()
+            obs_list, num_of_encoded_bytes = decode_obs_batch(
+                get_obs_codec(self._cfg.obs_codec, self._cfg.get('gray_scale', False)), obs_list
+            )
+            self.obs_codec_stats = {
+                'compression_ratio': obs_list.nbytes / max(num_of_encoded_bytes, 1),
+                'decode_time': time.time() - start_time,
+            }
+        return prepare_observation(obs_list, self._cfg.model.model_type)
+
+    def _get_game_segment_index(self, batch_index_list: np.ndarray) -> np.ndarray:
+        """
+        Overview:
+            Return the relative index in ``self.game_segment_buffer`` of the game segments of the given transitions.
+        """
+        if self._cfg.use_ring_buffer:
+            return self.game_segment_game_pos_look_up[np.asarray(batch_index_list)][:, 0] - self.base_idx
+        return np.array([self.game_segment_game_pos_look_up[idx][0] for idx in batch_index_list]) - self.base_idx
+
+    def _gather_unroll_obs(
+            self, game_segment_index: np.ndarray, pos_in_game_segment: np.ndarray, num_unroll_steps: int
+    ) -> np.ndarray:
+        """
+        Overview:
+            The vectorized ``GameSegment.get_unroll_obs(pos, num_unroll_steps, padding=True)`` over a batch of
+            positions, i.e. o[t, t + stack frames + num_unroll_steps], padded with the last frame of the game segment.
+        Returns:
+            - obs (:obj:`np.ndarray`): shape (batch_size, frame_stack_num + num_unroll_steps, *obs_shape).
+        """
+        store_index = self._segment_store_index[game_segment_index]
+        frames = pos_in_game_segment[:, None] + np.arange(self._cfg.model.frame_stack_num + num_unroll_steps)
+        frames = np.minimum(frames, store_index[:, 1:2] - 1)
+        if self._cfg.use_frame_dedup:
+            return self._obs_store.take(self._frame_index_store.take(store_index[:, 0:1] + frames))
+        return self._obs_store.take(store_index[:, 0:1] + frames)
+
+    def _gather_unroll_actions(self, game_segment_index: np.ndarray,
+                               pos_in_game_segment: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            Gather a[t, t + num_unroll_steps] of a batch of positions, the actions out of the game segment are
+            padded with random actions.
+        Returns:
+            - actions (:obj:`np.ndarray`): shape (batch_size, num_unroll_steps).
+            - mask (:obj:`np.ndarray`): shape (batch_size, num_unroll_steps + 1), 1 for valid and 0 for padded actions.
+        """
+        num_unroll_steps = self._cfg.num_unroll_steps
+        store_index = self._segment_store_index[game_segment_index]
+        steps = pos_in_game_segment[:, None] + np.arange(num_unroll_steps)
+        valid = steps < store_index[:, 3:4]
+        actions = self._action_store.take(store_index[:, 2:3] + np.minimum(steps, store_index[:, 3:4] - 1))
+        random_actions = np.random.randint(0, self._cfg.model.action_space_size, size=actions.shape)
+        actions = np.where(valid, actions, random_actions)
+        mask = (np.arange(num_unroll_steps + 1) < valid.sum(axis=1, keepdims=True)).astype(np.float64)
+        return actions, mask
 
     @abstractmethod
     def sample(
@@ -113,40 +487,149 @@ class GameBuffer(ABC, object):
         """
         assert self._beta > 0
         num_of_transitions = self.get_num_of_transitions()
-        if self._cfg.use_priority is False:
-            self.game_pos_priorities = np.ones_like(self.game_pos_priorities)
-
-        # +1e-6 for numerical stability
-        probs = self.game_pos_priorities ** self._alpha + 1e-6
-        probs /= probs.sum()
-
-        # sample according to transition index
-        # TODO(pu): replace=True
-        batch_index_list = np.random.choice(num_of_transitions, batch_size, p=probs, replace=False)
+        if self._priority_tree is not None:
+            batch_index_list, batch_probs = self._sample_from_priority_tree(batch_size)
+        else:
+            if self._cfg.use_ring_buffer:
+                priorities = self.game_pos_priorities.values()
+                if self._cfg.use_priority is False:
+                    priorities = np.ones_like(priorities)
+            else:
+                if self._cfg.use_priority is False:
+                    self.game_pos_priorities = np.ones_like(self.game_pos_priorities)
+                priorities = self.game_pos_priorities
+            if not self._sampling_strategy.use_priority:
+                priorities = np.ones_like(priorities)
+
+            # +1e-6 for numerical stability
+            probs = priorities ** self._alpha + 1e-6
+            probs /= probs.sum()
+            strategy_weights = self._sampling_strategy.weights(self, np.arange(num_of_transitions))
+            if strategy_weights is None:
+                sample_probs = probs
+            else:
+                sample_probs = probs * strategy_weights
+                sample_probs /= sample_probs.sum()
+
+            # sample according to transition index
+            # TODO(pu): replace=True
+            batch_index_list = np.random.choice(num_of_transitions, batch_size, p=sample_probs, replace=False)
+            batch_probs = probs[batch_index_list]
 
         if self._cfg.reanalyze_outdated is True:
             # NOTE: used in reanalyze part
-            batch_index_list.sort()
+            order = np.argsort(batch_index_list, kind='stable')
+            batch_index_list, batch_probs = batch_index_list[order], batch_probs[order]
 
-        weights_list = (num_of_transitions * probs[batch_index_list]) ** (-self._beta)
+        weights_list = (num_of_transitions * batch_probs) ** (-self._beta)
         weights_list /= weights_list.max()
 
-        game_segment_list = []
-        pos_in_game_segment_list = []
+        if self._cfg.use_ring_buffer:
+            # gather the (game segment index, position in game segment) of the whole batch at once
+            look_up = self.game_segment_game_pos_look_up[batch_index_list]
+            game_segment_list = self.game_segment_buffer[look_up[:, 0] - self.base_idx].tolist()
+            pos_in_game_segment_list = look_up[:, 1].tolist()
+        else:
+            game_segment_list = []
+            pos_in_game_segment_list = []
 
-        for idx in batch_index_list:
-            game_segment_idx, pos_in_game_segment = self.game_segment_game_pos_look_up[idx]
-            game_segment_idx -= self.base_idx
-            game_segment = self.game_segment_buffer[game_segment_idx]
+            for idx in batch_index_list:
+                game_segment_idx, pos_in_game_segment = self.game_segment_game_pos_look_up[idx]
+                game_segment_idx -= self.base_idx
+                game_segment = self.game_segment_buffer[game_segment_idx]
 
-            game_segment_list.append(game_segment)
-            pos_in_game_segment_list.append(pos_in_game_segment)
+                game_segment_list.append(game_segment)
+                pos_in_game_segment_list.append(pos_in_game_segment)
 
         make_time = [time.time() for _ in range(len(batch_index_list))]
 
         orig_data = (game_segment_list, pos_in_game_segment_list, batch_index_list, weights_list, make_time)
         return orig_data
 
+    def _sample_from_priority_tree(self, batch_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            Sample the transition indices from ``self._priority_tree`` in O(batch_size * log N). If the sampling
+            strategy reweights the transitions, the candidates are accepted with the probability of their weights and
+            the rejected ones are drawn again.
+        Arguments:
+            - batch_size (:obj:`int`): batch size
+        Returns:
+            - batch_index_list (:obj:`np.ndarray`): the sampled transition indices
+            - batch_probs (:obj:`np.ndarray`): the sampling probabilities (according to the priorities) of the sampled \
+                transitions
+        """
+        batch_index_list, batch_probs = self._draw_from_priority_tree(batch_size)
+        strategy_weights = self._sampling_strategy.weights(self, batch_index_list)
+        if strategy_weights is None:
+            return batch_index_list, batch_probs
+        accepted = np.random.uniform(size=batch_index_list.size) < strategy_weights
+        batch_index_list, batch_probs = batch_index_list[accepted], batch_probs[accepted]
+        while batch_index_list.size < batch_size:
+            indices, probs = self._draw_from_priority_tree(batch_size - batch_index_list.size)
+            accepted = np.random.uniform(size=indices.size) < self._sampling_strategy.weights(self, indices)
+            if not self._cfg.priority_tree_sample_replace:
+                accepted &= ~np.isin(indices, batch_index_list)
+            batch_index_list = np.concatenate([batch_index_list, indices[accepted]])
+            batch_probs = np.concatenate([batch_probs, probs[accepted]])
+        return batch_index_list, batch_probs
+
+    def _draw_from_priority_tree(self, batch_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        replace = self._cfg.priority_tree_sample_replace
+        if self._cfg.use_priority is False or not self._sampling_strategy.use_priority:
+            num_of_transitions = self.get_num_of_transitions()
+            if replace:
+                batch_index_list = np.random.randint(0, num_of_transitions, batch_size)
+            else:
+                # draw, deduplicate and redraw the missing ones, which is O(batch_size) when batch_size << N
+                batch_index_list = np.empty(0, dtype=np.int64)
+                while batch_index_list.size < batch_size:
+                    new = np.random.randint(0, num_of_transitions, batch_size - batch_index_list.size)
+                    batch_index_list = np.concatenate([batch_index_list, new])
+                    _, unique_indices = np.unique(batch_index_list, return_index=True)
+                    batch_index_list = batch_index_list[np.sort(unique_indices)]
+            return batch_index_list, np.full(batch_size, 1. / num_of_transitions)
+        return self._priority_tree.sample(batch_size, replace=replace)
+
+    def _set_priorities(self, indices: np.ndarray, priorities: np.ndarray) -> None:
+        """
+        Overview:
+            Set the priorities of a batch of transitions in one vectorized call. The ``indices`` are the indices of the
+            flattened transitions in the buffer, if an index occurs several times, its last priority is kept.
+        """
+        if self._priority_tree is not None:
+            self._priority_tree.update(indices, priorities)
+        else:
+            self.game_pos_priorities[np.asarray(indices, dtype=np.int64)] = priorities
+
+    def _update_priority_of_batch(self, indices: np.ndarray, make_time: np.ndarray, batch_priorities: Any) -> None:
+        """
+        Overview:
+            Update the priorities of the sampled transitions which are still in the buffer, i.e. which were sampled
+            after the last removal of the buffer.
+        Arguments:
+            - indices (:obj:`np.ndarray`): The sampled transition indices.
+            - make_time (:obj:`np.ndarray`): The time when the batch was made.
+            - batch_priorities (:obj:`Any`): The new priorities of the sampled transitions.
+        """
+        valid = np.asarray(make_time) > self.clear_time
+        self._set_priorities(
+            np.asarray(indices)[valid],
+            np.asarray(batch_priorities, dtype=np.float64).reshape(len(valid), -1)[:, 0][valid]
+        )
+
+    def _max_priority(self) -> float:
+        """
+        Overview:
+            Return the max priority of the transitions in the buffer, 1 if the buffer is empty. It is ``O(1)`` with
+            ``use_priority_tree``, which keeps the running max incrementally, and ``O(N)`` otherwise.
+        """
+        if not self.game_segment_buffer:
+            return 1
+        if self._priority_tree is not None:
+            return self._priority_tree.max()
+        return self.game_pos_priorities.max()
+
     def _preprocess_to_play_and_action_mask(
         self, game_segment_batch_size, to_play_segment, action_mask_segment, pos_in_game_segment_list
     ):
@@ -333,8 +816,26 @@ class GameBuffer(ABC, object):
         else:
             valid_len = len(data) - meta['unroll_plus_td_steps']
 
-        if meta['priorities'] is None:
-            max_prio = self.game_pos_priorities.max() if self.game_segment_buffer else 1
+        if self._priority_tree is not None:
+            if meta['priorities'] is None:
+                max_prio = self._max_priority()
+                priorities = np.zeros(len(data))
+                priorities[:valid_len] = max_prio
+            else:
+                assert len(data) == len(meta['priorities']), " priorities should be of same length as the game steps"
+                priorities = meta['priorities'].copy().reshape(-1)
+                priorities[valid_len:len(data)] = 0.
+            self._priority_tree.push(priorities)
+        elif self._cfg.use_ring_buffer:
+            priorities = np.zeros(len(data))
+            if meta['priorities'] is None:
+                priorities[:valid_len] = self._max_priority()
+            else:
+                assert len(data) == len(meta['priorities']), " priorities should be of same length as the game steps"
+                priorities[:valid_len] = meta['priorities'].reshape(-1)[:valid_len]
+            self.game_pos_priorities.extend(priorities)
+        elif meta['priorities'] is None:
+            max_prio = self._max_priority()
             # if no 'priorities' provided, set the valid part of the new-added game history the max_prio
             self.game_pos_priorities = np.concatenate(
                 (
@@ -348,10 +849,26 @@ class GameBuffer(ABC, object):
             priorities[valid_len:len(data)] = 0.
             self.game_pos_priorities = np.concatenate((self.game_pos_priorities, priorities))
 
+        if self._use_store:
+            self._push_game_segment_to_store(data)
+        elif self._disk_store is not None:
+            self._disk_store.spill(data)
         self.game_segment_buffer.append(data)
-        self.game_segment_game_pos_look_up += [
-            (self.base_idx + len(self.game_segment_buffer) - 1, step_pos) for step_pos in range(len(data))
-        ]
+        refresh_time = time.time()
+        self._target_refresh_time[self.base_idx + len(self.game_segment_buffer) - 1] = refresh_time
+        self._segment_refresh_time.append(refresh_time)
+        if self._cfg.use_ring_buffer:
+            self.game_segment_game_pos_look_up.extend(
+                np.stack(
+                    [np.full(len(data), self.base_idx + len(self.game_segment_buffer) - 1),
+                     np.arange(len(data))],
+                    axis=1
+                )
+            )
+        else:
+            self.game_segment_game_pos_look_up += [
+                (self.base_idx + len(self.game_segment_buffer) - 1, step_pos) for step_pos in range(len(data))
+            ]
 
     def remove_oldest_data_to_fit(self) -> None:
         """
@@ -382,10 +899,24 @@ class GameBuffer(ABC, object):
         excess_game_positions = sum(
             [len(game_segment) for game_segment in self.game_segment_buffer[:excess_game_segment_index]]
         )
+        if self._use_store:
+            self._remove_game_segments_from_store(excess_game_segment_index)
+        elif self._disk_store is not None:
+            for game_segment in self.game_segment_buffer[:excess_game_segment_index]:
+                self._disk_store.remove(game_segment)
         del self.game_segment_buffer[:excess_game_segment_index]
-        self.game_pos_priorities = self.game_pos_priorities[excess_game_positions:]
+        if self._priority_tree is not None:
+            self._priority_tree.pop_front(excess_game_positions)
+        elif self._cfg.use_ring_buffer:
+            del self.game_pos_priorities[:excess_game_positions]
+        else:
+            self.game_pos_priorities = self.game_pos_priorities[excess_game_positions:]
         del self.game_segment_game_pos_look_up[:excess_game_positions]
+        for segment_index in range(self.base_idx, self.base_idx + excess_game_segment_index):
+            self._target_refresh_time.pop(segment_index, None)
+        del self._segment_refresh_time[:excess_game_segment_index]
         self.base_idx += excess_game_segment_index
+        self.transition_base_idx += excess_game_positions
         self.clear_time = time.time()
 
     def get_num_of_episodes(self) -> int:
@@ -400,5 +931,54 @@ class GameBuffer(ABC, object):
         # total number of transitions
         return len(self.game_segment_game_pos_look_up)
 
+    def save_snapshot(self, path: str) -> None:
+        """
+        Overview:
+            Dump the game segments, the priorities and the counters of the buffer to the directory ``path`` in the
+            chunked columnar binary format of ``buffer_snapshot.py``, with ``snapshot_compression`` and
+            ``snapshot_num_workers`` parallel writers.
+        Arguments:
+            - path (:obj:`str`): The directory of the snapshot, which is replaced if it exists.
+        """
+        save_snapshot(
+            self,
+            path,
+            compression=self._cfg.snapshot_compression,
+            num_workers=self._cfg.snapshot_num_workers,
+            chunk_size=self._cfg.snapshot_chunk_size
+        )
+
+    def load_snapshot(self, path: str) -> None:
+        """
+        Overview:
+            Restore the buffer from the snapshot dumped by ``save_snapshot`` in the directory ``path``, e.g. to resume a
+            training warm. The current data of the buffer is dropped.
+        Arguments:
+            - path (:obj:`str`): The directory of the snapshot.
+        """
+        load_snapshot(self, path, num_workers=self._cfg.snapshot_num_workers)
+
+    def get_target_staleness(self) -> Tuple[float, float]:
+        """
+        Overview:
+            Get the mean and the max staleness (in seconds) of the stored targets of the game segments, i.e. the time
+            since their collection or their last refresh by ``ReanalyzeDaemon``.
+        """
+        if len(self._target_refresh_time) == 0:
+            return 0., 0.
+        staleness = time.time() - np.fromiter(self._target_refresh_time.values(), dtype=np.float64)
+        return float(staleness.mean()), float(staleness.max())
+
+    def close(self) -> None:
+        """
+        Overview:
+            Stop the worker processes of the ``ReanalyzeWorkerPool`` and release the shared memory and the disk files
+            of the stores, at the end of the training. The buffer must not be used afterwards.
+        """
+        if self._reanalyze_pool is not None:
+            self._reanalyze_pool.close()
+            self._reanalyze_pool = None
+        self._release_storage()
+
     def __repr__(self):
         return f'current buffer statistics is: num_of_all_collected_episodes: {self.num_of_collected_episodes}, num of game segments: {len(self.game_segment_buffer)}, number of transitions: {len(self.game_segment_game_pos_look_up)}'
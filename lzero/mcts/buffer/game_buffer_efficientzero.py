@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, List, Optional, Tuple
 
 import numpy as np
 import torch
@@ -6,9 +6,9 @@ from ding.utils import BUFFER_REGISTRY
 
 from lzero.mcts.tree_search.mcts_ctree import EfficientZeroMCTSCtree as MCTSCtree
 from lzero.mcts.tree_search.mcts_ptree import EfficientZeroMCTSPtree as MCTSPtree
-from lzero.mcts.utils import prepare_observation
-from lzero.policy import to_detach_cpu_numpy, concat_output, concat_output_value, inverse_scalar_transform
+from lzero.policy import to_detach_cpu_numpy, concat_output, inverse_scalar_transform
 from .game_buffer_muzero import MuZeroGameBuffer
+from .reanalyze_cache import get_target_model_version
 
 
 @BUFFER_REGISTRY.register('game_buffer_efficientzero')
@@ -35,9 +35,7 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
         self._alpha = self._cfg.priority_prob_alpha
         self._beta = self._cfg.priority_prob_beta
 
-        self.game_segment_buffer = []
-        self.game_pos_priorities = []
-        self.game_segment_game_pos_look_up = []
+        self._init_storage()
 
         self.keep_ratio = 1
         self.num_of_collected_episodes = 0
@@ -57,26 +55,46 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
         policy._target_model.to(self._cfg.device)
         policy._target_model.eval()
 
+        # the policy targets refreshed by ``ReanalyzeDaemon`` are served as they are stored
+        reanalyze_ratio = 0. if self._cfg.use_reanalyze_daemon else self._cfg.reanalyze_ratio
         # obtain the current_batch and prepare target context
         reward_value_context, policy_re_context, policy_non_re_context, current_batch = self._make_batch(
-            batch_size, self._cfg.reanalyze_ratio
+            batch_size, reanalyze_ratio
         )
 
-        # target value_prefixs, target value
-        batch_value_prefixs, batch_target_values = self._compute_target_reward_value(
-            reward_value_context, policy._target_model
-        )
-        # target policy
-        batch_target_policies_re = self._compute_target_policy_reanalyzed(policy_re_context, policy._target_model)
+        if self._reanalyze_cache is not None:
+            self._reanalyze_cache.set_model_version(get_target_model_version(policy._target_model))
+        reanalyze_pool = self._get_reanalyze_pool(policy._target_model)
+        if reanalyze_pool is not None:
+            # target value_prefixs, target value and reanalyzed target policy in the reanalyze worker processes
+            (batch_value_prefixs, batch_target_values), batch_target_policies_re = reanalyze_pool.compute(
+                [
+                    ('_compute_target_reward_value', reward_value_context),
+                    ('_compute_target_policy_reanalyzed', policy_re_context),
+                ]
+            )
+        elif self._cfg.use_fused_reanalyze:
+            # target value_prefixs, target value and reanalyzed target policy in one reanalysis
+            (batch_value_prefixs, batch_target_values), batch_target_policies_re = \
+                self._compute_fused_reanalyze_targets(
+                    reward_value_context, policy_re_context, policy._target_model, current_batch[3]
+                )
+        else:
+            # target value_prefixs, target value
+            batch_value_prefixs, batch_target_values = self._compute_target_reward_value(
+                reward_value_context, policy._target_model
+            )
+            # target policy
+            batch_target_policies_re = self._compute_target_policy_reanalyzed(policy_re_context, policy._target_model)
         batch_target_policies_non_re = self._compute_target_policy_non_reanalyzed(
             policy_non_re_context, self._cfg.model.action_space_size
         )
 
-        if 0 < self._cfg.reanalyze_ratio < 1:
+        if 0 < reanalyze_ratio < 1:
             batch_target_policies = np.concatenate([batch_target_policies_re, batch_target_policies_non_re])
-        elif self._cfg.reanalyze_ratio == 1:
+        elif reanalyze_ratio == 1:
             batch_target_policies = batch_target_policies_re
-        elif self._cfg.reanalyze_ratio == 0:
+        elif reanalyze_ratio == 0:
             batch_target_policies = batch_target_policies_non_re
 
         target_batch = [batch_value_prefixs, batch_target_values, batch_target_policies]
@@ -127,7 +145,7 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
             # prepare the corresponding observations for bootstrapped values o_{t+k}
             # o[t+ td_steps, t + td_steps + stack frames + num_unroll_steps]
             # t=2+3 -> o[2+3, 2+3+4+5] -> o[5, 14]
-            game_obs = game_segment.get_unroll_obs(state_index + td_steps, self._cfg.num_unroll_steps)
+            game_obs = game_segment.get_unroll_obs(state_index + td_steps, self._cfg.num_unroll_steps, decode=False)
 
             rewards_list.append(game_segment.reward_segment)
 
@@ -160,50 +178,35 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
         ]
         return reward_value_context
 
-    def _compute_target_reward_value(self, reward_value_context: List[Any], model: Any) -> List[np.ndarray]:
+    def _reanalyze(
+            self, obs: np.ndarray, search_index: np.ndarray, to_play: List[int], legal_actions: List[List[int]],
+            model: Any
+    ) -> Tuple[np.ndarray, Any]:
         """
         Overview:
-            prepare reward and value targets from the context of rewards and values.
+            Reanalyze the prepared observations with the target model, i.e. the initial inference of all the
+            observations in slices of ``mini_infer_size``, and then one batched MCTS from the latent states and the
+            reward hidden states of ``obs[search_index]``.
         Arguments:
-            - reward_value_context (:obj:'list'): the reward value context
-            - model (:obj:'torch.tensor'):model of the target model
+            - obs (:obj:`np.ndarray`): The prepared observations.
+            - search_index (:obj:`np.ndarray`): The indices of the observations of the roots to search.
+            - to_play (:obj:`List[int]`): The to_play of the roots.
+            - legal_actions (:obj:`List[List[int]]`): The legal actions of the roots.
+            - model (:obj:`Any`): The target model.
         Returns:
-            - batch_value_prefixs (:obj:'np.ndarray): batch of value prefix
-            - batch_target_values (:obj:'np.ndarray): batch of value estimation
+            - values (:obj:`np.ndarray`): The predicted values of all the observations.
+            - roots (:obj:`Any`): The searched roots, None if ``search_index`` is empty.
         """
-        value_obs_list, value_mask, pos_in_game_segment_list, rewards_list, game_segment_lens, td_steps_list, action_mask_segment, \
-        to_play_segment = reward_value_context  # noqa
-        # transition_batch_size = game_segment_batch_size * (num_unroll_steps+1)
-        transition_batch_size = len(value_obs_list)
-        game_segment_batch_size = len(pos_in_game_segment_list)
-
-        to_play, action_mask = self._preprocess_to_play_and_action_mask(
-            game_segment_batch_size, to_play_segment, action_mask_segment, pos_in_game_segment_list
-        )
-
-        legal_actions = [[i for i, x in enumerate(action_mask[j]) if x == 1] for j in range(transition_batch_size)]
-
-        # ==============================================================
-        # EfficientZero related core code
-        # ==============================================================
-        batch_target_values, batch_value_prefixs = [], []
         with torch.no_grad():
-            value_obs_list = prepare_observation(value_obs_list, self._cfg.model.model_type)
             # split a full batch into slices of mini_infer_size: to save the GPU memory for more GPU actors
-            slices = int(np.ceil(transition_batch_size / self._cfg.mini_infer_size))
+            slices = int(np.ceil(len(obs) / self._cfg.mini_infer_size))
             network_output = []
             for i in range(slices):
                 beg_index = self._cfg.mini_infer_size * i
                 end_index = self._cfg.mini_infer_size * (i + 1)
-
-                m_obs = torch.from_numpy(value_obs_list[beg_index:end_index]).to(self._cfg.device).float()
-
-                # calculate the target value
+                m_obs = torch.from_numpy(obs[beg_index:end_index]).to(self._cfg.device).float()
                 m_output = model.initial_inference(m_obs)
                 if not model.training:
-                    # ==============================================================
-                    # EfficientZero related core code
-                    # ==============================================================
                     # if not in training, obtain the scalars of the value/reward
                     [m_output.latent_state, m_output.value, m_output.policy_logits] = to_detach_cpu_numpy(
                         [
@@ -218,38 +221,73 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
                     )
                 network_output.append(m_output)
 
-            # concat the output slices after model inference
-            if self._cfg.use_root_value:
-                # use the root values from MCTS, as in EfficiientZero
-                # the root values have limited improvement but require much more GPU actors;
-                _, value_prefix_pool, policy_logits_pool, latent_state_roots, reward_hidden_state_roots = concat_output(
-                    network_output, data_type='efficientzero'
-                )
-                value_prefix_pool = value_prefix_pool.squeeze().tolist()
-                policy_logits_pool = policy_logits_pool.tolist()
-                noises = [
-                    np.random.dirichlet([self._cfg.root_dirichlet_alpha] * self._cfg.model.action_space_size
-                                        ).astype(np.float32).tolist() for _ in range(transition_batch_size)
-                ]
-                if self._cfg.mcts_ctree:
-                    # cpp mcts_tree
-                    roots = MCTSCtree.roots(transition_batch_size, legal_actions)
-                    roots.prepare(self._cfg.root_noise_weight, noises, value_prefix_pool, policy_logits_pool, to_play)
-                    # do MCTS for a new policy with the recent target model
-                    MCTSCtree(self._cfg).search(roots, model, latent_state_roots, reward_hidden_state_roots, to_play)
-                else:
-                    # python mcts_tree
-                    roots = MCTSPtree.roots(transition_batch_size, legal_actions)
-                    roots.prepare(self._cfg.root_noise_weight, noises, value_prefix_pool, policy_logits_pool, to_play)
-                    # do MCTS for a new policy with the recent target model
-                    MCTSPtree(self._cfg).search(
-                        roots, model, latent_state_roots, reward_hidden_state_roots, to_play=to_play
-                    )
-                roots_values = roots.get_values()
-                value_list = np.array(roots_values)
+            values, value_prefix_pool, policy_logits_pool, latent_state_roots, \
+                reward_hidden_state_roots = concat_output(network_output, data_type='efficientzero')
+            if len(search_index) == 0:
+                return values, None
+
+            num_of_roots = len(search_index)
+            value_prefix_pool = np.asarray(value_prefix_pool)[search_index].reshape(-1).tolist()
+            policy_logits_pool = policy_logits_pool[search_index].tolist()
+            latent_state_roots = latent_state_roots[search_index]
+            # the reward hidden states are of shape (1, batch_size, lstm_hidden_size)
+            reward_hidden_state_roots = tuple(state[:, search_index] for state in reward_hidden_state_roots)
+            # the noises of the legal actions, as in the collector
+            noises = [
+                np.random.dirichlet([self._cfg.root_dirichlet_alpha] * len(legal_actions[j])
+                                    ).astype(np.float32).tolist() for j in range(num_of_roots)
+            ]
+            if self._cfg.mcts_ctree:
+                # cpp mcts_tree
+                roots = MCTSCtree.roots(num_of_roots, legal_actions)
+                roots.prepare(self._cfg.root_noise_weight, noises, value_prefix_pool, policy_logits_pool, to_play)
+                # do MCTS for a new policy with the recent target model
+                MCTSCtree(self._cfg).search(roots, model, latent_state_roots, reward_hidden_state_roots, to_play)
             else:
-                # use the predicted values
-                value_list = concat_output_value(network_output)
+                # python mcts_tree
+                roots = MCTSPtree.roots(num_of_roots, legal_actions)
+                roots.prepare(self._cfg.root_noise_weight, noises, value_prefix_pool, policy_logits_pool, to_play)
+                # do MCTS for a new policy with the recent target model
+                MCTSPtree(self._cfg).search(
+                    roots, model, latent_state_roots, reward_hidden_state_roots, to_play=to_play
+                )
+        return values, roots
+
+    def _compute_target_reward_value(
+            self, reward_value_context: List[Any], model: Any, value_list: Optional[np.ndarray] = None
+    ) -> List[np.ndarray]:
+        """
+        Overview:
+            prepare reward and value targets from the context of rewards and values.
+        Arguments:
+            - reward_value_context (:obj:'list'): the reward value context
+            - model (:obj:'torch.tensor'):model of the target model
+            - value_list (:obj:'np.ndarray'): the bootstrapped values of ``value_obs_list`` which are already \
+                reanalyzed, e.g. by ``_compute_fused_reanalyze_targets``. If None, they are reanalyzed here.
+        Returns:
+            - batch_value_prefixs (:obj:'np.ndarray): batch of value prefix
+            - batch_target_values (:obj:'np.ndarray): batch of value estimation
+        """
+        value_obs_list, value_mask, pos_in_game_segment_list, rewards_list, game_segment_lens, td_steps_list, action_mask_segment, \
+        to_play_segment = reward_value_context  # noqa
+        # transition_batch_size = game_segment_batch_size * (num_unroll_steps+1)
+        transition_batch_size = len(value_obs_list)
+        to_play, legal_actions = self._preprocess_to_play_and_legal_actions(reward_value_context)
+
+        # ==============================================================
+        # EfficientZero related core code
+        # ==============================================================
+        batch_target_values, batch_value_prefixs = [], []
+        with torch.no_grad():
+            if value_list is None:
+                # use the root values from MCTS if use_root_value, as in EfficientZero, otherwise the predicted values.
+                # the root values have limited improvement but require much more GPU actors.
+                search_index = np.arange(transition_batch_size if self._cfg.use_root_value else 0)
+                value_list, roots = self._reanalyze(
+                    self._prepare_obs_batch(value_obs_list), search_index, to_play, legal_actions, model
+                )
+                if roots is not None:
+                    value_list = np.array(roots.get_values())
 
             # get last state value
             if self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2]:
@@ -267,6 +305,11 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
                 )
 
             value_list = value_list * np.array(value_mask)
+            if self._cfg.use_vectorized_value_target:
+                return self._compute_vectorized_value_prefix_value_target(
+                    value_list, rewards_list, pos_in_game_segment_list, game_segment_lens, td_steps_list, to_play_segment
+                )
+
             value_list = value_list.tolist()
             horizon_id, value_index = 0, 0
             for game_segment_len_non_re, reward_list, state_index, to_play_list in zip(game_segment_lens, rewards_list,
@@ -312,12 +355,66 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
 
         return batch_value_prefixs, batch_target_values
 
-    def _compute_target_policy_reanalyzed(self, policy_re_context: List[Any], model: Any) -> np.ndarray:
+    def _compute_vectorized_value_prefix_value_target(
+            self, value_list: np.ndarray, rewards_list: List[np.ndarray], pos_in_game_segment_list: List[int],
+            game_segment_lens: List[int], td_steps_list: List[int], to_play_segment: List[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            The vectorized version of the value prefix and value targets computed in ``_compute_target_reward_value``,
+            which is bit-identical to the python loop. The value prefix is reset every ``lstm_horizon_len`` transitions
+            counted over the whole minibatch, in the same way as the loop.
+        Arguments:
+            - value_list (:obj:`np.ndarray`): the discounted and masked bootstrapped values.
+            - rewards_list (:obj:`list`): the reward segments of the sampled game segments.
+            - pos_in_game_segment_list (:obj:`list`): the index of the start transitions in the game segments.
+            - game_segment_lens (:obj:`list`): the lengths of the sampled game segments.
+            - td_steps_list (:obj:`list`): the td steps of every transition.
+            - to_play_segment (:obj:`list`): the to_play segments of the sampled game segments, used in board games.
+        Returns:
+            - batch_value_prefixs (:obj:`np.ndarray`): batch of value prefix
+            - batch_target_values (:obj:`np.ndarray`): batch of value estimation
+        """
+        num_unroll_steps = self._cfg.num_unroll_steps
+        batch_size = len(pos_in_game_segment_list)
+        state_index = np.asarray(pos_in_game_segment_list)
+        horizon_id = np.arange(batch_size)[:, None] * (num_unroll_steps + 1) + np.arange(num_unroll_steps + 1)
+        reset = horizon_id % self._cfg.lstm_horizon_len == 0
+
+        # in board games, the reference player of the discounted rewards is moved to the last reset transition
+        base_index = np.repeat(state_index[:, None], num_unroll_steps + 1, axis=1)
+        for k in range(1, num_unroll_steps + 1):
+            base_index[:, k] = np.where(reset[:, k - 1], state_index + k - 1, base_index[:, k - 1])
+        target_values, target_rewards = self._compute_n_step_value_target(
+            value_list, rewards_list, pos_in_game_segment_list, td_steps_list, to_play_segment, base_index
+        )
+        in_game_segment = self._get_in_game_segment_mask(pos_in_game_segment_list, game_segment_lens)
+
+        # the dtype of ``value_prefix += reward`` in the python loop, where value_prefix starts from a python float
+        value_prefix_dtype = np.result_type(0. + rewards_list[0][0])
+        value_prefix = np.zeros(batch_size, dtype=value_prefix_dtype)
+        batch_value_prefixs = np.zeros((batch_size, num_unroll_steps + 1), dtype=value_prefix_dtype)
+        for k in range(num_unroll_steps + 1):
+            value_prefix = np.where(reset[:, k], 0., value_prefix).astype(value_prefix_dtype)
+            value_prefix = np.where(
+                in_game_segment[:, k], value_prefix + target_rewards[:, k].astype(value_prefix_dtype), value_prefix
+            )
+            batch_value_prefixs[:, k] = value_prefix
+        batch_target_values = np.where(in_game_segment, target_values, 0)
+
+        return batch_value_prefixs, batch_target_values
+
+    def _compute_target_policy_reanalyzed(
+            self, policy_re_context: List[Any], model: Any, roots_distributions: Optional[List[Any]] = None
+    ) -> np.ndarray:
         """
         Overview:
             prepare policy targets from the reanalyzed context of policies
         Arguments:
             - policy_re_context (:obj:`List`): List of policy context to reanalyzed
+            - roots_distributions (:obj:`List`): the visit count distributions of the roots of ``policy_obs_list`` \
+                which are already searched, e.g. by ``_compute_fused_reanalyze_targets``. If None, they are \
+                searched here.
         Returns:
             - batch_target_policies_re
         """
@@ -329,66 +426,28 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
         to_play_segment = policy_re_context  # noqa
         # transition_batch_size = game_segment_batch_size * (self._cfg.num_unroll_steps + 1)
         transition_batch_size = len(policy_obs_list)
-        game_segment_batch_size = len(pos_in_game_segment_list)
-        to_play, action_mask = self._preprocess_to_play_and_action_mask(
-            game_segment_batch_size, to_play_segment, action_mask_segment, pos_in_game_segment_list
-        )
-
-        legal_actions = [[i for i, x in enumerate(action_mask[j]) if x == 1] for j in range(transition_batch_size)]
+        to_play, legal_actions = self._preprocess_to_play_and_legal_actions(policy_re_context)
         with torch.no_grad():
-            policy_obs_list = prepare_observation(policy_obs_list, self._cfg.model.model_type)
-            # split a full batch into slices of mini_infer_size: to save the GPU memory for more GPU actors
-            slices = int(np.ceil(transition_batch_size / self._cfg.mini_infer_size))
-            network_output = []
-            for i in range(slices):
-                beg_index = self._cfg.mini_infer_size * i
-                end_index = self._cfg.mini_infer_size * (i + 1)
-                m_obs = torch.from_numpy(policy_obs_list[beg_index:end_index]).to(self._cfg.device).float()
-
-                m_output = model.initial_inference(m_obs)
-
-                if not model.training:
-                    # if not in training, obtain the scalars of the value/reward
-                    [m_output.latent_state, m_output.value, m_output.policy_logits] = to_detach_cpu_numpy(
-                        [
-                            m_output.latent_state,
-                            inverse_scalar_transform(m_output.value, self._cfg.model.support_scale),
-                            m_output.policy_logits
-                        ]
-                    )
-                    m_output.reward_hidden_state = (
-                        m_output.reward_hidden_state[0].detach().cpu().numpy(),
-                        m_output.reward_hidden_state[1].detach().cpu().numpy()
-                    )
-
-                network_output.append(m_output)
-
-            _, value_prefix_pool, policy_logits_pool, latent_state_roots, reward_hidden_state_roots = concat_output(
-                network_output, data_type='efficientzero'
-            )
-            value_prefix_pool = value_prefix_pool.squeeze().tolist()
-            policy_logits_pool = policy_logits_pool.tolist()
-            noises = [
-                np.random.dirichlet([self._cfg.root_dirichlet_alpha] * self._cfg.model.action_space_size
-                                    ).astype(np.float32).tolist() for _ in range(transition_batch_size)
-            ]
-            if self._cfg.mcts_ctree:
-                # cpp mcts_tree
-                roots = MCTSCtree.roots(transition_batch_size, legal_actions)
-                roots.prepare(self._cfg.root_noise_weight, noises, value_prefix_pool, policy_logits_pool, to_play)
-                # do MCTS for a new policy with the recent target model
-                MCTSCtree(self._cfg).search(roots, model, latent_state_roots, reward_hidden_state_roots, to_play)
-            else:
-                # python mcts_tree
-                roots = MCTSPtree.roots(transition_batch_size, legal_actions)
-                roots.prepare(self._cfg.root_noise_weight, noises, value_prefix_pool, policy_logits_pool, to_play)
-                # do MCTS for a new policy with the recent target model
-                MCTSPtree(self._cfg).search(
-                    roots, model, latent_state_roots, reward_hidden_state_roots, to_play=to_play
+            if roots_distributions is None:
+                _, roots = self._reanalyze_with_cache(
+                    self._prepare_obs_batch(policy_obs_list),
+                    np.arange(transition_batch_size),
+                    to_play,
+                    legal_actions,
+                    model,
+                    self._get_policy_root_keys(policy_re_context),
+                    need_values=False
+                )
+                roots_distributions = roots.get_distributions()
+            if self._cfg.use_vectorized_policy_target:
+                return self._assemble_target_policies(
+                    roots_distributions,
+                    policy_mask,
+                    self._cfg.model.action_space_size,
+                    action_mask=self._legal_actions_to_mask(legal_actions),
+                    normalize=True
                 )
-
             roots_legal_actions_list = legal_actions
-            roots_distributions = roots.get_distributions()
             policy_index = 0
             for state_index, game_index in zip(pos_in_game_segment_list, batch_index_list):
                 target_policies = []
@@ -3,7 +3,6 @@ from typing import Any, List, Tuple, Union, TYPE_CHECKING, Optional
 import numpy as np
 from ding.utils import BUFFER_REGISTRY
 
-from lzero.mcts.utils import prepare_observation
 from lzero.mcts.buffer import MuZeroGameBuffer
 
 @BUFFER_REGISTRY.register('game_buffer_gumbel_muzero')
@@ -68,7 +67,10 @@ class GumbelMuZeroGameBuffer(MuZeroGameBuffer):
             # e.g. stack+num_unroll_steps  4+5
             obs_list.append(
                 game_segment_list[i].get_unroll_obs(
-                    pos_in_game_segment_list[i], num_unroll_steps=self._cfg.num_unroll_steps, padding=True
+                    pos_in_game_segment_list[i],
+                    num_unroll_steps=self._cfg.num_unroll_steps,
+                    padding=True,
+                    decode=False
                 )
             )
             action_list.append(actions_tmp)
@@ -76,7 +78,7 @@ class GumbelMuZeroGameBuffer(MuZeroGameBuffer):
             mask_list.append(mask_tmp)
 
         # formalize the input observations
-        obs_list = prepare_observation(obs_list, self._cfg.model.model_type)
+        obs_list = self._prepare_obs_batch(obs_list)
 
         # formalize the inputs of a batch
         current_batch = [obs_list, action_list, improved_policy_list, mask_list, batch_index_list, weights_list, make_time_list]
@@ -1,3 +1,6 @@
+import contextlib
+import threading
+import time
 from typing import Any, List, Tuple, Union, TYPE_CHECKING, Optional
 
 import numpy as np
@@ -6,9 +9,11 @@ from ding.utils import BUFFER_REGISTRY
 
 from lzero.mcts.tree_search.mcts_ctree import MuZeroMCTSCtree as MCTSCtree
 from lzero.mcts.tree_search.mcts_ptree import MuZeroMCTSPtree as MCTSPtree
-from lzero.mcts.utils import prepare_observation
-from lzero.policy import to_detach_cpu_numpy, concat_output, concat_output_value, inverse_scalar_transform
+from lzero.policy import to_detach_cpu_numpy, concat_output, inverse_scalar_transform
+from .columnar_game_segment import RaggedRows
 from .game_buffer import GameBuffer
+from .reanalyze_cache import ReanalyzedRoots, get_target_model_version
+from .reanalyze_worker_pool import ReanalyzeWorkerPool
 
 if TYPE_CHECKING:
     from lzero.policy import MuZeroPolicy, EfficientZeroPolicy, SampledEfficientZeroPolicy
@@ -44,9 +49,7 @@ class MuZeroGameBuffer(GameBuffer):
         self.base_idx = 0
         self.clear_time = 0
 
-        self.game_segment_buffer = []
-        self.game_pos_priorities = []
-        self.game_segment_game_pos_look_up = []
+        self._init_storage()
 
     def sample(
             self, batch_size: int, policy: Union["MuZeroPolicy", "EfficientZeroPolicy", "SampledEfficientZeroPolicy"]
@@ -63,26 +66,45 @@ class MuZeroGameBuffer(GameBuffer):
         policy._target_model.to(self._cfg.device)
         policy._target_model.eval()
 
+        # the policy targets refreshed by ``ReanalyzeDaemon`` are served as they are stored
+        reanalyze_ratio = 0. if self._cfg.use_reanalyze_daemon else self._cfg.reanalyze_ratio
         # obtain the current_batch and prepare target context
         reward_value_context, policy_re_context, policy_non_re_context, current_batch = self._make_batch(
-            batch_size, self._cfg.reanalyze_ratio
+            batch_size, reanalyze_ratio
         )
-        # target reward, target value
-        batch_rewards, batch_target_values = self._compute_target_reward_value(
-            reward_value_context, policy._target_model
-        )
-        # target policy
-        batch_target_policies_re = self._compute_target_policy_reanalyzed(policy_re_context, policy._target_model)
+        if self._reanalyze_cache is not None:
+            self._reanalyze_cache.set_model_version(get_target_model_version(policy._target_model))
+        reanalyze_pool = self._get_reanalyze_pool(policy._target_model)
+        if reanalyze_pool is not None:
+            # target reward, target value and reanalyzed target policy in the reanalyze worker processes
+            (batch_rewards, batch_target_values), batch_target_policies_re = reanalyze_pool.compute(
+                [
+                    ('_compute_target_reward_value', reward_value_context),
+                    ('_compute_target_policy_reanalyzed', policy_re_context),
+                ]
+            )
+        elif self._cfg.use_fused_reanalyze:
+            # target reward, target value and reanalyzed target policy in one reanalysis
+            (batch_rewards, batch_target_values), batch_target_policies_re = self._compute_fused_reanalyze_targets(
+                reward_value_context, policy_re_context, policy._target_model, current_batch[3]
+            )
+        else:
+            # target reward, target value
+            batch_rewards, batch_target_values = self._compute_target_reward_value(
+                reward_value_context, policy._target_model
+            )
+            # target policy
+            batch_target_policies_re = self._compute_target_policy_reanalyzed(policy_re_context, policy._target_model)
         batch_target_policies_non_re = self._compute_target_policy_non_reanalyzed(
             policy_non_re_context, self._cfg.model.action_space_size
         )
 
         # fusion of batch_target_policies_re and batch_target_policies_non_re to batch_target_policies
-        if 0 < self._cfg.reanalyze_ratio < 1:
+        if 0 < reanalyze_ratio < 1:
             batch_target_policies = np.concatenate([batch_target_policies_re, batch_target_policies_non_re])
-        elif self._cfg.reanalyze_ratio == 1:
+        elif reanalyze_ratio == 1:
             batch_target_policies = batch_target_policies_re
-        elif self._cfg.reanalyze_ratio == 0:
+        elif reanalyze_ratio == 0:
             batch_target_policies = batch_target_policies_non_re
 
         target_batch = [batch_rewards, batch_target_values, batch_target_policies]
@@ -91,6 +113,33 @@ class MuZeroGameBuffer(GameBuffer):
         train_data = [current_batch, target_batch]
         return train_data
 
+    def _get_reanalyze_pool(self, model: torch.nn.Module) -> Optional[ReanalyzeWorkerPool]:
+        """
+        Overview:
+            Get the ``ReanalyzeWorkerPool`` if ``reanalyze_num_workers`` > 0, which is started with the weights of
+            ``model`` at the first call. The weights of the workers are then synchronized with ``model`` every
+            ``reanalyze_model_sync_freq`` calls.
+        Arguments:
+            - model (:obj:`torch.nn.Module`): The target model.
+        Returns:
+            - reanalyze_pool (:obj:`Optional[ReanalyzeWorkerPool]`): The pool, or None if the targets are computed in \
+                the current process.
+        """
+        if self._cfg.reanalyze_num_workers <= 0:
+            return None
+        if self._reanalyze_pool is None:
+            self._reanalyze_pool = ReanalyzeWorkerPool(
+                type(self),
+                self._cfg,
+                model,
+                self._cfg.reanalyze_num_workers,
+                sync_freq=self._cfg.reanalyze_model_sync_freq,
+                seed=np.random.randint(2 ** 31)
+            )
+        else:
+            self._reanalyze_pool.sync_model(model)
+        return self._reanalyze_pool
+
     def _make_batch(self, batch_size: int, reanalyze_ratio: float) -> Tuple[Any]:
         """
         Overview:
@@ -110,37 +159,47 @@ class MuZeroGameBuffer(GameBuffer):
         orig_data = self._sample_orig_data(batch_size)
         game_segment_list, pos_in_game_segment_list, batch_index_list, weights_list, make_time_list = orig_data
         batch_size = len(batch_index_list)
-        obs_list, action_list, mask_list = [], [], []
-        # prepare the inputs of a batch
-        for i in range(batch_size):
-            game = game_segment_list[i]
-            pos_in_game_segment = pos_in_game_segment_list[i]
-
-            actions_tmp = game.action_segment[pos_in_game_segment:pos_in_game_segment +
-                                              self._cfg.num_unroll_steps].tolist()
-            # add mask for invalid actions (out of trajectory), 1 for valid, 0 for invalid
-            mask_tmp = [1. for i in range(len(actions_tmp))]
-            mask_tmp += [0. for _ in range(self._cfg.num_unroll_steps + 1 - len(mask_tmp))]
-
-            # pad random action
-            actions_tmp += [
-                np.random.randint(0, game.action_space_size)
-                for _ in range(self._cfg.num_unroll_steps - len(actions_tmp))
-            ]
+        if self._use_store:
+            # gather the inputs of the whole batch from the per-buffer stores by fancy indexing
+            game_segment_index = self._get_game_segment_index(batch_index_list)
+            pos_in_game_segment = np.asarray(pos_in_game_segment_list)
+            obs_list = self._gather_unroll_obs(game_segment_index, pos_in_game_segment, self._cfg.num_unroll_steps)
+            action_list, mask_list = self._gather_unroll_actions(game_segment_index, pos_in_game_segment)
+        else:
+            obs_list, action_list, mask_list = [], [], []
+            # prepare the inputs of a batch
+            for i in range(batch_size):
+                game = game_segment_list[i]
+                pos_in_game_segment = pos_in_game_segment_list[i]
+
+                actions_tmp = game.action_segment[pos_in_game_segment:pos_in_game_segment +
+                                                  self._cfg.num_unroll_steps].tolist()
+                # add mask for invalid actions (out of trajectory), 1 for valid, 0 for invalid
+                mask_tmp = [1. for i in range(len(actions_tmp))]
+                mask_tmp += [0. for _ in range(self._cfg.num_unroll_steps + 1 - len(mask_tmp))]
+
+                # pad random action
+                actions_tmp += [
+                    np.random.randint(0, game.action_space_size)
+                    for _ in range(self._cfg.num_unroll_steps - len(actions_tmp))
+                ]
 
-            # obtain the input observations
-            # pad if length of obs in game_segment is less than stack+num_unroll_steps
-            # e.g. stack+num_unroll_steps = 4+5
-            obs_list.append(
-                game_segment_list[i].get_unroll_obs(
-                    pos_in_game_segment_list[i], num_unroll_steps=self._cfg.num_unroll_steps, padding=True
+                # obtain the input observations
+                # pad if length of obs in game_segment is less than stack+num_unroll_steps
+                # e.g. stack+num_unroll_steps = 4+5
+                obs_list.append(
+                    game_segment_list[i].get_unroll_obs(
+                        pos_in_game_segment_list[i],
+                        num_unroll_steps=self._cfg.num_unroll_steps,
+                        padding=True,
+                        decode=False
+                    )
                 )
-            )
-            action_list.append(actions_tmp)
-            mask_list.append(mask_tmp)
+                action_list.append(actions_tmp)
+                mask_list.append(mask_tmp)
 
         # formalize the input observations
-        obs_list = prepare_observation(obs_list, self._cfg.model.model_type)
+        obs_list = self._prepare_obs_batch(obs_list)
 
         # formalize the inputs of a batch
         current_batch = [obs_list, action_list, mask_list, batch_index_list, weights_list, make_time_list]
@@ -217,7 +276,7 @@ class MuZeroGameBuffer(GameBuffer):
             # prepare the corresponding observations for bootstrapped values o_{t+k}
             # o[t+ td_steps, t + td_steps + stack frames + num_unroll_steps]
             # t=2+3 -> o[2+3, 2+3+4+5] -> o[5, 14]
-            game_obs = game_segment.get_unroll_obs(state_index + td_steps, self._cfg.num_unroll_steps)
+            game_obs = game_segment.get_unroll_obs(state_index + td_steps, self._cfg.num_unroll_steps, decode=False)
 
             rewards_list.append(game_segment.reward_segment)
 
@@ -316,7 +375,7 @@ class MuZeroGameBuffer(GameBuffer):
 
                 child_visits.append(game_segment.child_visit_segment)
                 # prepare the corresponding observations
-                game_obs = game_segment.get_unroll_obs(state_index, self._cfg.num_unroll_steps)
+                game_obs = game_segment.get_unroll_obs(state_index, self._cfg.num_unroll_steps, decode=False)
                 for current_index in range(state_index, state_index + self._cfg.num_unroll_steps + 1):
 
                     if current_index < game_segment_len:
@@ -335,53 +394,57 @@ class MuZeroGameBuffer(GameBuffer):
         ]
         return policy_re_context
 
-    def _compute_target_reward_value(self, reward_value_context: List[Any], model: Any) -> Tuple[Any, Any]:
+    def _preprocess_to_play_and_legal_actions(self, context: List[Any]) -> Tuple[List[int], List[List[int]]]:
         """
         Overview:
-            prepare reward and value targets from the context of rewards and values.
-        Arguments:
-            - reward_value_context (:obj:'list'): the reward value context
-            - model (:obj:'torch.tensor'):model of the target model
-        Returns:
-            - batch_value_prefixs (:obj:'np.ndarray): batch of value prefix
-            - batch_target_values (:obj:'np.ndarray): batch of value estimation
+            prepare the to_play and the legal actions of the roots of the observations in ``reward_value_context`` or
+            ``policy_re_context``, which both start with the observations and end with the action masks and the
+            to_play of the game segments.
         """
-        value_obs_list, value_mask, pos_in_game_segment_list, rewards_list, game_segment_lens, td_steps_list, action_mask_segment, \
-        to_play_segment = reward_value_context  # noqa
+        obs_list, pos_in_game_segment_list, action_mask_segment, to_play_segment = context[0], context[2], context[
+            -2], context[-1]
         # transition_batch_size = game_segment_batch_size * (num_unroll_steps+1)
-        transition_batch_size = len(value_obs_list)
-        game_segment_batch_size = len(pos_in_game_segment_list)
-
+        transition_batch_size = len(obs_list)
         to_play, action_mask = self._preprocess_to_play_and_action_mask(
-            game_segment_batch_size, to_play_segment, action_mask_segment, pos_in_game_segment_list
+            len(pos_in_game_segment_list), to_play_segment, action_mask_segment, pos_in_game_segment_list
         )
         if self._cfg.model.continuous_action_space is True:
-            # when the action space of the environment is continuous, action_mask[:] is None.
-            action_mask = [
-                list(np.ones(self._cfg.model.action_space_size, dtype=np.int8)) for _ in range(transition_batch_size)
-            ]
             # NOTE: in continuous action space env: we set all legal_actions as -1
             legal_actions = [
                 [-1 for _ in range(self._cfg.model.action_space_size)] for _ in range(transition_batch_size)
             ]
         else:
             legal_actions = [[i for i, x in enumerate(action_mask[j]) if x == 1] for j in range(transition_batch_size)]
+        return to_play, legal_actions
 
-        batch_target_values, batch_rewards = [], []
+    def _reanalyze(
+            self, obs: np.ndarray, search_index: np.ndarray, to_play: List[int], legal_actions: List[List[int]],
+            model: Any
+    ) -> Tuple[np.ndarray, Any]:
+        """
+        Overview:
+            Reanalyze the prepared observations with the target model, i.e. the initial inference of all the
+            observations in slices of ``mini_infer_size``, and then one batched MCTS from the latent states of
+            ``obs[search_index]``.
+        Arguments:
+            - obs (:obj:`np.ndarray`): The prepared observations.
+            - search_index (:obj:`np.ndarray`): The indices of the observations of the roots to search.
+            - to_play (:obj:`List[int]`): The to_play of the roots.
+            - legal_actions (:obj:`List[List[int]]`): The legal actions of the roots.
+            - model (:obj:`Any`): The target model.
+        Returns:
+            - values (:obj:`np.ndarray`): The predicted values of all the observations.
+            - roots (:obj:`Any`): The searched roots, None if ``search_index`` is empty.
+        """
         with torch.no_grad():
-            value_obs_list = prepare_observation(value_obs_list, self._cfg.model.model_type)
             # split a full batch into slices of mini_infer_size: to save the GPU memory for more GPU actors
-            slices = int(np.ceil(transition_batch_size / self._cfg.mini_infer_size))
+            slices = int(np.ceil(len(obs) / self._cfg.mini_infer_size))
             network_output = []
             for i in range(slices):
                 beg_index = self._cfg.mini_infer_size * i
                 end_index = self._cfg.mini_infer_size * (i + 1)
-
-                m_obs = torch.from_numpy(value_obs_list[beg_index:end_index]).to(self._cfg.device).float()
-
-                # calculate the target value
+                m_obs = torch.from_numpy(obs[beg_index:end_index]).to(self._cfg.device).float()
                 m_output = model.initial_inference(m_obs)
-
                 if not model.training:
                     # if not in training, obtain the scalars of the value/reward
                     [m_output.latent_state, m_output.value, m_output.policy_logits] = to_detach_cpu_numpy(
@@ -394,37 +457,321 @@ class MuZeroGameBuffer(GameBuffer):
 
                 network_output.append(m_output)
 
-            # concat the output slices after model inference
-            if self._cfg.use_root_value:
-                # use the root values from MCTS, as in EfficiientZero
-                # the root values have limited improvement but require much more GPU actors;
-                _, reward_pool, policy_logits_pool, latent_state_roots = concat_output(
-                    network_output, data_type='muzero'
-                )
-                reward_pool = reward_pool.squeeze().tolist()
-                policy_logits_pool = policy_logits_pool.tolist()
-                noises = [
-                    np.random.dirichlet([self._cfg.root_dirichlet_alpha] * int(sum(action_mask[j]))
-                                        ).astype(np.float32).tolist() for j in range(transition_batch_size)
-                ]
-                if self._cfg.mcts_ctree:
-                    # cpp mcts_tree
-                    roots = MCTSCtree.roots(transition_batch_size, legal_actions)
-                    roots.prepare(self._cfg.root_noise_weight, noises, reward_pool, policy_logits_pool, to_play)
-                    # do MCTS for a new policy with the recent target model
-                    MCTSCtree(self._cfg).search(roots, model, latent_state_roots, to_play)
-                else:
-                    # python mcts_tree
-                    roots = MCTSPtree.roots(transition_batch_size, legal_actions)
-                    roots.prepare(self._cfg.root_noise_weight, noises, reward_pool, policy_logits_pool, to_play)
-                    # do MCTS for a new policy with the recent target model
-                    MCTSPtree(self._cfg).search(roots, model, latent_state_roots, to_play)
-
-                roots_values = roots.get_values()
-                value_list = np.array(roots_values)
+            values, reward_pool, policy_logits_pool, latent_state_roots = concat_output(
+                network_output, data_type='muzero'
+            )
+            if len(search_index) == 0:
+                return values, None
+
+            num_of_roots = len(search_index)
+            reward_pool = np.asarray(reward_pool)[search_index].reshape(-1).tolist()
+            policy_logits_pool = policy_logits_pool[search_index].tolist()
+            latent_state_roots = latent_state_roots[search_index]
+            # the noises of the legal actions, as in the collector
+            noises = [
+                np.random.dirichlet([self._cfg.root_dirichlet_alpha] * len(legal_actions[j])
+                                    ).astype(np.float32).tolist() for j in range(num_of_roots)
+            ]
+            if self._cfg.mcts_ctree:
+                # cpp mcts_tree
+                roots = MCTSCtree.roots(num_of_roots, legal_actions)
+                roots.prepare(self._cfg.root_noise_weight, noises, reward_pool, policy_logits_pool, to_play)
+                # do MCTS for a new policy with the recent target model
+                MCTSCtree(self._cfg).search(roots, model, latent_state_roots, to_play)
             else:
-                # use the predicted values
-                value_list = concat_output_value(network_output)
+                # python mcts_tree
+                roots = MCTSPtree.roots(num_of_roots, legal_actions)
+                roots.prepare(self._cfg.root_noise_weight, noises, reward_pool, policy_logits_pool, to_play)
+                # do MCTS for a new policy with the recent target model
+                MCTSPtree(self._cfg).search(roots, model, latent_state_roots, to_play)
+        return values, roots
+
+    def _reanalyze_with_cache(
+            self,
+            obs: np.ndarray,
+            search_index: np.ndarray,
+            to_play: List[int],
+            legal_actions: List[List[int]],
+            model: Any,
+            root_keys: List[Optional[Tuple[int, int, int]]],
+            need_values: bool = True
+    ) -> Tuple[Optional[np.ndarray], Any]:
+        """
+        Overview:
+            ``_reanalyze`` with the LRU cache of the reanalyzed roots if ``reanalyze_cache_size`` > 0. The roots which
+            are cached for the current target model are not searched again, and the searched roots are cached.
+        Arguments:
+            - obs (:obj:`np.ndarray`): The prepared observations.
+            - search_index (:obj:`np.ndarray`): The indices of the observations of the roots to search.
+            - to_play (:obj:`List[int]`): The to_play of the roots.
+            - legal_actions (:obj:`List[List[int]]`): The legal actions of the roots.
+            - model (:obj:`Any`): The target model.
+            - root_keys (:obj:`List`): The cache keys of the roots, None for the roots which are not cached.
+            - need_values (:obj:`bool`): Whether the predicted values of all the observations are needed. If False, \
+                only the observations of the roots to search are inferred.
+        Returns:
+            - values (:obj:`Optional[np.ndarray]`): The predicted values of all the observations, None if \
+                ``need_values`` is False and there is a cache.
+            - roots (:obj:`Any`): The searched or cached roots, None if ``search_index`` is empty.
+        """
+        cache = self._reanalyze_cache
+        if cache is None or len(search_index) == 0:
+            return self._reanalyze(obs, search_index, to_play, legal_actions, model)
+
+        entries = cache.get(root_keys)
+        # the roots of the same key in the batch, e.g. of the overlapping unrolled positions, are searched only once
+        miss, first_miss = [], {}
+        for i, (key, entry) in enumerate(zip(root_keys, entries)):
+            if entry is None and (key is None or key not in first_miss):
+                first_miss.setdefault(key, i)
+                miss.append(i)
+        miss = np.array(miss, dtype=np.int64)
+        miss_to_play, miss_legal_actions = [to_play[i] for i in miss], [legal_actions[i] for i in miss]
+        values, roots = None, None
+        if need_values:
+            values, roots = self._reanalyze(obs, search_index[miss], miss_to_play, miss_legal_actions, model)
+        elif len(miss) > 0:
+            # only infer the observations of the roots which are not cached
+            rows, miss_index = np.unique(search_index[miss], return_inverse=True)
+            _, roots = self._reanalyze(obs[rows], miss_index, miss_to_play, miss_legal_actions, model)
+        if roots is not None:
+            searched = list(zip(roots.get_values(), roots.get_distributions()))
+            cache.put([root_keys[i] for i in miss], searched)
+            for i, entry in zip(miss, searched):
+                entries[i] = entry
+            entries = [entries[first_miss[key]] if entry is None else entry for key, entry in zip(root_keys, entries)]
+        return values, ReanalyzedRoots([entry[0] for entry in entries], [entry[1] for entry in entries])
+
+    def _get_policy_root_keys(self,
+                              policy_re_context: List[Any]) -> List[Optional[Tuple[int, int, Tuple[int, int]]]]:
+        """
+        Overview:
+            Get the keys of ``ReanalyzeCache`` of the roots of ``policy_re_context``, i.e. (game segment id, position
+            in game segment, target model version) of every unrolled position.
+        """
+        if self._reanalyze_cache is None:
+            return [None] * len(policy_re_context[0])
+        pos_in_game_segment_list, batch_index_list = policy_re_context[2], policy_re_context[3]
+        # the game segment ids are global, i.e. they are never reused after the game segments are removed
+        segment_ids = self._get_game_segment_index(batch_index_list) + self.base_idx
+        version = self._reanalyze_cache.model_version
+        return [
+            (int(segment_id), int(state_index) + k, version)
+            for segment_id, state_index in zip(segment_ids, pos_in_game_segment_list)
+            for k in range(self._cfg.num_unroll_steps + 1)
+        ]
+
+    def _get_obs_keys(self, context: List[Any], batch_index_list: List[int], shift: np.ndarray) -> np.ndarray:
+        """
+        Overview:
+            Get the (global game segment id, position in game segment) of the observation windows of
+            ``reward_value_context`` or ``policy_re_context``, and (-1, -1) of the zero padded ones.
+        Arguments:
+            - context (:obj:`List[Any]`): The context, which starts with the observations, the masks of the valid \
+                observations and the positions in game segments.
+            - batch_index_list (:obj:`List[int]`): The indices of the sampled transitions of the context.
+            - shift (:obj:`np.ndarray`): The offset of every observation window from its unrolled position, \
+                e.g. the td steps of the bootstrapped observations.
+        Returns:
+            - keys (:obj:`np.ndarray`): The keys of the observation windows, of shape (len(context[0]), 2).
+        """
+        num_of_positions = self._cfg.num_unroll_steps + 1
+        segment_ids = self._get_game_segment_index(batch_index_list) + self.base_idx
+        positions = np.repeat(np.asarray(context[2], dtype=np.int64), num_of_positions) + np.tile(
+            np.arange(num_of_positions), len(segment_ids)
+        ) + shift
+        keys = np.stack([np.repeat(segment_ids, num_of_positions), positions], axis=1).astype(np.int64)
+        keys[np.asarray(context[1]) == 0] = -1
+        return keys
+
+    @staticmethod
+    def _deduplicate_obs(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            Find the unique observations of a batch by their keys of ``_get_obs_keys``, e.g. the zero padded
+            observations, or the observation windows of ``reward_value_context`` which are also in
+            ``policy_re_context``.
+        Returns:
+            - unique_index (:obj:`np.ndarray`): The indices of the first occurrences of the unique observations.
+            - inverse (:obj:`np.ndarray`): The index in ``unique_index`` of every observation, \
+                i.e. ``obs[unique_index][inverse]`` equals ``obs``.
+        """
+        _, unique_index, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        return unique_index, inverse.reshape(-1)
+
+    def _compute_fused_reanalyze_targets(self, reward_value_context: List[Any], policy_re_context: List[Any],
+                                         model: Any, batch_index_list: List[int]) -> Tuple[Tuple[Any, Any], Any]:
+        """
+        Overview:
+            Compute the reward/value targets and the reanalyzed policy targets in one reanalysis, instead of
+            ``_compute_target_reward_value`` and ``_compute_target_policy_reanalyzed`` one after the other.
+            The observations of both contexts are deduplicated by their (game segment id, position), so the
+            observation windows shared by the two contexts (and the zero padded ones) are prepared and represented
+            only once, and the value roots (if ``use_root_value``) and the policy roots are searched in one batched
+            MCTS.
+        Arguments:
+            - reward_value_context (:obj:`List`): The context of the rewards and values.
+            - policy_re_context (:obj:`List`): The context of the reanalyzed policies, None if there is no one.
+            - model (:obj:`Any`): The target model.
+            - batch_index_list (:obj:`List[int]`): The indices of the sampled transitions of the batch.
+        Returns:
+            - reward_value_targets (:obj:`Tuple`): The return of ``_compute_target_reward_value``.
+            - batch_target_policies_re (:obj:`np.ndarray`): The return of ``_compute_target_policy_reanalyzed``.
+        """
+        contexts = [reward_value_context] if policy_re_context is None else [reward_value_context, policy_re_context]
+        # the bootstrapped observations of reward_value_context are td_steps after their unrolled positions
+        keys = [self._get_obs_keys(reward_value_context, batch_index_list, np.asarray(reward_value_context[5]))]
+        if policy_re_context is not None:
+            keys.append(self._get_obs_keys(policy_re_context, policy_re_context[3], 0))
+        unique_index, inverse = self._deduplicate_obs(np.concatenate(keys))
+        obs_list = [obs for context in contexts for obs in context[0]]
+        obs = self._prepare_obs_batch([obs_list[i] for i in unique_index])
+        num_of_values = len(reward_value_context[0])
+        search_index, to_play, legal_actions, root_keys = [], [], [], []
+        for i, context in enumerate(contexts):
+            if i == 0 and not self._cfg.use_root_value:
+                continue
+            context_to_play, context_legal_actions = self._preprocess_to_play_and_legal_actions(context)
+            search_index.append(np.arange(len(context[0])) + i * num_of_values)
+            to_play += context_to_play
+            legal_actions += context_legal_actions
+            # the value roots are not cached, since the bootstrap observations are not indexed in the context
+            root_keys += [None] * num_of_values if i == 0 else self._get_policy_root_keys(context)
+
+        search_index = inverse[np.concatenate(search_index)] if len(search_index) > 0 else np.zeros(0, dtype=np.int64)
+        values, roots = self._reanalyze_with_cache(
+            obs,
+            search_index,
+            to_play,
+            legal_actions,
+            model,
+            root_keys,
+            need_values=not self._cfg.use_root_value
+        )
+
+        if self._cfg.use_root_value:
+            value_list = np.array(roots.get_values()[:num_of_values])
+        else:
+            value_list = values[inverse[:num_of_values]]
+        reward_value_targets = self._compute_target_reward_value(reward_value_context, model, value_list)
+        if policy_re_context is None:
+            return reward_value_targets, []
+        roots_distributions = roots.get_distributions()[-len(policy_re_context[0]):]
+        batch_target_policies_re = self._compute_target_policy_reanalyzed(policy_re_context, model, roots_distributions)
+        return reward_value_targets, batch_target_policies_re
+
+    def _prepare_refresh_context(self, num_of_transitions: int) -> Optional[List[Any]]:
+        """
+        Overview:
+            Select the game segments with the stalest targets, about ``num_of_transitions`` transitions in total, and
+            prepare the context of ``_refresh_targets``, i.e. the observations, the to_play and the legal actions of
+            all the positions with a stored search result (including the padding from the next game segment).
+            It is called by ``ReanalyzeDaemon`` with the lock of the buffer held.
+        Returns:
+            - refresh_context (:obj:`Optional[List[Any]]`): game_segments, segment_indices, obs, to_play, \
+                legal_actions, or None if the buffer is empty.
+        """
+        game_segments, segment_indices = [], []
+        obs_list, to_play, legal_actions = [], [], []
+        for segment_index in self._target_refresh_time:
+            if len(obs_list) >= num_of_transitions:
+                break
+            game_segment = self.game_segment_buffer[segment_index - self.base_idx]
+            num_of_positions = len(game_segment.child_visit_segment)
+            game_obs = game_segment.get_unroll_obs(0, num_of_positions - 1, decode=False)
+            for t in range(num_of_positions):
+                obs_list.append(game_obs[t:t + self._cfg.model.frame_stack_num])
+                # NOTE: the padding positions from the next game segment are treated as in
+                # ``_preprocess_to_play_and_action_mask``
+                to_play.append(game_segment.to_play_segment[t] if t < len(game_segment.to_play_segment) else -1)
+                if self._cfg.model.continuous_action_space is True:
+                    # NOTE: in continuous action space env: we set all legal_actions as -1
+                    legal_actions.append([-1 for _ in range(self._cfg.model.action_space_size)])
+                elif t < len(game_segment.action_mask_segment):
+                    legal_actions.append([i for i, x in enumerate(game_segment.action_mask_segment[t]) if x == 1])
+                else:
+                    legal_actions.append([i for i in range(self._cfg.model.action_space_size)])
+            game_segments.append(game_segment)
+            segment_indices.append(segment_index)
+        if len(game_segments) == 0:
+            return None
+        return [game_segments, segment_indices, self._prepare_obs_batch(obs_list), to_play, legal_actions]
+
+    def _refresh_targets(
+            self, refresh_context: List[Any], model: Any, lock: Optional[threading.RLock] = None
+    ) -> int:
+        """
+        Overview:
+            Reanalyze the positions of ``refresh_context`` with ``model`` and write the fresh root visit count
+            distributions and root values back into ``child_visit_segment`` and ``root_value_segment`` of the game
+            segments, as in MuZero Reanalyze. It is called by ``ReanalyzeDaemon``, which searches without the lock of
+            the buffer and only holds ``lock`` to write the targets back and update the refresh times.
+        Arguments:
+            - refresh_context (:obj:`List[Any]`): The return of ``_prepare_refresh_context``.
+            - model (:obj:`Any`): The target model.
+            - lock (:obj:`Optional[threading.RLock]`): The lock of the buffer, held during the write-back.
+        Returns:
+            - num_of_transitions (:obj:`int`): The number of refreshed transitions.
+        """
+        game_segments, segment_indices, obs, to_play, legal_actions = refresh_context
+        _, roots = self._reanalyze(obs, np.arange(len(obs)), to_play, legal_actions, model)
+        roots_values, roots_distributions = roots.get_values(), roots.get_distributions()
+        with lock if lock is not None else contextlib.nullcontext():
+            index = 0
+            for game_segment, segment_index in zip(game_segments, segment_indices):
+                num_of_positions = len(game_segment.child_visit_segment)
+                # the game segments removed from the buffer during the search are not tracked anymore
+                if segment_index not in self._target_refresh_time:
+                    index += num_of_positions
+                    continue
+                for t in range(num_of_positions):
+                    distributions = roots_distributions[index]
+                    if distributions is not None:
+                        sum_visits = sum(distributions)
+                        game_segment.child_visit_segment[t] = [
+                            visit_count / sum_visits for visit_count in distributions
+                        ]
+                        game_segment.root_value_segment[t] = roots_values[index]
+                    index += 1
+                refresh_time = time.time()
+                self._target_refresh_time[segment_index] = refresh_time
+                self._target_refresh_time.move_to_end(segment_index)
+                self._segment_refresh_time[segment_index - self.base_idx] = refresh_time
+            self.num_of_refreshed_transitions += len(obs)
+        return len(obs)
+
+    def _compute_target_reward_value(
+            self, reward_value_context: List[Any], model: Any, value_list: Optional[np.ndarray] = None
+    ) -> Tuple[Any, Any]:
+        """
+        Overview:
+            prepare reward and value targets from the context of rewards and values.
+        Arguments:
+            - reward_value_context (:obj:'list'): the reward value context
+            - model (:obj:'torch.tensor'):model of the target model
+            - value_list (:obj:'np.ndarray'): the bootstrapped values of ``value_obs_list`` which are already \
+                reanalyzed, e.g. by ``_compute_fused_reanalyze_targets``. If None, they are reanalyzed here.
+        Returns:
+            - batch_value_prefixs (:obj:'np.ndarray): batch of value prefix
+            - batch_target_values (:obj:'np.ndarray): batch of value estimation
+        """
+        value_obs_list, value_mask, pos_in_game_segment_list, rewards_list, game_segment_lens, td_steps_list, action_mask_segment, \
+        to_play_segment = reward_value_context  # noqa
+        # transition_batch_size = game_segment_batch_size * (num_unroll_steps+1)
+        transition_batch_size = len(value_obs_list)
+        to_play, legal_actions = self._preprocess_to_play_and_legal_actions(reward_value_context)
+
+        batch_target_values, batch_rewards = [], []
+        with torch.no_grad():
+            if value_list is None:
+                # use the root values from MCTS if use_root_value, as in EfficientZero, otherwise the predicted values.
+                # the root values have limited improvement but require much more GPU actors.
+                search_index = np.arange(transition_batch_size if self._cfg.use_root_value else 0)
+                value_list, roots = self._reanalyze(
+                    self._prepare_obs_batch(value_obs_list), search_index, to_play, legal_actions, model
+                )
+                if roots is not None:
+                    value_list = np.array(roots.get_values())
 
             # get last state value
             if self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2]:
@@ -442,6 +789,15 @@ class MuZeroGameBuffer(GameBuffer):
                 )
 
             value_list = value_list * np.array(value_mask)
+            if self._cfg.use_vectorized_value_target:
+                target_values, target_rewards = self._compute_n_step_value_target(
+                    value_list, rewards_list, pos_in_game_segment_list, td_steps_list, to_play_segment
+                )
+                in_game_segment = self._get_in_game_segment_mask(pos_in_game_segment_list, game_segment_lens)
+                batch_target_values = np.where(in_game_segment, target_values, 0)
+                batch_rewards = np.where(in_game_segment, target_rewards, 0.)
+                return batch_rewards, batch_target_values
+
             value_list = value_list.tolist()
             horizon_id, value_index = 0, 0
 
@@ -482,12 +838,108 @@ class MuZeroGameBuffer(GameBuffer):
         batch_target_values = np.asarray(batch_target_values, dtype=object)
         return batch_rewards, batch_target_values
 
-    def _compute_target_policy_reanalyzed(self, policy_re_context: List[Any], model: Any) -> np.ndarray:
+    def _get_in_game_segment_mask(self, pos_in_game_segment_list: List[int], game_segment_lens: List[int]) -> np.ndarray:
+        """
+        Overview:
+            Whether the unrolled transitions ``state_index + k, k = 0, ..., num_unroll_steps`` are in the game segments.
+        Returns:
+            - in_game_segment (:obj:`np.ndarray`): shape (game_segment_batch_size, num_unroll_steps + 1).
+        """
+        current_index = np.asarray(pos_in_game_segment_list)[:, None] + np.arange(self._cfg.num_unroll_steps + 1)
+        return current_index < np.asarray(game_segment_lens)[:, None]
+
+    def _compute_n_step_value_target(
+            self,
+            value_list: np.ndarray,
+            rewards_list: List[np.ndarray],
+            pos_in_game_segment_list: List[int],
+            td_steps_list: List[int],
+            to_play_segment: List[np.ndarray],
+            base_index: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            The vectorized version of the n-step value targets computed in ``_compute_target_reward_value``, i.e.
+            ``value_{t+k} = sum_{i < td_steps} reward_{t+k+i} * discount_factor ** i + bootstrapped value``.
+            Instead of looping over every transition, the discounted rewards of the whole minibatch are accumulated
+            offset by offset with masked array additions. The additions are done in the same order and with the same
+            dtypes as the python loop (a python float plus the numpy rewards), so the results are bit-identical.
+            The rewards are not summed with ``cumsum`` or a discounted convolution because they change the rounding.
+        Arguments:
+            - value_list (:obj:`np.ndarray`): the discounted and masked bootstrapped values, shape \
+                (game_segment_batch_size * (num_unroll_steps + 1), ).
+            - rewards_list (:obj:`list`): the reward segments of the sampled game segments.
+            - pos_in_game_segment_list (:obj:`list`): the index of the start transitions in the game segments.
+            - td_steps_list (:obj:`list`): the td steps of every transition.
+            - to_play_segment (:obj:`list`): the to_play segments of the sampled game segments, used in board games.
+            - base_index (:obj:`np.ndarray`): the index of the reference player used in board games, shape \
+                (game_segment_batch_size, num_unroll_steps + 1). Default to ``state_index`` for all unroll steps.
+        Returns:
+            - target_values (:obj:`np.ndarray`): the n-step value targets, which are not masked out of the game \
+                segments, shape (game_segment_batch_size, num_unroll_steps + 1).
+            - target_rewards (:obj:`np.ndarray`): the rewards ``reward_{t+k}`` padded with zeros out of the reward \
+                segments, shape (game_segment_batch_size, num_unroll_steps + 1).
+        """
+        num_unroll_steps = self._cfg.num_unroll_steps
+        batch_size = len(pos_in_game_segment_list)
+        state_index = np.asarray(pos_in_game_segment_list)
+        td_steps = np.asarray(td_steps_list).reshape(batch_size, num_unroll_steps + 1)
+        max_td_steps = int(td_steps.max())
+
+        # gather rewards[t, t + num_unroll_steps + max_td_steps) of every sample, padded with zeros
+        window_size = num_unroll_steps + max_td_steps
+        reward_windows = np.zeros((batch_size, window_size), dtype=np.result_type(*rewards_list))
+        reward_lens = np.zeros(batch_size, dtype=np.int64)
+        for i, (reward_list, index) in enumerate(zip(rewards_list, pos_in_game_segment_list)):
+            window = np.asarray(reward_list[index:index + window_size]).reshape(-1)
+            reward_windows[i, :len(window)] = window
+            reward_lens[i] = len(reward_list)
+        # the number of rewards in reward_list[current_index:bootstrap_index]
+        num_rewards = np.minimum(td_steps, reward_lens[:, None] - state_index[:, None] - np.arange(num_unroll_steps + 1))
+
+        board_games = self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2]
+        if board_games:
+            # NOTE: the same reference as the python loop, i.e. to_play_list[base_index] == to_play_list[i]
+            if base_index is None:
+                base_index = np.repeat(state_index[:, None], num_unroll_steps + 1, axis=1)
+            same_player = np.zeros((batch_size, num_unroll_steps + 1, max_td_steps), dtype=bool)
+            for i, to_play_list in enumerate(to_play_segment):
+                to_play_list = np.asarray(to_play_list)
+                head = to_play_list[:max_td_steps]
+                base_player = to_play_list[np.minimum(base_index[i], len(to_play_list) - 1)]
+                same_player[i, :, :len(head)] = base_player[:, None] == head[None, :]
+
+        # the dtypes of ``reward * discount_factor ** i`` and of the accumulated value follow the python loop, in which a
+        # reward is a numpy scalar (or a small array) and the bootstrapped value is a python float
+        reward = rewards_list[0][0]
+        target_values = np.asarray(value_list).reshape(batch_size, num_unroll_steps + 1)
+        for i in range(max_td_steps):
+            discount = self._cfg.discount_factor ** i
+            term = reward * discount
+            term_dtype, value_dtype = np.result_type(term), np.result_type(0. + term)
+            discounted_rewards = reward_windows[:, i:i + num_unroll_steps + 1].astype(term_dtype) * np.asarray(
+                discount, dtype=term_dtype
+            )
+            if board_games:
+                discounted_rewards = np.where(same_player[:, :, i], discounted_rewards, -discounted_rewards)
+            target_values = np.where(
+                i < num_rewards,
+                target_values.astype(value_dtype) + discounted_rewards.astype(value_dtype), target_values
+            )
+
+        return target_values, reward_windows[:, :num_unroll_steps + 1]
+
+    def _compute_target_policy_reanalyzed(
+            self, policy_re_context: List[Any], model: Any, roots_distributions: Optional[List[Any]] = None
+    ) -> np.ndarray:
         """
         Overview:
             prepare policy targets from the reanalyzed context of policies
         Arguments:
             - policy_re_context (:obj:`List`): List of policy context to reanalyzed
+            - roots_distributions (:obj:`List`): the visit count distributions of the roots of ``policy_obs_list`` \
+                which are already searched, e.g. by ``_compute_fused_reanalyze_targets``. If None, they are \
+                searched here.
         Returns:
             - batch_target_policies_re
         """
@@ -500,68 +952,29 @@ class MuZeroGameBuffer(GameBuffer):
         to_play_segment = policy_re_context  # noqa
         # transition_batch_size = game_segment_batch_size * (self._cfg.num_unroll_steps + 1)
         transition_batch_size = len(policy_obs_list)
-        game_segment_batch_size = len(pos_in_game_segment_list)
-
-        to_play, action_mask = self._preprocess_to_play_and_action_mask(
-            game_segment_batch_size, to_play_segment, action_mask_segment, pos_in_game_segment_list
-        )
-
-        if self._cfg.model.continuous_action_space is True:
-            # when the action space of the environment is continuous, action_mask[:] is None.
-            action_mask = [
-                list(np.ones(self._cfg.model.action_space_size, dtype=np.int8)) for _ in range(transition_batch_size)
-            ]
-            # NOTE: in continuous action space env: we set all legal_actions as -1
-            legal_actions = [
-                [-1 for _ in range(self._cfg.model.action_space_size)] for _ in range(transition_batch_size)
-            ]
-        else:
-            legal_actions = [[i for i, x in enumerate(action_mask[j]) if x == 1] for j in range(transition_batch_size)]
+        to_play, legal_actions = self._preprocess_to_play_and_legal_actions(policy_re_context)
 
         with torch.no_grad():
-            policy_obs_list = prepare_observation(policy_obs_list, self._cfg.model.model_type)
-            # split a full batch into slices of mini_infer_size: to save the GPU memory for more GPU actors
-            slices = int(np.ceil(transition_batch_size / self._cfg.mini_infer_size))
-            network_output = []
-            for i in range(slices):
-                beg_index = self._cfg.mini_infer_size * i
-                end_index = self._cfg.mini_infer_size * (i + 1)
-                m_obs = torch.from_numpy(policy_obs_list[beg_index:end_index]).to(self._cfg.device).float()
-                m_output = model.initial_inference(m_obs)
-                if not model.training:
-                    # if not in training, obtain the scalars of the value/reward
-                    [m_output.latent_state, m_output.value, m_output.policy_logits] = to_detach_cpu_numpy(
-                        [
-                            m_output.latent_state,
-                            inverse_scalar_transform(m_output.value, self._cfg.model.support_scale),
-                            m_output.policy_logits
-                        ]
-                    )
-
-                network_output.append(m_output)
-
-            _, reward_pool, policy_logits_pool, latent_state_roots = concat_output(network_output, data_type='muzero')
-            reward_pool = reward_pool.squeeze().tolist()
-            policy_logits_pool = policy_logits_pool.tolist()
-            noises = [
-                np.random.dirichlet([self._cfg.root_dirichlet_alpha] * self._cfg.model.action_space_size
-                                    ).astype(np.float32).tolist() for _ in range(transition_batch_size)
-            ]
-            if self._cfg.mcts_ctree:
-                # cpp mcts_tree
-                roots = MCTSCtree.roots(transition_batch_size, legal_actions)
-                roots.prepare(self._cfg.root_noise_weight, noises, reward_pool, policy_logits_pool, to_play)
-                # do MCTS for a new policy with the recent target model
-                MCTSCtree(self._cfg).search(roots, model, latent_state_roots, to_play)
-            else:
-                # python mcts_tree
-                roots = MCTSPtree.roots(transition_batch_size, legal_actions)
-                roots.prepare(self._cfg.root_noise_weight, noises, reward_pool, policy_logits_pool, to_play)
-                # do MCTS for a new policy with the recent target model
-                MCTSPtree(self._cfg).search(roots, model, latent_state_roots, to_play)
-
+            if roots_distributions is None:
+                _, roots = self._reanalyze_with_cache(
+                    self._prepare_obs_batch(policy_obs_list),
+                    np.arange(transition_batch_size),
+                    to_play,
+                    legal_actions,
+                    model,
+                    self._get_policy_root_keys(policy_re_context),
+                    need_values=False
+                )
+                roots_distributions = roots.get_distributions()
+            if self._cfg.use_vectorized_policy_target:
+                return self._assemble_target_policies(
+                    roots_distributions,
+                    policy_mask,
+                    self._cfg.model.action_space_size,
+                    action_mask=self._legal_actions_to_mask(legal_actions),
+                    normalize=True
+                )
             roots_legal_actions_list = legal_actions
-            roots_distributions = roots.get_distributions()
             policy_index = 0
             for state_index, game_index in zip(pos_in_game_segment_list, batch_index_list):
                 target_policies = []
@@ -631,6 +1044,27 @@ class MuZeroGameBuffer(GameBuffer):
             game_segment_batch_size, to_play_segment, action_mask_segment, pos_in_game_segment_list
         )
 
+        if self._cfg.use_vectorized_policy_target:
+            in_game_segment = self._get_in_game_segment_mask(pos_in_game_segment_list, game_segment_lens)
+            if self._cfg.env_type == 'not_board_games':
+                target_policies = self._gather_target_policies(
+                    child_visits, pos_in_game_segment_list, in_game_segment, policy_shape
+                )
+                if target_policies is not None:
+                    return target_policies
+            # NOTE: child_visit is already a distribution
+            distributions = [
+                child_visit[state_index + k] if in_game_segment[i, k] else None
+                for i, (child_visit, state_index) in enumerate(zip(child_visits, pos_in_game_segment_list))
+                for k in range(self._cfg.num_unroll_steps + 1)
+            ]
+            return self._assemble_target_policies(
+                distributions,
+                in_game_segment.reshape(-1),
+                policy_shape,
+                action_mask=None if self._cfg.env_type == 'not_board_games' else action_mask
+            )
+
         if self._cfg.model.continuous_action_space is True:
             # when the action space of the environment is continuous, action_mask[:] is None.
             action_mask = [
@@ -678,6 +1112,115 @@ class MuZeroGameBuffer(GameBuffer):
         batch_target_policies_non_re = np.asarray(batch_target_policies_non_re)
         return batch_target_policies_non_re
 
+    def _gather_target_policies(
+            self, child_visits: List[Any], pos_in_game_segment_list: List[int], in_game_segment: np.ndarray,
+            policy_shape: int
+    ) -> Optional[np.ndarray]:
+        """
+        Overview:
+            Gather the non-reanalyzed target policies of the one player environments, whose ``child_visit_segment`` is
+            already a 2-D array of distributions over the whole action space after ``game_segment_to_array``: the
+            unrolled rows of every game segment are sliced at once and scattered into the transitions in the game
+            segments, without the per-transition packing of ``_assemble_target_policies``.
+        Arguments:
+            - child_visits (:obj:`List[Any]`): the ``child_visit_segment`` of the game segments.
+            - pos_in_game_segment_list (:obj:`List[int]`): the positions of the sampled transitions.
+            - in_game_segment (:obj:`np.ndarray`): the return of ``_get_in_game_segment_mask``.
+            - policy_shape (:obj:`int`): the dimension of the target policies.
+        Returns:
+            - target_policies (:obj:`Optional[np.ndarray]`): shape (game_segment_batch_size, num_unroll_steps + 1, \
+                policy_shape), None if the distributions are not 2-D arrays, e.g. the rows of different lengths.
+        """
+        windows = []
+        for child_visit, state_index, num_of_rows in zip(child_visits, pos_in_game_segment_list,
+                                                         in_game_segment.sum(axis=1)):
+            window = child_visit[state_index:state_index + num_of_rows]
+            # the rows of a ragged column are padded with 0, i.e. the probabilities of the actions out of the rows
+            window = window.data if isinstance(window, RaggedRows) else np.asarray(window)
+            if window.ndim != 2 or window.dtype == object:
+                return None
+            windows.append(window)
+        target_policies = np.zeros(in_game_segment.shape + (policy_shape, ), dtype=np.float32)
+        if in_game_segment.any():
+            rows = np.concatenate(windows)[:, :policy_shape]
+            target_policies[..., :rows.shape[1]][in_game_segment] = rows
+        return target_policies
+
+    def _legal_actions_to_mask(self, legal_actions: List[List[int]]) -> Optional[np.ndarray]:
+        """
+        Overview:
+            Convert the legal actions of the roots into the action mask used by ``_assemble_target_policies``, which is
+            None if the visit count distributions cover the whole action space, i.e. in the one player environments.
+        """
+        if self._cfg.env_type == 'not_board_games':
+            return None
+        rows = np.repeat(np.arange(len(legal_actions)), [len(actions) for actions in legal_actions])
+        columns = np.concatenate(list(legal_actions) + [[]]).astype(np.int64)
+        action_mask = np.zeros((len(legal_actions), self._cfg.model.action_space_size), dtype=np.int8)
+        action_mask[rows, columns] = 1
+        return action_mask
+
+    def _assemble_target_policies(
+            self,
+            distributions: List[Optional[Any]],
+            policy_mask: Any,
+            policy_shape: int,
+            action_mask: Optional[Any] = None,
+            normalize: bool = False
+    ) -> np.ndarray:
+        """
+        Overview:
+            The vectorized version of the assembly of the target policies in ``_compute_target_policy_reanalyzed`` and
+            ``_compute_target_policy_non_reanalyzed``. Instead of building every target policy as a python list, the
+            distributions of the whole minibatch are packed into one padded array, normalized at once, and scattered
+            into a preallocated ``(B, num_unroll_steps + 1, policy_shape)`` float32 array.
+            In the board games, the i-th entry of a distribution is the probability of the i-th legal action of the
+            transition, so the entries are scattered into the columns of ``action_mask`` by their rank among the legal
+            actions. Otherwise, the i-th entry is the probability of the action i.
+        Arguments:
+            - distributions (:obj:`List[Optional[Any]]`): the visit count distributions of every transition, None if \
+                there is none, e.g. out of the game segments or for the roots without legal actions.
+            - policy_mask (:obj:`Any`): 1 for the transitions in the game segments, 0 for the padded transitions, \
+                whose target policies are 0, so that the corresponding cross entropy loss is 0. The transitions in \
+                the game segments without a distribution get the uniform target policy.
+            - policy_shape (:obj:`int`): the dimension of the target policies.
+            - action_mask (:obj:`Optional[Any]`): the legal actions of every transition in the board games, shape \
+                (transition_batch_size, policy_shape), None in the one player environments.
+            - normalize (:obj:`bool`): whether the distributions are visit counts to normalize.
+        Returns:
+            - target_policies (:obj:`np.ndarray`): shape (game_segment_batch_size, num_unroll_steps + 1, policy_shape).
+        """
+        policy_mask = np.asarray(policy_mask).reshape(-1) != 0
+        has_distribution = np.fromiter((d is not None for d in distributions), dtype=bool, count=len(distributions))
+        target_policies = np.zeros((len(policy_mask), policy_shape), dtype=np.float32)
+        target_policies[policy_mask & ~has_distribution] = 1. / policy_shape
+
+        rows = np.flatnonzero(policy_mask & has_distribution)
+        if len(rows) > 0:
+            values = [distributions[row] for row in rows]
+            lengths = np.fromiter((len(value) for value in values), dtype=np.int64, count=len(values))
+            if lengths.min() == lengths.max() > 0:
+                # the distributions of the same length, e.g. in the one player environments, are converted at once
+                padded = np.asarray(values, dtype=np.float64).reshape(len(rows), -1)
+            else:
+                values = [np.asarray(value, dtype=np.float64).reshape(-1) for value in values]
+                # pack the distributions of different lengths (of the board games) into one padded array
+                offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+                padded = np.zeros((len(rows), max(int(lengths.max()), 1)))
+                padded[np.repeat(np.arange(len(rows)), lengths), np.arange(int(lengths.sum())) - offsets] = \
+                    np.concatenate(values)
+            if normalize:
+                padded /= padded.sum(axis=1, keepdims=True)
+            if action_mask is None:
+                target_policies[rows, :padded.shape[1]] = padded[:, :policy_shape]
+            else:
+                legal = np.asarray(action_mask)[rows] == 1
+                # the rank of every legal action among the legal actions of its transition
+                rank = np.cumsum(legal, axis=1) - 1
+                scattered = np.take_along_axis(padded, np.clip(rank, 0, padded.shape[1] - 1), axis=1)
+                target_policies[rows] = np.where(legal & (rank < lengths[:, None]), scattered, 0.)
+        return target_policies.reshape(-1, self._cfg.num_unroll_steps + 1, policy_shape)
+
     def update_priority(self, train_data: List[np.ndarray], batch_priorities: Any) -> None:
         """
         Overview:
@@ -689,10 +1232,5 @@ class MuZeroGameBuffer(GameBuffer):
             train_data = [current_batch, target_batch]
             current_batch = [obs_list, action_list, improved_policy_list(only in Gumbel MuZero), mask_list, batch_index_list, weights, make_time_list]
         """
-        indices = train_data[0][-3]
-        metas = {'make_time': train_data[0][-1], 'batch_priorities': batch_priorities}
-        # only update the priorities for data still in replay buffer
-        for i in range(len(indices)):
-            if metas['make_time'][i] > self.clear_time:
-                idx, prio = indices[i], metas['batch_priorities'][i]
-                self.game_pos_priorities[idx] = prio
+        # only update the priorities for data still in replay buffer, in one vectorized call
+        self._update_priority_of_batch(train_data[0][-3], train_data[0][-1], batch_priorities)
@@ -6,7 +6,7 @@ from ding.utils import BUFFER_REGISTRY
 
 from lzero.mcts.tree_search.mcts_ctree_sampled import SampledEfficientZeroMCTSCtree as MCTSCtree
 from lzero.mcts.tree_search.mcts_ptree_sampled import SampledEfficientZeroMCTSPtree as MCTSPtree
-from lzero.mcts.utils import prepare_observation, generate_random_actions_discrete
+from lzero.mcts.utils import generate_random_actions_discrete
 from lzero.policy import to_detach_cpu_numpy, concat_output, concat_output_value, inverse_scalar_transform
 from .game_buffer_efficientzero import EfficientZeroGameBuffer
 
@@ -35,9 +35,7 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
         self._alpha = self._cfg.priority_prob_alpha
         self._beta = self._cfg.priority_prob_beta
 
-        self.game_segment_buffer = []
-        self.game_pos_priorities = []
-        self.game_segment_game_pos_look_up = []
+        self._init_storage()
 
         self.keep_ratio = 1
         self.num_of_collected_episodes = 0
@@ -62,10 +60,23 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
             batch_size, self._cfg.reanalyze_ratio
         )
 
-        # target reward, target value
-        batch_value_prefixs, batch_target_values = self._compute_target_reward_value(
-            reward_value_context, policy._target_model
-        )
+        reanalyze_pool = self._get_reanalyze_pool(policy._target_model)
+        if reanalyze_pool is not None:
+            # target reward, target value and reanalyzed target policy in the reanalyze worker processes
+            (batch_value_prefixs, batch_target_values), policy_re_results = reanalyze_pool.compute(
+                [
+                    ('_compute_target_reward_value', reward_value_context),
+                    (
+                        '_compute_target_policy_reanalyzed',
+                        policy_re_context if self._cfg.reanalyze_ratio > 0 else None
+                    ),
+                ]
+            )
+        else:
+            # target reward, target value
+            batch_value_prefixs, batch_target_values = self._compute_target_reward_value(
+                reward_value_context, policy._target_model
+            )
 
         batch_target_policies_non_re = self._compute_target_policy_non_reanalyzed(
             policy_non_re_context, self._cfg.model.num_of_sampled_actions
@@ -73,9 +84,12 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
 
         if self._cfg.reanalyze_ratio > 0:
             # target policy
-            batch_target_policies_re, root_sampled_actions = self._compute_target_policy_reanalyzed(
-                policy_re_context, policy._target_model
-            )
+            if reanalyze_pool is not None:
+                batch_target_policies_re, root_sampled_actions = policy_re_results
+            else:
+                batch_target_policies_re, root_sampled_actions = self._compute_target_policy_reanalyzed(
+                    policy_re_context, policy._target_model
+                )
             # ==============================================================
             # fix reanalyze in sez:
             # use the latest root_sampled_actions after the reanalyze process,
@@ -183,7 +197,10 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
             # pad if length of obs in game_segment is less than stack+num_unroll_steps
             obs_list.append(
                 game_lst[i].get_unroll_obs(
-                    pos_in_game_segment_list[i], num_unroll_steps=self._cfg.num_unroll_steps, padding=True
+                    pos_in_game_segment_list[i],
+                    num_unroll_steps=self._cfg.num_unroll_steps,
+                    padding=True,
+                    decode=False
                 )
             )
             action_list.append(actions_tmp)
@@ -192,7 +209,7 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
             mask_list.append(mask_tmp)
 
         # formalize the input observations
-        obs_list = prepare_observation(obs_list, self._cfg.model.model_type)
+        obs_list = self._prepare_obs_batch(obs_list)
         # ==============================================================
         # sampled related core code
         # ==============================================================
@@ -272,7 +289,7 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
 
         batch_target_values, batch_value_prefixs = [], []
         with torch.no_grad():
-            value_obs_list = prepare_observation(value_obs_list, self._cfg.model.model_type)
+            value_obs_list = self._prepare_obs_batch(value_obs_list)
             # split a full batch into slices of mini_infer_size: to save the GPU memory for more GPU actors
             slices = int(np.ceil(transition_batch_size / self._cfg.mini_infer_size))
             network_output = []
@@ -360,6 +377,11 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
                 )
 
             value_list = value_list * np.array(value_mask)
+            if self._cfg.use_vectorized_value_target:
+                return self._compute_vectorized_value_prefix_value_target(
+                    value_list, rewards_list, pos_in_game_segment_list, game_segment_lens, td_steps_list, to_play_segment
+                )
+
             value_list = value_list.tolist()
 
             horizon_id, value_index = 0, 0
@@ -447,7 +469,7 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
             legal_actions = [[i for i, x in enumerate(action_mask[j]) if x == 1] for j in range(transition_batch_size)]
 
         with torch.no_grad():
-            policy_obs_list = prepare_observation(policy_obs_list, self._cfg.model.model_type)
+            policy_obs_list = self._prepare_obs_batch(policy_obs_list)
             # split a full batch into slices of mini_infer_size: to save the GPU memory for more GPU actors
             self._cfg.mini_infer_size = self._cfg.mini_infer_size
             slices = np.ceil(transition_batch_size / self._cfg.mini_infer_size).astype(np.int_)
@@ -574,10 +596,5 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
             current_batch = [obs_list, action_list, root_sampled_actions_list, mask_list, batch_index_list, weights_list, make_time_list]
         """
 
-        batch_index_list = train_data[0][4]
-        metas = {'make_time': train_data[0][6], 'batch_priorities': batch_priorities}
-        # only update the priorities for data still in replay buffer
-        for i in range(len(batch_index_list)):
-            if metas['make_time'][i] > self.clear_time:
-                idx, prio = batch_index_list[i], metas['batch_priorities'][i]
-                self.game_pos_priorities[idx] = prio
+        # only update the priorities for data still in replay buffer, in one vectorized call
+        self._update_priority_of_batch(train_data[0][4], train_data[0][6], batch_priorities)
@@ -3,7 +3,6 @@ from typing import Any, Tuple, List
 import numpy as np
 from ding.utils import BUFFER_REGISTRY
 
-from lzero.mcts.utils import prepare_observation
 from .game_buffer_muzero import MuZeroGameBuffer
 
 
@@ -37,9 +36,7 @@ class StochasticMuZeroGameBuffer(MuZeroGameBuffer):
         self.base_idx = 0
         self.clear_time = 0
 
-        self.game_segment_buffer = []
-        self.game_pos_priorities = []
-        self.game_segment_game_pos_look_up = []
+        self._init_storage()
 
     def _make_batch(self, batch_size: int, reanalyze_ratio: float) -> Tuple[Any]:
         """
@@ -92,7 +89,10 @@ class StochasticMuZeroGameBuffer(MuZeroGameBuffer):
             # e.g. stack+num_unroll_steps  4+5
             obs_list.append(
                 game_segment_list[i].get_unroll_obs(
-                    pos_in_game_segment_list[i], num_unroll_steps=self._cfg.num_unroll_steps, padding=True
+                    pos_in_game_segment_list[i],
+                    num_unroll_steps=self._cfg.num_unroll_steps,
+                    padding=True,
+                    decode=False
                 )
             )
             action_list.append(actions_tmp)
@@ -101,7 +101,7 @@ class StochasticMuZeroGameBuffer(MuZeroGameBuffer):
                 chance_list.append(chances_tmp)
 
         # formalize the input observations
-        obs_list = prepare_observation(obs_list, self._cfg.model.model_type)
+        obs_list = self._prepare_obs_batch(obs_list)
 
         # formalize the inputs of a batch
         if self._cfg.use_ture_chance_label_in_chance_encoder:
@@ -162,10 +162,5 @@ class StochasticMuZeroGameBuffer(MuZeroGameBuffer):
                 obs_batch_orig, action_batch, mask_batch, indices, weights, make_time = current_batch
 
         """
-        indices = train_data[0][3]
-        metas = {'make_time': train_data[0][5], 'batch_priorities': batch_priorities}
-        # only update the priorities for data still in replay buffer
-        for i in range(len(indices)):
-            if metas['make_time'][i] > self.clear_time:
-                idx, prio = indices[i], metas['batch_priorities'][i]
-                self.game_pos_priorities[idx] = prio
+        # only update the priorities for data still in replay buffer, in one vectorized call
+        self._update_priority_of_batch(train_data[0][3], train_data[0][5], batch_priorities)
@@ -6,6 +6,8 @@ from easydict import EasyDict
 
 from ding.utils.compression_helper import jpeg_data_decompressor
 
+from .obs_codec import get_obs_codec
+
 
 class GameSegment:
     """
@@ -48,6 +50,8 @@ class GameSegment:
         self.action_space_size = config.model.action_space_size
         self.gray_scale = config.gray_scale
         self.transform2string = config.transform2string
+        # the name of the ``ObsCodec`` which encodes the stored observation frames, None to store the raw frames
+        self.obs_codec = config.get('obs_codec', None)
         self.sampled_algo = config.sampled_algo
         self.gumbel_algo = config.gumbel_algo
         self.use_ture_chance_label_in_chance_encoder = config.use_ture_chance_label_in_chance_encoder
@@ -83,7 +87,9 @@ class GameSegment:
             self.chance_segment = []
 
 
-    def get_unroll_obs(self, timestep: int, num_unroll_steps: int = 0, padding: bool = False) -> np.ndarray:
+    def get_unroll_obs(
+            self, timestep: int, num_unroll_steps: int = 0, padding: bool = False, decode: bool = True
+    ) -> np.ndarray:
         """
         Overview:
             Get an observation of the correct format: o[t, t + stack frames + num_unroll_steps].
@@ -91,15 +97,22 @@ class GameSegment:
             - timestep (int): The time step.
             - num_unroll_steps (int): The extra length of the observation frames.
             - padding (bool): If True, pad frames if (t + stack frames) is outside of the trajectory.
+            - decode (bool): If False, the frames encoded by ``obs_codec`` are returned as they are, so that the \
+                frames of a whole minibatch are decoded at once by the buffer (see ``GameBuffer._prepare_obs_batch``).
         """
         stacked_obs = self.obs_segment[timestep:timestep + self.frame_stack_num + num_unroll_steps]
         if padding:
             pad_len = self.frame_stack_num + num_unroll_steps - len(stacked_obs)
             if pad_len > 0:
-                pad_frames = np.array([stacked_obs[-1] for _ in range(pad_len)])
-                stacked_obs = np.concatenate((stacked_obs, pad_frames))
+                if self.obs_codec is not None:
+                    stacked_obs = list(stacked_obs) + [stacked_obs[-1] for _ in range(pad_len)]
+                else:
+                    pad_frames = np.array([stacked_obs[-1] for _ in range(pad_len)])
+                    stacked_obs = np.concatenate((stacked_obs, pad_frames))
         if self.transform2string:
             stacked_obs = [jpeg_data_decompressor(obs, self.gray_scale) for obs in stacked_obs]
+        elif self.obs_codec is not None and decode:
+            stacked_obs = get_obs_codec(self.obs_codec, self.gray_scale).decode_batch(list(stacked_obs))
         return stacked_obs
 
     def zero_obs(self) -> List:
@@ -127,6 +140,8 @@ class GameSegment:
         stacked_obs = self.obs_segment[timestep:timestep + self.frame_stack_num]
         if self.transform2string:
             stacked_obs = [jpeg_data_decompressor(obs, self.gray_scale) for obs in stacked_obs]
+        elif self.obs_codec is not None:
+            stacked_obs = list(get_obs_codec(self.obs_codec, self.gray_scale).decode_batch(stacked_obs))
         return stacked_obs
 
     def append(
@@ -143,7 +158,7 @@ class GameSegment:
             Append a transition tuple, including a_t, o_{t+1}, r_{t}, action_mask_{t}, to_play_{t}.
         """
         self.action_segment.append(action)
-        self.obs_segment.append(obs)
+        self.obs_segment.append(self._encode_obs(obs))
         self.reward_segment.append(reward)
 
         self.action_mask_segment.append(action_mask)
@@ -272,7 +287,13 @@ class GameSegment:
             For environments with a variable action space, such as board games, the elements in `child_visit_segment` may have
             different lengths. In such scenarios, it is necessary to use the object data type for `self.child_visit_segment`.
         """
-        self.obs_segment = np.array(self.obs_segment)
+        if self.obs_codec is not None:
+            # an object array, since numpy strips the trailing zero bytes of the encoded frames in a bytes array
+            obs_segment = np.empty(len(self.obs_segment), dtype=object)
+            obs_segment[:] = self.obs_segment
+            self.obs_segment = obs_segment
+        else:
+            self.obs_segment = np.array(self.obs_segment)
         self.action_segment = np.array(self.action_segment)
         self.reward_segment = np.array(self.reward_segment)
 
@@ -316,7 +337,17 @@ class GameSegment:
         assert len(init_observations) == self.frame_stack_num
 
         for observation in init_observations:
-            self.obs_segment.append(copy.deepcopy(observation))
+            self.obs_segment.append(self._encode_obs(copy.deepcopy(observation)))
+
+    def _encode_obs(self, obs: np.ndarray) -> np.ndarray:
+        """
+        Overview:
+            Encode an observation frame by ``obs_codec``. The frames which are already encoded, e.g. the padded
+            frames from the next game segment, are kept as they are.
+        """
+        if self.obs_codec is None or isinstance(obs, bytes):
+            return obs
+        return get_obs_codec(self.obs_codec, self.gray_scale).encode(np.asarray(obs))
 
     def is_full(self) -> bool:
         """
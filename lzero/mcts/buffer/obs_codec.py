@@ -0,0 +1,207 @@
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class ObsCodec(object):
+    """
+    Overview:
+        The base class of the observation codecs of ``GameSegment``, which encode every observation frame into
+        ``bytes`` when it is stored and decode the frames of a whole minibatch in one ``decode_batch`` call.
+        The encoded frames of the lossless codecs start with a small header of the dtype and the shape of the frame,
+        so a frame can be decoded by any codec instance of the same type, e.g. in the reanalyze workers.
+        The codecs which release the GIL (zlib, lz4, zstd) decode the frames of a batch in a thread pool.
+    Interfaces:
+        ``__init__``, ``encode``, ``decode``, ``decode_batch``
+    """
+    lossless = True
+
+    def __init__(self, num_threads: int = 4) -> None:
+        """
+        Overview:
+            Initialize the ``ObsCodec``.
+        Arguments:
+            - num_threads (:obj:`int`): The number of threads of ``decode_batch``, 0 to decode in the caller thread.
+        """
+        self.num_threads = num_threads
+        self._executor = None
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def encode(self, frame: np.ndarray) -> bytes:
+        frame = np.ascontiguousarray(frame)
+        header = struct.pack('<4sB', frame.dtype.str.encode(), frame.ndim) + struct.pack(
+            '<{}I'.format(frame.ndim), *frame.shape
+        )
+        return header + self.compress(frame.tobytes())
+
+    def decode(self, data: bytes) -> np.ndarray:
+        dtype, ndim = struct.unpack_from('<4sB', data)
+        shape = struct.unpack_from('<{}I'.format(ndim), data, 5)
+        frame = np.frombuffer(self.decompress(data[5 + 4 * ndim:]), dtype=np.dtype(dtype.strip(b'\x00').decode()))
+        return frame.reshape(shape)
+
+    def decode_batch(self, data_list: Sequence[bytes]) -> np.ndarray:
+        """
+        Overview:
+            Decode a list of encoded frames into one stacked array of shape ``(len(data_list), *frame_shape)``.
+        """
+        if self.num_threads > 0 and len(data_list) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.num_threads)
+            frames = list(self._executor.map(self.decode, data_list))
+        else:
+            frames = [self.decode(data) for data in data_list]
+        return np.stack(frames)
+
+
+class ZlibCodec(ObsCodec):
+    """
+    Overview:
+        The lossless codec based on ``zlib`` of the python standard library.
+    """
+
+    def __init__(self, level: int = 1, num_threads: int = 4) -> None:
+        super().__init__(num_threads)
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class LZ4Codec(ObsCodec):
+    """
+    Overview:
+        The fast lossless codec based on ``lz4.frame``, which requires ``pip install lz4``.
+    """
+
+    def __init__(self, num_threads: int = 4) -> None:
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ImportError("Please install lz4 first to use the lz4 observation codec, e.g. `pip install lz4`.")
+        super().__init__(num_threads)
+        self._lz4 = lz4.frame
+
+    def compress(self, data: bytes) -> bytes:
+        return self._lz4.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._lz4.decompress(data)
+
+
+class ZstdCodec(ObsCodec):
+    """
+    Overview:
+        The lossless codec based on ``zstandard``, which requires ``pip install zstandard``. It compresses better than
+        lz4 at a similar decoding speed.
+    """
+
+    def __init__(self, level: int = 3, num_threads: int = 4) -> None:
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                "Please install zstandard first to use the zstd observation codec, e.g. `pip install zstandard`."
+            )
+        super().__init__(num_threads)
+        # the (de)compressors are not thread-safe, so one is created per call, which is cheap
+        self._zstd = zstandard
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return self._zstd.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._zstd.ZstdDecompressor().decompress(data)
+
+
+class DeltaCodec(ZlibCodec):
+    """
+    Overview:
+        The lossless codec which replaces every byte of the frame by its difference (modulo 256) to the previous byte
+        before ``zlib``. For the uint8 image frames, the differences between the neighbouring pixels are mostly
+        zero, so they are compressed much better than the raw frames.
+    """
+
+    def compress(self, data: bytes) -> bytes:
+        data = np.frombuffer(data, dtype=np.uint8)
+        return super().compress(np.diff(data, prepend=np.uint8(0)).tobytes())
+
+    def decompress(self, data: bytes) -> bytes:
+        return np.cumsum(np.frombuffer(super().decompress(data), dtype=np.uint8), dtype=np.uint8).tobytes()
+
+
+class JpegCodec(ObsCodec):
+    """
+    Overview:
+        The lossy codec of ``ding``'s ``jpeg_data_compressor``, i.e. the same encoding as ``transform2string``, for
+        the uint8 image frames. It requires ``opencv-python``.
+    """
+    lossless = False
+
+    def __init__(self, gray_scale: bool = False, num_threads: int = 4) -> None:
+        super().__init__(num_threads)
+        self.gray_scale = gray_scale
+
+    def encode(self, frame: np.ndarray) -> bytes:
+        from ding.utils.compression_helper import jpeg_data_compressor
+        return jpeg_data_compressor(frame)
+
+    def decode(self, data: bytes) -> np.ndarray:
+        from ding.utils.compression_helper import jpeg_data_decompressor
+        return jpeg_data_decompressor(data, self.gray_scale)
+
+
+OBS_CODECS = {'zlib': ZlibCodec, 'lz4': LZ4Codec, 'zstd': ZstdCodec, 'delta': DeltaCodec, 'jpeg': JpegCodec}
+
+
+@lru_cache(maxsize=None)
+def get_obs_codec(name: str, gray_scale: bool = False) -> ObsCodec:
+    """
+    Overview:
+        Return the observation codec ``name`` in ``OBS_CODECS``. The codecs are shared by all the game segments of the
+        process, so that the game segments only keep (and pickle) the name of their codec.
+    Arguments:
+        - name (:obj:`str`): The name of the codec, one of ``'zlib'``, ``'lz4'``, ``'zstd'``, ``'delta'``, ``'jpeg'``.
+        - gray_scale (:obj:`bool`): Whether the frames are gray scale images, only used by ``'jpeg'``.
+    """
+    assert name in OBS_CODECS, 'unknown observation codec {}, should be one of {}'.format(name, list(OBS_CODECS))
+    if name == 'jpeg':
+        return JpegCodec(gray_scale)
+    return OBS_CODECS[name]()
+
+
+def decode_obs_batch(codec: ObsCodec, obs_list: List[Any]) -> Tuple[np.ndarray, int]:
+    """
+    Overview:
+        Decode the stacked observations of a minibatch, i.e. a list of lists of frames, in one ``decode_batch`` call.
+        The frames which are not encoded, e.g. the zero observations padded by the buffer, are kept as they are.
+    Arguments:
+        - codec (:obj:`ObsCodec`): The codec of the encoded frames.
+        - obs_list (:obj:`List[Any]`): The stacked observations, all of them have the same number of frames.
+    Returns:
+        - obs (:obj:`np.ndarray`): The decoded observations of shape (batch_size, num_frames, *frame_shape).
+        - num_of_encoded_bytes (:obj:`int`): The number of bytes of the decoded frames, for the compression ratio.
+    """
+    frames = [frame for stacked_obs in obs_list for frame in stacked_obs]
+    encoded_index = [i for i, frame in enumerate(frames) if isinstance(frame, bytes)]
+    num_of_encoded_bytes = sum(len(frames[i]) for i in encoded_index)
+    if len(encoded_index) > 0:
+        decoded = codec.decode_batch([frames[i] for i in encoded_index])
+        for i, frame in zip(encoded_index, decoded):
+            frames[i] = frame
+    num_of_frames = len(obs_list[0]) if len(obs_list) > 0 else 0
+    obs = np.asarray(frames)
+    return obs.reshape(len(obs_list), num_of_frames, *obs.shape[1:]), num_of_encoded_bytes
@@ -0,0 +1,153 @@
+import copy
+import queue
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional, Tuple
+
+from .game_buffer import GameBuffer
+
+
+class PrefetchSampler(object):
+    """
+    Overview:
+        Prepare the next ``prefetch_batch_num`` ``train_data`` of ``GameBuffer.sample`` in a background thread while
+        the learner is training, so that the CPU-side batch building and the reanalyze MCTS overlap with the gradient
+        steps. The prepared batches are kept in a bounded queue.
+        The reanalysis runs with a private copy of the target model, whose weights are synchronized from the policy
+        at most every ``max_staleness`` train iterations. A prefetched batch whose target weights are older than
+        ``max_staleness`` train iterations is dropped.
+    .. note::
+        All the other accesses to the replay buffer, e.g. ``push_game_segments``, ``remove_oldest_data_to_fit`` and
+        ``update_priority``, must hold ``lock``. The priorities updated by the learner only take effect on the batches
+        sampled afterwards, i.e. up to ``prefetch_batch_num`` batches later than in the synchronous sampling.
+    Interfaces:
+        ``__init__``, ``sample``, ``sync_target_model``, ``close``
+    Properties:
+        ``lock``, ``model_version``, ``dropped_batch_num``
+    """
+
+    def __init__(
+            self,
+            replay_buffer: GameBuffer,
+            policy: Any,
+            batch_size: int,
+            prefetch_batch_num: int = 2,
+            max_staleness: int = 10,
+            train_iter: int = 0
+    ) -> None:
+        """
+        Overview:
+            Initialize the ``PrefetchSampler`` and start the background sampling thread.
+        Arguments:
+            - replay_buffer (:obj:`GameBuffer`): The game buffer to sample from.
+            - policy (:obj:`Any`): The policy whose ``_target_model`` is used for reanalysis.
+            - batch_size (:obj:`int`): The batch size of every ``train_data``.
+            - prefetch_batch_num (:obj:`int`): The capacity of the queue of the prepared batches.
+            - max_staleness (:obj:`int`): The max number of train iterations the target weights used to prepare a \
+                batch can lag behind. ``0`` means the batches are always prepared with the latest target weights.
+            - train_iter (:obj:`int`): The current train iteration of the learner.
+        """
+        self._replay_buffer = replay_buffer
+        self._policy = policy
+        self._batch_size = batch_size
+        self._max_staleness = max_staleness
+        self._queue = queue.Queue(maxsize=max(prefetch_batch_num, 1))
+        self._lock = threading.RLock()
+        self._model_lock = threading.Lock()
+        # the private target model, which is only read by the background thread
+        self._target_model = copy.deepcopy(policy._model)
+        self._model_version = train_iter
+        self.sync_target_model(train_iter)
+        self._dropped_batch_num = 0
+        self._error = None
+        self._end_flag = threading.Event()
+        self._thread = threading.Thread(target=self._prefetch_loop, name='prefetch_sampler', daemon=True)
+        self._thread.start()
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self._lock
+
+    @property
+    def model_version(self) -> int:
+        return self._model_version
+
+    @property
+    def dropped_batch_num(self) -> int:
+        return self._dropped_batch_num
+
+    def sync_target_model(self, train_iter: int) -> None:
+        """
+        Overview:
+            Copy the weights of the target model of the policy to the private target model used for reanalysis.
+        Arguments:
+            - train_iter (:obj:`int`): The current train iteration of the learner, i.e. the version of the weights.
+        """
+        state_dict = self._policy._target_model.state_dict()
+        with self._model_lock:
+            self._target_model.load_state_dict(state_dict)
+            self._model_version = train_iter
+
+    def sample(self, train_iter: int, timeout: Optional[float] = None) -> List[Any]:
+        """
+        Overview:
+            Get the next prepared ``train_data``, which is the same as the returns of ``GameBuffer.sample``.
+            The private target model is synchronized first if it lags behind ``max_staleness`` train iterations.
+        Arguments:
+            - train_iter (:obj:`int`): The current train iteration of the learner.
+            - timeout (:obj:`Optional[float]`): The max seconds to wait for a batch, None means waiting forever.
+        Returns:
+            - train_data (:obj:`List`): List of train data, including current_batch and target_batch.
+        """
+        if train_iter - self._model_version >= self._max_staleness:
+            self.sync_target_model(train_iter)
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if self._error is not None:
+                raise self._error
+            try:
+                model_version, train_data = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if deadline is not None and time.time() > deadline:
+                    raise TimeoutError('PrefetchSampler: no batch is prepared in {}s'.format(timeout))
+                continue
+            if train_iter - model_version <= self._max_staleness:
+                return train_data
+            self._dropped_batch_num += 1
+
+    def close(self) -> None:
+        """
+        Overview:
+            Stop the background sampling thread and drop the prepared batches.
+        """
+        self._end_flag.set()
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._thread.join()
+
+    def _prefetch_loop(self) -> None:
+        # ``GameBuffer.sample`` only reads ``_target_model`` of the policy
+        policy = SimpleNamespace(_target_model=self._target_model)
+        try:
+            while not self._end_flag.is_set():
+                batch = self._sample_once(policy)
+                if batch is None:
+                    # wait for the data to be collected
+                    self._end_flag.wait(0.01)
+                    continue
+                while not self._end_flag.is_set():
+                    try:
+                        self._queue.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        except Exception as e:
+            self._error = e
+
+    def _sample_once(self, policy: SimpleNamespace) -> Optional[Tuple[int, List[Any]]]:
+        with self._lock:
+            if self._replay_buffer.get_num_of_transitions() <= self._batch_size:
+                return None
+            with self._model_lock:
+                return self._model_version, self._replay_buffer.sample(self._batch_size, policy)
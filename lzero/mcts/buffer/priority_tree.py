@@ -0,0 +1,229 @@
+from typing import Tuple, Union
+
+import numpy as np
+
+
+class PriorityTree(object):
+    """
+    Overview:
+        A sum-tree over the transition priorities of a ``GameBuffer``. The leaves are laid out as a ring that is
+        indexed by the global transition index, so pushing a new game segment only writes at the tail and evicting
+        the oldest game segments only clears the head, without shifting the remaining leaves.
+        All the operations are vectorized over a batch of transitions, the cost of sampling and updating ``k``
+        transitions is ``O(k log N)``, where ``N`` is the capacity of the tree. Besides the sums of the sampling
+        weights, the tree also keeps the maxima of the raw priorities, so ``max`` is ``O(1)``.
+        The indices exposed by this class are relative to the oldest transition still in the tree, i.e. they are the
+        same as the indices of ``GameBuffer.game_pos_priorities``.
+    Interfaces:
+        ``__init__``, ``__len__``, ``push``, ``pop_front``, ``update``, ``sample``, ``total``, ``max``, ``priorities``
+    """
+
+    def __init__(self, capacity: int, alpha: float, eps: float = 1e-6) -> None:
+        """
+        Overview:
+            Initialize the ``PriorityTree``.
+        Arguments:
+            - capacity (:obj:`int`): The initial number of transitions the tree can hold, rounded up to a power of 2. \
+                The tree is doubled automatically when it is full.
+            - alpha (:obj:`float`): The degree of prioritization, the sampling weight of a leaf is ``p ** alpha + eps``.
+            - eps (:obj:`float`): The small constant added to the weight of every stored transition for numerical \
+                stability, which is the same as the ``1e-6`` used in ``GameBuffer._sample_orig_data``.
+        """
+        self._alpha = alpha
+        self._eps = eps
+        self._capacity = 1
+        while self._capacity < max(capacity, 1):
+            self._capacity *= 2
+        # Index 1 is the root; the leaves are in [capacity, 2 * capacity).
+        self._tree = np.zeros(2 * self._capacity, dtype=np.float64)
+        # The max-tree of the raw priorities with the same layout, the empty leaves are -inf.
+        self._max_tree = np.full(2 * self._capacity, -np.inf)
+        # The raw (not powered) priorities of the leaves.
+        self._priorities = np.zeros(self._capacity, dtype=np.float64)
+        # The leaf position of the oldest transition and the number of stored transitions.
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def total(self) -> float:
+        """
+        Overview:
+            Return the sum of the sampling weights of all stored transitions.
+        """
+        return self._tree[1]
+
+    def max(self) -> float:
+        """
+        Overview:
+            Return the max raw priority of the stored transitions, -inf if the tree is empty.
+        """
+        return self._max_tree[1]
+
+    def priorities(self) -> np.ndarray:
+        """
+        Overview:
+            Return the raw priorities of the stored transitions, ordered from the oldest to the newest.
+        """
+        return self._priorities[self._positions(np.arange(self._size))]
+
+    def push(self, priorities: np.ndarray) -> None:
+        """
+        Overview:
+            Append the priorities of newly pushed transitions at the tail of the tree.
+        Arguments:
+            - priorities (:obj:`np.ndarray`): The raw priorities of the new transitions.
+        """
+        priorities = np.asarray(priorities, dtype=np.float64).reshape(-1)
+        if priorities.size == 0:
+            return
+        while self._size + priorities.size > self._capacity:
+            self._grow()
+        positions = self._positions(np.arange(self._size, self._size + priorities.size))
+        self._size += priorities.size
+        self._set_leaves(positions, priorities)
+
+    def pop_front(self, num: int) -> None:
+        """
+        Overview:
+            Remove the ``num`` oldest transitions from the tree.
+        Arguments:
+            - num (:obj:`int`): The number of transitions to remove.
+        """
+        num = min(num, self._size)
+        if num <= 0:
+            return
+        positions = self._positions(np.arange(num))
+        self._priorities[positions] = 0.
+        self._tree[positions + self._capacity] = 0.
+        self._max_tree[positions + self._capacity] = -np.inf
+        self._propagate(positions, update_max=True)
+        self._head = (self._head + num) % self._capacity
+        self._size -= num
+
+    def update(self, indices: Union[int, np.ndarray], priorities: Union[float, np.ndarray]) -> None:
+        """
+        Overview:
+            Update the priorities of the transitions at the given relative indices.
+        Arguments:
+            - indices (:obj:`Union[int, np.ndarray]`): The relative indices of the transitions.
+            - priorities (:obj:`Union[float, np.ndarray]`): The new raw priorities.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        if indices.size == 0:
+            return
+        assert indices.min() >= 0 and indices.max() < self._size, "indices out of the range of the priority tree"
+        priorities = np.broadcast_to(np.asarray(priorities, dtype=np.float64).reshape(-1), indices.shape)
+        self._set_leaves(self._positions(indices), priorities)
+
+    def sample(self, batch_size: int, replace: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            Sample ``batch_size`` transitions proportionally to their weights ``p ** alpha + eps``.
+            With ``replace=False``, the same rounds as ``np.random.choice(..., p=probs, replace=False)`` are used:
+            draw the missing samples, keep the first occurrence of every new index, mask out the found ones and
+            repeat, so that the sampling distribution is the same as the one of the original implementation.
+        Arguments:
+            - batch_size (:obj:`int`): The number of transitions to sample.
+            - replace (:obj:`bool`): Whether to sample with replacement.
+        Returns:
+            - indices (:obj:`np.ndarray`): The relative indices of the sampled transitions.
+            - probs (:obj:`np.ndarray`): The normalized sampling probabilities of the sampled transitions.
+        """
+        assert self._size > 0, "can not sample from an empty priority tree"
+        total = self.total()
+        if replace:
+            positions = self._find(np.random.uniform(0, total, batch_size))
+        else:
+            assert batch_size <= self._size, "can not take a larger sample than the population when replace=False"
+            positions = np.empty(batch_size, dtype=np.int64)
+            found = 0
+            saved_leaves = []
+            while found < batch_size:
+                new = self._find(np.random.uniform(0, self.total(), batch_size - found))
+                _, unique_indices = np.unique(new, return_index=True)
+                new = new[np.sort(unique_indices)]
+                positions[found:found + new.size] = new
+                found += new.size
+                # temporarily mask out the found leaves, they are restored below
+                saved_leaves.append((new, self._tree[new + self._capacity].copy()))
+                self._tree[new + self._capacity] = 0.
+                self._propagate(new)
+            for leaves, values in saved_leaves:
+                self._tree[leaves + self._capacity] = values
+            self._propagate(positions)
+        probs = self._tree[positions + self._capacity] / total
+        indices = (positions - self._head) % self._capacity
+        return indices, probs
+
+    def _positions(self, indices: np.ndarray) -> np.ndarray:
+        return (self._head + indices) % self._capacity
+
+    def _set_leaves(self, positions: np.ndarray, priorities: np.ndarray) -> None:
+        self._priorities[positions] = priorities
+        self._tree[positions + self._capacity] = priorities ** self._alpha + self._eps
+        self._max_tree[positions + self._capacity] = self._priorities[positions]
+        self._propagate(positions, update_max=True)
+
+    def _propagate(self, positions: np.ndarray, update_max: bool = False) -> None:
+        """
+        Overview:
+            Recompute the sums (and the maxima if ``update_max`` is True) of all the ancestors of the given leaves,
+            level by level.
+        """
+        nodes = np.unique((positions + self._capacity) >> 1)
+        while nodes.size > 0:
+            self._tree[nodes] = self._tree[2 * nodes] + self._tree[2 * nodes + 1]
+            if update_max:
+                self._max_tree[nodes] = np.maximum(self._max_tree[2 * nodes], self._max_tree[2 * nodes + 1])
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes >> 1)
+
+    def _find(self, prefix_sums: np.ndarray) -> np.ndarray:
+        """
+        Overview:
+            Descend the tree for a batch of prefix sums at once and return the positions of the found leaves.
+        """
+        prefix_sums = np.minimum(prefix_sums, np.nextafter(self.total(), 0))
+        nodes = np.ones(prefix_sums.shape, dtype=np.int64)
+        while nodes.size > 0 and nodes[0] < self._capacity:
+            left = 2 * nodes
+            left_sums = self._tree[left]
+            go_right = prefix_sums >= left_sums
+            prefix_sums = np.where(go_right, prefix_sums - left_sums, prefix_sums)
+            nodes = left + go_right
+        positions = nodes - self._capacity
+        # the floating-point error may lead the descent into an empty leaf, draw those samples again
+        empty = self._tree[nodes] == 0.
+        if empty.any():
+            positions[empty] = self._find(np.random.uniform(0, self.total(), int(empty.sum())))
+        return positions
+
+    def _grow(self) -> None:
+        """
+        Overview:
+            Double the capacity of the tree and rebuild it, the oldest transition is moved to the leaf 0.
+        """
+        priorities = self.priorities()
+        leaves = self._tree[self._positions(np.arange(self._size)) + self._capacity]
+        self._capacity *= 2
+        self._tree = np.zeros(2 * self._capacity, dtype=np.float64)
+        self._max_tree = np.full(2 * self._capacity, -np.inf)
+        self._priorities = np.zeros(self._capacity, dtype=np.float64)
+        self._priorities[:self._size] = priorities
+        self._tree[self._capacity:self._capacity + self._size] = leaves
+        self._max_tree[self._capacity:self._capacity + self._size] = priorities
+        self._head = 0
+        level = self._capacity // 2
+        while level >= 1:
+            self._tree[level:2 * level] = self._tree[2 * level:4 * level:2] + self._tree[2 * level + 1:4 * level:2]
+            self._max_tree[level:2 * level] = np.maximum(
+                self._max_tree[2 * level:4 * level:2], self._max_tree[2 * level + 1:4 * level:2]
+            )
+            level //= 2
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Sequence, Tuple
+
+import torch
+
+
+class ReanalyzeCache(object):
+    """
+    Overview:
+        The LRU cache of the reanalyzed roots of ``MuZeroGameBuffer``, used if ``reanalyze_cache_size`` > 0. The root
+        value and the visit count distribution of every searched root are kept under the key (game segment id,
+        position in game segment, target model version), so a transition which is sampled again before the next
+        update of the target model is not searched again.
+        All the entries are dropped when the target model version changes.
+    Interfaces:
+        ``__init__``, ``set_model_version``, ``get``, ``put``, ``hit_rate``
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Overview:
+            Initialize the ``ReanalyzeCache``.
+        Arguments:
+            - capacity (:obj:`int`): The max number of the cached roots.
+        """
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        # None means that the version of the target model is unknown, and then nothing is cached
+        self.model_version = None
+        self.hits, self.misses = 0, 0
+
+    def set_model_version(self, model_version: Optional[int]) -> None:
+        if model_version != self.model_version:
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, keys: Sequence[Optional[Hashable]]) -> List[Optional[Tuple[float, Any]]]:
+        """
+        Overview:
+            Get the cached (root value, distributions) of the ``keys``, None for the missing ones and the None keys. Only
+        the lookups of the keys which can be cached count in ``hit_rate``.
+        """
+        if self.model_version is None:
+            return [None] * len(keys)
+        entries = []
+        for key in keys:
+            entry = None if key is None else self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            elif key is not None:
+                self.misses += 1
+            entries.append(entry)
+        return entries
+
+    def put(self, keys: Sequence[Optional[Hashable]], entries: Sequence[Tuple[float, Any]]) -> None:
+        if self.model_version is None:
+            return
+        for key, entry in zip(keys, entries):
+            if key is not None:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ReanalyzedRoots(object):
+    """
+    Overview:
+        The root values and the visit count distributions of the roots which are partly read from ``ReanalyzeCache``,
+        with the same interfaces as the searched roots of MCTS.
+    """
+
+    def __init__(self, values: List[float], distributions: List[Any]) -> None:
+        self._values = values
+        self._distributions = distributions
+
+    def get_values(self) -> List[float]:
+        return self._values
+
+    def get_distributions(self) -> List[Any]:
+        return self._distributions
+
+
+def get_target_model_version(model: torch.nn.Module) -> Optional[Tuple[int, int]]:
+    """
+    Overview:
+        Get the version of the target model, i.e. the number of the weights loaded by ``mark_target_model_loaded``
+        and the number of the hard (``assign``) updates of ding's ``TargetNetworkWrapper``, which loads the weights of
+        the learner model every ``freq`` updates.
+        The version is None for the ``momentum`` updates (the weights change at every update) and the unwrapped models.
+    """
+    if getattr(model, '_update_type', None) != 'assign':
+        return None
+    return getattr(model, '_num_of_loads', 0), model._update_count // model._update_kwargs['freq']
+
+
+def mark_target_model_loaded(model: torch.nn.Module) -> None:
+    """
+    Overview:
+        Change the version of the target model after its weights are replaced out of its regular updates, e.g. by
+        ``load_state_dict`` or ``update(direct=True)``, so the roots searched with the previous weights are dropped.
+    """
+    model._num_of_loads = getattr(model, '_num_of_loads', 0) + 1
@@ -0,0 +1,158 @@
+import copy
+import threading
+import time
+from typing import Any, Optional
+
+import torch
+
+from .game_buffer import GameBuffer
+from .reanalyze_cache import get_target_model_version
+
+
+class ReanalyzeDaemon(object):
+    """
+    Overview:
+        Refresh the stored policy targets of ``MuZeroGameBuffer`` or ``EfficientZeroGameBuffer`` in a background
+        thread, in the spirit of MuZero Reanalyze: the game segments are walked from the stalest targets, and their
+        positions are searched again with a private copy of the target model, whose fresh root visit count
+        distributions and root values are written back into ``child_visit_segment`` and ``root_value_segment``.
+        With ``use_reanalyze_daemon`` in the buffer config, ``sample`` serves the stored policy targets, so there is
+        no MCTS on the critical path of the learner.
+        At most ``budget`` transitions are refreshed per second, in steps of ``mini_infer_size`` transitions.
+        The weights of the target model are loaded into a spare copy of the private model, which replaces it between
+        two refreshing steps, so ``sync_target_model`` never waits for a search.
+    .. note::
+        All the other accesses to the replay buffer, e.g. ``push_game_segments``, ``remove_oldest_data_to_fit`` and
+        ``sample``, must hold ``lock``, which is only held by the daemon while it selects the game segments and
+        gathers their observations, and while it writes the fresh targets back, not during the search.
+    Interfaces:
+        ``__init__``, ``sync_target_model``, ``close``
+    Properties:
+        ``lock``, ``model_version``, ``refresh_rate``
+    """
+
+    def __init__(
+            self,
+            replay_buffer: GameBuffer,
+            policy: Any,
+            budget: float = 1000.,
+            sync_freq: int = 1,
+            train_iter: int = 0,
+            lock: Optional[threading.RLock] = None
+    ) -> None:
+        """
+        Overview:
+            Initialize the ``ReanalyzeDaemon`` and start the background refreshing thread.
+        Arguments:
+            - replay_buffer (:obj:`GameBuffer`): The game buffer whose targets are refreshed.
+            - policy (:obj:`Any`): The policy whose ``_target_model`` is used for reanalysis.
+            - budget (:obj:`float`): The max number of transitions refreshed per second.
+            - sync_freq (:obj:`int`): Synchronize the private target model every ``sync_freq`` train iterations, \
+                if the target model of the policy is updated at every iteration (e.g. the ``momentum`` updates). The \
+                hard (``assign``) updates are synchronized when they load new weights.
+            - train_iter (:obj:`int`): The current train iteration of the learner.
+            - lock (:obj:`Optional[threading.RLock]`): The lock of the buffer, e.g. the lock of ``PrefetchSampler``. \
+                If None, a new lock is created.
+        """
+        assert not replay_buffer._cfg.use_disk_store, 'ReanalyzeDaemon can not write the targets of the disk store'
+        self._replay_buffer = replay_buffer
+        self._policy = policy
+        self._budget = budget
+        self._sync_freq = max(sync_freq, 1)
+        self._lock = threading.RLock() if lock is None else lock
+        # the lock of the references to the private models, which is never held during a search
+        self._model_lock = threading.Lock()
+        # the private target model, which is only read by the background thread, the model of the current search
+        # and the spare model, into which the next weights are loaded
+        self._target_model = copy.deepcopy(policy._model)
+        self._target_model.eval()
+        self._searching_model = None
+        self._spare_model = None
+        self._model_version = train_iter
+        self._target_model_version = None
+        self._refresh_rate = 0.
+        self._error = None
+        self.sync_target_model(train_iter, force=True)
+        self._end_flag = threading.Event()
+        self._thread = threading.Thread(target=self._refresh_loop, name='reanalyze_daemon', daemon=True)
+        self._thread.start()
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self._lock
+
+    @property
+    def model_version(self) -> int:
+        return self._model_version
+
+    @property
+    def refresh_rate(self) -> float:
+        """
+        Overview:
+            The number of transitions refreshed per second in the last refreshing step.
+        """
+        return self._refresh_rate
+
+    def sync_target_model(self, train_iter: int, force: bool = False) -> None:
+        """
+        Overview:
+            Copy the weights of the target model of the policy to the private target model, if they have changed
+            since the last synchronization (for the hard updates of ``TargetNetworkWrapper``), if the private target
+            model lags behind ``sync_freq`` train iterations (for the other target models) or if ``force`` is True.
+            The weights are loaded into the spare model, which then replaces the private target model, so the search
+            in progress is not waited for. The errors of the background thread are raised here.
+        Arguments:
+            - train_iter (:obj:`int`): The current train iteration of the learner, i.e. the version of the weights.
+            - force (:obj:`bool`): Whether to synchronize the weights anyway.
+        """
+        if self._error is not None:
+            raise self._error
+        target_model_version = get_target_model_version(self._policy._target_model)
+        if not force:
+            if target_model_version is not None and target_model_version == self._target_model_version:
+                return
+            if target_model_version is None and train_iter - self._model_version < self._sync_freq:
+                return
+        with self._model_lock:
+            model = self._spare_model if self._spare_model is not self._searching_model else None
+        if model is None:
+            # the spare model is still searched, e.g. by a long search over two synchronizations
+            model = copy.deepcopy(self._target_model)
+        model.load_state_dict(self._policy._target_model.state_dict())
+        with self._model_lock:
+            self._spare_model, self._target_model = self._target_model, model
+            self._model_version = train_iter
+            self._target_model_version = target_model_version
+
+    def close(self) -> None:
+        """
+        Overview:
+            Stop the background refreshing thread.
+        """
+        self._end_flag.set()
+        self._thread.join()
+
+    def _refresh_loop(self) -> None:
+        num_of_transitions = self._replay_buffer._cfg.mini_infer_size
+        try:
+            while not self._end_flag.is_set():
+                start_time = time.time()
+                with self._lock:
+                    refresh_context = self._replay_buffer._prepare_refresh_context(num_of_transitions)
+                if refresh_context is None:
+                    # wait for the data to be collected
+                    self._end_flag.wait(0.01)
+                    continue
+                with self._model_lock:
+                    self._searching_model = self._target_model
+                with torch.no_grad():
+                    num_of_refreshed = self._replay_buffer._refresh_targets(
+                        refresh_context, self._searching_model, self._lock
+                    )
+                with self._model_lock:
+                    self._searching_model = None
+                # sleep to keep the refresh rate within the budget
+                self._end_flag.wait(max(num_of_refreshed / self._budget - (time.time() - start_time), 0.))
+                self._refresh_rate = num_of_refreshed / max(time.time() - start_time, 1e-6)
+        except Exception as e:
+            self._error = e
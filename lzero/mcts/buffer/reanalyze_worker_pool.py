@@ -0,0 +1,215 @@
+import copy
+import math
+import traceback
+from multiprocessing import shared_memory
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from easydict import EasyDict
+
+
+def _to_shared_memory(result: Any) -> Tuple[bool, List[Tuple[str, tuple, str]]]:
+    """
+    Overview:
+        Copy the returned arrays of a reanalyze method to shared memory blocks, which are unlinked by the main process.
+    """
+    is_tuple = isinstance(result, tuple)
+    descriptors = []
+    for array in (result if is_tuple else (result, )):
+        array = np.asarray(array)
+        if array.dtype == object:
+            array = array.astype(np.float64)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        descriptors.append((shm.name, array.shape, array.dtype.str))
+        shm.close()
+    return is_tuple, descriptors
+
+
+def _from_shared_memory(descriptors: List[Tuple[str, tuple, str]]) -> List[np.ndarray]:
+    arrays = []
+    for name, shape, dtype in descriptors:
+        shm = shared_memory.SharedMemory(name=name)
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy())
+        shm.close()
+        shm.unlink()
+    return arrays
+
+
+def _reanalyze_worker(
+        rank: int, buffer_type: type, cfg: EasyDict, model: torch.nn.Module, command_queue: mp.Queue,
+        result_queue: mp.Queue, seed: int
+) -> None:
+    """
+    Overview:
+        The loop of a reanalyze worker process. It holds a game buffer without data, whose reanalyze methods (e.g.
+        ``_compute_target_reward_value``) are called on the shards of the contexts with a CPU copy of the target model.
+    """
+    torch.set_num_threads(1)
+    np.random.seed(seed + rank)
+    buffer = buffer_type(cfg)
+    model.eval()
+    while True:
+        command, data = command_queue.get()
+        if command == 'close':
+            break
+        elif command == 'sync':
+            model.load_state_dict(data)
+            continue
+        task_id, method, context = data
+        try:
+            with torch.no_grad():
+                result = getattr(buffer, method)(context, model)
+            result_queue.put((task_id, _to_shared_memory(result), None))
+        except Exception:
+            result_queue.put((task_id, None, traceback.format_exc()))
+
+
+class ReanalyzeWorkerPool(object):
+    """
+    Overview:
+        A pool of worker processes which recompute the reanalyzed targets of the game buffers, e.g.
+        ``_compute_target_reward_value`` and ``_compute_target_policy_reanalyzed``, out of the learner process.
+        Every worker holds a CPU copy of the target model, which is synchronized every ``sync_freq`` calls of
+        ``sync_model``. The contexts are split by the sampled game segments into one shard per worker, and the targets
+        of the shards are returned through shared memory and concatenated in order.
+    Interfaces:
+        ``__init__``, ``sync_model``, ``compute``, ``close``
+    """
+
+    def __init__(
+            self,
+            buffer_type: type,
+            cfg: EasyDict,
+            model: torch.nn.Module,
+            num_workers: int,
+            sync_freq: int = 1,
+            seed: int = 0
+    ) -> None:
+        """
+        Overview:
+            Initialize the ``ReanalyzeWorkerPool`` and start the worker processes.
+        Arguments:
+            - buffer_type (:obj:`type`): The class of the game buffer whose reanalyze methods are called in the workers.
+            - cfg (:obj:`EasyDict`): The config of the game buffer.
+            - model (:obj:`torch.nn.Module`): The target model, which is copied to CPU in every worker.
+            - num_workers (:obj:`int`): The number of worker processes.
+            - sync_freq (:obj:`int`): Synchronize the weights of the workers every ``sync_freq`` calls of ``sync_model``.
+            - seed (:obj:`int`): The base random seed of the workers.
+        """
+        cfg = copy.deepcopy(cfg)
+        cfg.device = 'cpu'
+        cfg.reanalyze_num_workers = 0
+        self._cfg = cfg
+        self._num_workers = num_workers
+        self._sync_freq = max(sync_freq, 1)
+        self._sync_count = 0
+        self._task_count = 0
+        # The value prefix of EfficientZero is reset every ``lstm_horizon_len`` transitions counted over the whole
+        # minibatch, so the shards start at the multiples of the reset period to keep the same targets.
+        horizon = cfg.get('lstm_horizon_len', 1)
+        self._shard_alignment = horizon // math.gcd(horizon, cfg.num_unroll_steps + 1)
+
+        context = mp.get_context('spawn')
+        self._result_queue = context.Queue()
+        self._command_queues = [context.Queue() for _ in range(num_workers)]
+        cpu_model = copy.deepcopy(model).to('cpu')
+        self._workers = [
+            context.Process(
+                target=_reanalyze_worker,
+                args=(rank, buffer_type, cfg, cpu_model, self._command_queues[rank], self._result_queue, seed),
+                daemon=True
+            ) for rank in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def sync_model(self, model: torch.nn.Module) -> None:
+        """
+        Overview:
+            Count one call and synchronize the weights of the workers with ``model`` every ``sync_freq`` calls.
+        """
+        self._sync_count += 1
+        if self._sync_count % self._sync_freq != 0:
+            return
+        state_dict = {k: v.detach().to('cpu') for k, v in model.state_dict().items()}
+        for command_queue in self._command_queues:
+            command_queue.put(('sync', state_dict))
+
+    def compute(self, tasks: Sequence[Tuple[str, Optional[List[Any]]]]) -> List[Any]:
+        """
+        Overview:
+            Run the reanalyze methods on their contexts in the workers in parallel.
+        Arguments:
+            - tasks (:obj:`Sequence[Tuple[str, Optional[List[Any]]]]`): The pairs of the name of a reanalyze method of \
+                the game buffer and its context. The tasks whose context is None are skipped and get an empty list.
+        Returns:
+            - results (:obj:`List[Any]`): The returns of the methods, whose arrays are concatenated over the shards.
+        """
+        shard_ids = []
+        for method, context in tasks:
+            ids = []
+            if context is not None:
+                for shard in self._split_context(context):
+                    task_id = self._task_count
+                    self._task_count += 1
+                    self._command_queues[task_id % self._num_workers].put(('task', (task_id, method, shard)))
+                    ids.append(task_id)
+            shard_ids.append(ids)
+
+        num_tasks = sum(len(ids) for ids in shard_ids)
+        shard_results, error = {}, None
+        for _ in range(num_tasks):
+            task_id, result, error_info = self._result_queue.get()
+            if error_info is not None:
+                error = error_info
+                continue
+            is_tuple, descriptors = result
+            shard_results[task_id] = (is_tuple, _from_shared_memory(descriptors))
+        if error is not None:
+            raise RuntimeError('ReanalyzeWorkerPool: the reanalyze worker failed:\n{}'.format(error))
+
+        results = []
+        for ids in shard_ids:
+            if len(ids) == 0:
+                results.append([])
+                continue
+            is_tuple = shard_results[ids[0]][0]
+            arrays = [np.concatenate(items) for items in zip(*[shard_results[i][1] for i in ids])]
+            results.append(tuple(arrays) if is_tuple else arrays[0])
+        return results
+
+    def close(self) -> None:
+        """
+        Overview:
+            Stop the worker processes.
+        """
+        for command_queue in self._command_queues:
+            command_queue.put(('close', None))
+        for worker in self._workers:
+            worker.join()
+
+    def _split_context(self, context: List[Any]) -> List[List[Any]]:
+        """
+        Overview:
+            Split a context by the sampled game segments. The items of a context are either of length
+            ``game_segment_batch_size`` or of length ``game_segment_batch_size * (num_unroll_steps + 1)``.
+        """
+        # pos_in_game_segment_list is the third item of all the contexts
+        batch_size = len(context[2])
+        unroll = self._cfg.num_unroll_steps + 1
+        shard_size = math.ceil(batch_size / self._num_workers / self._shard_alignment) * self._shard_alignment
+        shards = []
+        for begin in range(0, batch_size, shard_size):
+            end = min(begin + shard_size, batch_size)
+            shard = []
+            for item in context:
+                if len(item) == batch_size:
+                    shard.append(item[begin:end])
+                else:
+                    assert len(item) == batch_size * unroll, len(item)
+                    shard.append(item[begin * unroll:end * unroll])
+            shards.append(shard)
+        return shards
@@ -0,0 +1,473 @@
+import copy
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Connection, Listener, wait
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from ding.utils import get_rank, get_world_size
+from easydict import EasyDict
+
+REPLAY_BUFFER_TRANSPORTS = ('pipe', 'socket')
+
+
+class _ShardStats(object):
+    """
+    Overview:
+        The counters of a replay buffer shard, which are reported as throughputs by ``ReplayBufferClient.get_stats``.
+    """
+
+    def __init__(self) -> None:
+        self.start_time = time.time()
+        self.num_of_requests = 0
+        self.busy_time = 0.
+        self.num_of_pushed_transitions = 0
+        self.num_of_sampled_transitions = 0
+        self.num_of_updated_priorities = 0
+
+    def report(self, buffer: Any) -> Dict[str, float]:
+        duration = max(time.time() - self.start_time, 1e-6)
+        return {
+            'num_of_transitions': buffer.get_num_of_transitions(),
+            'num_of_game_segments': len(buffer.game_segment_buffer),
+            'requests_per_second': self.num_of_requests / duration,
+            'pushed_transitions_per_second': self.num_of_pushed_transitions / duration,
+            'sampled_transitions_per_second': self.num_of_sampled_transitions / duration,
+            'updated_priorities_per_second': self.num_of_updated_priorities / duration,
+            'busy_ratio': self.busy_time / duration,
+        }
+
+
+def _handle_request(
+        buffer: Any, policy: SimpleNamespace, stats: _ShardStats, command: str, data: Any
+) -> Tuple[Any, int]:
+    if command == 'push':
+        buffer.push_game_segments(data)
+        buffer.remove_oldest_data_to_fit()
+        stats.num_of_pushed_transitions += sum(len(game_segment) for game_segment in data[0])
+        result = None
+    elif command == 'sample':
+        with torch.no_grad():
+            result = buffer.sample(data, policy)
+        stats.num_of_sampled_transitions += data
+    elif command == 'update_priority':
+        batch_index, make_time, priorities = data
+        # ``update_priority`` only reads the indices and the make times of ``current_batch``
+        buffer.update_priority([[batch_index, None, make_time]], priorities)
+        stats.num_of_updated_priorities += len(batch_index)
+        result = None
+    elif command == 'sync':
+        policy._target_model.load_state_dict(data)
+        result = None
+    elif command == 'stats':
+        result = stats.report(buffer)
+    else:
+        raise KeyError('unknown replay buffer command {}'.format(command))
+    return result, buffer.get_num_of_transitions()
+
+
+def _serve_shard(
+        shard_id: int, buffer_type: type, cfg: EasyDict, model: torch.nn.Module, connections: List[Connection],
+        address: Optional[Tuple[str, int]], authkey: bytes, address_queue: Optional[mp.Queue], seed: int
+) -> None:
+    """
+    Overview:
+        The loop of a replay buffer shard process. It holds a game buffer of ``cfg.replay_buffer_size`` transitions
+        and a copy of the target model on ``cfg.device``, and serves the requests of the clients connected by
+        ``connections`` (the pipe transport) or to the listener at ``address`` (the socket transport) one at a time.
+        The first connection is the control connection of ``ReplayBufferServer``, which stops the shard.
+    """
+    if cfg.device == 'cpu':
+        # the shards compute their targets in parallel, one core each
+        torch.set_num_threads(1)
+    np.random.seed(seed + shard_id)
+    buffer = buffer_type(cfg)
+    model = model.to(cfg.device)
+    model.eval()
+    policy = SimpleNamespace(_target_model=model)
+    stats = _ShardStats()
+    control = connections[0]
+    lock = threading.Lock()
+    if address is not None:
+        listener = Listener(address, authkey=authkey)
+        address_queue.put((shard_id, listener.address))
+
+        def accept() -> None:
+            while True:
+                try:
+                    connection = listener.accept()
+                except OSError:
+                    # the listener is closed
+                    return
+                with lock:
+                    connections.append(connection)
+
+        threading.Thread(target=accept, daemon=True).start()
+
+    while True:
+        with lock:
+            ready = wait(list(connections), timeout=0.1)
+        for connection in ready:
+            try:
+                command, data = connection.recv()
+            except (EOFError, OSError):
+                # the client is disconnected
+                with lock:
+                    connections.remove(connection)
+                continue
+            if connection is control and command == 'close':
+                if address is not None:
+                    listener.close()
+                buffer.close()
+                control.send(None)
+                return
+            start_time = time.time()
+            try:
+                result = _handle_request(buffer, policy, stats, command, data), None
+            except Exception:
+                result = None, traceback.format_exc()
+            stats.num_of_requests += 1
+            stats.busy_time += time.time() - start_time
+            connection.send(result)
+
+
+class ReplayBufferServer(object):
+    """
+    Overview:
+        A replay buffer service for the data-parallel training: the storage of the game buffer is sharded across
+        ``num_shards`` processes, and every learner (e.g. every DDP rank) connects a ``ReplayBufferClient`` to all the
+        shards, so it pushes its collected game segments to the global buffer and samples from the data of all the
+        collectors instead of only its own.
+        The shards communicate by an RPC over ``multiprocessing.connection``, either by pipes created with the server
+        (the local multiprocess transport ``'pipe'``, for the clients of the processes which start or inherit the
+        server) or by authenticated sockets (``'socket'``, for the clients of other processes or hosts, which connect
+        to ``addresses``).
+        Every shard computes the targets of its part of a minibatch with a copy of the target model on ``device``,
+        which the clients synchronize.
+    Interfaces:
+        ``__init__``, ``connect``, ``close``.
+    """
+
+    def __init__(
+            self,
+            buffer_type: type,
+            cfg: EasyDict,
+            model: torch.nn.Module,
+            num_shards: int,
+            transport: str = 'pipe',
+            num_clients: int = 1,
+            host: str = 'localhost',
+            authkey: bytes = b'lightzero',
+            seed: int = 0,
+            device: str = 'cpu'
+    ) -> None:
+        """
+        Overview:
+            Initialize the ``ReplayBufferServer`` and start the shard processes.
+        Arguments:
+            - buffer_type (:obj:`type`): The class of the game buffer of the shards.
+            - cfg (:obj:`EasyDict`): The config of the global game buffer. Every shard keeps \
+                ``replay_buffer_size / num_shards`` transitions.
+            - model (:obj:`torch.nn.Module`): The target model, which is copied to ``device`` in every shard.
+            - num_shards (:obj:`int`): The number of shard processes.
+            - transport (:obj:`str`): The transport of the RPC, 'pipe' or 'socket'.
+            - num_clients (:obj:`int`): The number of the clients of the pipe transport, see ``connect``.
+            - host (:obj:`str`): The host of the listeners of the socket transport, whose ports are chosen by the OS.
+            - authkey (:obj:`bytes`): The authentication key of the socket transport.
+            - seed (:obj:`int`): The base random seed of the shards.
+            - device (:obj:`str`): The device on which the shards compute the targets, e.g. 'cuda'. On 'cpu', \
+                every shard uses one thread.
+        """
+        assert transport in REPLAY_BUFFER_TRANSPORTS, \
+            'unknown replay buffer transport {}, should be one of {}'.format(transport, REPLAY_BUFFER_TRANSPORTS)
+        cfg = copy.deepcopy(cfg)
+        cfg.device = device
+        cfg.replay_buffer_size = max(int(cfg.replay_buffer_size) // num_shards, 1)
+        self.transport = transport
+        self.authkey = authkey
+        self._num_shards = num_shards
+
+        context = mp.get_context('spawn')
+        address_queue = context.Queue() if transport == 'socket' else None
+        # the model is sent to the shards on CPU and moved to ``device`` there
+        cpu_model = copy.deepcopy(model).to('cpu')
+        self._control_connections = []
+        # the client ends of the pipes, one list of ``num_shards`` connections per client
+        self._client_connections = [[] for _ in range(num_clients if transport == 'pipe' else 0)]
+        self._shards = []
+        for shard_id in range(num_shards):
+            control, shard_control = context.Pipe()
+            shard_connections = [shard_control]
+            for client_connections in self._client_connections:
+                client, shard_client = context.Pipe()
+                client_connections.append(client)
+                shard_connections.append(shard_client)
+            shard = context.Process(
+                target=_serve_shard,
+                args=(
+                    shard_id, buffer_type, cfg, cpu_model, shard_connections,
+                    (host, 0) if transport == 'socket' else None, authkey, address_queue, seed
+                ),
+                daemon=True
+            )
+            shard.start()
+            self._control_connections.append(control)
+            self._shards.append(shard)
+        self.addresses = None
+        if transport == 'socket':
+            addresses = dict(address_queue.get() for _ in range(num_shards))
+            self.addresses = [addresses[shard_id] for shard_id in range(num_shards)]
+
+    def connect(self, client_id: int = 0, sync_freq: int = 1, cfg: Optional[EasyDict] = None) -> 'ReplayBufferClient':
+        """
+        Overview:
+            Return a ``ReplayBufferClient`` of the shards. With the pipe transport, ``client_id`` selects one of the
+            ``num_clients`` pipes of every shard, which may be passed to a child process. With the socket transport,
+            the client connects to ``addresses``, see also ``ReplayBufferClient.from_addresses``.
+        """
+        if self.transport == 'socket':
+            return ReplayBufferClient.from_addresses(self.addresses, self.authkey, sync_freq=sync_freq, cfg=cfg)
+        return ReplayBufferClient(self._client_connections[client_id], sync_freq=sync_freq, cfg=cfg)
+
+    def close(self) -> None:
+        """
+        Overview:
+            Stop the shard processes.
+        """
+        for control in self._control_connections:
+            control.send(('close', None))
+        for control, shard in zip(self._control_connections, self._shards):
+            control.recv()
+            shard.join()
+
+
+class ReplayBufferClient(object):
+    """
+    Overview:
+        The client of the shards of a ``ReplayBufferServer``, with the interface of ``GameBuffer`` used by the train
+        entries. The game segments of a push are distributed over the shards in turn. A minibatch is split over the
+        shards in proportion to their numbers of transitions, the shards sample and compute the targets of their parts
+        in parallel, and the parts are concatenated. The batch indices of the minibatch encode the shard of every
+        transition, so that ``update_priority`` updates the priorities in their shards.
+    .. note::
+        The importance sampling weights are normalized within the part of every shard.
+    Interfaces:
+        ``__init__``, ``from_addresses``, ``push_game_segments``, ``remove_oldest_data_to_fit``, ``sample``,
+        ``update_priority``, ``get_num_of_transitions``, ``get_stats``, ``close``.
+    """
+
+    def __init__(
+            self, connections: Sequence[Connection], sync_freq: int = 1, cfg: Optional[EasyDict] = None
+    ) -> None:
+        """
+        Arguments:
+            - connections (:obj:`Sequence[Connection]`): The connections to the shards, in the order of the shards.
+            - sync_freq (:obj:`int`): Synchronize the target models of the shards every ``sync_freq`` calls of \
+                ``sample``.
+            - cfg (:obj:`Optional[EasyDict]`): The config of the game buffer, which the train entries read as \
+                ``_cfg``.
+        """
+        self._cfg = cfg
+        self._connections = list(connections)
+        self._num_shards = len(self._connections)
+        self._sync_freq = max(sync_freq, 1)
+        self._sync_count = 0
+        self._push_count = 0
+        self._num_of_transitions = np.zeros(self._num_shards, dtype=np.int64)
+        self._latency = np.zeros(self._num_shards)
+        self._num_of_requests = np.zeros(self._num_shards, dtype=np.int64)
+
+    @classmethod
+    def from_addresses(
+            cls,
+            addresses: Sequence[Tuple[str, int]],
+            authkey: bytes = b'lightzero',
+            sync_freq: int = 1,
+            cfg: Optional[EasyDict] = None
+    ) -> 'ReplayBufferClient':
+        """
+        Overview:
+            Connect to the shards listening at ``addresses`` (the ``addresses`` of a ``ReplayBufferServer`` with the
+            socket transport), e.g. from every DDP rank.
+        """
+        return cls([Client(tuple(address), authkey=authkey) for address in addresses], sync_freq=sync_freq, cfg=cfg)
+
+    def _request(self, requests: Dict[int, Tuple[str, Any]]) -> Dict[int, Any]:
+        """
+        Overview:
+            Send the requests to their shards, then wait for all the results, so the shards serve them in parallel.
+        """
+        start_time = time.time()
+        for shard_id, request in requests.items():
+            self._connections[shard_id].send(request)
+        results, errors = {}, []
+        # receive all the responses before raising an error, so the connections stay in sync
+        for shard_id in requests:
+            response, error = self._connections[shard_id].recv()
+            self._latency[shard_id] += time.time() - start_time
+            self._num_of_requests[shard_id] += 1
+            if error is not None:
+                errors.append('replay buffer shard {} failed:\n{}'.format(shard_id, error))
+                continue
+            results[shard_id], self._num_of_transitions[shard_id] = response
+        if len(errors) > 0:
+            raise RuntimeError('\n'.join(errors))
+        return results
+
+    def push_game_segments(self, data_and_meta: Any) -> None:
+        """
+        Overview:
+            Push the game segments and their meta information to the shards, one game segment per shard in turn.
+            Every shard removes its oldest data to fit after the push.
+        """
+        data, meta = data_and_meta
+        parts = {}
+        for game_segment, game_meta in zip(data, meta):
+            segments, metas = parts.setdefault(self._push_count % self._num_shards, ([], []))
+            segments.append(game_segment)
+            metas.append(game_meta)
+            self._push_count += 1
+        self._request({shard_id: ('push', part) for shard_id, part in parts.items()})
+
+    def remove_oldest_data_to_fit(self) -> None:
+        """
+        Overview:
+            The shards remove their oldest data to fit when the game segments are pushed.
+        """
+        pass
+
+    def sample(self, batch_size: int, policy: Any) -> List[Any]:
+        """
+        Overview:
+            Sample a minibatch from all the shards and get its targets, see ``GameBuffer.sample``. The target models
+            of the shards are synchronized with ``policy._target_model`` every ``sync_freq`` calls.
+        """
+        self._sync_count += 1
+        if self._sync_count % self._sync_freq == 0 or self._sync_count == 1:
+            state_dict = {k: v.detach().to('cpu') for k, v in policy._target_model.state_dict().items()}
+            self._request({shard_id: ('sync', state_dict) for shard_id in range(self._num_shards)})
+
+        sizes = self._split_batch(batch_size)
+        results = self._request({shard_id: ('sample', int(size)) for shard_id, size in enumerate(sizes) if size > 0})
+        current_batches, target_batches = [], []
+        for shard_id, (current_batch, target_batch) in results.items():
+            current_batch = list(current_batch)
+            # encode the shard of every transition into the batch indices
+            current_batch[-3] = np.asarray(current_batch[-3], dtype=np.int64) * self._num_shards + shard_id
+            current_batches.append(current_batch)
+            target_batches.append(target_batch)
+        current_batch = [np.concatenate([np.asarray(b[i]) for b in current_batches]) for i in range(len(current_batch))]
+        target_batch = [np.concatenate([np.asarray(b[i]) for b in target_batches]) for i in range(len(target_batch))]
+        return [current_batch, target_batch]
+
+    def _split_batch(self, batch_size: int) -> np.ndarray:
+        num_of_transitions = self._num_of_transitions
+        assert num_of_transitions.sum() >= batch_size, 'not enough transitions in the replay buffer shards'
+        sizes = np.random.multinomial(batch_size, num_of_transitions / num_of_transitions.sum())
+        # move the samples beyond the transitions of a shard to the shards with room
+        excess = np.maximum(sizes - num_of_transitions, 0)
+        sizes -= excess
+        for _ in range(int(excess.sum())):
+            room = num_of_transitions - sizes
+            sizes[np.argmax(room)] += 1
+        return sizes
+
+    def update_priority(self, train_data: List[np.ndarray], batch_priorities: Any) -> None:
+        """
+        Overview:
+            Update the priorities of the transitions of a minibatch returned by ``sample`` in their shards.
+        """
+        batch_index = np.asarray(train_data[0][-3], dtype=np.int64)
+        make_time = np.asarray(train_data[0][-1])
+        batch_priorities = np.asarray(batch_priorities)
+        shard_ids = batch_index % self._num_shards
+        requests = {}
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            requests[int(shard_id)] = (
+                'update_priority', (batch_index[mask] // self._num_shards, make_time[mask], batch_priorities[mask])
+            )
+        self._request(requests)
+
+    def get_num_of_transitions(self) -> int:
+        """
+        Overview:
+            Get the number of transitions of all the shards, as of the last response of every shard.
+        """
+        return int(self._num_of_transitions.sum())
+
+    def get_stats(self) -> List[Dict[str, float]]:
+        """
+        Overview:
+            Get the throughputs of every shard, i.e. the requests, the pushed, sampled and updated transitions per
+            second since the shard started, and the ratio of its time spent on serving, together with the mean
+            round-trip latency of the requests of this client.
+        """
+        results = self._request({shard_id: ('stats', None) for shard_id in range(self._num_shards)})
+        stats = []
+        for shard_id in range(self._num_shards):
+            shard_stats = dict(results[shard_id])
+            shard_stats['latency'] = self._latency[shard_id] / max(self._num_of_requests[shard_id], 1)
+            stats.append(shard_stats)
+        return stats
+
+    def close(self) -> None:
+        """
+        Overview:
+            Disconnect from the shards.
+        """
+        for connection in self._connections:
+            connection.close()
+
+    def __repr__(self) -> str:
+        return 'replay buffer client of {} shards, number of transitions: {}'.format(
+            self._num_shards, self.get_num_of_transitions()
+        )
+
+
+def connect_replay_buffer_server(
+        buffer_type: type, cfg: EasyDict, model: torch.nn.Module
+) -> Tuple[ReplayBufferClient, Optional[ReplayBufferServer]]:
+    """
+    Overview:
+        Start the ``ReplayBufferServer`` of ``buffer_server_num_shards`` shards and connect to it. In a data-parallel
+        training, the rank 0 starts the server with the socket transport and broadcasts its addresses, and every rank
+        connects a client to the same shards.
+    Arguments:
+        - buffer_type (:obj:`type`): The class of the game buffer of the shards.
+        - cfg (:obj:`EasyDict`): The config of the game buffer.
+        - model (:obj:`torch.nn.Module`): The target model.
+    Returns:
+        - client (:obj:`ReplayBufferClient`): The client of this process.
+        - server (:obj:`Optional[ReplayBufferServer]`): The server started by this process, which it has to close.
+    """
+    if get_world_size() == 1:
+        server = ReplayBufferServer(
+            buffer_type,
+            cfg,
+            model,
+            cfg.buffer_server_num_shards,
+            transport=cfg.buffer_server_transport,
+            host=cfg.buffer_server_host,
+            device=cfg.buffer_server_device
+        )
+        return server.connect(sync_freq=cfg.buffer_server_sync_freq, cfg=cfg), server
+    assert cfg.buffer_server_transport == 'socket', 'the replay buffer server of DDP needs the socket transport'
+    server, addresses = None, [None]
+    if get_rank() == 0:
+        server = ReplayBufferServer(
+            buffer_type,
+            cfg,
+            model,
+            cfg.buffer_server_num_shards,
+            transport='socket',
+            host=cfg.buffer_server_host,
+            device=cfg.buffer_server_device
+        )
+        addresses = [server.addresses]
+    torch.distributed.broadcast_object_list(addresses, src=0)
+    return ReplayBufferClient.from_addresses(addresses[0], sync_freq=cfg.buffer_server_sync_freq, cfg=cfg), server
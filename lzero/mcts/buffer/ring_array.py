@@ -0,0 +1,243 @@
+from typing import Any, Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+
+class RingArray(object):
+    """
+    Overview:
+        A preallocated circular array used as the storage of ``GameBuffer`` in the ring buffer mode.
+        New items are written at the tail and the oldest items are dropped from the head, so ``extend`` and
+        ``popleft`` cost O(number of items) and never reallocate or shift the stored items.
+        Items are addressed by their relative index, i.e. ``ring[0]`` is always the oldest item, which keeps the
+        interface compatible with the ``list`` / ``np.ndarray`` storage used by default. Items can also be addressed by
+        their global index ``base + relative index`` (see ``frames`` and ``take``), which does not change when the
+        oldest items are dropped.
+        If an ``extend`` does not fit into the capacity, the ring is doubled, which only happens when the buffer
+        holds more items than the preallocated capacity. The views returned before (e.g. by ``frames``) still
+        reference the previous array, which is only released once they are dropped.
+    Interfaces:
+        ``__init__``, ``__len__``, ``__getitem__``, ``__setitem__``, ``__delitem__``, ``__iadd__``, ``__iter__``,
+        ``append``, ``extend``, ``popleft``, ``values``, ``max``, ``frames``, ``take``
+    """
+
+    def __init__(self, capacity: int, shape: Tuple[int, ...] = (), dtype: Any = np.float64) -> None:
+        """
+        Overview:
+            Initialize the ``RingArray``.
+        Arguments:
+            - capacity (:obj:`int`): The number of preallocated items.
+            - shape (:obj:`Tuple[int, ...]`): The shape of one item, ``()`` for scalars.
+            - dtype (:obj:`Any`): The dtype of the items, use ``object`` to store python objects such as game segments.
+        """
+        self._data = self._allocate((max(int(capacity), 1), *shape), dtype)
+        self._head = 0
+        self._size = 0
+        # the number of items dropped so far, i.e. the global index of ``ring[0]``
+        self.base = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._data.shape[0]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._data.dtype
+
+    def positions(self, index: Union[int, np.ndarray]) -> Union[int, np.ndarray]:
+        """
+        Overview:
+            Map the relative indices to the positions in the underlying preallocated array.
+        """
+        return (self._head + index) % self.capacity
+
+    def values(self) -> np.ndarray:
+        """
+        Overview:
+            Return all the items ordered from the oldest to the newest. This is a view if the items do not wrap
+            around the end of the underlying array and a copy otherwise.
+        """
+        end = self._head + self._size
+        if end <= self.capacity:
+            return self._data[self._head:end]
+        return np.concatenate([self._data[self._head:], self._data[:end - self.capacity]])
+
+    def max(self) -> Any:
+        return self.values().max()
+
+    def frames(self, start: int, length: int) -> np.ndarray:
+        """
+        Overview:
+            Return the items ``[start, start + length)`` addressed by the global index. This is a view if the items
+            do not wrap around the end of the underlying array and a copy otherwise.
+        """
+        assert start >= self.base, 'the items {} have been dropped from the ring'.format(start)
+        return self[start - self.base:start - self.base + length]
+
+    def take(self, index: np.ndarray) -> np.ndarray:
+        """
+        Overview:
+            Return a copy of the items addressed by the array of global indices ``index``.
+        """
+        index = np.asarray(index)
+        assert index.size == 0 or index.min() >= self.base, 'some items have been dropped from the ring'
+        return self._data[self.positions(index - self.base)]
+
+    def __getitem__(self, index: Union[int, slice, np.ndarray]) -> Any:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._size)
+            if step != 1:
+                return self.values()[index]
+            # a view if the items do not wrap around the end of the underlying array and a copy otherwise
+            start, num = self.positions(start), max(stop - start, 0)
+            if start + num <= self.capacity:
+                return self._data[start:start + num]
+            return np.concatenate([self._data[start:], self._data[:start + num - self.capacity]])
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += self._size
+            assert 0 <= index < self._size, index
+            return self._data[self.positions(index)]
+        index = np.asarray(index)
+        return self._data[self.positions(np.where(index < 0, index + self._size, index))]
+
+    def __setitem__(self, index: Union[int, np.ndarray], value: Any) -> None:
+        if isinstance(index, (int, np.integer)):
+            assert 0 <= index < self._size, index
+        self._data[self.positions(np.asarray(index))] = value
+
+    def __delitem__(self, index: slice) -> None:
+        """
+        Overview:
+            Only the deletion of the oldest items, i.e. ``del ring[:num]``, is supported.
+        """
+        assert isinstance(index, slice) and index.start in [None, 0] and index.step in [None, 1], \
+            "RingArray only supports to delete the oldest items"
+        self.popleft(self._size if index.stop is None else index.stop)
+
+    def __iadd__(self, values: Iterable) -> 'RingArray':
+        self.extend(values)
+        return self
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._data[self.positions(i)]
+
+    def append(self, value: Any) -> None:
+        if self._size + 1 > self.capacity:
+            self._grow(self._size + 1)
+        self._data[self.positions(self._size)] = value
+        self._size += 1
+
+    def extend(self, values: Iterable) -> None:
+        if self._data.dtype == object:
+            values = list(values)
+            num = len(values)
+        else:
+            values = np.asarray(values, dtype=self._data.dtype)
+            num = values.shape[0]
+        if num == 0:
+            return
+        if self._size + num > self.capacity:
+            self._grow(self._size + num)
+        start = self.positions(self._size)
+        first = min(num, self.capacity - start)
+        if self._data.dtype == object:
+            # assign one by one to avoid numpy converting the objects (e.g. lists) into nested arrays
+            for i, value in enumerate(values):
+                self._data[(start + i) % self.capacity] = value
+        else:
+            self._data[start:start + first] = values[:first]
+            self._data[:num - first] = values[first:]
+        self._size += num
+
+    def popleft(self, num: int) -> None:
+        """
+        Overview:
+            Drop the ``num`` oldest items. The references of dropped python objects are released.
+        """
+        num = min(int(num), self._size)
+        if num <= 0:
+            return
+        if self._data.dtype == object:
+            self._data[self.positions(np.arange(num))] = None
+        self._head = self.positions(num)
+        self._size -= num
+        self.base += num
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = self.capacity
+        while capacity < min_capacity:
+            capacity *= 2
+        data = self._allocate((capacity, *self._data.shape[1:]), self._data.dtype)
+        data[:self._size] = self.values()
+        self._data = data
+        self._head = 0
+
+    @staticmethod
+    def _allocate(shape: Tuple[int, ...], dtype: Any) -> np.ndarray:
+        # NOTE: ``np.zeros`` only commits the memory pages when they are written, so a large capacity is cheap.
+        # The object arrays are filled with None by ``np.empty``.
+        return np.empty(shape, dtype=dtype) if np.dtype(dtype) == object else np.zeros(shape, dtype=dtype)
+
+
+class FrameSlice(object):
+    """
+    Overview:
+        The frames of a frame store (a ``RingArray`` or a ``SharedObsArena``) addressed by an array of global indices,
+        which is used as the ``obs_segment`` of a game segment in the observation store of ``GameBuffer``. It behaves
+        like the ``np.ndarray`` of the frames: integer indexing returns a frame, slicing returns a ``FrameSlice``
+        without reading the frames, and ``np.asarray`` returns the frames.
+        If the indices are consecutive, the frames are returned as a view of the store, otherwise they are gathered.
+        The indices may be shared with other game segments, e.g. the stacked frames at the beginning of a game
+        segment, which are also the last frames of the previous game segment of the same episode.
+    .. note::
+        A ``FrameSlice`` of a ``SharedObsArena`` is pickled by reference, i.e. the name of the shared memory block
+        and the indices, while a ``FrameSlice`` of another store is pickled as the ``np.ndarray`` of its frames.
+    """
+
+    def __init__(self, store: RingArray, frame_ids: np.ndarray) -> None:
+        self.store = store
+        self.frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        self._consecutive = len(self.frame_ids) == 0 or bool(
+            self.frame_ids[-1] - self.frame_ids[0] == len(self.frame_ids) - 1 and np.all(np.diff(self.frame_ids) == 1)
+        )
+
+    def __len__(self) -> int:
+        return len(self.frame_ids)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (len(self.frame_ids), *self.store._data.shape[1:])
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.store.dtype
+
+    def __getitem__(self, index: Union[int, slice, np.ndarray]) -> Any:
+        if isinstance(index, (int, np.integer)):
+            return self.store.frames(int(self.frame_ids[index]), 1)[0]
+        if isinstance(index, slice):
+            return FrameSlice(self.store, self.frame_ids[index])
+        return np.asarray(self)[index]
+
+    def __iter__(self):
+        for i in range(len(self.frame_ids)):
+            yield self[i]
+
+    def __array__(self, dtype: Optional[Any] = None, copy: Optional[bool] = None) -> np.ndarray:
+        if len(self.frame_ids) == 0:
+            frames = np.empty(self.shape, dtype=self.dtype)
+        elif self._consecutive:
+            frames = self.store.frames(int(self.frame_ids[0]), len(self.frame_ids))
+        else:
+            frames = self.store.take(self.frame_ids)
+        return frames if dtype is None else frames.astype(dtype, copy=False)
+
+    def __reduce__(self) -> Tuple:
+        if getattr(self.store, 'pickle_by_reference', False):
+            return FrameSlice, (self.store, self.frame_ids)
+        return np.array, (np.asarray(self), )
@@ -0,0 +1,117 @@
+import time
+from typing import Any, Optional, Union
+
+import numpy as np
+
+
+class SamplingStrategy(object):
+    """
+    Overview:
+        The base class of the sampling strategies of ``GameBuffer``, which shape the sampling distribution of the
+        transitions on top of the priorities. A strategy decides whether the priorities are used (``use_priority``)
+        and returns a weight in (0, 1] for every candidate transition (``weights``), so the probability of sampling the
+        transition ``i`` is proportional to ``(p_i ** alpha + eps) * w_i``.
+        Without ``use_priority_tree``, the weights of all the transitions are computed in one vectorized call. With
+        ``use_priority_tree``, the candidates sampled from the tree are accepted with the probability ``w_i``
+        (rejection sampling), so only the weights of the candidates are computed and the tree is not rebuilt.
+        The importance sampling weights of the minibatch only correct the bias of the priorities, the strategy
+        weights are a deliberate focus of the sampling.
+    Interfaces:
+        ``weights``
+    """
+    # whether the transitions are sampled according to their priorities
+    use_priority = True
+
+    def weights(self, buffer: Any, indices: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Overview:
+            Return the weights in (0, 1] of the transitions at the relative ``indices`` of ``buffer``, or None if the
+            strategy does not reweight the transitions.
+        Arguments:
+            - buffer (:obj:`GameBuffer`): The game buffer to sample from.
+            - indices (:obj:`np.ndarray`): The relative transition indices of the candidates.
+        """
+        return None
+
+
+class UniformStrategy(SamplingStrategy):
+    """
+    Overview:
+        Sample the transitions uniformly, i.e. ignore the priorities.
+    """
+    use_priority = False
+
+
+class PrioritizedStrategy(SamplingStrategy):
+    """
+    Overview:
+        Sample the transitions according to their priorities (PER), which is the default of ``GameBuffer``.
+    """
+    use_priority = True
+
+
+class RecencyStrategy(SamplingStrategy):
+    """
+    Overview:
+        Weight the transitions by their age, i.e. the number of transitions pushed after them, which halves the weight
+        every ``half_life`` fraction of the stored transitions. The weights are floored at ``min_weight``, so that the
+        old transitions are still sampled.
+    """
+
+    def __init__(self, half_life: float = 0.25, min_weight: float = 0.01, use_priority: bool = True) -> None:
+        assert half_life > 0 and 0 < min_weight <= 1
+        self.half_life = half_life
+        self.min_weight = min_weight
+        self.use_priority = use_priority
+
+    def weights(self, buffer: Any, indices: np.ndarray) -> np.ndarray:
+        num_of_transitions = buffer.get_num_of_transitions()
+        age = (num_of_transitions - 1 - np.asarray(indices)) / num_of_transitions
+        return np.maximum(0.5 ** (age / self.half_life), self.min_weight)
+
+
+class ReanalyzeFreshFirstStrategy(SamplingStrategy):
+    """
+    Overview:
+        Weight the transitions by the freshness of the stored targets of their game segments, i.e. the time since the
+        collection of the game segment or its last refresh by ``ReanalyzeDaemon``, which halves the weight every
+        ``half_life`` seconds. With the daemon, the learner is focused on the transitions whose policy targets have
+        been recomputed by the latest target models. The weights are floored at ``min_weight``.
+    """
+
+    def __init__(self, half_life: float = 60., min_weight: float = 0.01, use_priority: bool = True) -> None:
+        assert half_life > 0 and 0 < min_weight <= 1
+        self.half_life = half_life
+        self.min_weight = min_weight
+        self.use_priority = use_priority
+
+    def weights(self, buffer: Any, indices: np.ndarray) -> np.ndarray:
+        game_segment_index = buffer._get_game_segment_index(indices)
+        staleness = np.maximum(time.time() - buffer._segment_refresh_time[game_segment_index], 0.)
+        return np.maximum(0.5 ** (staleness / self.half_life), self.min_weight)
+
+
+SAMPLING_STRATEGIES = {
+    'uniform': UniformStrategy,
+    'per': PrioritizedStrategy,
+    'recency': RecencyStrategy,
+    'reanalyze_fresh_first': ReanalyzeFreshFirstStrategy,
+}
+
+
+def get_sampling_strategy(strategy: Union[str, SamplingStrategy], **kwargs) -> SamplingStrategy:
+    """
+    Overview:
+        Return the sampling strategy ``strategy`` in ``SAMPLING_STRATEGIES`` created with ``kwargs``. An instance of
+        ``SamplingStrategy`` is returned as it is, which allows the user defined strategies.
+    Arguments:
+        - strategy (:obj:`Union[str, SamplingStrategy]`): The name of the strategy, one of ``'uniform'``, ``'per'``, \
+            ``'recency'``, ``'reanalyze_fresh_first'``, or a ``SamplingStrategy``.
+    """
+    if isinstance(strategy, SamplingStrategy):
+        return strategy
+    assert strategy in SAMPLING_STRATEGIES, \
+        'unknown sampling strategy {}, should be one of {}'.format(strategy, list(SAMPLING_STRATEGIES))
+    if strategy in ['recency', 'reanalyze_fresh_first']:
+        return SAMPLING_STRATEGIES[strategy](**kwargs)
+    return SAMPLING_STRATEGIES[strategy]()
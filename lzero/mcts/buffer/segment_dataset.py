@@ -0,0 +1,322 @@
+import os
+import pickle
+import re
+import struct
+from typing import Any, Iterator, List, Optional, Tuple
+
+from .buffer_snapshot import SNAPSHOT_COMPRESSIONS
+from .obs_codec import get_obs_codec
+
+# the version of the dataset format, which is checked when a dataset is opened
+DATASET_VERSION = 2
+DATASET_COMPRESSIONS = SNAPSHOT_COMPRESSIONS
+# every record of a shard is the length of its payload followed by the (compressed) pickled (game segment, meta)
+_RECORD_HEADER = struct.Struct('<Q')
+_SHARD_PATTERN = re.compile(r'^shard_(\d+)_(\d{6})\.bin$')
+
+
+def _shard_path(path: str, writer_id: int, shard_id: int) -> str:
+    return os.path.join(path, 'shard_{:03d}_{:06d}.bin'.format(writer_id, shard_id))
+
+
+def _list_shards(path: str, writer_id: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Overview:
+        List the (writer id, shard id) of the finished shards, i.e. not the shards which are being written
+        (``*.bin.part``), of all the writers or only of ``writer_id``, ordered by shard id and then by writer id, so
+        the shards of concurrent writers are interleaved.
+    """
+    if not os.path.isdir(path):
+        return []
+    shards = [(int(m.group(1)), int(m.group(2))) for m in map(_SHARD_PATTERN.match, os.listdir(path)) if m is not None]
+    return sorted(
+        (shard for shard in shards if writer_id is None or shard[0] == writer_id), key=lambda shard: shard[::-1]
+    )
+
+
+def _read_meta(path: str) -> Optional[dict]:
+    meta_path = os.path.join(path, 'meta.pkl')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'rb') as f:
+        meta = pickle.load(f)
+    assert meta['version'] == DATASET_VERSION, 'unsupported dataset version {}'.format(meta['version'])
+    return meta
+
+
+def _read_record(f: Any, compression: Optional[str], skip: bool = False) -> Tuple[bool, Any]:
+    """
+    Overview:
+        Read the next record of the shard file ``f``. Return ``(False, None)`` at the end of the shard, including a
+        truncated record at the end of a shard which was being written when the writer stopped.
+    """
+    header = f.read(_RECORD_HEADER.size)
+    if len(header) < _RECORD_HEADER.size:
+        return False, None
+    size, = _RECORD_HEADER.unpack(header)
+    if skip:
+        position = f.tell()
+        if f.seek(0, os.SEEK_END) < position + size:
+            return False, None
+        f.seek(position + size)
+        return True, None
+    payload = f.read(size)
+    if len(payload) < size:
+        return False, None
+    if compression is not None:
+        payload = get_obs_codec(compression).decompress(payload)
+    return True, pickle.loads(payload)
+
+
+class SegmentDatasetWriter(object):
+    """
+    Overview:
+        The streaming exporter of the game segments collected by ``MuZeroCollector``, which decouples the collection
+        from the training: the ``(game_segments, metas)`` returned by ``MuZeroCollector.collect`` are appended to the
+        dataset directory ``path``, one record per game segment, and ``SegmentDatasetReader`` (or
+        ``load_segment_dataset``) streams them into a game buffer later.
+        The dataset is a directory of append-only shard files of ``shard_size`` game segments. The shard being written
+        is named ``shard_{writer_id}_{id}.bin.part`` and renamed to ``shard_{writer_id}_{id}.bin`` once it is full (or
+        the writer is closed), so the readers only see finished shards. Several writers, e.g. the DDP ranks or the
+        collector nodes, write to the same dataset with different ``writer_id``. A writer opened on an existing
+        dataset resumes its own shards: the records of its unfinished shard, e.g. of a writer which was killed, are
+        kept up to the last complete record.
+    Interfaces:
+        ``__init__``, ``write``, ``close``.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            shard_size: int = 256,
+            compression: Optional[str] = None,
+            obs_codec: Optional[str] = None,
+            writer_id: int = 0
+    ) -> None:
+        """
+        Arguments:
+            - path (:obj:`str`): The directory of the dataset, which is created if it does not exist.
+            - shard_size (:obj:`int`): The number of game segments per shard.
+            - compression (:obj:`Optional[str]`): The compression of the records, one of None, 'zlib', 'lz4' and \
+                'zstd', see ``obs_codec.py``.
+            - obs_codec (:obj:`Optional[str]`): The ``obs_codec`` of the exported game segments, which is checked by \
+                ``load_segment_dataset``, since the frames are exported as they are.
+            - writer_id (:obj:`int`): The id of the writer, which must be unique among the concurrent writers of \
+                the dataset.
+        """
+        assert compression in DATASET_COMPRESSIONS, \
+            'unknown dataset compression {}, should be one of {}'.format(compression, DATASET_COMPRESSIONS)
+        assert shard_size > 0
+        assert writer_id >= 0
+        self.path = path
+        self.shard_size = shard_size
+        self.writer_id = writer_id
+        os.makedirs(path, exist_ok=True)
+        meta = _read_meta(path)
+        if meta is None:
+            meta = {'version': DATASET_VERSION, 'compression': compression, 'obs_codec': obs_codec}
+            # the concurrent writers replace the meta atomically, so the readers never see a partial one
+            meta_path = os.path.join(path, 'meta.pkl.{}.tmp'.format(writer_id))
+            with open(meta_path, 'wb') as f:
+                pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(meta_path, os.path.join(path, 'meta.pkl'))
+        else:
+            assert (meta['compression'], meta['obs_codec']) == (compression, obs_codec), \
+                'the dataset {} is written with compression={} and obs_codec={}'.format(
+                    path, meta['compression'], meta['obs_codec']
+                )
+        self.compression = compression
+        shards = _list_shards(path, writer_id)
+        self._shard_id = shards[-1][1] + 1 if len(shards) > 0 else 0
+        self._file, self._num_of_records = None, 0
+        self._resume_part()
+
+    def _part_path(self) -> str:
+        return _shard_path(self.path, self.writer_id, self._shard_id) + '.part'
+
+    def _resume_part(self) -> None:
+        part_path = self._part_path()
+        if not os.path.exists(part_path):
+            return
+        # keep the complete records of the unfinished shard and drop a truncated last record
+        end = 0
+        with open(part_path, 'rb') as f:
+            while _read_record(f, self.compression, skip=True)[0]:
+                self._num_of_records += 1
+                end = f.tell()
+        with open(part_path, 'r+b') as f:
+            f.truncate(end)
+        self._file = open(part_path, 'ab')
+        if self._num_of_records >= self.shard_size:
+            self._finish_shard()
+
+    def _finish_shard(self) -> None:
+        self._file.close()
+        self._file = None
+        if self._num_of_records > 0:
+            os.rename(self._part_path(), _shard_path(self.path, self.writer_id, self._shard_id))
+            self._shard_id += 1
+        else:
+            os.remove(self._part_path())
+        self._num_of_records = 0
+
+    def write(self, data: Tuple[List[Any], List[dict]]) -> None:
+        """
+        Overview:
+            Append the game segments to the dataset. The records are flushed at the end of the call, so the
+            dataset is consistent up to the last call even if the writer is not closed.
+        Arguments:
+            - data (:obj:`Tuple[List[Any], List[dict]]`): The game segments and their meta, i.e. the output of \
+                ``MuZeroCollector.collect``. They must be exported before they are pushed into a game buffer, which \
+                may move their observations into its observation store.
+        """
+        game_segments, metas = data
+        for game_segment, meta in zip(game_segments, metas):
+            payload = pickle.dumps((game_segment, meta), protocol=pickle.HIGHEST_PROTOCOL)
+            if self.compression is not None:
+                payload = get_obs_codec(self.compression).compress(payload)
+            if self._file is None:
+                self._file = open(self._part_path(), 'ab')
+            self._file.write(_RECORD_HEADER.pack(len(payload)))
+            self._file.write(payload)
+            self._num_of_records += 1
+            if self._num_of_records >= self.shard_size:
+                self._finish_shard()
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        """
+        Overview:
+            Finish the current shard, so that the readers see all the exported game segments.
+        """
+        if self._file is not None:
+            self._finish_shard()
+
+    def __enter__(self) -> 'SegmentDatasetWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class SegmentDatasetReader(object):
+    """
+    Overview:
+        Stream the game segments of a dataset written by ``SegmentDatasetWriter``, shard by shard and without
+        holding the dataset in memory. The shards of all the writers are read in the order of their shard ids. The
+        shards are split across ``world_size`` readers (e.g. the ranks of a distributed training), the reader of
+        ``rank`` reads the shards whose ``writer_id + shard_id`` equals ``rank`` modulo ``world_size``.
+        The position of the reader is ``cursor``, i.e. the next shard id and the next record in it of every writer,
+        which can be saved and passed to a new reader to resume the stream.
+    Interfaces:
+        ``__init__``, ``__iter__``, ``read``.
+    """
+
+    def __init__(self, path: str, rank: int = 0, world_size: int = 1, cursor: Optional[dict] = None) -> None:
+        """
+        Arguments:
+            - path (:obj:`str`): The directory of the dataset.
+            - rank (:obj:`int`): The rank of the reader.
+            - world_size (:obj:`int`): The number of the readers which split the shards.
+            - cursor (:obj:`Optional[dict]`): The position to resume the stream from, i.e. the ``cursor`` of a \
+                previous reader. None means the beginning of the dataset.
+        """
+        assert 0 <= rank < world_size
+        meta = _read_meta(path)
+        assert meta is not None, 'no dataset in {}'.format(path)
+        self.path = path
+        self.rank = rank
+        self.world_size = world_size
+        self.compression = meta['compression']
+        self.obs_codec = meta['obs_codec']
+        # writer id -> {'shard': the next shard id, 'record': the next record in it}
+        self.cursor = {writer_id: dict(position) for writer_id, position in (cursor or {}).items()}
+
+    def __iter__(self) -> Iterator[Tuple[Any, dict]]:
+        """
+        Overview:
+            Yield the ``(game segment, meta)`` of the finished shards of this reader from ``cursor`` on. The shards
+            finished by a running writer during the iteration are also read.
+        """
+        while True:
+            shards = [
+                (writer_id, shard_id) for writer_id, shard_id in _list_shards(self.path)
+                if shard_id >= self.cursor.get(writer_id, {'shard': 0})['shard']
+                and (writer_id + shard_id) % self.world_size == self.rank
+            ]
+            if len(shards) == 0:
+                return
+            for writer_id, shard_id in shards:
+                position = self.cursor.get(writer_id)
+                if position is None or position['shard'] != shard_id:
+                    position = self.cursor[writer_id] = {'shard': shard_id, 'record': 0}
+                with open(_shard_path(self.path, writer_id, shard_id), 'rb') as f:
+                    for _ in range(position['record']):
+                        _read_record(f, self.compression, skip=True)
+                    while True:
+                        ok, record = _read_record(f, self.compression)
+                        if not ok:
+                            break
+                        position['record'] += 1
+                        yield record
+                self.cursor[writer_id] = {'shard': shard_id + 1, 'record': 0}
+
+    def read(self, num_of_game_segments: int) -> Tuple[List[Any], List[dict]]:
+        """
+        Overview:
+            Read the next (at most) ``num_of_game_segments`` game segments in the format of the output of
+            ``MuZeroCollector.collect``, i.e. the input of ``GameBuffer.push_game_segments``. An empty list means
+            the end of the dataset.
+        """
+        game_segments, metas = [], []
+        if num_of_game_segments <= 0:
+            return game_segments, metas
+        for game_segment, meta in self:
+            game_segments.append(game_segment)
+            metas.append(meta)
+            if len(game_segments) >= num_of_game_segments:
+                break
+        return game_segments, metas
+
+
+def load_segment_dataset(
+        buffer: Any,
+        path: str,
+        num_of_game_segments: Optional[int] = None,
+        rank: int = 0,
+        world_size: int = 1,
+        cursor: Optional[dict] = None,
+        batch_size: int = 64
+) -> dict:
+    """
+    Overview:
+        Stream the game segments of the dataset ``path`` into ``buffer`` in batches of ``batch_size`` game segments,
+        removing the oldest data of the buffer to fit after each batch, so the dataset is never held in memory.
+    Arguments:
+        - buffer (:obj:`GameBuffer`): The game buffer to fill.
+        - path (:obj:`str`): The directory of the dataset written by ``SegmentDatasetWriter``.
+        - num_of_game_segments (:obj:`Optional[int]`): The max number of game segments to load. None means all the \
+            remaining game segments.
+        - rank (:obj:`int`): The rank of the reader, see ``SegmentDatasetReader``.
+        - world_size (:obj:`int`): The number of the readers which split the shards.
+        - cursor (:obj:`Optional[dict]`): The position to resume from, i.e. the return value of a previous call.
+        - batch_size (:obj:`int`): The number of game segments pushed at once.
+    Returns:
+        - cursor (:obj:`dict`): The position after the loaded game segments, to pass to the next call.
+    """
+    reader = SegmentDatasetReader(path, rank=rank, world_size=world_size, cursor=cursor)
+    assert reader.obs_codec == buffer._cfg.obs_codec, \
+        'the dataset with obs_codec={} can not be loaded into a buffer with obs_codec={}'.format(
+            reader.obs_codec, buffer._cfg.obs_codec
+        )
+    num_of_loaded = 0
+    while num_of_game_segments is None or num_of_loaded < num_of_game_segments:
+        size = batch_size if num_of_game_segments is None else min(batch_size, num_of_game_segments - num_of_loaded)
+        data = reader.read(size)
+        if len(data[0]) == 0:
+            break
+        buffer.push_game_segments(data)
+        buffer.remove_oldest_data_to_fit()
+        num_of_loaded += len(data[0])
+    return reader.cursor
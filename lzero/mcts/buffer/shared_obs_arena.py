@@ -0,0 +1,97 @@
+import weakref
+from multiprocessing import shared_memory
+from typing import Any, Tuple
+
+import numpy as np
+
+from .ring_array import RingArray
+
+
+def _release_shared_memory(shm: shared_memory.SharedMemory, unlink: bool) -> None:
+    if unlink:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+    try:
+        shm.close()
+    except BufferError:
+        # some frames are still referenced, the block is unmapped when they are released
+        pass
+
+
+class SharedObsArena(RingArray):
+    """
+    Overview:
+        A ``RingArray`` of observation frames allocated in shared memory (``multiprocessing.shared_memory``).
+        It is used as the observation store of ``GameBuffer`` if ``use_shared_obs_store`` is True, and the game segments
+        only reference their frames by global index through ``FrameSlice``.
+        Pickling an arena (or a ``FrameSlice`` of it) only pickles the name of the shared memory block and the indices,
+        so the game segments and the contexts built from them can be sent to other processes, e.g. the reanalyze
+        workers, without pickling the frame arrays. The other processes attach to the same block and read the frames
+        in place.
+    .. note::
+        The process that creates the arena owns the shared memory block and unlinks it when the arena is released.
+    """
+    pickle_by_reference = True
+
+    def __init__(self, capacity: int, shape: Tuple[int, ...] = (), dtype: Any = np.float32) -> None:
+        """
+        Overview:
+            Initialize the ``SharedObsArena``.
+        Arguments:
+            - capacity (:obj:`int`): The number of preallocated frames.
+            - shape (:obj:`Tuple[int, ...]`): The shape of one frame.
+            - dtype (:obj:`Any`): The dtype of the frames.
+        """
+        self._owner = True
+        # the current shared memory block is the last one, the previous ones are kept alive after a growth because
+        # the frames returned before may still be referenced
+        self._shms = []
+        self._finalizers = []
+        super().__init__(capacity, shape, dtype)
+
+    @property
+    def name(self) -> str:
+        return self._shms[-1].name
+
+    def _allocate(self, shape: Tuple[int, ...], dtype: Any) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        assert dtype != object, 'SharedObsArena only stores the numeric observation frames'
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        if self._shms:
+            # the block of a growth replaces the current one, which is unlinked and only kept for the old references
+            self._shms[-1].unlink()
+        self._shms.append(shm)
+        # release the block when the arena is closed, garbage collected or at exit
+        self._finalizers.append(weakref.finalize(self, _release_shared_memory, shm, True))
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def close(self) -> None:
+        """
+        Overview:
+            Release the shared memory blocks of the arena (and unlink them if the arena owns them). The frames which
+            are still referenced stay readable until they are released.
+        """
+        for finalizer in self._finalizers:
+            finalizer()
+
+    def __getstate__(self) -> dict:
+        return {
+            'name': self.name,
+            'shape': self._data.shape,
+            'dtype': self._data.dtype.str,
+            'head': self._head,
+            'size': self._size,
+            'base': self.base,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        # attach to the shared memory block of the owner
+        shm = shared_memory.SharedMemory(name=state['name'])
+        self._owner = False
+        self._shms = [shm]
+        self._data = np.ndarray(state['shape'], dtype=state['dtype'], buffer=shm.buf)
+        self._head, self._size, self.base = state['head'], state['size'], state['base']
+        self._finalizers = [weakref.finalize(self, _release_shared_memory, shm, False)]
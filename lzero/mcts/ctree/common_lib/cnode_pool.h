@@ -0,0 +1,110 @@
+// C++11
+
+#ifndef CNODE_POOL_H
+#define CNODE_POOL_H
+
+#include <memory>
+#include <vector>
+
+namespace tools {
+
+    template <class Node>
+    class CNodePool {
+        /*
+        Overview:
+            An arena of tree nodes, shared by all the nodes of the trees of one ``CRoots``. The children of a node are
+            allocated as one contiguous block indexed by action, so selecting a child reads neighbouring memory
+            instead of chasing the nodes of a ``std::map``. The nodes live in chunks which are never moved (the
+            pointers to the nodes in the search paths stay valid) and never freed by ``reset``, so the next search
+            reuses the memory of the previous one instead of allocating every node again.
+        */
+        public:
+            int chunk_size;
+
+            CNodePool(int chunk_size = 4096)
+            {
+                this->chunk_size = chunk_size;
+                this->chunk_index = 0;
+                this->offset = 0;
+            }
+
+            CNodePool(const CNodePool &) = delete;
+            CNodePool &operator=(const CNodePool &) = delete;
+
+            Node *allocate(int num)
+            {
+                /*
+                Overview:
+                    Allocate a contiguous block of ``num`` default nodes.
+                */
+                while (this->chunk_index < (int)this->chunks.size() && this->offset + num > this->capacities[this->chunk_index])
+                {
+                    this->chunk_index += 1;
+                    this->offset = 0;
+                }
+                if (this->chunk_index == (int)this->chunks.size())
+                {
+                    this->add_chunk(num > this->chunk_size ? num : this->chunk_size);
+                }
+                Node *block = this->chunks[this->chunk_index].get() + this->offset;
+                this->offset += num;
+                // the nodes of a reused chunk still hold the statistics of the previous search
+                for (int i = 0; i < num; ++i)
+                {
+                    block[i] = Node();
+                }
+                return block;
+            }
+
+            void reserve(int num_nodes)
+            {
+                /*
+                Overview:
+                    Make sure that the first ``num_nodes`` allocated nodes (e.g. ``(num_simulations + 1) * root_num *
+                    action_space_size``) do not allocate any memory.
+                */
+                int capacity = this->capacity();
+                if (capacity < num_nodes)
+                {
+                    this->add_chunk(num_nodes - capacity > this->chunk_size ? num_nodes - capacity : this->chunk_size);
+                }
+            }
+
+            void reset()
+            {
+                /*
+                Overview:
+                    Release all the nodes while keeping their memory for the next allocations.
+                */
+                this->chunk_index = 0;
+                this->offset = 0;
+            }
+
+            int capacity()
+            {
+                /*
+                Overview:
+                    Return the number of nodes of all the chunks.
+                */
+                int capacity = 0;
+                for (int i = 0; i < (int)this->capacities.size(); ++i)
+                {
+                    capacity += this->capacities[i];
+                }
+                return capacity;
+            }
+
+        private:
+            int chunk_index, offset;
+            std::vector<std::unique_ptr<Node[]> > chunks;
+            std::vector<int> capacities;
+
+            void add_chunk(int capacity)
+            {
+                this->chunks.push_back(std::unique_ptr<Node[]>(new Node[capacity]));
+                this->capacities.push_back(capacity);
+            }
+    };
+}
+
+#endif
@@ -59,6 +59,8 @@ cdef extern from "lib/cnode.h" namespace "tree":
         void prepare_no_noise(const vector[float] & value_prefixs, const vector[vector[float]] & policies,
                               vector[int] to_play_batch)
         void clear()
+        void reset(int root_num, vector[vector[int]] &legal_actions_list)
+        void reserve(int num_nodes)
         vector[vector[int]] get_trajectories()
         vector[vector[int]] get_distributions()
         vector[float] get_values()
@@ -79,6 +81,9 @@ cdef extern from "lib/cnode.h" namespace "tree":
                                vector[float] values, vector[vector[float]] policies,
                                CMinMaxStatsList *min_max_stats_lst, CSearchResults & results,
                                vector[int] is_reset_list, vector[int] & to_play_batch)
+    void cbatch_backpropagate(int current_latent_state_index, float discount_factor, const float *value_prefixs, const float *values,
+                              const float *policies, int action_num, CMinMaxStatsList *min_max_stats_lst,
+                              CSearchResults &results, const int *is_reset_list, const int *to_play_batch)
     void cbatch_traverse(CRoots *roots, int pb_c_base, float pb_c_init, float discount_factor,
                          CMinMaxStatsList *min_max_stats_lst, CSearchResults & results,
                          vector[int] & virtual_to_play_batch)
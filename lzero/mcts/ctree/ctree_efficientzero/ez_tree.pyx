@@ -1,8 +1,11 @@
 # distutils:language=c++
 # cython:language_level=3
 import cython
+from libc.string cimport memcpy
 from libcpp.vector cimport vector
 
+import numpy as np
+
 cdef class MinMaxStatsList:
     @cython.binding
     def __cinit__(self, int num):
@@ -59,6 +62,14 @@ cdef class Roots:
     def clear(self):
         self.roots[0].clear()
 
+    def reset(self, int root_num, vector[vector[int]] legal_actions_list):
+        # reuse the nodes of the previous search for the new roots
+        self.root_num = root_num
+        self.roots[0].reset(root_num, legal_actions_list)
+
+    def reserve(self, int num_nodes):
+        self.roots[0].reserve(num_nodes)
+
     def __dealloc__(self):
         del self.roots
 
@@ -98,3 +109,43 @@ def batch_traverse(Roots roots, int pb_c_base, float pb_c_init, float discount_f
                     results.cresults, virtual_to_play_batch)
 
     return results.cresults.latent_state_index_in_search_path, results.cresults.latent_state_index_in_batch, results.cresults.last_actions, results.cresults.virtual_to_play_batchs
+
+
+cdef _to_int32_array(vector[int] &values):
+    array = np.empty(values.size(), dtype=np.int32)
+    cdef int[::1] view = array
+    if values.size() > 0:
+        memcpy(&view[0], values.data(), values.size() * sizeof(int))
+    return array
+
+@cython.binding
+def batch_backpropagate_array(int current_latent_state_index, float discount_factor, const float[::1] value_prefixs,
+                              const float[::1] values, const float[:, ::1] policies, MinMaxStatsList min_max_stats_lst,
+                              ResultsWrapper results, const int[::1] is_reset_list,
+                                const int[::1] to_play_batch):
+    # The same as ``batch_backpropagate``, which reads the contiguous float32/int32 arrays in place instead of
+    # converting the lists of python numbers.
+    cdef int num = results.cresults.num
+    assert value_prefixs.shape[0] == num and values.shape[0] == num and policies.shape[0] == num
+    assert to_play_batch.shape[0] == num and is_reset_list.shape[0] == num
+
+    cbatch_backpropagate(current_latent_state_index, discount_factor, &value_prefixs[0], &values[0], &policies[0, 0],
+                         policies.shape[1], min_max_stats_lst.cmin_max_stats_lst, results.cresults, &is_reset_list[0],
+                         &to_play_batch[0])
+
+@cython.binding
+def batch_traverse_array(Roots roots, int pb_c_base, float pb_c_init, float discount_factor,
+                         MinMaxStatsList min_max_stats_lst, ResultsWrapper results,
+                         const int[::1] virtual_to_play_batch):
+    # The same as ``batch_traverse``, which takes and returns int32 arrays instead of lists.
+    cdef vector[int] cvirtual_to_play_batch
+    cvirtual_to_play_batch.assign(&virtual_to_play_batch[0], &virtual_to_play_batch[0] + virtual_to_play_batch.shape[0])
+    cbatch_traverse(roots.roots, pb_c_base, pb_c_init, discount_factor, min_max_stats_lst.cmin_max_stats_lst,
+                    results.cresults, cvirtual_to_play_batch)
+
+    return (
+        _to_int32_array(results.cresults.latent_state_index_in_search_path),
+        _to_int32_array(results.cresults.latent_state_index_in_batch),
+        _to_int32_array(results.cresults.last_actions),
+        _to_int32_array(results.cresults.virtual_to_play_batchs),
+    )
@@ -50,6 +50,9 @@ namespace tree
         */
         this->prior = 0;
         this->legal_actions = legal_actions;
+        this->children = nullptr;
+        this->num_children = 0;
+        this->pool = nullptr;
 
         this->is_reset = 0;
         this->visit_count = 0;
@@ -71,6 +74,9 @@ namespace tree
         */
         this->prior = prior;
         this->legal_actions = legal_actions;
+        this->children = nullptr;
+        this->num_children = 0;
+        this->pool = nullptr;
 
         this->is_reset = 0;
         this->visit_count = 0;
@@ -86,6 +92,15 @@ namespace tree
     CNode::~CNode() {}
 
     void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const std::vector<float> &policy_logits)
+    {
+        /*
+        Overview:
+            Expand the child nodes of the current node, with the policy logits in a vector.
+        */
+        this->expand(to_play, current_latent_state_index, batch_index, value_prefix, policy_logits.data(), policy_logits.size());
+    }
+
+    void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const float *policy_logits, int action_num)
     {
         /*
         Overview:
@@ -96,13 +111,13 @@ namespace tree
             - batch_index: the y/second index of hidden state vector of the current node, i.e. the index of batch root node, its maximum is ``batch_size``/``env_num``.
             - value_prefix: the value prefix of the current node.
             - policy_logits: the policy logit of the child nodes.
+            - action_num: the number of the policy logits, i.e. the size of the action space.
         */
         this->to_play = to_play;
         this->current_latent_state_index = current_latent_state_index;
         this->batch_index = batch_index;
         this->value_prefix = value_prefix;
 
-        int action_num = policy_logits.size();
         if (this->legal_actions.size() == 0)
         {
             for (int i = 0; i < action_num; ++i)
@@ -136,12 +151,14 @@ namespace tree
             policy[a] = temp_policy;
         }
 
+        this->allocate_children(action_num);
         float prior;
         for (auto a : this->legal_actions)
         {
             prior = policy[a] / policy_sum;
             std::vector<int> tmp_empty;
             this->children[a] = CNode(prior, tmp_empty); // only for muzero/efficient zero, not support alphazero
+            this->children[a].pool = this->pool;
         }
         #ifdef _WIN32
         // 释放数组内存
@@ -222,7 +239,7 @@ namespace tree
         Overview:
             Return whether the current node is expanded.
         */
-        return this->children.size() > 0;
+        return this->num_children > 0;
     }
 
     float CNode::value()
@@ -296,6 +313,24 @@ namespace tree
         return &(this->children[action]);
     }
 
+    void CNode::allocate_children(int action_num)
+    {
+        /*
+        Overview:
+            Allocate the children of the current node as one block of ``action_num`` nodes indexed by action, from
+            the node pool of its tree. A node without a pool (i.e. not created by ``CRoots``) owns a pool of its own.
+        Arguments:
+            - action_num: the size of the action space.
+        */
+        if (this->pool == nullptr)
+        {
+            this->owned_pool = std::make_shared<tools::CNodePool<CNode> >();
+            this->pool = this->owned_pool.get();
+        }
+        this->children = this->pool->allocate(action_num);
+        this->num_children = action_num;
+    }
+
     //*********************************************************
 
     CRoots::CRoots()
@@ -319,9 +354,12 @@ namespace tree
         this->root_num = root_num;
         this->legal_actions_list = legal_actions_list;
 
+        // the search paths point to the roots, which must not be moved by a reallocation
+        this->roots.reserve(root_num);
         for (int i = 0; i < root_num; ++i)
         {
             this->roots.push_back(CNode(0, this->legal_actions_list[i]));
+            this->roots[i].pool = &(this->pool);
         }
     }
 
@@ -368,9 +406,44 @@ namespace tree
     {
         /*
         Overview:
-            Clear the roots vector.
+            Clear the roots vector and release their nodes.
         */
         this->roots.clear();
+        this->pool.reset();
+    }
+
+    void CRoots::reset(int root_num, std::vector<std::vector<int> > &legal_actions_list)
+    {
+        /*
+        Overview:
+            Replace the trees by new unexpanded roots, which reuse the node pool of the previous search, so no node
+            is allocated again once the pool is large enough.
+        Arguments:
+            - root_num: the number of the new roots.
+            - legal_action_list: the vector of the legal action of each new root.
+        */
+        this->clear();
+        this->root_num = root_num;
+        this->legal_actions_list = legal_actions_list;
+
+        this->roots.reserve(root_num);
+        for (int i = 0; i < root_num; ++i)
+        {
+            this->roots.push_back(CNode(0, this->legal_actions_list[i]));
+            this->roots[i].pool = &(this->pool);
+        }
+    }
+
+    void CRoots::reserve(int num_nodes)
+    {
+        /*
+        Overview:
+            Preallocate the node pool, e.g. ``(num_simulations + 1) * root_num * action_space_size`` nodes for a whole
+            search in which every simulation expands one leaf node of each root.
+        Arguments:
+            - num_nodes: the number of nodes to preallocate.
+        */
+        this->pool.reserve(num_nodes);
     }
 
     std::vector<std::vector<int> > CRoots::get_trajectories()
@@ -605,6 +678,26 @@ namespace tree
         }
     }
 
+    void cbatch_backpropagate(int current_latent_state_index, float discount_factor, const float *value_prefixs, const float *values, const float *policies, int action_num, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, const int *is_reset_list, const int *to_play_batch)
+    {
+        /*
+        Overview:
+            The same as the vector version of ``cbatch_backpropagate``, which reads the network outputs from contiguous
+            arrays (e.g. the buffers of numpy arrays) instead of copying them into vectors.
+        Arguments:
+            - policies: the row-major ``results.num x action_num`` array of the policy logits of the leaf nodes.
+            - action_num: the size of the action space.
+        */
+        for (int i = 0; i < results.num; ++i)
+        {
+            results.nodes[i]->expand(to_play_batch[i], current_latent_state_index, i, value_prefixs[i], policies + i * action_num, action_num);
+            // reset
+            results.nodes[i]->is_reset = is_reset_list[i];
+
+            cbackpropagate(results.search_paths[i], min_max_stats_lst->stats_lst[i], to_play_batch[i], values[i], discount_factor);
+        }
+    }
+
     int cselect_child(CNode *root, tools::CMinMaxStats &min_max_stats, int pb_c_base, float pb_c_init, float discount_factor, float mean_q, int players)
     {
         /*
@@ -4,6 +4,7 @@
 #define CNODE_H
 
 #include "../../common_lib/cminimax.h"
+#include "../../common_lib/cnode_pool.h"
 #include <math.h>
 #include <vector>
 #include <stack>
@@ -13,6 +14,7 @@
 #include <sys/timeb.h>
 #include <time.h>
 #include <map>
+#include <memory>
 
 const int DEBUG_MODE = 0;
 
@@ -23,7 +25,11 @@ namespace tree {
             float value_prefix, prior, value_sum;
             float parent_value_prefix;
             std::vector<int> children_index;
-            std::map<int, CNode> children;
+            // the children are a block of the node pool indexed by action, see ``allocate_children``
+            CNode *children;
+            int num_children;
+            tools::CNodePool<CNode> *pool;
+            std::shared_ptr<tools::CNodePool<CNode> > owned_pool;
 
             std::vector<int> legal_actions;
 
@@ -32,6 +38,7 @@ namespace tree {
             ~CNode();
 
             void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const std::vector<float> &policy_logits);
+            void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const float *policy_logits, int action_num);
             void add_exploration_noise(float exploration_fraction, const std::vector<float> &noises);
             float compute_mean_q(int isRoot, float parent_q, float discount_factor);
             void print_out();
@@ -43,6 +50,7 @@ namespace tree {
             std::vector<int> get_trajectory();
             std::vector<int> get_children_distribution();
             CNode* get_child(int action);
+            void allocate_children(int action_num);
     };
 
     class CRoots{
@@ -50,6 +58,7 @@ namespace tree {
             int root_num;
             std::vector<CNode> roots;
             std::vector<std::vector<int> > legal_actions_list;
+            tools::CNodePool<CNode> pool;
 
             CRoots();
             CRoots(int root_num, std::vector<std::vector<int> > &legal_actions_list);
@@ -58,6 +67,8 @@ namespace tree {
             void prepare(float root_noise_weight, const std::vector<std::vector<float> > &noises, const std::vector<float> &value_prefixs, const std::vector<std::vector<float> > &policies, std::vector<int> &to_play_batch);
             void prepare_no_noise(const std::vector<float> &value_prefixs, const std::vector<std::vector<float> > &policies, std::vector<int> &to_play_batch);
             void clear();
+            void reset(int root_num, std::vector<std::vector<int> > &legal_actions_list);
+            void reserve(int num_nodes);
             std::vector<std::vector<int> > get_trajectories();
             std::vector<std::vector<int> > get_distributions();
             std::vector<float> get_values();
@@ -83,6 +94,7 @@ namespace tree {
     void update_tree_q(CNode* root, tools::CMinMaxStats &min_max_stats, float discount_factor, int players);
     void cbackpropagate(std::vector<CNode*> &search_path, tools::CMinMaxStats &min_max_stats, int to_play, float value, float discount_factor);
     void cbatch_backpropagate(int current_latent_state_index, float discount_factor, const std::vector<float> &value_prefixs, const std::vector<float> &values, const std::vector<std::vector<float> > &policies, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, std::vector<int> is_reset_list, std::vector<int> &to_play_batch);
+    void cbatch_backpropagate(int current_latent_state_index, float discount_factor, const float *value_prefixs, const float *values, const float *policies, int action_num, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, const int *is_reset_list, const int *to_play_batch);
     int cselect_child(CNode* root, tools::CMinMaxStats &min_max_stats, int pb_c_base, float pb_c_init, float discount_factor, float mean_q, int players);
     float cucb_score(CNode *child, tools::CMinMaxStats &min_max_stats, float parent_mean_q, int is_reset, float total_children_visit_counts, float parent_value_prefix, float pb_c_base, float pb_c_init, float discount_factor, int players);
     void cbatch_traverse(CRoots *roots, int pb_c_base, float pb_c_init, float discount_factor, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, std::vector<int> &virtual_to_play_batch);
@@ -59,6 +59,8 @@ cdef extern from "lib/cnode.h" namespace "tree":
         void prepare(float root_noise_weight, const vector[vector[float]] &noises, const vector[float] &value_prefixs, const vector[float] &values, const vector[vector[float]] &policies, vector[int] to_play_batch)
         void prepare_no_noise(const vector[float] &value_prefixs, const vector[float] &values, const vector[vector[float]] &policies, vector[int] to_play_batch)
         void clear()
+        void reset(int root_num, vector[vector[int]] &legal_actions_list)
+        void reserve(int num_nodes)
         vector[vector[int]] get_trajectories()
         vector[vector[int]] get_distributions()
         vector[vector[float]] get_children_values(float discount, int action_space_size)
@@ -57,6 +57,14 @@ cdef class Roots:
     def clear(self):
         self.roots[0].clear()
 
+    def reset(self, int root_num, vector[vector[int]] legal_actions_list):
+        # reuse the nodes of the previous search for the new roots
+        self.root_num = root_num
+        self.roots[0].reset(root_num, legal_actions_list)
+
+    def reserve(self, int num_nodes):
+        self.roots[0].reserve(num_nodes)
+
     def __dealloc__(self):
         del self.roots
 
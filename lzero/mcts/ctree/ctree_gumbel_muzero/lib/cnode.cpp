@@ -50,6 +50,9 @@ namespace tree{
         */
         this->prior = 0;
         this->legal_actions = legal_actions;
+        this->children = nullptr;
+        this->num_children = 0;
+        this->pool = nullptr;
 
         this->visit_count = 0;
         this->value_sum = 0;
@@ -74,6 +77,9 @@ namespace tree{
         */
         this->prior = prior;
         this->legal_actions = legal_actions;
+        this->children = nullptr;
+        this->num_children = 0;
+        this->pool = nullptr;
 
         this->visit_count = 0;
         this->value_sum = 0;
@@ -141,11 +147,13 @@ namespace tree{
             policy[a] = temp_policy;
         }
 
+        this->allocate_children(action_num);
         float prior;
         for(auto a: this->legal_actions){
             prior = policy[a] / policy_sum;
             std::vector<int> tmp_empty;
             this->children[a] = CNode(prior, tmp_empty); // only for muzero/efficient zero, not support alphazero
+            this->children[a].pool = this->pool;
         }
 
         #ifdef _WIN32
@@ -239,7 +247,7 @@ namespace tree{
         Overview:
             Return whether the current node is expanded.
         */
-        return this->children.size() > 0;
+        return this->num_children > 0;
     }
 
     float CNode::value()
@@ -348,6 +356,24 @@ namespace tree{
         return &(this->children[action]);
     }
 
+    void CNode::allocate_children(int action_num)
+    {
+        /*
+        Overview:
+            Allocate the children of the current node as one block of ``action_num`` nodes indexed by action, from
+            the node pool of its tree. A node without a pool (i.e. not created by ``CRoots``) owns a pool of its own.
+        Arguments:
+            - action_num: the size of the action space.
+        */
+        if (this->pool == nullptr)
+        {
+            this->owned_pool = std::make_shared<tools::CNodePool<CNode> >();
+            this->pool = this->owned_pool.get();
+        }
+        this->children = this->pool->allocate(action_num);
+        this->num_children = action_num;
+    }
+
     //*********************************************************
     // Gumbel Muzero related code
     //*********************************************************
@@ -407,9 +433,12 @@ namespace tree{
         this->root_num = root_num;
         this->legal_actions_list = legal_actions_list;
 
+        // the search paths point to the roots, which must not be moved by a reallocation
+        this->roots.reserve(root_num);
         for (int i = 0; i < root_num; ++i)
         {
             this->roots.push_back(CNode(0, this->legal_actions_list[i]));
+            this->roots[i].pool = &(this->pool);
         }
     }
 
@@ -458,9 +487,44 @@ namespace tree{
     {
         /*
         Overview:
-            Clear the roots vector.
+            Clear the roots vector and release their nodes.
         */
         this->roots.clear();
+        this->pool.reset();
+    }
+
+    void CRoots::reset(int root_num, std::vector<std::vector<int> > &legal_actions_list)
+    {
+        /*
+        Overview:
+            Replace the trees by new unexpanded roots, which reuse the node pool of the previous search, so no node
+            is allocated again once the pool is large enough.
+        Arguments:
+            - root_num: the number of the new roots.
+            - legal_action_list: the vector of the legal action of each new root.
+        */
+        this->clear();
+        this->root_num = root_num;
+        this->legal_actions_list = legal_actions_list;
+
+        this->roots.reserve(root_num);
+        for (int i = 0; i < root_num; ++i)
+        {
+            this->roots.push_back(CNode(0, this->legal_actions_list[i]));
+            this->roots[i].pool = &(this->pool);
+        }
+    }
+
+    void CRoots::reserve(int num_nodes)
+    {
+        /*
+        Overview:
+            Preallocate the node pool, e.g. ``(num_simulations + 1) * root_num * action_space_size`` nodes for a whole
+            search in which every simulation expands one leaf node of each root.
+        Arguments:
+            - num_nodes: the number of nodes to preallocate.
+        */
+        this->pool.reserve(num_nodes);
     }
 
     std::vector<std::vector<int> > CRoots::get_trajectories()
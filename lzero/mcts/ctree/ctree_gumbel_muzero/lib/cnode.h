@@ -4,6 +4,7 @@
 #define CNODE_H
 
 #include "./../common_lib/cminimax.h"
+#include "./../common_lib/cnode_pool.h"
 #include <math.h>
 #include <vector>
 #include <stack>
@@ -13,6 +14,7 @@
 #include <sys/timeb.h>
 #include <sys/time.h>
 #include <map>
+#include <memory>
 
 const int DEBUG_MODE = 0;
 
@@ -23,7 +25,11 @@ namespace tree {
             int visit_count, to_play, current_latent_state_index, batch_index, best_action;
             float reward, prior, value_sum, raw_value, gumbel_scale, gumbel_rng;
             std::vector<int> children_index;
-            std::map<int, CNode> children;
+            // the children are a block of the node pool indexed by action, see ``allocate_children``
+            CNode *children;
+            int num_children;
+            tools::CNodePool<CNode> *pool;
+            std::shared_ptr<tools::CNodePool<CNode> > owned_pool;
 
             std::vector<int> legal_actions;
             std::vector<float> gumbel;
@@ -47,6 +53,7 @@ namespace tree {
             std::vector<float> get_children_value(float discount_factor, int action_space_size);
             std::vector<float> get_policy(float discount, int action_space_size);
             CNode* get_child(int action);
+            void allocate_children(int action_num);
     };
 
     class CRoots{
@@ -54,6 +61,7 @@ namespace tree {
             int root_num;
             std::vector<CNode> roots;
             std::vector<std::vector<int> > legal_actions_list;
+            tools::CNodePool<CNode> pool;
 
             CRoots();
             CRoots(int root_num, std::vector<std::vector<int> > &legal_actions_list);
@@ -62,6 +70,8 @@ namespace tree {
             void prepare(float root_noise_weight, const std::vector<std::vector<float> > &noises, const std::vector<float> &rewards, const std::vector<float> &values, const std::vector<std::vector<float> > &policies, std::vector<int> &to_play_batch);
             void prepare_no_noise(const std::vector<float> &rewards, const std::vector<float> &values, const std::vector<std::vector<float> > &policies, std::vector<int> &to_play_batch);
             void clear();
+            void reset(int root_num, std::vector<std::vector<int> > &legal_actions_list);
+            void reserve(int num_nodes);
             std::vector<std::vector<int> > get_trajectories();
             std::vector<std::vector<int> > get_distributions();
             std::vector<std::vector<float> > get_children_values(float discount, int action_space_size);
@@ -50,6 +50,9 @@ namespace tree
         */
         this->prior = 0;
         this->legal_actions = legal_actions;
+        this->children = nullptr;
+        this->num_children = 0;
+        this->pool = nullptr;
 
         this->visit_count = 0;
         this->value_sum = 0;
@@ -69,6 +72,9 @@ namespace tree
         */
         this->prior = prior;
         this->legal_actions = legal_actions;
+        this->children = nullptr;
+        this->num_children = 0;
+        this->pool = nullptr;
 
         this->visit_count = 0;
         this->value_sum = 0;
@@ -81,6 +87,15 @@ namespace tree
     CNode::~CNode() {}
 
     void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float reward, const std::vector<float> &policy_logits)
+    {
+        /*
+        Overview:
+            Expand the child nodes of the current node, with the policy logits in a vector.
+        */
+        this->expand(to_play, current_latent_state_index, batch_index, reward, policy_logits.data(), policy_logits.size());
+    }
+
+    void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float reward, const float *policy_logits, int action_num)
     {
         /*
         Overview:
@@ -91,13 +106,13 @@ namespace tree
             - batch_index: The index of latent state of the leaf node in the search path of the current node.
             - reward: the reward of the current node.
             - policy_logits: the logit of the child nodes.
+            - action_num: the number of the policy logits, i.e. the size of the action space.
         */
         this->to_play = to_play;
         this->current_latent_state_index = current_latent_state_index;
         this->batch_index = batch_index;
         this->reward = reward;
 
-        int action_num = policy_logits.size();
         if (this->legal_actions.size() == 0)
         {
             for (int i = 0; i < action_num; ++i)
@@ -131,12 +146,14 @@ namespace tree
             policy[a] = temp_policy;
         }
 
+        this->allocate_children(action_num);
         float prior;
         for (auto a : this->legal_actions)
         {
             prior = policy[a] / policy_sum;
             std::vector<int> tmp_empty;
             this->children[a] = CNode(prior, tmp_empty); // only for muzero/efficient zero, not support alphazero
+            this->children[a].pool = this->pool;
         }
         
         #ifdef _WIN32
@@ -213,7 +230,7 @@ namespace tree
         Overview:
             Return whether the current node is expanded.
         */
-        return this->children.size() > 0;
+        return this->num_children > 0;
     }
 
     float CNode::value()
@@ -287,6 +304,24 @@ namespace tree
         return &(this->children[action]);
     }
 
+    void CNode::allocate_children(int action_num)
+    {
+        /*
+        Overview:
+            Allocate the children of the current node as one block of ``action_num`` nodes indexed by action, from
+            the node pool of its tree. A node without a pool (i.e. not created by ``CRoots``) owns a pool of its own.
+        Arguments:
+            - action_num: the size of the action space.
+        */
+        if (this->pool == nullptr)
+        {
+            this->owned_pool = std::make_shared<tools::CNodePool<CNode> >();
+            this->pool = this->owned_pool.get();
+        }
+        this->children = this->pool->allocate(action_num);
+        this->num_children = action_num;
+    }
+
     //*********************************************************
 
     CRoots::CRoots()
@@ -310,9 +345,12 @@ namespace tree
         this->root_num = root_num;
         this->legal_actions_list = legal_actions_list;
 
+        // the search paths point to the roots, which must not be moved by a reallocation
+        this->roots.reserve(root_num);
         for (int i = 0; i < root_num; ++i)
         {
             this->roots.push_back(CNode(0, this->legal_actions_list[i]));
+            this->roots[i].pool = &(this->pool);
         }
     }
 
@@ -361,9 +399,107 @@ namespace tree
     {
         /*
         Overview:
-            Clear the roots vector.
+            Clear the roots vector and release their nodes.
         */
         this->roots.clear();
+        this->pool.reset();
+    }
+
+    void CRoots::reset(int root_num, std::vector<std::vector<int> > &legal_actions_list)
+    {
+        /*
+        Overview:
+            Replace the trees by new unexpanded roots, which reuse the node pool of the previous search, so no node
+            is allocated again once the pool is large enough.
+        Arguments:
+            - root_num: the number of the new roots.
+            - legal_action_list: the vector of the legal action of each new root.
+        */
+        this->clear();
+        this->root_num = root_num;
+        this->legal_actions_list = legal_actions_list;
+
+        this->roots.reserve(root_num);
+        for (int i = 0; i < root_num; ++i)
+        {
+            this->roots.push_back(CNode(0, this->legal_actions_list[i]));
+            this->roots[i].pool = &(this->pool);
+        }
+    }
+
+    void CRoots::reserve(int num_nodes)
+    {
+        /*
+        Overview:
+            Preallocate the node pool, e.g. ``(num_simulations + 1) * root_num * action_space_size`` nodes for a whole
+            search in which every simulation expands one leaf node of each root.
+        Arguments:
+            - num_nodes: the number of nodes to preallocate.
+        */
+        this->pool.reserve(num_nodes);
+    }
+
+    void CRoots::reuse_subtree(int index, CNode *node, std::vector<int> &reused_latent_state_index_in_search_path, std::vector<int> &reused_latent_state_index_in_batch)
+    {
+        /*
+        Overview:
+            Copy the statistics and the subtrees of the children of ``node``, a node of the tree of the previous search,
+            to the children of the prepared root ``index``, whose priors are kept. The copied nodes are allocated from
+            the pool of the roots, so they outlive the tree of the previous search. The expanded copied nodes are
+            numbered ``(1, index), (2, index), ...`` and the indices of their latent states in the previous search are
+            appended to the two output vectors in the same order.
+        Arguments:
+            - index: the index of the prepared root.
+            - node: the node of the previous search, i.e. the child of the chosen action of the previous root.
+            - reused_latent_state_index_in_search_path: the first indices of the latent states of the copied nodes.
+            - reused_latent_state_index_in_batch: the second indices of the latent states of the copied nodes.
+        */
+        CNode *root = &(this->roots[index]);
+        if (!node->expanded() || !root->expanded())
+        {
+            return;
+        }
+        int reused_visit_count = 0;
+        std::vector<std::pair<CNode *, CNode *> > stack;
+        for (auto a : root->legal_actions)
+        {
+            if (a < node->num_children)
+            {
+                stack.push_back(std::make_pair(node->get_child(a), root->get_child(a)));
+                reused_visit_count += node->get_child(a)->visit_count;
+            }
+        }
+        while (stack.size() > 0)
+        {
+            CNode *source = stack.back().first;
+            CNode *target = stack.back().second;
+            stack.pop_back();
+
+            target->visit_count = source->visit_count;
+            target->value_sum = source->value_sum;
+            target->best_action = source->best_action;
+            target->to_play = source->to_play;
+            target->reward = source->reward;
+            if (!source->expanded())
+            {
+                continue;
+            }
+            reused_latent_state_index_in_search_path.push_back(source->current_latent_state_index);
+            reused_latent_state_index_in_batch.push_back(source->batch_index);
+            target->current_latent_state_index = reused_latent_state_index_in_search_path.size();
+            target->batch_index = index;
+            target->legal_actions = source->legal_actions;
+            target->allocate_children(source->num_children);
+            for (auto a : source->legal_actions)
+            {
+                target->children[a].prior = source->children[a].prior;
+                target->children[a].pool = target->pool;
+                stack.push_back(std::make_pair(source->get_child(a), target->get_child(a)));
+            }
+        }
+        // the visit of the preparation of the root has no value, as in a new search
+        root->visit_count += reused_visit_count;
+        root->value_sum += node->value() * reused_visit_count;
     }
 
     std::vector<std::vector<int> > CRoots::get_trajectories()
@@ -548,6 +684,23 @@ namespace tree
         }
     }
 
+    void cbatch_backpropagate(int current_latent_state_index, float discount_factor, const float *rewards, const float *values, const float *policies, int action_num, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, const int *to_play_batch)
+    {
+        /*
+        Overview:
+            The same as the vector version of ``cbatch_backpropagate``, which reads the network outputs from contiguous
+            arrays (e.g. the buffers of numpy arrays) instead of copying them into vectors.
+        Arguments:
+            - policies: the row-major ``results.num x action_num`` array of the policy logits of the leaf nodes.
+            - action_num: the size of the action space.
+        */
+        for (int i = 0; i < results.num; ++i)
+        {
+            results.nodes[i]->expand(to_play_batch[i], current_latent_state_index, i, rewards[i], policies + i * action_num, action_num);
+            cbackpropagate(results.search_paths[i], min_max_stats_lst->stats_lst[i], to_play_batch[i], values[i], discount_factor);
+        }
+    }
+
     int cselect_child(CNode *root, tools::CMinMaxStats &min_max_stats, int pb_c_base, float pb_c_init, float discount_factor, float mean_q, int players)
     {
         /*
@@ -712,4 +865,145 @@ namespace tree
         }
     }
 
-}
\ No newline at end of file
+    void cadd_virtual_loss(std::vector<CNode *> &search_path, float virtual_loss, int players, int sign)
+    {
+        /*
+        Overview:
+            Add (sign 1) or remove (sign -1) a virtual loss along the search path, i.e. a virtual visit of every node and
+            a loss of ``virtual_loss`` in the value of every node except the root, which makes the path less attractive
+            to the next selections until the real value of its leaf node is backpropagated.
+        Arguments:
+            - search_path: a vector of nodes on the search path.
+            - virtual_loss: the value of the virtual loss.
+            - players: the number of players.
+            - sign: 1 to add the virtual loss, -1 to remove it.
+        */
+        // in self-play-mode, the parent selects the child by the negative value of the child
+        float loss = players == 1 ? -virtual_loss : virtual_loss;
+        int path_len = search_path.size();
+        for (int i = 0; i < path_len; ++i)
+        {
+            search_path[i]->visit_count += sign;
+            if (i > 0)
+            {
+                search_path[i]->value_sum += sign * loss;
+            }
+        }
+    }
+
+    void cbatch_traverse_with_virtual_loss(CRoots *roots, int num_leaves, float virtual_loss, int pb_c_base, float pb_c_init, float discount_factor, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, std::vector<int> &virtual_to_play_batch)
+    {
+        /*
+        Overview:
+            Search ``num_leaves`` node paths from each root, where each selected path gets a virtual loss, so the
+            following selections of the same root spread over different leaf nodes. The result ``k * root_num + i``
+            is the k-th path of the root i, and ``results.num`` must be ``num_leaves * root_num``.
+        Arguments:
+            - roots: the roots that search from.
+            - num_leaves: the number of leaf nodes to select from each root.
+            - virtual_loss: the value of the virtual loss.
+            - pb_c_base: constants c2 in muzero.
+            - pb_c_init: constants c1 in muzero.
+            - disount_factor: the discount factor of reward.
+            - min_max_stats: a tool used to min-max normalize the score.
+            - results: the search results.
+            - virtual_to_play_batch: the batch of which player is playing on each root.
+        */
+        // set seed
+        get_time_and_set_rand_seed();
+
+        results.search_lens = std::vector<int>();
+
+        int players = 0;
+        int largest_element = *max_element(virtual_to_play_batch.begin(), virtual_to_play_batch.end()); // 0 or 2
+        if (largest_element == -1)
+            players = 1;
+        else
+            players = 2;
+
+        for (int k = 0; k < num_leaves; ++k)
+        {
+            for (int i = 0; i < roots->root_num; ++i)
+            {
+                int j = k * roots->root_num + i;
+                int to_play = virtual_to_play_batch[i];
+                int last_action = -1;
+                float parent_q = 0.0;
+                CNode *node = &(roots->roots[i]);
+                int is_root = 1;
+                int search_len = 0;
+                results.search_paths[j].push_back(node);
+
+                while (node->expanded())
+                {
+                    float mean_q = node->compute_mean_q(is_root, parent_q, discount_factor);
+                    is_root = 0;
+                    parent_q = mean_q;
+
+                    int action = cselect_child(node, min_max_stats_lst->stats_lst[i], pb_c_base, pb_c_init, discount_factor, mean_q, players);
+                    if (players > 1)
+                    {
+                        assert(to_play == 1 || to_play == 2);
+                        if (to_play == 1)
+                            to_play = 2;
+                        else
+                            to_play = 1;
+                    }
+
+                    node->best_action = action;
+                    // next
+                    node = node->get_child(action);
+                    last_action = action;
+                    results.search_paths[j].push_back(node);
+                    search_len += 1;
+                }
+
+                CNode *parent = results.search_paths[j][results.search_paths[j].size() - 2];
+
+                results.latent_state_index_in_search_path.push_back(parent->current_latent_state_index);
+                results.latent_state_index_in_batch.push_back(parent->batch_index);
+
+                results.last_actions.push_back(last_action);
+                results.search_lens.push_back(search_len);
+                results.nodes.push_back(node);
+                results.virtual_to_play_batchs.push_back(to_play);
+
+                cadd_virtual_loss(results.search_paths[j], virtual_loss, players, 1);
+            }
+        }
+    }
+
+    void cbatch_backpropagate_with_virtual_loss(int current_latent_state_index, float discount_factor, const float *rewards, const float *values, const float *policies, int action_num, float virtual_loss, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, const int *to_play_batch)
+    {
+        /*
+        Overview:
+            Remove the virtual losses of the paths selected by ``cbatch_traverse_with_virtual_loss``, then expand their
+            leaf nodes and update the infos along the paths as ``cbatch_backpropagate``. A leaf node selected by
+            several paths is expanded once, and the values of all these paths are backpropagated.
+        Arguments:
+            - current_latent_state_index: The index of latent state of the leaf node in the search path.
+            - discount_factor: the discount factor of reward.
+            - rewards: the rewards of the leaf nodes.
+            - values: the values to propagate along the search paths.
+            - policies: the row-major ``results.num x action_num`` array of the policy logits of the leaf nodes.
+            - action_num: the size of the action space.
+            - virtual_loss: the value of the virtual loss added by the traversal.
+            - min_max_stats: a tool used to min-max normalize the q value.
+            - results: the search results.
+            - to_play_batch: the batch of which player is playing on the leaf nodes.
+        */
+        for (int j = 0; j < results.num; ++j)
+        {
+            cadd_virtual_loss(results.search_paths[j], virtual_loss, to_play_batch[j] == -1 ? 1 : 2, -1);
+        }
+        for (int j = 0; j < results.num; ++j)
+        {
+            if (!results.nodes[j]->expanded())
+            {
+                results.nodes[j]->expand(to_play_batch[j], current_latent_state_index, j, rewards[j], policies + j * action_num, action_num);
+            }
+            cbackpropagate(results.search_paths[j], min_max_stats_lst->stats_lst[j % min_max_stats_lst->num], to_play_batch[j], values[j], discount_factor);
+        }
+    }
+
+}
@@ -33,7 +33,7 @@ cdef extern from "lib/cnode.h" namespace "tree":
     cdef cppclass CNode:
         CNode() except +
         CNode(float prior, vector[int] &legal_actions) except +
-        int visit_count, to_play, current_latent_state_index, batch_index, best_action
+        int visit_count, to_play, current_latent_state_index, batch_index, best_action, num_children
         float value_prefixs, prior, value_sum, parent_value_prefix
 
         void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefixs, vector[float] policy_logits)
@@ -55,6 +55,10 @@ cdef extern from "lib/cnode.h" namespace "tree":
         void prepare(float root_noise_weight, const vector[vector[float]] &noises, const vector[float] &value_prefixs, const vector[vector[float]] &policies, vector[int] to_play_batch)
         void prepare_no_noise(const vector[float] &value_prefixs, const vector[vector[float]] &policies, vector[int] to_play_batch)
         void clear()
+        void reset(int root_num, vector[vector[int]] &legal_actions_list)
+        void reserve(int num_nodes)
+        void reuse_subtree(int index, CNode *node, vector[int] &reused_latent_state_index_in_search_path,
+                           vector[int] &reused_latent_state_index_in_batch)
         vector[vector[int]] get_trajectories()
         vector[vector[int]] get_distributions()
         vector[float] get_values()
@@ -70,4 +74,14 @@ cdef extern from "lib/cnode.h" namespace "tree":
     cdef void cbackpropagate(vector[CNode*] &search_path, CMinMaxStats &min_max_stats, int to_play, float value, float discount_factor)
     void cbatch_backpropagate(int current_latent_state_index, float discount_factor, vector[float] value_prefixs, vector[float] values, vector[vector[float]] policies,
                                CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, vector[int] &to_play_batch)
+    void cbatch_backpropagate(int current_latent_state_index, float discount_factor, const float *rewards, const float *values,
+                              const float *policies, int action_num, CMinMaxStatsList *min_max_stats_lst,
+                              CSearchResults &results, const int *to_play_batch)
     void cbatch_traverse(CRoots *roots, int pb_c_base, float pb_c_init, float discount_factor, CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, vector[int] &virtual_to_play_batch)
+    void cbatch_traverse_with_virtual_loss(CRoots *roots, int num_leaves, float virtual_loss, int pb_c_base, float pb_c_init,
+                                           float discount_factor, CMinMaxStatsList *min_max_stats_lst,
+                                           CSearchResults &results, vector[int] &virtual_to_play_batch)
+    void cbatch_backpropagate_with_virtual_loss(int current_latent_state_index, float discount_factor, const float *rewards,
+                                                const float *values, const float *policies, int action_num,
+                                                float virtual_loss, CMinMaxStatsList *min_max_stats_lst,
+                                                CSearchResults &results, const int *to_play_batch)
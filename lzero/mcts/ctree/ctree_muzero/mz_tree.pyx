@@ -1,7 +1,10 @@
 # distutils: language=c++
 # cython:language_level=3
+from libc.string cimport memcpy
 from libcpp.vector cimport vector
 
+import numpy as np
+
 cdef class MinMaxStatsList:
     cdef CMinMaxStatsList *cmin_max_stats_lst
 
@@ -50,6 +53,26 @@ cdef class Roots:
     def clear(self):
         self.roots[0].clear()
 
+    def reset(self, int root_num, vector[vector[int]] legal_actions_list):
+        # reuse the nodes of the previous search for the new roots
+        self.root_num = root_num
+        self.roots[0].reset(root_num, legal_actions_list)
+
+    def reserve(self, int num_nodes):
+        self.roots[0].reserve(num_nodes)
+
+    def reuse_subtree(self, int index, Roots roots, int root_index, int action):
+        # copy the subtree of the child ``action`` of the root ``root_index`` of ``roots`` to the prepared root
+        # ``index``, and return the indices of the latent states of the copied expanded nodes in the search of ``roots``
+        assert 0 <= index < self.root_num and 0 <= root_index < roots.root_num
+        cdef CNode *root = &roots.roots[0].roots[root_index]
+        cdef vector[int] latent_state_index_in_search_path, latent_state_index_in_batch
+        if 0 <= action < root.num_children:
+            self.roots[0].reuse_subtree(
+                index, root.get_child(action), latent_state_index_in_search_path, latent_state_index_in_batch
+            )
+        return _to_int32_array(latent_state_index_in_search_path), _to_int32_array(latent_state_index_in_batch)
+
     def __dealloc__(self):
         del self.roots
 
@@ -87,3 +110,72 @@ def batch_traverse(Roots roots, int pb_c_base, float pb_c_init, float discount_f
                     virtual_to_play_batch)
 
     return results.cresults.latent_state_index_in_search_path, results.cresults.latent_state_index_in_batch, results.cresults.last_actions, results.cresults.virtual_to_play_batchs
+
+
+cdef _to_int32_array(vector[int] &values):
+    array = np.empty(values.size(), dtype=np.int32)
+    cdef int[::1] view = array
+    if values.size() > 0:
+        memcpy(&view[0], values.data(), values.size() * sizeof(int))
+    return array
+
+def batch_backpropagate_array(int current_latent_state_index, float discount_factor, const float[::1] value_prefixs,
+                              const float[::1] values, const float[:, ::1] policies, MinMaxStatsList min_max_stats_lst,
+                              ResultsWrapper results, const int[::1] to_play_batch):
+    # The same as ``batch_backpropagate``, which reads the contiguous float32/int32 arrays in place instead of
+    # converting the lists of python numbers.
+    cdef int num = results.cresults.num
+    assert value_prefixs.shape[0] == num and values.shape[0] == num and policies.shape[0] == num
+    assert to_play_batch.shape[0] == num
+
+    cbatch_backpropagate(current_latent_state_index, discount_factor, &value_prefixs[0], &values[0], &policies[0, 0],
+                         policies.shape[1], min_max_stats_lst.cmin_max_stats_lst, results.cresults,
+                         &to_play_batch[0])
+
+def batch_traverse_array(Roots roots, int pb_c_base, float pb_c_init, float discount_factor,
+                         MinMaxStatsList min_max_stats_lst, ResultsWrapper results,
+                         const int[::1] virtual_to_play_batch):
+    # The same as ``batch_traverse``, which takes and returns int32 arrays instead of lists.
+    cdef vector[int] cvirtual_to_play_batch
+    cvirtual_to_play_batch.assign(&virtual_to_play_batch[0], &virtual_to_play_batch[0] + virtual_to_play_batch.shape[0])
+    cbatch_traverse(roots.roots, pb_c_base, pb_c_init, discount_factor, min_max_stats_lst.cmin_max_stats_lst,
+                    results.cresults, cvirtual_to_play_batch)
+
+    return (
+        _to_int32_array(results.cresults.latent_state_index_in_search_path),
+        _to_int32_array(results.cresults.latent_state_index_in_batch),
+        _to_int32_array(results.cresults.last_actions),
+        _to_int32_array(results.cresults.virtual_to_play_batchs),
+    )
+
+def batch_backpropagate_with_virtual_loss(int current_latent_state_index, float discount_factor,
+                                          const float[::1] rewards, const float[::1] values,
+                                          const float[:, ::1] policies, float virtual_loss,
+                                          MinMaxStatsList min_max_stats_lst, ResultsWrapper results,
+                                          const int[::1] to_play_batch):
+    # The counterpart of ``batch_traverse_with_virtual_loss``, which removes the virtual losses before backpropagating.
+    cdef int num = results.cresults.num
+    assert rewards.shape[0] == num and values.shape[0] == num and policies.shape[0] == num
+    assert to_play_batch.shape[0] == num
+
+    cbatch_backpropagate_with_virtual_loss(current_latent_state_index, discount_factor, &rewards[0], &values[0],
+                                           &policies[0, 0], policies.shape[1], virtual_loss,
+                                           min_max_stats_lst.cmin_max_stats_lst, results.cresults, &to_play_batch[0])
+
+def batch_traverse_with_virtual_loss(Roots roots, int num_leaves, float virtual_loss, int pb_c_base, float pb_c_init,
+                                     float discount_factor, MinMaxStatsList min_max_stats_lst, ResultsWrapper results,
+                                     const int[::1] virtual_to_play_batch):
+    # Select ``num_leaves`` leaf nodes of each root with virtual losses, where ``results`` holds
+    # ``num_leaves * roots.num`` results, and the result ``k * roots.num + i`` is the k-th leaf node of the root i.
+    assert results.cresults.num == num_leaves * roots.root_num
+    cdef vector[int] cvirtual_to_play_batch
+    cvirtual_to_play_batch.assign(&virtual_to_play_batch[0], &virtual_to_play_batch[0] + virtual_to_play_batch.shape[0])
+    cbatch_traverse_with_virtual_loss(roots.roots, num_leaves, virtual_loss, pb_c_base, pb_c_init, discount_factor,
+                                      min_max_stats_lst.cmin_max_stats_lst, results.cresults, cvirtual_to_play_batch)
+
+    return (
+        _to_int32_array(results.cresults.latent_state_index_in_search_path),
+        _to_int32_array(results.cresults.latent_state_index_in_batch),
+        _to_int32_array(results.cresults.last_actions),
+        _to_int32_array(results.cresults.virtual_to_play_batchs),
+    )
@@ -211,6 +211,51 @@ class Roots:
 
             self.roots[i].visit_count += 1
 
+    def reuse_subtree(self, index: int, roots: "Roots", root_index: int, action: int) -> Tuple[List[int], List[int]]:
+        """
+        Overview:
+            Copy the statistics and the subtrees of the children of the child ``action`` of the root ``root_index`` of
+            ``roots``, i.e. the roots of the previous search, to the children of the prepared root ``index``, whose
+            priors are kept. The expanded copied nodes are numbered ``(1, index), (2, index), ...``.
+        Arguments:
+            - index (:obj:`int`): the index of the prepared root.
+            - roots (:obj:`Roots`): the roots of the previous search.
+            - root_index (:obj:`int`): the index of the root in ``roots``.
+            - action (:obj:`int`): the action chosen at the root of the previous search.
+        Returns:
+            - latent_state_index_in_search_path (:obj:`list`): the first indices of the latent states of the copied \
+                expanded nodes in the previous search.
+            - latent_state_index_in_batch (:obj:`list`): the second indices of the latent states of the copied \
+                expanded nodes in the previous search.
+        """
+        latent_state_index_in_search_path, latent_state_index_in_batch = [], []
+        root, node = self.roots[index], roots.roots[root_index].children.get(int(action))
+        if node is None or not node.expanded or not root.expanded:
+            return latent_state_index_in_search_path, latent_state_index_in_batch
+        stack = [(node.get_child(a), root.get_child(a)) for a in root.legal_actions if int(a) in node.children]
+        reused_visit_count = sum(source.visit_count for source, _ in stack)
+        while stack:
+            source, target = stack.pop()
+            target.visit_count = source.visit_count
+            target.value_sum = source.value_sum
+            target.best_action = source.best_action
+            target.to_play = source.to_play
+            target.reward = source.reward
+            if not source.expanded:
+                continue
+            latent_state_index_in_search_path.append(source.simulation_index)
+            latent_state_index_in_batch.append(source.batch_index)
+            target.simulation_index = len(latent_state_index_in_search_path)
+            target.batch_index = index
+            target.legal_actions = source.legal_actions
+            for a, child in source.children.items():
+                target.children[a] = Node(child.prior)
+                stack.append((child, target.children[a]))
+        # the visit of the preparation of the root has no value, as in a new search
+        root.visit_count += reused_visit_count
+        root.value_sum += node.value * reused_visit_count
+        return latent_state_index_in_search_path, latent_state_index_in_batch
+
     def clear(self) -> None:
         self.roots.clear()
 
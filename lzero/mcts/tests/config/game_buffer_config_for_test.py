@@ -0,0 +1,158 @@
+from typing import List, Tuple
+
+import numpy as np
+import torch
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.model.efficientzero_model_mlp import EfficientZeroModelMLP
+from lzero.model.muzero_model_mlp import MuZeroModelMLP
+
+# The config of the game buffer and the game segments used in the buffer unit tests.
+game_buffer_config = dict(
+    model=dict(
+        model_type='mlp',
+        continuous_action_space=False,
+        observation_shape=4,
+        action_space_size=3,
+        image_channel=1,
+        frame_stack_num=2,
+        support_scale=10,
+        categorical_distribution=True,
+    ),
+    env_type='not_board_games',
+    device='cpu',
+    mcts_ctree=True,
+    sampled_algo=False,
+    gumbel_algo=False,
+    use_ture_chance_label_in_chance_encoder=False,
+    transform2string=False,
+    gray_scale=False,
+    game_segment_length=8,
+    num_unroll_steps=3,
+    td_steps=4,
+    discount_factor=0.9,
+    lstm_horizon_len=5,
+    batch_size=6,
+    reanalyze_ratio=0.,
+    replay_buffer_size=int(1e3),
+    use_priority=True,
+    priority_prob_alpha=0.6,
+    priority_prob_beta=0.4,
+    root_dirichlet_alpha=0.3,
+    root_noise_weight=0.25,
+    num_simulations=4,
+)
+game_buffer_config = EasyDict(game_buffer_config)
+
+
+def make_game_segments(
+        config: EasyDict,
+        num_of_episodes: int = 2,
+        seed: int = 0,
+        game_segment_type: type = GameSegment
+) -> Tuple[List[GameSegment], List[dict]]:
+    """
+    Overview:
+        Generate the game segments of ``num_of_episodes`` random episodes in the same way as ``MuZeroCollector``:
+        every episode is split into segments of ``game_segment_length`` transitions, the unfinished segments are
+        padded with the leading data of the next segment, and the last segment of each episode is shorter and done.
+        For board games, ``to_play`` alternates between 1 and 2 and the legal actions are random.
+    Returns:
+        - game_segments (:obj:`List[GameSegment]`): the game segments, which are converted by ``game_segment_to_array``.
+        - metas (:obj:`List[dict]`): the meta information used in ``GameBuffer.push_game_segments``.
+    """
+    rng = np.random.RandomState(seed)
+    action_space_size = config.model.action_space_size
+    stack, unroll, td = config.model.frame_stack_num, config.num_unroll_steps, config.td_steps
+    board_games = config.env_type == 'board_games'
+    game_segments, metas = [], []
+    for _ in range(num_of_episodes):
+        episode_len = rng.randint(2, 3) * config.game_segment_length + rng.randint(1, config.game_segment_length)
+        obs = [rng.randn(config.model.observation_shape).astype(np.float32) for _ in range(episode_len + stack)]
+        rewards = rng.randn(episode_len).astype(np.float32)
+        actions = rng.randint(0, action_space_size, episode_len)
+        root_values = rng.randn(episode_len).astype(np.float32)
+        action_masks = np.ones((episode_len, action_space_size), dtype=np.int8)
+        if board_games:
+            action_masks = (rng.rand(episode_len, action_space_size) < 0.7).astype(np.int8)
+            action_masks[np.arange(episode_len), actions] = 1
+        visit_counts = [rng.randint(1, 10, int(action_masks[t].sum())) for t in range(episode_len)]
+        child_visits = [list(v / v.sum()) for v in visit_counts]
+        to_play = [1 + t % 2 for t in range(episode_len)] if board_games else [-1] * episode_len
+
+        for start in range(0, episode_len, config.game_segment_length):
+            end = min(start + config.game_segment_length, episode_len)
+            game_segment = game_segment_type(None, game_segment_length=config.game_segment_length, config=config)
+            game_segment.reset(obs[start:start + stack])
+            for t in range(start, end):
+                game_segment.store_search_stats(list(visit_counts[t]), root_values[t])
+                game_segment.append(actions[t], obs[t + stack], rewards[t], action_masks[t], to_play[t])
+            done = end == episode_len
+            if not done:
+                game_segment.pad_over(
+                    obs[end + stack:end + stack + unroll], list(rewards[end:end + unroll + td - 1]),
+                    list(root_values[end:end + unroll + td]), child_visits[end:end + unroll]
+                )
+            game_segment.game_segment_to_array()
+            game_segments.append(game_segment)
+            metas.append({'done': done, 'unroll_plus_td_steps': unroll + td, 'priorities': None})
+    return game_segments, metas
+
+
+def make_model(config: EasyDict, buffer_type: type = MuZeroGameBuffer, **kwargs) -> torch.nn.Module:
+    """
+    Overview:
+        Make a small MLP model for the observations of ``config``, i.e. ``EfficientZeroModelMLP`` for the
+        EfficientZero game buffers and ``MuZeroModelMLP`` for the other ones.
+    Arguments:
+        - config (:obj:`EasyDict`): The config of the game buffer, e.g. ``game_buffer_config``.
+        - buffer_type (:obj:`type`): The type of the game buffer which reanalyzes with the model.
+        - kwargs: The other arguments of the model, e.g. ``lstm_hidden_size``.
+    """
+    support_size = 2 * config.model.support_scale + 1
+    model_kwargs = dict(
+        observation_shape=config.model.observation_shape * config.model.frame_stack_num,
+        action_space_size=config.model.action_space_size,
+        latent_state_dim=16,
+        reward_support_size=support_size,
+        value_support_size=support_size,
+    )
+    model_kwargs.update(kwargs)
+    if issubclass(buffer_type, EfficientZeroGameBuffer):
+        return EfficientZeroModelMLP(**model_kwargs)
+    return MuZeroModelMLP(**model_kwargs)
+
+
+class FakeModel(torch.nn.Module):
+
+    def __init__(self, action_space_size, num_roots):
+        super().__init__()
+        self.action_space_size = action_space_size
+        self.num_roots = num_roots
+        self.num_of_calls = 0
+
+    def recurrent_inference(self, latent_states, *args):
+        # the latent state of the leaf node expanded in the column j of the simulation i is 100 * (i + 1) + j, so the
+        # gathered latent states are the ones of the parents of the leaf nodes, expanded in the previous simulations
+        batch_size = latent_states.shape[0]
+        parent_simulation_index, batch_index = latent_states[:, 0] // 100, latent_states[:, 0] % 100
+        # the column j of a simulation is a leaf node of the root j % num_roots
+        assert torch.all(batch_index % self.num_roots == torch.arange(batch_size) % self.num_roots)
+        assert torch.all(parent_simulation_index <= self.num_of_calls)
+        self.num_of_calls += 1
+        output = EasyDict(
+            latent_state=torch.arange(batch_size).float()[:, None].repeat(1, 8) + 100 * self.num_of_calls,
+            policy_logits=torch.randn(batch_size, self.action_space_size),
+            value=torch.randn(batch_size, 601),
+            reward=torch.randn(batch_size, 601),
+            value_prefix=torch.randn(batch_size, 601),
+        )
+        if len(args) == 2:
+            # the hidden states are gathered as the latent states, or reset every ``lstm_horizon_len`` steps
+            hidden_states = args[0][0][0]
+            assert torch.all((hidden_states == latent_states).all(-1) | (hidden_states == 0).all(-1))
+            output.reward_hidden_state = (output.latent_state[None], output.latent_state[None])
+        return output
@@ -0,0 +1,185 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.columnar_game_segment import ColumnarGameSegment
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_sampled_efficientzero import SampledEfficientZeroGameBuffer
+from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+
+def fill_buffer(buffer, game_segment_type=GameSegment):
+    for seed in range(3):
+        buffer.push_game_segments(
+            make_game_segments(buffer._cfg, num_of_episodes=2, seed=seed, game_segment_type=game_segment_type)
+        )
+        buffer.remove_oldest_data_to_fit()
+    priorities = np.random.RandomState(0).uniform(0.1, 1, buffer.get_num_of_transitions())
+    buffer._set_priorities(np.arange(len(priorities)), priorities)
+
+
+def sample(buffer, model):
+    np.random.seed(0)
+    current_batch, target_batch = buffer.sample(6, SimpleNamespace(_target_model=model))
+    return [np.asarray(x, dtype=np.float64) for x in current_batch[:4] + list(target_batch)]
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    'buffer_type, env_type, game_segment_type, compression, save_kwargs, load_kwargs', [
+        (MuZeroGameBuffer, 'not_board_games', GameSegment, None, {}, {}),
+        (
+            MuZeroGameBuffer, 'board_games', GameSegment, 'zlib', dict(use_priority_tree=True),
+            dict(use_ring_buffer=True)
+        ),
+        (
+            MuZeroGameBuffer, 'board_games', ColumnarGameSegment, None, dict(use_ring_buffer=True),
+            dict(use_vectorized_batch=True)
+        ),
+        (EfficientZeroGameBuffer, 'not_board_games', GameSegment, None, dict(use_disk_store=True), {}),
+        (
+            EfficientZeroGameBuffer, 'not_board_games', ColumnarGameSegment, 'zlib', dict(obs_codec='zlib'),
+            dict(obs_codec='zlib', use_ring_buffer=True)
+        ),
+    ]
+)
+def test_buffer_snapshot(tmp_path, buffer_type, env_type, game_segment_type, compression, save_kwargs, load_kwargs):
+    config = dict(
+        game_buffer_config,
+        env_type=env_type,
+        replay_buffer_size=60,
+        snapshot_compression=compression,
+        snapshot_chunk_size=4,
+        snapshot_num_workers=2
+    )
+    buffer = buffer_type(EasyDict(dict(config, **save_kwargs)))
+    fill_buffer(buffer, game_segment_type)
+    buffer.num_of_refreshed_transitions = 7
+    path = os.path.join(str(tmp_path), 'snapshot')
+    buffer.save_snapshot(path)
+    # the snapshot is replaced
+    buffer.save_snapshot(path)
+    assert not os.path.exists(path + '.tmp') and len(os.listdir(path)) > 2
+
+    # the snapshot is loaded into a buffer of another storage mode
+    restored_buffer = buffer_type(EasyDict(dict(config, **load_kwargs)))
+    restored_buffer.push_game_segments(make_game_segments(restored_buffer._cfg, num_of_episodes=1, seed=10))
+    restored_buffer.load_snapshot(path)
+    assert restored_buffer.base_idx == buffer.base_idx > 0
+    assert restored_buffer.transition_base_idx == buffer.transition_base_idx
+    assert restored_buffer.num_of_collected_episodes == buffer.num_of_collected_episodes
+    assert restored_buffer.num_of_refreshed_transitions == 7
+    assert restored_buffer.get_num_of_transitions() == buffer.get_num_of_transitions()
+    assert list(restored_buffer._target_refresh_time.items()) == list(buffer._target_refresh_time.items())
+    assert np.array_equal(restored_buffer._segment_refresh_time.values(), buffer._segment_refresh_time.values())
+    assert np.array_equal(
+        list(restored_buffer.game_segment_game_pos_look_up), list(buffer.game_segment_game_pos_look_up)
+    )
+    for game_segment, restored_game_segment in zip(buffer.game_segment_buffer, restored_buffer.game_segment_buffer):
+        assert type(restored_game_segment) is type(game_segment)
+        for field in ['obs_segment', 'action_segment', 'reward_segment', 'child_visit_segment', 'root_value_segment']:
+            expected, value = getattr(game_segment, field), getattr(restored_game_segment, field)
+            assert all(np.array_equal(a, b) for a, b in zip(expected, value)), field
+
+    model = make_model(buffer._cfg, buffer_type)
+    model.eval()
+    for expected, value in zip(sample(buffer, model), sample(restored_buffer, model)):
+        assert np.allclose(expected, value)
+
+
+@pytest.mark.unittest
+def test_sampled_buffer_snapshot(tmp_path):
+    config = EasyDict(dict(game_buffer_config, sampled_algo=True))
+    buffer = SampledEfficientZeroGameBuffer(config)
+    game_segments, metas = make_game_segments(config, num_of_episodes=1, seed=0)
+    for game_segment in game_segments:
+        game_segment.root_sampled_actions = [np.random.randn(3, 1) for _ in range(len(game_segment))]
+    buffer.push_game_segments((game_segments, metas))
+    path = os.path.join(str(tmp_path), 'snapshot')
+    buffer.save_snapshot(path)
+    restored_buffer = SampledEfficientZeroGameBuffer(config)
+    restored_buffer.load_snapshot(path)
+    for game_segment, restored_game_segment in zip(game_segments, restored_buffer.game_segment_buffer):
+        # the root sampled actions stay a list
+        assert isinstance(restored_game_segment.root_sampled_actions, list)
+        assert all(
+            np.array_equal(a, b)
+            for a, b in zip(game_segment.root_sampled_actions, restored_game_segment.root_sampled_actions)
+        )
+    with pytest.raises(AssertionError):
+        MuZeroGameBuffer(config).load_snapshot(path)
+    with pytest.raises(AssertionError):
+        SampledEfficientZeroGameBuffer(EasyDict(dict(config, obs_codec='zlib'))).load_snapshot(path)
+
+
+@pytest.mark.unittest
+def test_buffer_snapshot_releases_storage(tmp_path):
+    from multiprocessing import shared_memory
+    disk_store_dir = os.path.join(str(tmp_path), 'disk_store')
+    buffer = MuZeroGameBuffer(EasyDict(dict(game_buffer_config, snapshot_chunk_size=1, snapshot_num_workers=2)))
+    buffer.push_game_segments(make_game_segments(buffer._cfg, num_of_episodes=1, seed=0))
+    path = os.path.join(str(tmp_path), 'snapshot')
+    buffer.save_snapshot(path)
+
+    for storage_kwargs in [
+            dict(use_vectorized_batch=True, use_shared_obs_store=True),
+            dict(use_disk_store=True, disk_store_dir=disk_store_dir),
+    ]:
+        restored_buffer = MuZeroGameBuffer(EasyDict(dict(game_buffer_config, **storage_kwargs)))
+        # the buffer holds more game segments than the snapshot
+        fill_buffer(restored_buffer)
+        if 'use_shared_obs_store' in storage_kwargs:
+            name = restored_buffer._obs_store.name
+        else:
+            num_of_old_segments = len(restored_buffer.game_segment_buffer)
+        restored_buffer.load_snapshot(path)
+        if 'use_shared_obs_store' in storage_kwargs:
+            # the shared memory of the replaced arena is unlinked
+            with pytest.raises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
+            assert restored_buffer._obs_store.name != name
+        else:
+            # the files of the replaced disk store are deleted
+            segment_ids = {int(file_name.split('_')[0]) for file_name in os.listdir(disk_store_dir)}
+            assert segment_ids == set(range(len(restored_buffer.game_segment_buffer)))
+            assert len(segment_ids) < num_of_old_segments
+        assert restored_buffer.get_num_of_transitions() == buffer.get_num_of_transitions()
+
+
+@pytest.mark.unittest
+def test_buffer_snapshot_replace(tmp_path, monkeypatch):
+    path = os.path.join(str(tmp_path), 'snapshot')
+    buffer = MuZeroGameBuffer(EasyDict(game_buffer_config))
+    buffer.push_game_segments(make_game_segments(buffer._cfg, num_of_episodes=1, seed=0))
+    buffer.save_snapshot(path)
+    num_of_transitions = buffer.get_num_of_transitions()
+    buffer.push_game_segments(make_game_segments(buffer._cfg, num_of_episodes=1, seed=1))
+
+    # a crash between the renames of the dump leaves the previous snapshot aside
+    rename = os.rename
+
+    def crashed_rename(src, dst):
+        if src.endswith('.tmp'):
+            raise OSError('crash')
+        rename(src, dst)
+
+    monkeypatch.setattr(os, 'rename', crashed_rename)
+    with pytest.raises(OSError):
+        buffer.save_snapshot(path)
+    monkeypatch.setattr(os, 'rename', rename)
+    assert not os.path.exists(path)
+    restored_buffer = MuZeroGameBuffer(EasyDict(game_buffer_config))
+    restored_buffer.load_snapshot(path)
+    assert restored_buffer.get_num_of_transitions() == num_of_transitions
+
+    # the next dump replaces both of them
+    buffer.save_snapshot(path)
+    assert sorted(os.listdir(str(tmp_path))) == ['snapshot']
+    restored_buffer.load_snapshot(path)
+    assert restored_buffer.get_num_of_transitions() == buffer.get_num_of_transitions() > num_of_transitions
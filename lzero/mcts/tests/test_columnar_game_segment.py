@@ -0,0 +1,94 @@
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.columnar_game_segment import ColumnarGameSegment, RaggedRows, SegmentColumn
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+FIELDS = [
+    'obs_segment', 'action_segment', 'reward_segment', 'child_visit_segment', 'root_value_segment',
+    'action_mask_segment', 'to_play_segment'
+]
+
+
+@pytest.mark.unittest
+def test_segment_column():
+    column = SegmentColumn(2, is_float=True)
+    column.extend([1, 2, 3])
+    assert column.values().dtype == np.float64 and np.array_equal(column.values(), [1, 2, 3])
+
+    column = SegmentColumn(4, is_float=True, ragged=True)
+    column.extend([[0.5, 0.5], [1.]])
+    rows = column.values()
+    assert isinstance(rows, RaggedRows) and len(rows) == 2 and np.array_equal(rows[1], [1.])
+    # a longer row widens the column
+    column.append([0.2, 0.3, 0.5])
+    rows = column.values()
+    assert [len(row) for row in rows] == [2, 1, 3] and np.array_equal(rows[0], [0.5, 0.5])
+    rows[1] = [0.5, 0.5]
+    assert np.array_equal(column.values()[1], [0.5, 0.5])
+
+    # the encoded frames are kept as they are, including their trailing zero bytes
+    column = SegmentColumn(2)
+    column.extend([b'ab\x00', b'c'])
+    assert column.values().dtype == object and column.values()[0] == b'ab\x00'
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('env_type', ['not_board_games', 'board_games'])
+def test_columnar_game_segment(env_type):
+    config = EasyDict(dict(game_buffer_config, env_type=env_type))
+    game_segments, _ = make_game_segments(config, num_of_episodes=2, seed=0)
+    columnar_game_segments, _ = make_game_segments(
+        config, num_of_episodes=2, seed=0, game_segment_type=ColumnarGameSegment
+    )
+    for game_segment, columnar_game_segment in zip(game_segments, columnar_game_segments):
+        assert not hasattr(columnar_game_segment, '__dict__')
+        assert len(game_segment) == len(columnar_game_segment)
+        for field in FIELDS:
+            expected, value = getattr(game_segment, field), getattr(columnar_game_segment, field)
+            assert len(expected) == len(value)
+            assert all(np.array_equal(e, v) for e, v in zip(expected, value)), field
+        child_visits = columnar_game_segment.child_visit_segment
+        assert isinstance(child_visits, RaggedRows) or child_visits.dtype != object
+        assert np.array_equal(
+            game_segment.get_unroll_obs(3, config.num_unroll_steps, padding=True),
+            columnar_game_segment.get_unroll_obs(3, config.num_unroll_steps, padding=True)
+        )
+        restored = pickle.loads(pickle.dumps(columnar_game_segment))
+        assert all(np.array_equal(e, v) for e, v in zip(restored.child_visit_segment, child_visits))
+
+    # the columns grow beyond the preallocated size, e.g. for the whole episodes of the evaluator
+    game_segment = ColumnarGameSegment(None, game_segment_length=2, config=config)
+    game_segment.reset([np.zeros(4, dtype=np.float32)] * config.model.frame_stack_num)
+    for t in range(10):
+        game_segment.store_search_stats([1, 3], float(t))
+        game_segment.append(t % 3, np.full(4, t, dtype=np.float32), 1., np.ones(3, dtype=np.int8), -1)
+    assert len(game_segment) == 10 and np.array_equal(game_segment.root_value_segment, np.arange(10))
+    assert game_segment.get_obs()[-1][0] == 9
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('env_type', ['not_board_games', 'board_games'])
+def test_game_buffer_with_columnar_game_segment(env_type):
+    config = EasyDict(dict(game_buffer_config, env_type=env_type))
+    buffer, columnar_buffer = MuZeroGameBuffer(config), MuZeroGameBuffer(config)
+    for seed in range(2):
+        buffer.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=seed))
+        columnar_buffer.push_game_segments(
+            make_game_segments(config, num_of_episodes=2, seed=seed, game_segment_type=ColumnarGameSegment)
+        )
+    policy = SimpleNamespace(_target_model=make_model(config))
+    np.random.seed(0)
+    current_batch, target_batch = buffer.sample(6, policy)
+    np.random.seed(0)
+    columnar_current_batch, columnar_target_batch = columnar_buffer.sample(6, policy)
+    for expected, value in zip(current_batch[:4], columnar_current_batch[:4]):
+        assert np.array_equal(np.asarray(expected), np.asarray(value))
+    for expected, value in zip(target_batch, columnar_target_batch):
+        assert np.allclose(np.asarray(expected, dtype=np.float64), np.asarray(value, dtype=np.float64))
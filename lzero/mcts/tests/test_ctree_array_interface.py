@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.ctree.ctree_efficientzero import ez_tree
+from lzero.mcts.ctree.ctree_muzero import mz_tree
+from lzero.mcts.tests.config.game_buffer_config_for_test import FakeModel
+from lzero.mcts.tree_search.mcts_ctree import EfficientZeroMCTSCtree, MuZeroMCTSCtree
+
+
+def simulate(tree, use_array, action_space_size, batch_size=5, num_simulations=10):
+    rng = np.random.RandomState(0)
+    roots = tree.Roots(batch_size, [[] for _ in range(batch_size)])
+    to_play_batch = [-1 for _ in range(batch_size)]
+    roots.prepare_no_noise([0. for _ in range(batch_size)], [[0.] * action_space_size] * batch_size, to_play_batch)
+    min_max_stats_lst = tree.MinMaxStatsList(batch_size)
+    min_max_stats_lst.set_delta(0.01)
+    indices = []
+    for simulation_index in range(num_simulations):
+        results = tree.ResultsWrapper(num=batch_size)
+        rewards = rng.randn(batch_size).astype(np.float32)
+        values = rng.randn(batch_size).astype(np.float32)
+        policies = rng.randn(batch_size, action_space_size).astype(np.float32)
+        is_reset = rng.randint(0, 2, batch_size).astype(np.int32)
+        if use_array:
+            outputs = tree.batch_traverse_array(
+                roots, 19652, 1.25, 0.997, min_max_stats_lst, results, np.array(to_play_batch, dtype=np.int32)
+            )
+            assert all(output.dtype == np.int32 for output in outputs)
+            args = [rewards, values, policies, min_max_stats_lst, results]
+            args += [is_reset, outputs[-1]] if tree is ez_tree else [outputs[-1]]
+            tree.batch_backpropagate_array(simulation_index + 1, 0.997, *args)
+        else:
+            outputs = tree.batch_traverse(roots, 19652, 1.25, 0.997, min_max_stats_lst, results, list(to_play_batch))
+            args = [rewards.tolist(), values.tolist(), policies.tolist(), min_max_stats_lst, results]
+            args += [is_reset.tolist(), outputs[-1]] if tree is ez_tree else [outputs[-1]]
+            tree.batch_backpropagate(simulation_index + 1, 0.997, *args)
+        indices.append([list(output) for output in outputs])
+    return indices, roots.get_distributions(), roots.get_values()
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('tree', [mz_tree, ez_tree])
+def test_array_interface(tree):
+    # with a single action, the search does not break any tie at random, so both interfaces give the same trees
+    indices, distributions, values = simulate(tree, False, action_space_size=1)
+    array_indices, array_distributions, array_values = simulate(tree, True, action_space_size=1)
+    assert indices == array_indices and distributions == array_distributions
+    assert np.allclose(values, array_values)
+
+    _, distributions, values = simulate(tree, True, action_space_size=4)
+    assert all(len(d) == 4 and sum(d) == 10 for d in distributions) and np.all(np.isfinite(values))
+    with pytest.raises(ValueError):
+        # the arrays of the network outputs must be float32
+        tree.batch_backpropagate_array(
+            1, 0.997, np.zeros(1), np.zeros(1), np.zeros((1, 4)), tree.MinMaxStatsList(1), tree.ResultsWrapper(num=1),
+            *([np.zeros(1, dtype=np.int32)] * (2 if tree is ez_tree else 1))
+        )
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('mcts_type', [MuZeroMCTSCtree, EfficientZeroMCTSCtree])
+def test_mcts_ctree_search(mcts_type):
+    batch_size, action_space_size = 4, 5
+    config = EasyDict(
+        num_simulations=20,
+        lstm_horizon_len=5,
+        discount_factor=0.997,
+        device='cpu',
+        model=dict(action_space_size=action_space_size, support_scale=300, categorical_distribution=True),
+    )
+    legal_actions = [[0, 1, 3], list(range(action_space_size)), [2, 4], [1]]
+    roots = mcts_type.roots(batch_size, legal_actions)
+    policy_logits = np.random.randn(batch_size, action_space_size).tolist()
+    roots.prepare_no_noise([0.] * batch_size, policy_logits, [-1] * batch_size)
+    latent_state_roots = np.arange(batch_size, dtype=np.float32)[:, None].repeat(8, 1)
+    model = FakeModel(action_space_size, batch_size)
+    if mcts_type is EfficientZeroMCTSCtree:
+        reward_hidden_state_roots = (latent_state_roots[None], latent_state_roots[None])
+        mcts_type(config).search(roots, model, latent_state_roots, reward_hidden_state_roots, [-1] * batch_size)
+    else:
+        mcts_type(config).search(roots, model, latent_state_roots, [-1] * batch_size)
+    distributions = roots.get_distributions()
+    assert [len(d) for d in distributions] == [len(a) for a in legal_actions]
+    assert all(sum(d) == config.num_simulations for d in distributions)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('num_leaves', [2, 3])
+def test_mcts_ctree_search_with_virtual_loss(num_leaves):
+    batch_size, action_space_size = 3, 4
+    legal_actions = [list(range(action_space_size)), [0, 2, 3], [1, 2, 3]]
+    to_play_batch = np.full(batch_size, -1, dtype=np.int32)
+    # the virtual losses spread the leaf nodes selected from the same root over the children of the root
+    roots = mz_tree.Roots(batch_size, legal_actions)
+    roots.prepare_no_noise([0.] * batch_size, [[0.] * action_space_size] * batch_size, list(to_play_batch))
+    min_max_stats_lst = mz_tree.MinMaxStatsList(batch_size)
+    min_max_stats_lst.set_delta(0.01)
+    results = mz_tree.ResultsWrapper(num=num_leaves * batch_size)
+    _, latent_state_index_in_batch, last_actions, _ = mz_tree.batch_traverse_with_virtual_loss(
+        roots, num_leaves, 1., 19652, 1.25, 0.997, min_max_stats_lst, results, to_play_batch
+    )
+    assert list(latent_state_index_in_batch) == list(range(batch_size)) * num_leaves
+    for i in range(batch_size):
+        assert len(set(last_actions[i::batch_size])) == num_leaves
+    mz_tree.batch_backpropagate_with_virtual_loss(
+        1, 0.997, np.zeros(num_leaves * batch_size, dtype=np.float32),
+        np.ones(num_leaves * batch_size, dtype=np.float32),
+        np.zeros((num_leaves * batch_size, action_space_size), dtype=np.float32), 1., min_max_stats_lst, results,
+        np.full(num_leaves * batch_size, -1, dtype=np.int32)
+    )
+    # the virtual losses are removed, and the real values are backpropagated
+    assert all(sum(d) == num_leaves for d in roots.get_distributions())
+    assert np.allclose(roots.get_values(), 0.997 * num_leaves / (num_leaves + 1))
+
+    config = EasyDict(
+        num_simulations=20,
+        num_leaves_per_iteration=num_leaves,
+        discount_factor=0.997,
+        device='cpu',
+        model=dict(action_space_size=action_space_size, support_scale=300, categorical_distribution=True),
+    )
+    roots = MuZeroMCTSCtree.roots(batch_size, legal_actions)
+    policy_logits = np.random.randn(batch_size, action_space_size).tolist()
+    roots.prepare_no_noise([0.] * batch_size, policy_logits, [-1] * batch_size)
+    model = FakeModel(action_space_size, batch_size)
+    latent_state_roots = np.arange(batch_size, dtype=np.float32)[:, None].repeat(8, 1)
+    MuZeroMCTSCtree(config).search(roots, model, latent_state_roots, [-1] * batch_size)
+    assert model.num_of_calls == (config.num_simulations + num_leaves - 1) // num_leaves
+    distributions = roots.get_distributions()
+    assert [len(d) for d in distributions] == [len(a) for a in legal_actions]
+    assert all(sum(d) == config.num_simulations for d in distributions)
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.ctree.ctree_efficientzero import ez_tree
+from lzero.mcts.ctree.ctree_muzero import mz_tree
+from lzero.mcts.tests.config.game_buffer_config_for_test import FakeModel
+from lzero.mcts.tree_search.mcts_ctree import EfficientZeroMCTSCtree, MuZeroMCTSCtree
+
+action_space_size = 6
+
+
+def search(tree, roots, seed, num_simulations=30):
+    # drive the C++ search with random network outputs
+    rng = np.random.RandomState(seed)
+    batch_size = roots.num
+    to_play_batch = [-1 for _ in range(batch_size)]
+    roots.prepare_no_noise(
+        [0. for _ in range(batch_size)],
+        rng.randn(batch_size, action_space_size).tolist(), to_play_batch
+    )
+    min_max_stats_lst = tree.MinMaxStatsList(batch_size)
+    min_max_stats_lst.set_delta(0.01)
+    for simulation_index in range(num_simulations):
+        results = tree.ResultsWrapper(num=batch_size)
+        outputs = [
+            rng.randn(batch_size).tolist(),
+            rng.randn(batch_size).tolist(),
+            rng.randn(batch_size, action_space_size).tolist()
+        ]
+        tree.batch_traverse(roots, 19652, 1.25, 0.997, min_max_stats_lst, results, list(to_play_batch))
+        if tree is ez_tree:
+            tree.batch_backpropagate(
+                simulation_index + 1, 0.997, *outputs, min_max_stats_lst, results, [0] * batch_size, to_play_batch
+            )
+        else:
+            tree.batch_backpropagate(simulation_index + 1, 0.997, *outputs, min_max_stats_lst, results, to_play_batch)
+    return roots.get_distributions(), roots.get_values()
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('tree', [mz_tree, ez_tree])
+def test_ctree_node_pool(tree):
+    legal_actions = [[0, 2, 3], list(range(action_space_size)), [], [1, 4, 5]]
+    roots = tree.Roots(len(legal_actions), legal_actions)
+    roots.reserve(31 * len(legal_actions) * action_space_size)
+    distributions, values = search(tree, roots, seed=0)
+    assert [len(d) for d in distributions] == [3, action_space_size, action_space_size, 3]
+    assert all(sum(d) == 30 for d in distributions)
+
+    # the reset roots reuse the nodes of the previous search, without the statistics of the previous search
+    for seed, new_legal_actions in enumerate([legal_actions[::-1], legal_actions * 3], start=1):
+        roots.reset(len(new_legal_actions), new_legal_actions)
+        assert roots.num == len(new_legal_actions)
+        assert roots.get_distributions() == [[] for _ in new_legal_actions]
+        assert roots.get_values() == [0. for _ in new_legal_actions]
+        distributions, values = search(tree, roots, seed)
+        assert [len(d) for d in distributions] == [len(a) or action_space_size for a in new_legal_actions]
+        assert all(sum(d) == 30 for d in distributions) and np.all(np.isfinite(values))
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('mcts_type', [MuZeroMCTSCtree, EfficientZeroMCTSCtree])
+def test_mcts_ctree_reset_roots(mcts_type):
+    config = EasyDict(
+        num_simulations=20,
+        lstm_horizon_len=5,
+        discount_factor=0.997,
+        device='cpu',
+        model=dict(action_space_size=action_space_size, support_scale=300, categorical_distribution=True),
+    )
+    mcts = mcts_type(config)
+    roots = None
+    # the searches of one MCTS share its roots, also for different numbers of roots
+    for batch_size in [4, 2, 4]:
+        legal_actions = [list(range(action_space_size - i % 3)) for i in range(batch_size)]
+        new_roots = mcts.reset_roots(batch_size, legal_actions)
+        assert roots is None or new_roots is roots
+        roots = new_roots
+        assert roots.num == batch_size
+        policy_logits = np.random.randn(batch_size, action_space_size).tolist()
+        roots.prepare_no_noise([0.] * batch_size, policy_logits, [-1] * batch_size)
+        latent_state_roots = np.arange(batch_size, dtype=np.float32)[:, None].repeat(8, 1)
+        model = FakeModel(action_space_size, batch_size)
+        if mcts_type is EfficientZeroMCTSCtree:
+            reward_hidden_state_roots = (latent_state_roots[None], latent_state_roots[None])
+            mcts.search(roots, model, latent_state_roots, reward_hidden_state_roots, [-1] * batch_size)
+        else:
+            mcts.search(roots, model, latent_state_roots, [-1] * batch_size)
+        distributions = roots.get_distributions()
+        assert [len(d) for d in distributions] == [len(a) for a in legal_actions]
+        assert all(sum(d) == config.num_simulations for d in distributions)
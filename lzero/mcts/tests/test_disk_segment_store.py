@@ -0,0 +1,77 @@
+import os
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.disk_segment_store import DiskArray, DiskSegmentStore
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('env_type', ['not_board_games', 'board_games'])
+def test_game_buffer_with_disk_store(tmp_path, env_type):
+    config = EasyDict(dict(game_buffer_config, env_type=env_type, replay_buffer_size=60, reanalyze_ratio=0.))
+    buffer = MuZeroGameBuffer(config)
+    # a small cache, so that the arrays are also read from the segment files
+    disk_buffer = MuZeroGameBuffer(
+        EasyDict(dict(config, use_disk_store=True, disk_store_dir=str(tmp_path), disk_cache_bytes=2048))
+    )
+    for seed in range(4):
+        for b in [buffer, disk_buffer]:
+            b.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=seed))
+            b.remove_oldest_data_to_fit()
+    store = disk_buffer._disk_store
+    assert isinstance(disk_buffer.game_segment_buffer[0].obs_segment, DiskArray)
+    # the files of the removed game segments are deleted
+    num_of_files = sum(
+        isinstance(getattr(game_segment, field), DiskArray) for game_segment in disk_buffer.game_segment_buffer
+        for field in DiskSegmentStore.SPILL_FIELDS
+    )
+    assert len(os.listdir(tmp_path)) == num_of_files
+
+    policy = SimpleNamespace(_target_model=make_model(config))
+    for seed in range(3):
+        np.random.seed(seed)
+        current_batch, target_batch = buffer.sample(6, policy)
+        np.random.seed(seed)
+        disk_current_batch, disk_target_batch = disk_buffer.sample(6, policy)
+        assert np.array_equal(current_batch[0], disk_current_batch[0])
+        for target, disk_target in zip(target_batch, disk_target_batch):
+            assert np.array_equal(np.asarray(target, dtype=np.float64), np.asarray(disk_target, dtype=np.float64))
+    assert store._cached_bytes <= store.cache_bytes
+    assert store.hits > 0 and store.misses > 0
+
+    # a pickled game segment only references its segment files
+    game_segment = disk_buffer.game_segment_buffer[-1]
+    unpickled = pickle.loads(pickle.dumps(game_segment))
+    assert np.array_equal(np.asarray(unpickled.obs_segment), np.asarray(game_segment.obs_segment))
+
+
+@pytest.mark.unittest
+def test_disk_segment_store_cold_reads(tmp_path):
+    store = DiskSegmentStore(str(tmp_path), cache_bytes=1000)
+    small, large = np.arange(20, dtype=np.float32), np.arange(600, dtype=np.float32).reshape(300, 2)
+    segments = [SimpleNamespace(reward_segment=small), SimpleNamespace(reward_segment=large)]
+    for segment in segments:
+        store.spill(segment)
+    small_array, large_array = segments[0].reward_segment, segments[1].reward_segment
+
+    # a cold read only reads the indexed rows through the memmap, without caching the whole array
+    assert small_array[3] == 3 and store._cached_bytes == 0
+    # the array read again is hot
+    assert np.array_equal(small_array[2:5], small[2:5]) and store._cached_bytes == small.nbytes
+    assert small_array[7] == 7 and store.hits == 1
+    # the arrays larger than the cache are always read through their memmaps
+    for _ in range(3):
+        rows = large_array[np.array([0, 299])]
+        assert np.array_equal(rows, large[[0, 299]]) and not isinstance(rows, np.memmap)
+    assert store._cached_bytes == small.nbytes and len(store._memmaps) == 1
+    assert np.array_equal(np.asarray(large_array), large)
+
+    store.remove(segments[1])
+    assert len(store._memmaps) == 0 and len(os.listdir(tmp_path)) == 1
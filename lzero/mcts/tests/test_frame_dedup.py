@@ -0,0 +1,72 @@
+import pickle
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.ring_array import FrameSlice, RingArray
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments
+
+
+@pytest.mark.unittest
+def test_frame_slice():
+    store_frames = np.arange(20, dtype=np.float32).reshape(10, 2)
+    store = RingArray(8, shape=(2, ), dtype=np.float32)
+    store.extend(store_frames[:6])
+    store.popleft(3)
+    store.extend(store_frames[6:])
+    # consecutive indices are read as a view of the store
+    frames = FrameSlice(store, np.arange(4, 8))
+    assert np.shares_memory(np.asarray(frames), store._data)
+    assert np.array_equal(np.asarray(frames), store_frames[4:8])
+    assert np.array_equal(frames[-1], store_frames[7])
+    assert isinstance(frames[1:3], FrameSlice) and np.array_equal(np.asarray(frames[1:3]), store_frames[5:7])
+    # the shared indices are gathered
+    frames = FrameSlice(store, np.array([3, 4, 4, 9]))
+    assert np.array_equal(np.asarray(frames), store_frames[[3, 4, 4, 9]])
+    # a slice of a store in the process memory is pickled as its frames
+    unpickled = pickle.loads(pickle.dumps(frames))
+    assert isinstance(unpickled, np.ndarray) and np.array_equal(unpickled, store_frames[[3, 4, 4, 9]])
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('use_shared_obs_store', [False, True])
+def test_game_buffer_with_frame_dedup(use_shared_obs_store):
+    config = EasyDict(dict(game_buffer_config, replay_buffer_size=60, use_vectorized_batch=True))
+    buffer = MuZeroGameBuffer(config)
+    dedup_buffer = MuZeroGameBuffer(
+        EasyDict(dict(config, use_frame_dedup=True, use_shared_obs_store=use_shared_obs_store))
+    )
+    game_segments, metas = make_game_segments(config, num_of_episodes=2, seed=0)
+    dedup_buffer.push_game_segments((game_segments, metas))
+    # the frames of an episode are stored once, i.e. its length plus the stacked initial frames
+    num_of_frames = sum(len(g.action_segment) for g in game_segments) + 2 * config.model.frame_stack_num
+    assert len(dedup_buffer._obs_store) == num_of_frames
+    assert sum(len(g.obs_segment) for g in game_segments) > num_of_frames
+
+    dedup_buffer = MuZeroGameBuffer(
+        EasyDict(dict(config, use_frame_dedup=True, use_shared_obs_store=use_shared_obs_store))
+    )
+    for seed in range(4):
+        for b in [buffer, dedup_buffer]:
+            b.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=seed))
+            b.remove_oldest_data_to_fit()
+    assert len(dedup_buffer._obs_store) < len(buffer._obs_store)
+    assert len(dedup_buffer._frame_index_store) == len(buffer._obs_store)
+    for game_segment, dedup_game_segment in zip(buffer.game_segment_buffer, dedup_buffer.game_segment_buffer):
+        assert isinstance(dedup_game_segment.obs_segment, FrameSlice)
+        assert np.array_equal(game_segment.obs_segment, np.asarray(dedup_game_segment.obs_segment))
+        assert np.array_equal(
+            game_segment.get_unroll_obs(1, 3, padding=True), dedup_game_segment.get_unroll_obs(1, 3, padding=True)
+        )
+
+    for seed in range(3):
+        np.random.seed(seed)
+        context = buffer._make_batch(6, 0.5)
+        np.random.seed(seed)
+        dedup_context = dedup_buffer._make_batch(6, 0.5)
+        assert np.array_equal(context[-1][0], dedup_context[-1][0])
+        # the observations of the reanalyze contexts
+        for i in [0, 1]:
+            assert np.array_equal(np.array(context[i][0]), np.array(dedup_context[i][0]))
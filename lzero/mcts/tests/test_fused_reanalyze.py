@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+
+@pytest.mark.unittest
+def test_deduplicate_obs():
+    config = EasyDict(dict(game_buffer_config, replay_buffer_size=60, reanalyze_ratio=0.5))
+    buffer = MuZeroGameBuffer(config)
+    buffer.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=0))
+    np.random.seed(0)
+    reward_value_context, policy_re_context, _, current_batch = buffer._make_batch(8, config.reanalyze_ratio)
+    keys = np.concatenate(
+        [
+            buffer._get_obs_keys(reward_value_context, current_batch[3], np.asarray(reward_value_context[5])),
+            buffer._get_obs_keys(policy_re_context, policy_re_context[3], 0),
+        ]
+    )
+    unique_index, inverse = MuZeroGameBuffer._deduplicate_obs(keys)
+    # the shared observation windows and the zero padded ones are represented only once
+    assert len(unique_index) < len(keys)
+    assert len(np.unique(inverse[np.all(keys == -1, axis=1)])) <= 1
+    obs = buffer._prepare_obs_batch(reward_value_context[0] + policy_re_context[0])
+    assert np.array_equal(obs[unique_index][inverse], obs)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('buffer_type', [MuZeroGameBuffer, EfficientZeroGameBuffer])
+@pytest.mark.parametrize('use_root_value', [False, True])
+def test_fused_reanalyze(buffer_type, use_root_value):
+    config = EasyDict(
+        dict(game_buffer_config, replay_buffer_size=60, reanalyze_ratio=0.5, use_root_value=use_root_value)
+    )
+    buffer, fused_buffer = buffer_type(config), buffer_type(EasyDict(dict(config, use_fused_reanalyze=True)))
+    for seed in range(3):
+        for b in [buffer, fused_buffer]:
+            b.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=seed))
+            b.remove_oldest_data_to_fit()
+
+    model = make_model(config, buffer_type)
+    # count the observations represented by the target model
+    num_of_inferred_obs = []
+    initial_inference = model.initial_inference
+
+    def counted_initial_inference(obs):
+        num_of_inferred_obs[-1] += len(obs)
+        return initial_inference(obs)
+
+    model.initial_inference = counted_initial_inference
+    policy = SimpleNamespace(_target_model=model)
+    for seed in range(2):
+        num_of_inferred_obs.append(0)
+        np.random.seed(seed)
+        current_batch, target_batch = buffer.sample(6, policy)
+        num_of_inferred_obs.append(0)
+        np.random.seed(seed)
+        fused_current_batch, fused_target_batch = fused_buffer.sample(6, policy)
+        assert num_of_inferred_obs[-1] < num_of_inferred_obs[-2]
+        assert np.array_equal(current_batch[0], fused_current_batch[0])
+
+        rewards, values, policies = [np.asarray(target, dtype=np.float64) for target in target_batch]
+        fused_rewards, fused_values, fused_policies = [
+            np.asarray(target, dtype=np.float64) for target in fused_target_batch
+        ]
+        assert np.array_equal(rewards, fused_rewards)
+        if not use_root_value:
+            assert np.allclose(values, fused_values, atol=1e-5)
+        assert values.shape == fused_values.shape
+        # the non-reanalyzed policies are the same, the reanalyzed ones are searched with other root noises
+        num_of_re = int(6 * config.reanalyze_ratio)
+        assert policies.shape == fused_policies.shape
+        assert np.array_equal(policies[num_of_re:], fused_policies[num_of_re:])
+        policy_sum = fused_policies[:num_of_re].sum(-1)
+        assert np.all(np.isclose(policy_sum, 1) | np.isclose(policy_sum, 0))
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('use_ring_buffer', [False, True])
+def test_vectorized_make_batch(use_ring_buffer):
+    buffer = MuZeroGameBuffer(EasyDict(dict(game_buffer_config, replay_buffer_size=60)))
+    vectorized_buffer = MuZeroGameBuffer(
+        EasyDict(dict(game_buffer_config, replay_buffer_size=60, use_vectorized_batch=True, use_ring_buffer=use_ring_buffer))
+    )
+    # push several times to exercise the eviction of the oldest game segments from the stores
+    for seed in range(4):
+        for b in [buffer, vectorized_buffer]:
+            b.push_game_segments(make_game_segments(game_buffer_config, num_of_episodes=2, seed=seed))
+            b.remove_oldest_data_to_fit()
+    assert vectorized_buffer.get_num_of_game_segments() == buffer.get_num_of_game_segments()
+    assert len(vectorized_buffer._segment_store_index) == vectorized_buffer.get_num_of_game_segments()
+    assert len(vectorized_buffer._obs_store) == sum(len(g.obs_segment) for g in vectorized_buffer.game_segment_buffer)
+
+    for seed in range(3):
+        np.random.seed(seed)
+        *_, current_batch = buffer._make_batch(6, 0.)
+        np.random.seed(seed)
+        *_, vectorized_current_batch = vectorized_buffer._make_batch(6, 0.)
+        obs, actions, mask, batch_index, weights, make_time = current_batch
+        v_obs, v_actions, v_mask, v_batch_index, v_weights, _ = vectorized_current_batch
+
+        assert np.array_equal(batch_index, v_batch_index)
+        assert np.array_equal(weights, v_weights)
+        assert obs.shape == v_obs.shape and np.array_equal(obs, v_obs)
+        assert mask.dtype == v_mask.dtype and np.array_equal(mask, v_mask)
+        assert actions.shape == v_actions.shape
+        # the padded actions are random
+        valid = mask[:, :-1] == 1
+        assert np.array_equal(actions[valid], v_actions[valid])
+        assert np.all((v_actions >= 0) & (v_actions < game_buffer_config.model.action_space_size))
+
+
+@pytest.mark.unittest
+def test_vectorized_store_growth():
+    # the stores are too small for the pushed game segments and grow several times
+    buffer = MuZeroGameBuffer(
+        EasyDict(dict(game_buffer_config, replay_buffer_size=600, use_vectorized_batch=True, ring_buffer_capacity=8))
+    )
+    expected = []
+    for seed in range(3):
+        game_segments, metas = make_game_segments(game_buffer_config, num_of_episodes=2, seed=seed)
+        expected += [(np.array(g.obs_segment), np.array(g.action_segment)) for g in game_segments]
+        buffer.push_game_segments((game_segments, metas))
+    assert buffer._action_store.capacity > 8
+    for game_segment, (obs, actions) in zip(buffer.game_segment_buffer, expected):
+        # the views of the game segments reference the current arrays of the stores, not the released ones
+        assert game_segment.obs_segment.base is buffer._obs_store._data
+        assert game_segment.action_segment.base is buffer._action_store._data
+        assert np.array_equal(game_segment.obs_segment, obs) and np.array_equal(game_segment.action_segment, actions)
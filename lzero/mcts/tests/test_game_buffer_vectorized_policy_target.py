@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.columnar_game_segment import ColumnarGameSegment
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('buffer_type', [MuZeroGameBuffer, EfficientZeroGameBuffer])
+@pytest.mark.parametrize('env_type', ['not_board_games', 'board_games'])
+@pytest.mark.parametrize('game_segment_type', [GameSegment, ColumnarGameSegment])
+def test_vectorized_policy_target(buffer_type, env_type, game_segment_type):
+    config = EasyDict(dict(game_buffer_config, env_type=env_type, batch_size=16))
+    buffer = buffer_type(config)
+    for seed in range(3):
+        buffer.push_game_segments(
+            make_game_segments(config, num_of_episodes=2, seed=seed, game_segment_type=game_segment_type)
+        )
+    action_space_size = config.model.action_space_size
+
+    for seed in range(3):
+        np.random.seed(seed)
+        orig_data = buffer._sample_orig_data(config.batch_size)
+        game_segment_list, pos_in_game_segment_list, batch_index_list = orig_data[:3]
+        policy_non_re_context = buffer._prepare_policy_non_reanalyzed_context(
+            batch_index_list, game_segment_list, pos_in_game_segment_list
+        )
+        buffer._cfg.use_vectorized_policy_target = False
+        target_policies = buffer._compute_target_policy_non_reanalyzed(policy_non_re_context, action_space_size)
+        buffer._cfg.use_vectorized_policy_target = True
+        v_target_policies = buffer._compute_target_policy_non_reanalyzed(policy_non_re_context, action_space_size)
+        assert v_target_policies.dtype == np.float32 and v_target_policies.shape == target_policies.shape
+        assert np.allclose(target_policies.astype(np.float64), v_target_policies, atol=1e-6)
+        if env_type == 'not_board_games':
+            # the distributions of the one player environments are gathered without the per-transition packing
+            pos_in_game_segment_list, child_visits, game_segment_lens = policy_non_re_context[:3]
+            in_game_segment = buffer._get_in_game_segment_mask(pos_in_game_segment_list, game_segment_lens)
+            assert buffer._gather_target_policies(
+                child_visits, pos_in_game_segment_list, in_game_segment, action_space_size
+            ) is not None
+        # the padded transitions out of the game segments have the target policy 0
+        assert np.any(target_policies.sum(-1) == 0) and np.any(target_policies.sum(-1) > 0)
+
+        # the visit counts of the roots, over the legal actions of every root, some roots without legal actions
+        policy_re_context = buffer._prepare_policy_reanalyzed_context(
+            batch_index_list, game_segment_list, pos_in_game_segment_list
+        )
+        _, legal_actions = buffer._preprocess_to_play_and_legal_actions(policy_re_context)
+        roots_distributions = [
+            None if i % 7 == 3 else list(np.random.randint(1, 10, len(actions)))
+            for i, actions in enumerate(legal_actions)
+        ]
+        buffer._cfg.use_vectorized_policy_target = False
+        target_policies = buffer._compute_target_policy_reanalyzed(policy_re_context, None, roots_distributions)
+        buffer._cfg.use_vectorized_policy_target = True
+        v_target_policies = buffer._compute_target_policy_reanalyzed(policy_re_context, None, roots_distributions)
+        assert v_target_policies.dtype == np.float32 and v_target_policies.shape == target_policies.shape
+        assert np.allclose(target_policies.astype(np.float64), v_target_policies, atol=1e-6)
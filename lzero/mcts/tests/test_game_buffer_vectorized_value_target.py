@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('buffer_type', [MuZeroGameBuffer, EfficientZeroGameBuffer])
+@pytest.mark.parametrize('env_type', ['not_board_games', 'board_games'])
+@pytest.mark.parametrize('td_steps', [1, 2, 4])
+def test_vectorized_value_target(buffer_type, env_type, td_steps):
+    config = EasyDict(dict(game_buffer_config, env_type=env_type, td_steps=td_steps, lstm_horizon_len=3, batch_size=16))
+    buffer = buffer_type(config)
+    for seed in range(3):
+        buffer.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=seed))
+    model = make_model(config, buffer_type, lstm_hidden_size=16, last_linear_layer_init_zero=False)
+    model.eval()
+
+    for seed in range(3):
+        np.random.seed(seed)
+        game_segment_list, pos_in_game_segment_list, batch_index_list, _, _ = buffer._sample_orig_data(config.batch_size)
+        reward_value_context = buffer._prepare_reward_value_context(
+            batch_index_list, game_segment_list, pos_in_game_segment_list, buffer.get_num_of_transitions()
+        )
+        buffer._cfg.use_vectorized_value_target = False
+        rewards, target_values = buffer._compute_target_reward_value(reward_value_context, model)
+        buffer._cfg.use_vectorized_value_target = True
+        v_rewards, v_target_values = buffer._compute_target_reward_value(reward_value_context, model)
+
+        assert v_rewards.shape == rewards.shape and v_target_values.shape == target_values.shape
+        # bit-identical to the python loop
+        assert np.array_equal(rewards.astype(np.float64), v_rewards.astype(np.float64))
+        assert np.array_equal(target_values.astype(np.float64), v_target_values.astype(np.float64))
+        assert np.any(target_values.astype(np.float64) != 0)
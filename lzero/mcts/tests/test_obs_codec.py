@@ -0,0 +1,74 @@
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.obs_codec import decode_obs_batch, get_obs_codec
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('name', ['zlib', 'delta', 'lz4', 'zstd'])
+def test_lossless_codec(name):
+    if name in ['lz4', 'zstd']:
+        pytest.importorskip({'lz4': 'lz4.frame', 'zstd': 'zstandard'}[name])
+    codec = get_obs_codec(name)
+    rng = np.random.RandomState(0)
+    frames = [rng.randint(0, 256, (8, 8, 3)).astype(np.uint8), rng.randn(4).astype(np.float32), np.zeros((2, 5))]
+    for frame in frames:
+        data = codec.encode(frame)
+        assert isinstance(data, bytes)
+        decoded = codec.decode(data)
+        assert decoded.dtype == frame.dtype and np.array_equal(decoded, frame)
+    # smooth images are compressed
+    image = np.tile(np.arange(64, dtype=np.uint8), (64, 1))
+    assert len(codec.encode(image)) < image.nbytes / 4
+    batch = codec.decode_batch([codec.encode(frames[0])] * 5)
+    assert batch.shape == (5, 8, 8, 3) and np.array_equal(batch[3], frames[0])
+
+
+@pytest.mark.unittest
+def test_decode_obs_batch():
+    codec = get_obs_codec('zlib')
+    frames = np.random.randn(3, 2, 4).astype(np.float32)
+    # the zero observations padded by the buffer are not encoded
+    obs_list = [[codec.encode(f) for f in frames[0]], list(np.zeros((2, 4), dtype=np.float32))]
+    obs, num_of_encoded_bytes = decode_obs_batch(codec, obs_list)
+    assert obs.shape == (2, 2, 4)
+    assert np.array_equal(obs[0], frames[0]) and np.all(obs[1] == 0)
+    assert num_of_encoded_bytes == sum(len(data) for data in obs_list[0])
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('buffer_type', [MuZeroGameBuffer, EfficientZeroGameBuffer])
+def test_game_buffer_with_obs_codec(buffer_type):
+    config = EasyDict(dict(game_buffer_config, replay_buffer_size=60, reanalyze_ratio=0.5))
+    codec_config = EasyDict(dict(config, obs_codec='delta'))
+    buffer, codec_buffer = buffer_type(config), buffer_type(codec_config)
+    for seed in range(3):
+        buffer.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=seed))
+        codec_buffer.push_game_segments(make_game_segments(codec_config, num_of_episodes=2, seed=seed))
+        for b in [buffer, codec_buffer]:
+            b.remove_oldest_data_to_fit()
+    game_segment = codec_buffer.game_segment_buffer[0]
+    assert isinstance(game_segment.obs_segment[0], bytes)
+    assert np.array_equal(game_segment.get_unroll_obs(0, 3), buffer.game_segment_buffer[0].get_unroll_obs(0, 3))
+    # only the codec name is pickled with the game segment
+    assert np.array_equal(pickle.loads(pickle.dumps(game_segment)).get_unroll_obs(2), game_segment.get_unroll_obs(2))
+
+    policy = SimpleNamespace(_target_model=make_model(config, buffer_type))
+    for seed in range(2):
+        np.random.seed(seed)
+        current_batch, target_batch = buffer.sample(6, policy)
+        np.random.seed(seed)
+        codec_current_batch, codec_target_batch = codec_buffer.sample(6, policy)
+        assert np.array_equal(current_batch[0], codec_current_batch[0])
+        for target, codec_target in zip(target_batch, codec_target_batch):
+            assert np.array_equal(np.asarray(target, dtype=np.float64), np.asarray(codec_target, dtype=np.float64))
+    assert codec_buffer.obs_codec_stats['decode_time'] > 0.
+    assert codec_buffer.obs_codec_stats['compression_ratio'] > 0.
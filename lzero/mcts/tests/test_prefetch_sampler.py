@@ -0,0 +1,52 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.prefetch_sampler import PrefetchSampler
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+
+def make_policy(config: EasyDict) -> SimpleNamespace:
+    return SimpleNamespace(_model=make_model(config), _target_model=make_model(config))
+
+
+@pytest.mark.unittest
+def test_prefetch_sampler():
+    config = EasyDict(dict(game_buffer_config, reanalyze_ratio=0.5))
+    buffer = MuZeroGameBuffer(config)
+    policy = make_policy(config)
+    sampler = PrefetchSampler(buffer, policy, config.batch_size, prefetch_batch_num=2, max_staleness=0)
+    try:
+        # no batch is prepared before the data is collected
+        with pytest.raises(TimeoutError):
+            sampler.sample(0, timeout=0.3)
+        with sampler.lock:
+            buffer.push_game_segments(make_game_segments(config, num_of_episodes=2))
+            buffer.remove_oldest_data_to_fit()
+
+        for train_iter in range(3):
+            current_batch, target_batch = sampler.sample(train_iter, timeout=30)
+            assert len(current_batch[0]) == config.batch_size
+            assert all(len(target) == config.batch_size for target in target_batch)
+            with sampler.lock:
+                buffer.update_priority([current_batch, target_batch], np.random.uniform(0.1, 1, config.batch_size))
+        # the private target model is synchronized with the target model of the policy every train iteration
+        assert sampler.model_version == 2
+        for p, target_p in zip(sampler._target_model.parameters(), policy._target_model.parameters()):
+            assert torch.equal(p, target_p)
+        # the batches prepared with the weights of the previous train iterations are dropped
+        while not sampler._queue.full():
+            time.sleep(0.01)
+        dropped_batch_num = sampler.dropped_batch_num
+        sampler.sample(10, timeout=30)
+        assert sampler.model_version == 10
+        assert sampler.dropped_batch_num >= dropped_batch_num + 2
+    finally:
+        sampler.close()
+    assert not sampler._thread.is_alive()
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.priority_tree import PriorityTree
+
+config = EasyDict(
+    dict(
+        batch_size=10,
+        transition_num=20,
+        priority_prob_alpha=0.6,
+        priority_prob_beta=0.4,
+        replay_buffer_size=64,
+        env_type='not_board_games',
+        use_priority=True,
+        use_priority_tree=True,
+    )
+)
+
+
+@pytest.mark.unittest
+class TestPriorityTree:
+
+    def test_push_pop_update(self):
+        tree = PriorityTree(capacity=8, alpha=0.6)
+        priorities = np.random.uniform(0.1, 1, 20)
+        # push more than the initial capacity to trigger the growth
+        tree.push(priorities[:5])
+        tree.push(priorities[5:])
+        assert len(tree) == 20 and tree.capacity == 32
+        assert np.allclose(tree.priorities(), priorities)
+        assert np.isclose(tree.total(), (priorities ** 0.6 + 1e-6).sum())
+        assert tree.max() == priorities.max()
+
+        tree.pop_front(7)
+        assert np.allclose(tree.priorities(), priorities[7:])
+        assert np.isclose(tree.total(), (priorities[7:] ** 0.6 + 1e-6).sum())
+        assert tree.max() == priorities[7:].max()
+
+        tree.update(np.array([0, 3]), np.array([2., 3.]))
+        expected = priorities[7:].copy()
+        expected[[0, 3]] = [2., 3.]
+        assert np.allclose(tree.priorities(), expected)
+        assert np.isclose(tree.total(), (expected ** 0.6 + 1e-6).sum())
+        # the running max also decreases
+        tree.update(np.array([3, 3]), np.array([4., 0.05]))
+        expected[3] = 0.05
+        assert tree.max() == 2.
+
+        # wrap around the ring
+        tree.push(np.ones(15))
+        assert len(tree) == 28 and tree.capacity == 32
+        assert np.allclose(tree.priorities(), np.concatenate([expected, np.ones(15)]))
+
+    def test_sample(self):
+        np.random.seed(0)
+        tree = PriorityTree(capacity=4, alpha=1.)
+        tree.push(np.array([0., 1., 3., 0.]))
+        indices, probs = tree.sample(2, replace=False)
+        # the transitions with zero priority are (almost) never sampled
+        assert sorted(indices.tolist()) == [1, 2]
+        assert np.allclose(probs, np.array([1., 3.])[indices - 1] / 4., atol=1e-5)
+        # the masked out leaves are restored after sampling without replacement
+        assert np.isclose(tree.total(), 4. + 4e-6)
+
+        indices, _ = tree.sample(20000, replace=True)
+        freq = np.bincount(indices, minlength=4) / 20000
+        assert np.allclose(freq, [0., 0.25, 0.75, 0.], atol=0.02)
+
+
+@pytest.mark.unittest
+def test_game_buffer_with_priority_tree():
+    buffer = EfficientZeroGameBuffer(config)
+    data = [[1, 1, 1] for _ in range(10)]
+    meta = {'done': True, 'unroll_plus_td_steps': 5, 'priorities': np.array([0.9 for _ in range(10)])}
+    for _ in range(10):
+        buffer._push_game_segment(data, meta)
+    assert buffer.get_num_of_transitions() == 100
+    assert len(buffer._priority_tree) == 100
+
+    game_segment_list, pos_in_game_segment_list, batch_index_list, weights_list, make_time = \
+        buffer._sample_orig_data(batch_size=10)
+    assert len(set(batch_index_list.tolist())) == 10
+    assert np.all(np.diff(batch_index_list) > 0)
+    assert np.allclose(weights_list, 1.)
+
+    train_data = [[[], [], [], batch_index_list[:2], [], np.array([np.inf, np.inf])], []]
+    buffer.update_priority(train_data, [2., 3.])
+    assert np.allclose(buffer._priority_tree.priorities()[batch_index_list[:2]], [2., 3.])
+
+    # no priorities given: the new transitions get the max priority
+    buffer._push_game_segment(data, {'done': True, 'unroll_plus_td_steps': 5, 'priorities': None})
+    assert np.allclose(buffer._priority_tree.priorities()[-10:], 3.)
+
+    buffer.remove_oldest_data_to_fit()
+    assert buffer.get_num_of_transitions() <= config.replay_buffer_size
+    assert len(buffer._priority_tree) == buffer.get_num_of_transitions()
+    assert np.allclose(buffer._priority_tree.priorities()[-10:], 3.)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('use_priority_tree', [False, True])
+def test_vectorized_update_priority(use_priority_tree):
+    buffer = EfficientZeroGameBuffer(EasyDict(dict(config, use_priority_tree=use_priority_tree)))
+    data = [[1, 1, 1] for _ in range(10)]
+    for i in range(3):
+        buffer._push_game_segment(data, {'done': True, 'unroll_plus_td_steps': 5, 'priorities': np.full(10, 0.5)})
+
+    indices = np.array([3, 7, 3, 21])
+    # the batch made before the last removal (make_time < clear_time) is skipped
+    make_time = np.array([np.inf, -np.inf, np.inf, np.inf])
+    buffer.update_priority([[[], [], [], indices, [], make_time], []], np.array([2., 5., 4., 0.1]))
+    expected = np.full(30, 0.5)
+    # the last priority of a duplicated index is kept
+    expected[[3, 21]] = [4., 0.1]
+    priorities = buffer._priority_tree.priorities() if use_priority_tree else buffer.game_pos_priorities
+    assert np.allclose(priorities, expected)
+    assert buffer._max_priority() == 4.
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from ding.model import model_wrap
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.reanalyze_cache import ReanalyzeCache, mark_target_model_loaded
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+
+@pytest.mark.unittest
+def test_reanalyze_cache():
+    cache = ReanalyzeCache(capacity=2)
+    # nothing is cached for an unknown model version, and the lookups are not counted
+    cache.put([(0, 0, None)], [(1., [1, 2])])
+    assert cache.get([(0, 0, None)]) == [None] and len(cache) == 0
+    cache.set_model_version(0)
+    cache.put([(0, 0, 0), None, (0, 1, 0)], [(1., [1, 2]), (2., [3, 4]), (3., [5, 6])])
+    assert len(cache) == 2
+    # the None keys of the roots which are not cached are not counted as misses
+    assert cache.get([(0, 0, 0), None]) == [(1., [1, 2]), None]
+    # (0, 1, 0) is the least recently used one
+    cache.put([(1, 0, 0)], [(4., [7, 8])])
+    assert cache.get([(0, 1, 0), (0, 0, 0), (1, 0, 0)]) == [None, (1., [1, 2]), (4., [7, 8])]
+    assert cache.hits == 3 and cache.misses == 1 and cache.hit_rate() == 0.75
+    cache.set_model_version(1)
+    assert len(cache) == 0
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('buffer_type', [MuZeroGameBuffer, EfficientZeroGameBuffer])
+@pytest.mark.parametrize('use_fused_reanalyze', [False, True])
+def test_game_buffer_with_reanalyze_cache(buffer_type, use_fused_reanalyze):
+    config = EasyDict(
+        dict(
+            game_buffer_config,
+            replay_buffer_size=60,
+            reanalyze_ratio=1.,
+            reanalyze_cache_size=1000,
+            use_fused_reanalyze=use_fused_reanalyze
+        )
+    )
+    buffer = buffer_type(config)
+    for seed in range(3):
+        buffer.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=seed))
+        buffer.remove_oldest_data_to_fit()
+
+    model = make_model(config, buffer_type)
+    target_model = model_wrap(model, wrapper_name='target', update_type='assign', update_kwargs={'freq': 2})
+    policy = SimpleNamespace(_target_model=target_model)
+    cache = buffer._reanalyze_cache
+
+    np.random.seed(0)
+    _, target_batch = buffer.sample(6, policy)
+    assert cache.model_version == (0, 0) and len(cache) > 0 and cache.hits == 0
+    assert cache.misses == 6 * (config.num_unroll_steps + 1)
+    # the same transitions are sampled again before the target model is updated
+    np.random.seed(0)
+    _, cached_target_batch = buffer.sample(6, policy)
+    assert cache.hits == 6 * (config.num_unroll_steps + 1)
+    assert np.array_equal(np.asarray(target_batch[2]), np.asarray(cached_target_batch[2]))
+
+    target_model.update(model.state_dict())
+    np.random.seed(0)
+    buffer.sample(6, policy)
+    assert cache.model_version == (0, 0) and cache.hits == 12 * (config.num_unroll_steps + 1)
+    # the second update loads the weights of the learner model, so the cached roots are outdated
+    target_model.update(model.state_dict())
+    np.random.seed(0)
+    buffer.sample(6, policy)
+    assert cache.model_version == (0, 1) and cache.hits == 12 * (config.num_unroll_steps + 1)
+    # the value roots, which are not cached, are not counted
+    assert cache.hit_rate() == 0.5
+
+    # the weights loaded into the target model, e.g. from a checkpoint, do not reuse the cached roots
+    target_model.load_state_dict(model.state_dict())
+    mark_target_model_loaded(target_model)
+    np.random.seed(0)
+    buffer.sample(6, policy)
+    assert cache.model_version == (1, 1) and cache.hits == 12 * (config.num_unroll_steps + 1)
@@ -0,0 +1,143 @@
+import copy
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+from ding.model import model_wrap
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.reanalyze_daemon import ReanalyzeDaemon
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('buffer_type', [MuZeroGameBuffer, EfficientZeroGameBuffer])
+@pytest.mark.parametrize('env_type', ['not_board_games', 'board_games'])
+def test_refresh_targets(buffer_type, env_type):
+    config = EasyDict(dict(game_buffer_config, env_type=env_type, use_reanalyze_daemon=True))
+    buffer = buffer_type(config)
+    buffer.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=0))
+    model = make_model(config, buffer_type)
+    model.eval()
+    old_child_visits = [list(map(list, g.child_visit_segment)) for g in buffer.game_segment_buffer]
+    stalest = list(buffer._target_refresh_time)
+
+    # the stalest game segments are refreshed first
+    refresh_context = buffer._prepare_refresh_context(1)
+    game_segments, segment_indices = refresh_context[:2]
+    assert segment_indices == stalest[:1] and game_segments[0] is buffer.game_segment_buffer[0]
+    num_of_positions = len(game_segments[0].child_visit_segment)
+    assert len(refresh_context[2]) == num_of_positions
+    assert buffer._refresh_targets(refresh_context, model) == num_of_positions
+    assert list(buffer._target_refresh_time) == stalest[1:] + stalest[:1]
+    assert buffer.num_of_refreshed_transitions == num_of_positions
+
+    game_segment = buffer.game_segment_buffer[0]
+    for t in range(num_of_positions):
+        # the refreshed distributions are over the same legal actions as the stored ones
+        assert len(game_segment.child_visit_segment[t]) == len(old_child_visits[0][t])
+        assert np.isclose(sum(game_segment.child_visit_segment[t]), 1)
+    assert any(
+        not np.allclose(new, old) for new, old in zip(game_segment.child_visit_segment, old_child_visits[0])
+    )
+    # the other game segments are not refreshed
+    for game_segment, child_visits in zip(buffer.game_segment_buffer[1:], old_child_visits[1:]):
+        assert all(np.array_equal(new, old) for new, old in zip(game_segment.child_visit_segment, child_visits))
+    mean_staleness, max_staleness = buffer.get_target_staleness()
+    assert 0 <= mean_staleness <= max_staleness
+
+    # the game segments removed during the search are skipped by the write-back, which holds the lock of the buffer
+    lock = threading.RLock()
+    refresh_context = buffer._prepare_refresh_context(2 * num_of_positions)
+    removed_segment, kept_indices = refresh_context[0][0], refresh_context[1][1:]
+    removed_child_visits = list(map(list, removed_segment.child_visit_segment))
+    assert len(kept_indices) > 0 and min(kept_indices) > refresh_context[1][0]
+    buffer._remove(refresh_context[1][0] - buffer.base_idx + 1)
+    refresh_time = list(buffer._segment_refresh_time)
+    assert buffer._refresh_targets(refresh_context, model, lock) == len(refresh_context[2])
+    assert all(np.array_equal(new, old) for new, old in zip(removed_segment.child_visit_segment, removed_child_visits))
+    assert list(buffer._target_refresh_time)[-len(kept_indices):] == kept_indices
+    for segment_index in kept_indices:
+        position = segment_index - buffer.base_idx
+        assert buffer._segment_refresh_time[position] > refresh_time[position]
+
+
+@pytest.mark.unittest
+def test_reanalyze_daemon():
+    config = EasyDict(dict(game_buffer_config, replay_buffer_size=60, reanalyze_ratio=0.5, use_reanalyze_daemon=True))
+    buffer = MuZeroGameBuffer(config)
+    model = make_model(config, MuZeroGameBuffer)
+    policy = SimpleNamespace(_model=model, _target_model=model)
+    daemon = ReanalyzeDaemon(buffer, policy, budget=1e5)
+    try:
+        for seed in range(3):
+            with daemon.lock:
+                buffer.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=seed))
+                buffer.remove_oldest_data_to_fit()
+        # all the game segments are refreshed in the background
+        deadline = time.time() + 60
+        num_of_transitions = sum(len(g.child_visit_segment) for g in buffer.game_segment_buffer)
+        while buffer.num_of_refreshed_transitions < 2 * num_of_transitions and time.time() < deadline:
+            time.sleep(0.01)
+        assert buffer.num_of_refreshed_transitions >= 2 * num_of_transitions
+        assert daemon.refresh_rate > 0
+        num_of_game_segments = len(buffer.game_segment_buffer)
+        assert set(buffer._target_refresh_time) == set(range(buffer.base_idx, buffer.base_idx + num_of_game_segments))
+        # the stored policy targets are served without reanalysis
+        with daemon.lock:
+            current_batch, target_batch = buffer.sample(6, policy)
+        assert np.asarray(target_batch[2]).shape == (6, config.num_unroll_steps + 1, config.model.action_space_size)
+        daemon.sync_target_model(10)
+        assert daemon.model_version == 10
+    finally:
+        daemon.close()
+
+
+@pytest.mark.unittest
+def test_reanalyze_daemon_sync_during_search():
+    config = EasyDict(dict(game_buffer_config, replay_buffer_size=60, use_reanalyze_daemon=True))
+    buffer = MuZeroGameBuffer(config)
+    buffer.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=0))
+    model = make_model(config, MuZeroGameBuffer)
+    target_model = model_wrap(
+        copy.deepcopy(model), wrapper_name='target', update_type='assign', update_kwargs={'freq': 2}
+    )
+    policy = SimpleNamespace(_model=model, _target_model=target_model)
+    # the searches of the daemon block until the end of the test
+    searching, finish = threading.Event(), threading.Event()
+    searched_models = []
+
+    def refresh_targets(refresh_context, searched_model, lock=None):
+        searched_models.append(searched_model)
+        searching.set()
+        finish.wait()
+        return 0
+
+    buffer._refresh_targets = refresh_targets
+    daemon = ReanalyzeDaemon(buffer, policy, budget=1e5, sync_freq=1)
+    try:
+        assert searching.wait(10)
+        # the target weights are not changed by the first update, so nothing is synchronized
+        target_model.update(model.state_dict())
+        daemon.sync_target_model(1)
+        assert daemon.model_version == 0
+        with torch.no_grad():
+            for p in model.parameters():
+                p.add_(1.)
+        target_model.update(model.state_dict())
+        # the new weights are loaded into the spare model without waiting for the search in progress
+        start_time = time.time()
+        daemon.sync_target_model(2)
+        assert time.time() - start_time < 5 and daemon.model_version == 2
+        assert daemon._target_model is not searched_models[0]
+        for p, target_p in zip(model.parameters(), daemon._target_model.parameters()):
+            assert torch.equal(p, target_p)
+    finally:
+        finish.set()
+        daemon.close()
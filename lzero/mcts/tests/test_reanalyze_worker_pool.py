@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('buffer_type', [MuZeroGameBuffer, EfficientZeroGameBuffer])
+def test_reanalyze_worker_pool(buffer_type):
+    config = EasyDict(dict(game_buffer_config, reanalyze_ratio=1., lstm_horizon_len=3, batch_size=16))
+    buffer = buffer_type(config)
+    pool_buffer = buffer_type(EasyDict(dict(config, reanalyze_num_workers=2, reanalyze_model_sync_freq=2)))
+    for b in [buffer, pool_buffer]:
+        b.push_game_segments(make_game_segments(config, num_of_episodes=3))
+    model = make_model(config, buffer_type, lstm_hidden_size=16, last_linear_layer_init_zero=False)
+    policy = SimpleNamespace(_target_model=model)
+
+    try:
+        for i in range(3):
+            np.random.seed(i)
+            current_batch, target_batch = buffer.sample(config.batch_size, policy)
+            np.random.seed(i)
+            pool_current_batch, pool_target_batch = pool_buffer.sample(config.batch_size, policy)
+            assert np.array_equal(current_batch[3], pool_current_batch[3])
+
+            rewards, target_values, target_policies = target_batch
+            pool_rewards, pool_target_values, pool_target_policies = pool_target_batch
+            # the model inference is deterministic, while the reanalyzed policies depend on the root noises
+            assert np.allclose(rewards.astype(np.float64), pool_rewards)
+            # the workers still use the weights of the first minibatch until the 2nd synchronization
+            synchronized = i != 1
+            assert np.allclose(target_values.astype(np.float64), pool_target_values) == synchronized
+            assert pool_target_policies.shape == target_policies.shape
+            assert np.allclose(pool_target_policies.sum(-1), target_policies.sum(-1))
+
+            # change the target model, the workers are synchronized every 2 minibatches
+            with torch.no_grad():
+                for p in model.parameters():
+                    p.add_(0.1)
+        workers = pool_buffer._reanalyze_pool._workers
+    finally:
+        pool_buffer.close()
+    assert pool_buffer._reanalyze_pool is None
+    assert not any(worker.is_alive() for worker in workers)
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.replay_buffer_server import ReplayBufferServer
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments, \
+    make_model
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    'transport, device', [
+        ('pipe', 'cpu'),
+        ('socket', 'cpu'),
+        pytest.param('pipe', 'cuda', marks=pytest.mark.skipif(not torch.cuda.is_available(), reason='no cuda')),
+    ]
+)
+def test_replay_buffer_server(transport, device):
+    config = EasyDict(dict(game_buffer_config, replay_buffer_size=1000))
+    model = make_model(config, MuZeroGameBuffer)
+    policy = SimpleNamespace(_target_model=model)
+    server = ReplayBufferServer(
+        MuZeroGameBuffer, config, model, num_shards=2, transport=transport, num_clients=2, device=device
+    )
+    try:
+        # e.g. two DDP ranks, which push their own game segments to the global buffer
+        clients = [server.connect(client_id) for client_id in range(2)]
+        num_of_transitions = 0
+        for seed, client in enumerate(clients):
+            game_segments, metas = make_game_segments(config, num_of_episodes=2, seed=seed)
+            client.push_game_segments((game_segments, metas))
+            num_of_transitions += sum(len(game_segment) for game_segment in game_segments)
+        clients[0].get_stats()
+        assert clients[0].get_num_of_transitions() == num_of_transitions
+
+        local_buffer = MuZeroGameBuffer(config)
+        local_buffer.push_game_segments(make_game_segments(config, num_of_episodes=2, seed=0))
+        expected_current_batch, expected_target_batch = local_buffer.sample(16, policy)
+        current_batch, target_batch = clients[1].sample(16, policy)
+        for expected, value in zip(expected_current_batch + expected_target_batch, current_batch + target_batch):
+            assert expected.shape == value.shape
+        # the minibatch is sampled from both shards, whose shard ids are encoded in the batch indices
+        assert set(current_batch[-3] % 2) == {0, 1}
+
+        clients[1].update_priority([current_batch, target_batch], np.full(16, 2.))
+        stats = clients[0].get_stats()
+        assert len(stats) == 2 and sum(s['num_of_transitions'] for s in stats) == num_of_transitions
+        assert sum(s['updated_priorities_per_second'] for s in stats) > 0
+        assert all(s['pushed_transitions_per_second'] > 0 and s['latency'] > 0 for s in stats)
+
+        # the errors of the shards are raised in the client, which stays usable
+        with pytest.raises(RuntimeError):
+            clients[0]._request({0: ('unknown', None), 1: ('stats', None)})
+        assert clients[0].sample(4, policy)[0][0].shape[0] == 4
+        for client in clients:
+            client.close()
+    finally:
+        server.close()
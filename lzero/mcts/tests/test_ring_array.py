@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.ring_array import RingArray
+
+config = EasyDict(
+    dict(
+        batch_size=10,
+        transition_num=20,
+        priority_prob_alpha=0.6,
+        priority_prob_beta=0.4,
+        replay_buffer_size=50,
+        env_type='not_board_games',
+        use_priority=True,
+    )
+)
+
+
+@pytest.mark.unittest
+class TestRingArray:
+
+    def test_scalar(self):
+        ring = RingArray(8, dtype=np.float64)
+        ring.extend(np.arange(6))
+        del ring[:4]
+        # wrap around the end of the preallocated array
+        ring += np.arange(6, 12)
+        assert len(ring) == 8 and ring.capacity == 8
+        assert np.array_equal(ring.values(), np.arange(4, 12))
+        assert ring[0] == 4 and ring[-1] == 11
+        assert np.array_equal(ring[np.array([1, 7])], [5, 11])
+        ring[np.array([0, 1])] = -1
+        assert np.array_equal(ring[:3], [-1, -1, 6])
+        assert ring.max() == 11
+        # grow when the capacity is exceeded
+        ring.append(12)
+        assert ring.capacity == 16
+        assert np.array_equal(ring.values(), [-1, -1] + list(range(6, 13)))
+
+    def test_object(self):
+        ring = RingArray(2, dtype=object)
+        segments = [[i] * 3 for i in range(5)]
+        for segment in segments:
+            ring.append(segment)
+        assert [ring[i] for i in range(5)] == segments
+        ring.popleft(2)
+        assert list(ring) == segments[2:]
+        assert ring[np.array([0, 2])].tolist() == [segments[2], segments[4]]
+
+
+@pytest.mark.unittest
+def test_game_buffer_with_ring_buffer():
+    buffer = EfficientZeroGameBuffer(config)
+    ring_buffer = EfficientZeroGameBuffer(EasyDict(dict(config, use_ring_buffer=True)))
+    assert isinstance(ring_buffer.game_pos_priorities, RingArray)
+    for i in range(12):
+        data = [[i, i, i] for _ in range(10)]
+        priorities = None if i % 3 == 0 else np.random.uniform(0.1, 1, 10)
+        meta = {'done': i % 2 == 0, 'unroll_plus_td_steps': 5, 'priorities': priorities}
+        for b in [buffer, ring_buffer]:
+            b._push_game_segment(data, meta)
+            b.remove_oldest_data_to_fit()
+
+    assert buffer.get_num_of_transitions() == ring_buffer.get_num_of_transitions()
+    assert buffer.base_idx == ring_buffer.base_idx
+    assert ring_buffer.transition_base_idx == 12 * 10 - ring_buffer.get_num_of_transitions()
+    assert np.allclose(buffer.game_pos_priorities, ring_buffer.game_pos_priorities.values())
+    assert np.array_equal(np.array(buffer.game_segment_game_pos_look_up), ring_buffer.game_segment_game_pos_look_up.values())
+
+    np.random.seed(0)
+    orig_data = buffer._sample_orig_data(batch_size=5)
+    np.random.seed(0)
+    ring_orig_data = ring_buffer._sample_orig_data(batch_size=5)
+    for item, ring_item in zip(orig_data[:4], ring_orig_data[:4]):
+        assert np.allclose(np.array(item), np.array(ring_item))
+
+    train_data = [[[], [], [], ring_orig_data[2][:2], [], np.array([np.inf, np.inf])], []]
+    ring_buffer.update_priority(train_data, [2., 3.])
+    assert np.allclose(ring_buffer.game_pos_priorities[ring_orig_data[2][:2]], [2., 3.])
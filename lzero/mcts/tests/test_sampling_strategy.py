@@ -0,0 +1,88 @@
+import time
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.sampling_strategy import RecencyStrategy, ReanalyzeFreshFirstStrategy, SamplingStrategy, \
+    get_sampling_strategy
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments
+
+
+def make_buffer(**kwargs):
+    buffer = MuZeroGameBuffer(EasyDict(dict(game_buffer_config, **kwargs)))
+    for seed in range(3):
+        buffer.push_game_segments(make_game_segments(buffer._cfg, num_of_episodes=2, seed=seed))
+    return buffer
+
+
+def sample_counts(buffer, num_of_batches=300):
+    np.random.seed(0)
+    counts = np.zeros(buffer.get_num_of_transitions())
+    for _ in range(num_of_batches):
+        batch_index_list = buffer._sample_orig_data(6)[2]
+        assert len(np.unique(batch_index_list)) == 6
+        counts[batch_index_list] += 1
+    return counts
+
+
+@pytest.mark.unittest
+def test_get_sampling_strategy():
+    assert not get_sampling_strategy('uniform').use_priority
+    assert get_sampling_strategy('per').weights(None, np.arange(3)) is None
+    strategy = get_sampling_strategy('recency', half_life=0.5, min_weight=0.1)
+    assert isinstance(strategy, RecencyStrategy) and strategy.half_life == 0.5
+    custom_strategy = SamplingStrategy()
+    assert get_sampling_strategy(custom_strategy) is custom_strategy
+    with pytest.raises(AssertionError):
+        get_sampling_strategy('unknown')
+
+
+@pytest.mark.unittest
+def test_strategy_weights():
+    buffer = make_buffer()
+    num_of_transitions = buffer.get_num_of_transitions()
+    weights = RecencyStrategy(half_life=0.5, min_weight=0.01).weights(buffer, np.arange(num_of_transitions))
+    assert weights[-1] == 1 and np.all(np.diff(weights) > 0)
+    assert np.isclose(weights[num_of_transitions // 2 - 1], 0.5, atol=0.05)
+    assert np.all(RecencyStrategy(half_life=1e-3, min_weight=0.2).weights(buffer, np.arange(10)) == 0.2)
+
+    # the game segments refreshed just now have the weight 1, the others are stale
+    buffer._segment_refresh_time[np.arange(len(buffer._segment_refresh_time))] = time.time() - 60
+    buffer._segment_refresh_time[np.array([1])] = time.time()
+    weights = ReanalyzeFreshFirstStrategy(half_life=60.).weights(buffer, np.arange(num_of_transitions))
+    fresh = buffer._get_game_segment_index(np.arange(num_of_transitions)) == 1
+    assert np.allclose(weights[fresh], 1, atol=1e-3) and np.allclose(weights[~fresh], 0.5, atol=1e-3)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('use_priority_tree', [False, True])
+def test_sampling_strategy(use_priority_tree):
+    # the recent transitions are sampled more often than the old ones
+    buffer = make_buffer(use_priority_tree=use_priority_tree, sampling_strategy='recency', sampling_half_life=0.1)
+    counts = sample_counts(buffer)
+    half = len(counts) // 2
+    assert counts[half:].sum() > 5 * counts[:half].sum()
+
+    # only the freshly refreshed game segments are sampled, up to the min weight
+    buffer = make_buffer(
+        use_priority_tree=use_priority_tree,
+        sampling_strategy='reanalyze_fresh_first',
+        sampling_half_life=1.,
+        sampling_min_weight=1e-3
+    )
+    buffer._segment_refresh_time[np.arange(len(buffer._segment_refresh_time))] = time.time() - 100
+    buffer._segment_refresh_time[np.array([0, 2, 4])] = time.time() + 100
+    counts = sample_counts(buffer)
+    fresh = np.isin(buffer._get_game_segment_index(np.arange(len(counts))), [0, 2, 4])
+    assert counts[fresh].sum() > 0.95 * counts.sum()
+
+    # the uniform strategy ignores the priorities, but keeps them
+    buffer = make_buffer(use_priority_tree=use_priority_tree, sampling_strategy='uniform')
+    priorities = np.full(buffer.get_num_of_transitions(), 1e-3)
+    priorities[0] = 1e3
+    buffer._set_priorities(np.arange(len(priorities)), priorities)
+    counts = sample_counts(buffer)
+    assert counts[0] < 0.2 * 300 and counts[1:].min() > 0
+    assert buffer._max_priority() == 1e3
@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.columnar_game_segment import ColumnarGameSegment
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.mcts.buffer.segment_dataset import SegmentDatasetReader, SegmentDatasetWriter, load_segment_dataset
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments
+
+
+def assert_same_game_segments(expected, value):
+    assert len(expected) == len(value)
+    for game_segment, restored_game_segment in zip(expected, value):
+        assert type(restored_game_segment) is type(game_segment)
+        for field in ['obs_segment', 'action_segment', 'reward_segment', 'child_visit_segment', 'root_value_segment']:
+            expected_values, values = getattr(game_segment, field), getattr(restored_game_segment, field)
+            assert all(np.array_equal(a, b) for a, b in zip(expected_values, values)), field
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    'game_segment_type, compression', [(GameSegment, None), (GameSegment, 'zlib'), (ColumnarGameSegment, None)]
+)
+def test_segment_dataset(tmp_path, game_segment_type, compression):
+    config = EasyDict(game_buffer_config)
+    path = os.path.join(str(tmp_path), 'dataset')
+    data = [
+        make_game_segments(config, num_of_episodes=2, seed=seed, game_segment_type=game_segment_type)
+        for seed in range(3)
+    ]
+    game_segments = sum([d[0] for d in data], [])
+    metas = sum([d[1] for d in data], [])
+
+    writer = SegmentDatasetWriter(path, shard_size=5, compression=compression)
+    writer.write(data[0])
+    writer.write(data[1])
+    # the readers only see the finished shards
+    assert len(list(SegmentDatasetReader(path))) == len(data[0][0]) + len(data[1][0]) - writer._num_of_records
+    num_of_written = len(data[0][0]) + len(data[1][0])
+    # the writer is killed without closing the unfinished shard
+    writer._file.close()
+    # a resumed writer keeps the complete records of the unfinished shard and drops a truncated last record
+    with open(writer._part_path(), 'ab') as f:
+        f.write(b'\x05\x00')
+    with pytest.raises(AssertionError):
+        SegmentDatasetWriter(path, shard_size=5, compression='lz4' if compression is None else None)
+    with SegmentDatasetWriter(path, shard_size=5, compression=compression) as writer:
+        writer.write(data[2])
+    records = list(SegmentDatasetReader(path))
+    assert len(records) == len(game_segments) and num_of_written < len(records)
+    assert_same_game_segments(game_segments, [record[0] for record in records])
+    for meta, (_, restored_meta) in zip(metas, records):
+        assert meta['done'] == restored_meta['done'] and np.array_equal(meta['priorities'], restored_meta['priorities'])
+
+    # the shards are split across the readers, and a reader resumes from the cursor of a previous one
+    readers = [SegmentDatasetReader(path, rank=rank, world_size=2) for rank in range(2)]
+    assert sum(len(list(reader)) for reader in readers) == len(game_segments)
+    reader = SegmentDatasetReader(path)
+    first, _ = reader.read(4)
+    rest, _ = SegmentDatasetReader(path, cursor=reader.cursor).read(100)
+    assert_same_game_segments(game_segments, first + rest)
+    assert len(reader.read(100)[0]) == len(game_segments) - 4 and len(reader.read(100)[0]) == 0
+
+    # the game segments are streamed into a buffer
+    buffer = MuZeroGameBuffer(config)
+    cursor = load_segment_dataset(buffer, path, num_of_game_segments=5, batch_size=2)
+    assert len(buffer.game_segment_buffer) == 5
+    load_segment_dataset(buffer, path, cursor=cursor)
+    expected_buffer = MuZeroGameBuffer(config)
+    for d in data:
+        expected_buffer.push_game_segments(d)
+    assert buffer.get_num_of_transitions() == expected_buffer.get_num_of_transitions()
+    assert_same_game_segments(expected_buffer.game_segment_buffer, buffer.game_segment_buffer)
+    with pytest.raises(AssertionError):
+        load_segment_dataset(MuZeroGameBuffer(EasyDict(dict(config, obs_codec='zlib'))), path)
+
+
+@pytest.mark.unittest
+def test_segment_dataset_concurrent_writers(tmp_path):
+    config = EasyDict(game_buffer_config)
+    path = os.path.join(str(tmp_path), 'dataset')
+    data = [make_game_segments(config, num_of_episodes=2, seed=seed) for seed in range(4)]
+    # e.g. two DDP ranks, which export their collected game segments to the same dataset at the same time
+    writers = [SegmentDatasetWriter(path, shard_size=3, writer_id=writer_id) for writer_id in range(2)]
+    for i, d in enumerate(data):
+        writers[i % 2].write(d)
+    reader = SegmentDatasetReader(path)
+    first, _ = reader.read(4)
+    for writer in writers:
+        writer.close()
+    game_segments = [data[writer_id][0] + data[writer_id + 2][0] for writer_id in range(2)]
+    num_of_shards = [(len(segments) + 2) // 3 for segments in game_segments]
+    assert sorted(os.listdir(path)) == sorted(
+        ['meta.pkl'] + [
+            'shard_{:03d}_{:06d}.bin'.format(writer_id, shard_id) for writer_id in range(2)
+            for shard_id in range(num_of_shards[writer_id])
+        ]
+    )
+    # the shards of the writers are interleaved, and the shards finished after the first read are also read
+    rest, _ = reader.read(100)
+    expected = [
+        game_segment for shard_id in range(max(num_of_shards)) for writer_id in range(2)
+        for game_segment in game_segments[writer_id][3 * shard_id:3 * shard_id + 3]
+    ]
+    assert_same_game_segments(expected, first + rest)
+    # the shards of both writers are split across the readers
+    records = [list(SegmentDatasetReader(path, rank=rank, world_size=2)) for rank in range(2)]
+    assert all(len(r) > 0 for r in records) and sum(len(r) for r in records) == len(expected)
+
+    # a writer resumes its own shards only
+    with SegmentDatasetWriter(path, shard_size=3, writer_id=1) as writer:
+        assert writer._shard_id == num_of_shards[1]
@@ -0,0 +1,72 @@
+import pickle
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.ring_array import FrameSlice
+from lzero.mcts.buffer.shared_obs_arena import SharedObsArena
+from lzero.mcts.tests.config.game_buffer_config_for_test import game_buffer_config, make_game_segments
+
+
+@pytest.mark.unittest
+class TestSharedObsArena:
+
+    def test_arena(self):
+        arena = SharedObsArena(8, shape=(2, ), dtype=np.float32)
+        arena.extend(np.arange(12, dtype=np.float32).reshape(6, 2))
+        arena.popleft(4)
+        # wrap around the end of the shared memory block
+        arena.extend(np.arange(12, 24, dtype=np.float32).reshape(6, 2))
+        assert arena.base == 4 and len(arena) == 8
+        frames = FrameSlice(arena, np.arange(5, 9))
+        expected = np.arange(10, 18, dtype=np.float32).reshape(4, 2)
+        assert np.array_equal(np.asarray(frames), expected)
+        assert np.array_equal(frames[-1], expected[-1])
+        assert isinstance(frames[1:3], FrameSlice) and np.array_equal(np.asarray(frames[1:3]), expected[1:3])
+
+        # only the reference is pickled, and the unpickled slice reads the same shared memory block
+        data = pickle.dumps(frames)
+        assert len(data) < 1024
+        attached = pickle.loads(data)
+        assert attached.store.name == arena.name
+        arena[np.array([1])] = -1.
+        assert np.array_equal(np.asarray(attached)[0], [-1., -1.])
+
+        # the global indices are kept after a growth
+        arena.extend(np.zeros((4, 2), dtype=np.float32))
+        assert arena.capacity == 16
+        assert np.array_equal(np.asarray(frames)[1:], expected[1:])
+
+
+@pytest.mark.unittest
+def test_game_buffer_with_shared_obs_store():
+    buffer = MuZeroGameBuffer(EasyDict(dict(game_buffer_config, replay_buffer_size=60)))
+    shared_buffer = MuZeroGameBuffer(
+        EasyDict(dict(game_buffer_config, replay_buffer_size=60, use_vectorized_batch=True, use_shared_obs_store=True))
+    )
+    for seed in range(4):
+        for b in [buffer, shared_buffer]:
+            b.push_game_segments(make_game_segments(game_buffer_config, num_of_episodes=2, seed=seed))
+            b.remove_oldest_data_to_fit()
+    assert isinstance(shared_buffer._obs_store, SharedObsArena)
+    for game_segment, shared_game_segment in zip(buffer.game_segment_buffer, shared_buffer.game_segment_buffer):
+        assert isinstance(shared_game_segment.obs_segment, FrameSlice)
+        assert np.array_equal(game_segment.obs_segment, np.asarray(shared_game_segment.obs_segment))
+        assert np.array_equal(
+            game_segment.get_unroll_obs(0, 3, padding=True), shared_game_segment.get_unroll_obs(0, 3, padding=True)
+        )
+    # a pickled game segment does not contain its frames
+    game_segment = shared_buffer.game_segment_buffer[0]
+    assert np.asarray(game_segment.obs_segment)[:2].tobytes() not in pickle.dumps(game_segment)
+
+    for seed in range(2):
+        np.random.seed(seed)
+        context = buffer._make_batch(6, 0.5)
+        np.random.seed(seed)
+        shared_context = shared_buffer._make_batch(6, 0.5)
+        assert np.array_equal(context[-1][0], shared_context[-1][0])
+        # the observations of the reanalyze contexts
+        for i in [0, 1]:
+            assert np.array_equal(np.array(context[i][0]), np.array(shared_context[i][0]))
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.tests.config.game_buffer_config_for_test import FakeModel
+from lzero.mcts.tree_search.mcts_ctree import MuZeroMCTSCtree
+from lzero.mcts.tree_search.mcts_ptree import MuZeroMCTSPtree
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('mcts_type, num_leaves', [(MuZeroMCTSCtree, 1), (MuZeroMCTSCtree, 2), (MuZeroMCTSPtree, 1)])
+def test_subtree_reuse(mcts_type, num_leaves):
+    batch_size, action_space_size = 3, 4
+    config = EasyDict(
+        num_simulations=20,
+        num_leaves_per_iteration=num_leaves,
+        discount_factor=0.997,
+        device='cpu',
+        model=dict(action_space_size=action_space_size, support_scale=300, categorical_distribution=True),
+    )
+    mcts = mcts_type(config)
+    model = FakeModel(action_space_size, batch_size)
+    legal_actions = [list(range(action_space_size)) for _ in range(batch_size)]
+    latent_state_roots = np.arange(batch_size, dtype=np.float32)[:, None].repeat(8, 1)
+
+    roots = mcts_type.roots(batch_size, legal_actions)
+    policy_logits = np.random.randn(batch_size, action_space_size).tolist()
+    roots.prepare_no_noise([0.] * batch_size, policy_logits, [-1] * batch_size)
+    latent_states = mcts.search(roots, model, latent_state_roots, [-1] * batch_size)
+    actions = [int(np.argmax(d)) for d in roots.get_distributions()]
+
+    # the new roots start from the subtrees of the chosen actions, without the visits of the chosen children
+    new_roots = mcts_type.roots(batch_size, legal_actions)
+    new_roots.prepare_no_noise([0.] * batch_size, [[0.] * action_space_size] * batch_size, [-1] * batch_size)
+    reused_states = []
+    for i, action in enumerate(actions):
+        ix, iy = new_roots.reuse_subtree(i, roots, i, action)
+        reused_states.append(np.asarray([np.asarray(latent_states[x][y]) for x, y in zip(ix, iy)]).reshape(-1, 8))
+    # every simulation through the chosen child expands one node of its subtree, the first one the child itself,
+    # except for the leaf nodes selected more than once in one iteration with the virtual losses
+    reused_visit_counts = [sum(d) for d in new_roots.get_distributions()]
+    for i, n in enumerate(reused_visit_counts):
+        if num_leaves == 1:
+            assert len(reused_states[i]) == n == max(roots.get_distributions()[i]) - 1
+        else:
+            assert len(reused_states[i]) <= n <= max(roots.get_distributions()[i]) - 1
+
+    reused_latent_states = np.zeros((max(len(s) for s in reused_states), batch_size, 8), dtype=np.float32)
+    for i, states in enumerate(reused_states):
+        reused_latent_states[:len(states), i] = states
+    # the model checks that the gathered latent states, including the reused ones, are the ones of the parents
+    latent_states = mcts.search(new_roots, model, latent_state_roots, [-1] * batch_size, reused_latent_states)
+    assert len(latent_states) == len(reused_latent_states) + (config.num_simulations - 1) // num_leaves + 2
+    assert [sum(d) for d in new_roots.get_distributions()] == [n + config.num_simulations for n in reused_visit_counts]
+    assert np.all(np.isfinite(new_roots.get_values()))
+
+    # an unexpanded child has no subtree to reuse
+    new_roots = mcts_type.roots(batch_size, legal_actions)
+    new_roots.prepare_no_noise([0.] * batch_size, [[0.] * action_space_size] * batch_size, [-1] * batch_size)
+    unvisited = [a for a, n in enumerate(roots.get_distributions()[0]) if n == 0]
+    if unvisited:
+        assert len(new_roots.reuse_subtree(0, roots, 0, unvisited[0])[0]) == 0
+        assert sum(new_roots.get_distributions()[0]) == 0
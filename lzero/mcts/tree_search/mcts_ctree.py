@@ -15,6 +15,45 @@ if TYPE_CHECKING:
     from lzero.mcts.ctree.ctree_muzero import mz_tree as mz_ctree
     from lzero.mcts.ctree.ctree_gumbel_muzero import gmz_tree as gmz_ctree
 
+
+
+def _latent_state_cache(
+        states: Any,
+        num_simulations: int,
+        device: str,
+        num_leaves: int = 1,
+        reused_states: Any = None
+) -> torch.Tensor:
+    """
+    Overview:
+        Preallocate the storage of the latent states of all the nodes of one search on ``device``, whose first row is
+        the given states of the roots, and whose row ``i`` is filled with the states of the leaf nodes expanded in the
+        simulation ``i``. The states of the leaf nodes of a simulation are then gathered by one indexing op, without
+        moving the states between the device and the cpu. The states of the nodes reused from the previous search
+        (see ``Roots.reuse_subtree``) take the rows after the first one, before the rows of the simulations.
+    Arguments:
+        - states (:obj:`Any`): the states of the roots, in shape (batch_size, *state_shape).
+        - num_simulations (:obj:`int`): the number of simulations of the search.
+        - device (:obj:`str`): the device of the model.
+        - num_leaves (:obj:`int`): the number of leaf nodes of each root expanded in one simulation.
+        - reused_states (:obj:`Any`): the states of the reused nodes, in shape (num_reused, batch_size, *state_shape).
+    Returns:
+        - cache (:obj:`torch.Tensor`): the float tensor in shape \
+            (num_reused + num_simulations + 1, num_leaves * batch_size, *state_shape).
+    """
+    states = torch.as_tensor(np.asarray(states) if not isinstance(states, torch.Tensor) else states)
+    num_reused = 0 if reused_states is None else len(reused_states)
+    cache = torch.empty(
+        (num_reused + num_simulations + 1, num_leaves * states.shape[0], *states.shape[1:]),
+        dtype=torch.float32,
+        device=device
+    )
+    cache[0, :states.shape[0]] = states
+    if num_reused > 0:
+        cache[1:num_reused + 1, :states.shape[0]] = torch.as_tensor(reused_states)
+    return cache
+
+
 # ==============================================================
 # EfficientZero
 # ==============================================================
@@ -25,7 +64,7 @@ class EfficientZeroMCTSCtree(object):
     Overview:
         MCTSCtree for EfficientZero. The core ``batch_traverse`` and ``batch_backpropagate`` function is implemented in C++.
     Interfaces:
-        __init__, roots, search
+        __init__, roots, reset_roots, search
         
     """
 
@@ -61,6 +100,8 @@ class EfficientZeroMCTSCtree(object):
         self.inverse_scalar_transform_handle = InverseScalarTransform(
             self._cfg.model.support_scale, self._cfg.device, self._cfg.model.categorical_distribution
         )
+        # the roots of the searches of ``reset_roots``, whose node pool is kept from one search to the next
+        self._roots = None
 
     @classmethod
     def roots(cls: int, active_collect_env_num: int, legal_actions: List[Any]) -> "ez_ctree.Roots":
@@ -74,6 +115,22 @@ class EfficientZeroMCTSCtree(object):
         from lzero.mcts.ctree.ctree_efficientzero import ez_tree as ctree
         return ctree.Roots(active_collect_env_num, legal_actions)
 
+    def reset_roots(self, active_collect_env_num: int, legal_actions: List[Any]) -> "ez_ctree.Roots":
+        """
+        Overview:
+            Return the roots of the next search, i.e. the roots kept by this MCTS reset to the new root nodes, so the
+            node pool grown by the previous searches is reused instead of allocated again. The roots returned by the
+            previous call are reset, so they must not be used any more.
+        Arguments:
+            - root_num (:obj:`int`): the number of the current root.
+            - legal_action_list (:obj:`list`): the vector of the legal action of this root.
+        """
+        if self._roots is None:
+            self._roots = self.roots(active_collect_env_num, legal_actions)
+        else:
+            self._roots.reset(active_collect_env_num, legal_actions)
+        return self._roots
+
     def search(
             self, roots: Any, model: torch.nn.Module, latent_state_roots: List[Any],
             reward_hidden_state_roots: List[Any], to_play_batch: Union[int, List[Any]]
@@ -93,13 +150,18 @@ class EfficientZeroMCTSCtree(object):
 
             # preparation some constant
             batch_size = roots.num
+            # preallocate the node pool of the whole search, in which every simulation expands one leaf node of each
+            # root, which is already done for the roots of ``reset_roots`` after the first search
+            roots.reserve((self._cfg.num_simulations + 1) * batch_size * self._cfg.model.action_space_size)
             pb_c_base, pb_c_init, discount_factor = self._cfg.pb_c_base, self._cfg.pb_c_init, self._cfg.discount_factor
+            num_simulations, device = self._cfg.num_simulations, self._cfg.device
 
-            # the data storage of latent states: storing the latent state of all the nodes in one search.
-            latent_state_batch_in_search_path = [latent_state_roots]
+            # the data storage of latent states: storing the latent state of all the nodes in one search, which is
+            # preallocated on the device of the model, where the latent states of the leaf nodes are gathered.
+            latent_state_batch_in_search_path = _latent_state_cache(latent_state_roots, num_simulations, device)
             # the data storage of value prefix hidden states in LSTM
-            reward_hidden_state_c_batch = [reward_hidden_state_roots[0]]
-            reward_hidden_state_h_batch = [reward_hidden_state_roots[1]]
+            reward_hidden_state_c_batch = _latent_state_cache(reward_hidden_state_roots[0][0], num_simulations, device)
+            reward_hidden_state_h_batch = _latent_state_cache(reward_hidden_state_roots[1][0], num_simulations, device)
 
             # minimax value storage
             min_max_stats_lst = tree_efficientzero.MinMaxStatsList(batch_size)
@@ -108,10 +170,6 @@ class EfficientZeroMCTSCtree(object):
             for simulation_index in range(self._cfg.num_simulations):
                 # In each simulation, we expanded a new node, so in one search, we have ``num_simulations`` num of nodes at most.
 
-                latent_states = []
-                hidden_states_c_reward = []
-                hidden_states_h_reward = []
-
                 # prepare a result wrapper to transport results between python and c++ parts
                 results = tree_efficientzero.ResultsWrapper(num=batch_size)
 
@@ -123,24 +181,19 @@ class EfficientZeroMCTSCtree(object):
                 MCTS stage 1: Selection
                     Each simulation starts from the internal root state s0, and finishes when the simulation reaches a leaf node s_l.
                 """
-                latent_state_index_in_search_path, latent_state_index_in_batch, last_actions, virtual_to_play_batch = tree_efficientzero.batch_traverse(
+                latent_state_index_in_search_path, latent_state_index_in_batch, last_actions, virtual_to_play_batch = tree_efficientzero.batch_traverse_array(
                     roots, pb_c_base, pb_c_init, discount_factor, min_max_stats_lst, results,
-                    copy.deepcopy(to_play_batch)
+                    np.array(to_play_batch, dtype=np.int32)
                 )
                 # obtain the search horizon for leaf nodes
                 search_lens = results.get_search_len()
 
                 # obtain the latent state for leaf node
-                for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
-                    latent_states.append(latent_state_batch_in_search_path[ix][iy])
-                    hidden_states_c_reward.append(reward_hidden_state_c_batch[ix][0][iy])
-                    hidden_states_h_reward.append(reward_hidden_state_h_batch[ix][0][iy])
-
-                latent_states = torch.from_numpy(np.asarray(latent_states)).to(self._cfg.device).float()
-                hidden_states_c_reward = torch.from_numpy(np.asarray(hidden_states_c_reward)).to(self._cfg.device
-                                                                                                 ).unsqueeze(0)
-                hidden_states_h_reward = torch.from_numpy(np.asarray(hidden_states_h_reward)).to(self._cfg.device
-                                                                                                 ).unsqueeze(0)
+                ix = torch.as_tensor(latent_state_index_in_search_path, dtype=torch.long, device=device)
+                iy = torch.as_tensor(latent_state_index_in_batch, dtype=torch.long, device=device)
+                latent_states = latent_state_batch_in_search_path[ix, iy]
+                hidden_states_c_reward = reward_hidden_state_c_batch[ix, iy].unsqueeze(0)
+                hidden_states_h_reward = reward_hidden_state_h_batch[ix, iy].unsqueeze(0)
                 # .long() is only for discrete action
                 last_actions = torch.from_numpy(np.asarray(last_actions)).to(self._cfg.device).long()
                 """
@@ -154,41 +207,34 @@ class EfficientZeroMCTSCtree(object):
                     latent_states, (hidden_states_c_reward, hidden_states_h_reward), last_actions
                 )
 
-                network_output.latent_state = to_detach_cpu_numpy(network_output.latent_state)
                 network_output.policy_logits = to_detach_cpu_numpy(network_output.policy_logits)
                 network_output.value = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.value))
                 network_output.value_prefix = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.value_prefix))
 
-                network_output.reward_hidden_state = (
-                    network_output.reward_hidden_state[0].detach().cpu().numpy(),
-                    network_output.reward_hidden_state[1].detach().cpu().numpy()
-                )
-
-                latent_state_batch_in_search_path.append(network_output.latent_state)
-                # tolist() is to be compatible with cpp datatype.
-                value_prefix_batch = network_output.value_prefix.reshape(-1).tolist()
-                value_batch = network_output.value.reshape(-1).tolist()
-                policy_logits_batch = network_output.policy_logits.tolist()
+                # NOTE: simulation_index + 1 is very important, which is the depth of the current leaf node.
+                current_latent_state_index = simulation_index + 1
+                latent_state_batch_in_search_path[current_latent_state_index] = network_output.latent_state
+                # the contiguous float32 arrays are read by the cpp tree in place.
+                value_prefix_batch = np.ascontiguousarray(network_output.value_prefix.reshape(-1), dtype=np.float32)
+                value_batch = np.ascontiguousarray(network_output.value.reshape(-1), dtype=np.float32)
+                policy_logits_batch = np.ascontiguousarray(network_output.policy_logits, dtype=np.float32)
 
-                reward_latent_state_batch = network_output.reward_hidden_state
                 # reset the hidden states in LSTM every ``lstm_horizon_len`` steps in one search.
                 # which enable the model only need to predict the value prefix in a range (e.g.: [s0,...,s5])
                 assert self._cfg.lstm_horizon_len > 0
                 reset_idx = (np.array(search_lens) % self._cfg.lstm_horizon_len == 0)
                 assert len(reset_idx) == batch_size
-                reward_latent_state_batch[0][:, reset_idx, :] = 0
-                reward_latent_state_batch[1][:, reset_idx, :] = 0
-                is_reset_list = reset_idx.astype(np.int32).tolist()
-                reward_hidden_state_c_batch.append(reward_latent_state_batch[0])
-                reward_hidden_state_h_batch.append(reward_latent_state_batch[1])
+                reward_hidden_state_c_batch[current_latent_state_index] = network_output.reward_hidden_state[0][0]
+                reward_hidden_state_h_batch[current_latent_state_index] = network_output.reward_hidden_state[1][0]
+                reset_mask = torch.from_numpy(reset_idx).to(device)
+                reward_hidden_state_c_batch[current_latent_state_index, reset_mask] = 0
+                reward_hidden_state_h_batch[current_latent_state_index, reset_mask] = 0
+                is_reset_list = reset_idx.astype(np.int32)
 
                 # In ``batch_backpropagate()``, we first expand the leaf node using ``the policy_logits`` and
                 # ``reward`` predicted by the model, then perform backpropagation along the search path to update the
                 # statistics.
-
-                # NOTE: simulation_index + 1 is very important, which is the depth of the current leaf node.
-                current_latent_state_index = simulation_index + 1
-                tree_efficientzero.batch_backpropagate(
+                tree_efficientzero.batch_backpropagate_array(
                     current_latent_state_index, discount_factor, value_prefix_batch, value_batch, policy_logits_batch,
                     min_max_stats_lst, results, is_reset_list, virtual_to_play_batch
                 )
@@ -205,7 +251,7 @@ class MuZeroMCTSCtree(object):
         MCTSCtree for MuZero. The core ``batch_traverse`` and ``batch_backpropagate`` function is implemented in C++.
 
     Interfaces:
-        __init__, roots, search
+        __init__, roots, reset_roots, search
     """
 
     config = dict(
@@ -219,6 +265,12 @@ class MuZeroMCTSCtree(object):
         pb_c_init=1.25,
         # (float) The maximum change in value allowed during the backup step of the search tree update.
         value_delta_max=0.01,
+        # (int) The number of leaf nodes selected from each root in one iteration of the search, which are evaluated
+        # by one ``recurrent_inference`` call. With more than one leaf node, every selected path gets a virtual loss
+        # until its leaf node is evaluated, which trades some search quality for larger inference batches.
+        num_leaves_per_iteration=1,
+        # (float) The virtual loss added to the value of the nodes of a selected path.
+        virtual_loss=1.0,
     )
 
     @classmethod
@@ -240,6 +292,8 @@ class MuZeroMCTSCtree(object):
         self.inverse_scalar_transform_handle = InverseScalarTransform(
             self._cfg.model.support_scale, self._cfg.device, self._cfg.model.categorical_distribution
         )
+        # the roots of the searches of ``reset_roots``, whose node pool is kept from one search to the next
+        self._roots = None
 
     @classmethod
     def roots(cls: int, active_collect_env_num: int, legal_actions: List[Any]) -> "mz_ctree":
@@ -253,10 +307,30 @@ class MuZeroMCTSCtree(object):
         from lzero.mcts.ctree.ctree_muzero import mz_tree as ctree
         return ctree.Roots(active_collect_env_num, legal_actions)
 
+    def reset_roots(self, active_collect_env_num: int, legal_actions: List[Any]) -> "mz_ctree":
+        """
+        Overview:
+            Return the roots of the next search, i.e. the roots kept by this MCTS reset to the new root nodes, so the
+            node pool grown by the previous searches is reused instead of allocated again. The roots returned by the
+            previous call are reset, so they must not be used any more.
+        Arguments:
+            - root_num (:obj:`int`): the number of the current root.
+            - legal_action_list (:obj:`list`): the vector of the legal action of this root.
+        """
+        if self._roots is None:
+            self._roots = self.roots(active_collect_env_num, legal_actions)
+        else:
+            self._roots.reset(active_collect_env_num, legal_actions)
+        return self._roots
+
     def search(
-            self, roots: Any, model: torch.nn.Module, latent_state_roots: List[Any], to_play_batch: Union[int,
-                                                                                                          List[Any]]
-    ) -> None:
+            self,
+            roots: Any,
+            model: torch.nn.Module,
+            latent_state_roots: List[Any],
+            to_play_batch: Union[int, List[Any]],
+            reused_latent_states: Any = None
+    ) -> torch.Tensor:
         """
         Overview:
             Do MCTS for the roots (a batch of root nodes in parallel). Parallel in model inference.
@@ -265,15 +339,31 @@ class MuZeroMCTSCtree(object):
             - roots (:obj:`Any`): a batch of expanded root nodes
             - latent_state_roots (:obj:`list`): the hidden states of the roots
             - to_play_batch (:obj:`list`): the to_play_batch list used in in self-play-mode board games
+            - reused_latent_states (:obj:`Any`): the latent states of the nodes reused by ``roots.reuse_subtree``, \
+                in shape (num_reused, batch_size, *state_shape), where the state of the reused node (x, y) is \
+                ``reused_latent_states[x - 1, y]``.
+        Returns:
+            - latent_state_batch_in_search_path (:obj:`torch.Tensor`): the latent states of all the nodes of the \
+                search, where the state of the node (x, y) is ``latent_state_batch_in_search_path[x, y]``.
         """
+        if self._cfg.num_leaves_per_iteration > 1:
+            return self._search_with_virtual_loss(roots, model, latent_state_roots, to_play_batch, reused_latent_states)
         with torch.no_grad():
             model.eval()
 
             # preparation some constant
             batch_size = roots.num
+            # preallocate the node pool of the whole search, in which every simulation expands one leaf node of each
+            # root, which is already done for the roots of ``reset_roots`` after the first search
+            roots.reserve((self._cfg.num_simulations + 1) * batch_size * self._cfg.model.action_space_size)
             pb_c_base, pb_c_init, discount_factor = self._cfg.pb_c_base, self._cfg.pb_c_init, self._cfg.discount_factor
-            # the data storage of latent states: storing the latent state of all the nodes in the search.
-            latent_state_batch_in_search_path = [latent_state_roots]
+            num_simulations, device = self._cfg.num_simulations, self._cfg.device
+            # the data storage of latent states: storing the latent state of all the nodes in the search, which is
+            # preallocated on the device of the model, where the latent states of the leaf nodes are gathered.
+            latent_state_batch_in_search_path = _latent_state_cache(
+                latent_state_roots, num_simulations, device, reused_states=reused_latent_states
+            )
+            num_reused = 0 if reused_latent_states is None else len(reused_latent_states)
 
             # minimax value storage
             min_max_stats_lst = tree_muzero.MinMaxStatsList(batch_size)
@@ -282,8 +372,6 @@ class MuZeroMCTSCtree(object):
             for simulation_index in range(self._cfg.num_simulations):
                 # In each simulation, we expanded a new node, so in one search, we have ``num_simulations`` num of nodes at most.
 
-                latent_states = []
-
                 # prepare a result wrapper to transport results between python and c++ parts
                 results = tree_muzero.ResultsWrapper(num=batch_size)
 
@@ -295,16 +383,15 @@ class MuZeroMCTSCtree(object):
                 MCTS stage 1: Selection
                     Each simulation starts from the internal root state s0, and finishes when the simulation reaches a leaf node s_l.
                 """
-                latent_state_index_in_search_path, latent_state_index_in_batch, last_actions, virtual_to_play_batch = tree_muzero.batch_traverse(
+                latent_state_index_in_search_path, latent_state_index_in_batch, last_actions, virtual_to_play_batch = tree_muzero.batch_traverse_array(
                     roots, pb_c_base, pb_c_init, discount_factor, min_max_stats_lst, results,
-                    copy.deepcopy(to_play_batch)
+                    np.array(to_play_batch, dtype=np.int32)
                 )
 
                 # obtain the latent state for leaf node
-                for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
-                    latent_states.append(latent_state_batch_in_search_path[ix][iy])
-
-                latent_states = torch.from_numpy(np.asarray(latent_states)).to(self._cfg.device).float()
+                ix = torch.as_tensor(latent_state_index_in_search_path, dtype=torch.long, device=device)
+                iy = torch.as_tensor(latent_state_index_in_batch, dtype=torch.long, device=device)
+                latent_states = latent_state_batch_in_search_path[ix, iy]
                 # .long() is only for discrete action
                 last_actions = torch.from_numpy(np.asarray(last_actions)).to(self._cfg.device).long()
                 """
@@ -316,34 +403,117 @@ class MuZeroMCTSCtree(object):
                 """
                 network_output = model.recurrent_inference(latent_states, last_actions)
 
-                network_output.latent_state = to_detach_cpu_numpy(network_output.latent_state)
                 network_output.policy_logits = to_detach_cpu_numpy(network_output.policy_logits)
                 network_output.value = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.value))
                 network_output.reward = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.reward))
 
-                latent_state_batch_in_search_path.append(network_output.latent_state)
-                # tolist() is to be compatible with cpp datatype.
-                reward_batch = network_output.reward.reshape(-1).tolist()
-                value_batch = network_output.value.reshape(-1).tolist()
-                policy_logits_batch = network_output.policy_logits.tolist()
+                # NOTE: simulation_index + 1 is very important, which is the depth of the current leaf node.
+                current_latent_state_index = num_reused + simulation_index + 1
+                latent_state_batch_in_search_path[current_latent_state_index] = network_output.latent_state
+                # the contiguous float32 arrays are read by the cpp tree in place.
+                reward_batch = np.ascontiguousarray(network_output.reward.reshape(-1), dtype=np.float32)
+                value_batch = np.ascontiguousarray(network_output.value.reshape(-1), dtype=np.float32)
+                policy_logits_batch = np.ascontiguousarray(network_output.policy_logits, dtype=np.float32)
 
                 # In ``batch_backpropagate()``, we first expand the leaf node using ``the policy_logits`` and
                 # ``reward`` predicted by the model, then perform backpropagation along the search path to update the
                 # statistics.
-
-                # NOTE: simulation_index + 1 is very important, which is the depth of the current leaf node.
-                current_latent_state_index = simulation_index + 1
-                tree_muzero.batch_backpropagate(
+                tree_muzero.batch_backpropagate_array(
                     current_latent_state_index, discount_factor, reward_batch, value_batch, policy_logits_batch,
                     min_max_stats_lst, results, virtual_to_play_batch
                 )
+        return latent_state_batch_in_search_path
+
+    def _search_with_virtual_loss(
+            self,
+            roots: Any,
+            model: torch.nn.Module,
+            latent_state_roots: List[Any],
+            to_play_batch: Union[int, List[Any]],
+            reused_latent_states: Any = None
+    ) -> torch.Tensor:
+        """
+        Overview:
+            Do MCTS for the roots as ``search``, but select ``num_leaves_per_iteration`` leaf nodes from each root in
+            one iteration with virtual losses, and evaluate all of them in one ``recurrent_inference`` call. The search
+            still runs ``num_simulations`` simulations of each root, in ``num_simulations / num_leaves_per_iteration``
+            iterations.
+        Arguments:
+            - roots (:obj:`Any`): a batch of expanded root nodes
+            - latent_state_roots (:obj:`list`): the hidden states of the roots
+            - to_play_batch (:obj:`list`): the to_play_batch list used in in self-play-mode board games
+            - reused_latent_states (:obj:`Any`): the latent states of the nodes reused by ``roots.reuse_subtree``.
+        Returns:
+            - latent_state_batch_in_search_path (:obj:`torch.Tensor`): the latent states of all the nodes of the search.
+        """
+        with torch.no_grad():
+            model.eval()
+
+            # preparation some constant
+            batch_size = roots.num
+            roots.reserve((self._cfg.num_simulations + 1) * batch_size * self._cfg.model.action_space_size)
+            pb_c_base, pb_c_init, discount_factor = self._cfg.pb_c_base, self._cfg.pb_c_init, self._cfg.discount_factor
+            num_simulations, device = self._cfg.num_simulations, self._cfg.device
+            num_leaves, virtual_loss = self._cfg.num_leaves_per_iteration, self._cfg.virtual_loss
+            num_iterations = (num_simulations + num_leaves - 1) // num_leaves
+            # the latent states of the leaf nodes expanded in the iteration i are in the row num_reused + i + 1, where
+            # the k-th leaf node of the root b is in the column k * batch_size + b.
+            latent_state_batch_in_search_path = _latent_state_cache(
+                latent_state_roots, num_iterations, device, num_leaves, reused_latent_states
+            )
+            num_reused = 0 if reused_latent_states is None else len(reused_latent_states)
+            to_play_batch = np.array(to_play_batch, dtype=np.int32)
+
+            # minimax value storage
+            min_max_stats_lst = tree_muzero.MinMaxStatsList(batch_size)
+            min_max_stats_lst.set_delta(self._cfg.value_delta_max)
+
+            for iteration_index in range(num_iterations):
+                # the last iteration selects the remaining simulations
+                num_leaves_of_iteration = min(num_leaves, num_simulations - iteration_index * num_leaves)
+                results = tree_muzero.ResultsWrapper(num=num_leaves_of_iteration * batch_size)
+
+                # MCTS stage 1: Selection of ``num_leaves_of_iteration`` leaf nodes of each root.
+                latent_state_index_in_search_path, latent_state_index_in_batch, last_actions, virtual_to_play_batch = \
+                    tree_muzero.batch_traverse_with_virtual_loss(
+                        roots, num_leaves_of_iteration, virtual_loss, pb_c_base, pb_c_init, discount_factor,
+                        min_max_stats_lst, results, to_play_batch
+                    )
+
+                ix = torch.as_tensor(latent_state_index_in_search_path, dtype=torch.long, device=device)
+                iy = torch.as_tensor(latent_state_index_in_batch, dtype=torch.long, device=device)
+                latent_states = latent_state_batch_in_search_path[ix, iy]
+                # .long() is only for discrete action
+                last_actions = torch.from_numpy(last_actions).to(device).long()
+
+                # MCTS stage 2: Expansion, i.e. the evaluation of all the selected leaf nodes in one batch.
+                network_output = model.recurrent_inference(latent_states, last_actions)
+
+                network_output.policy_logits = to_detach_cpu_numpy(network_output.policy_logits)
+                network_output.value = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.value))
+                network_output.reward = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.reward))
+
+                current_latent_state_index = num_reused + iteration_index + 1
+                latent_state_batch_in_search_path[current_latent_state_index, :len(latent_states)] = \
+                    network_output.latent_state
+                reward_batch = np.ascontiguousarray(network_output.reward.reshape(-1), dtype=np.float32)
+                value_batch = np.ascontiguousarray(network_output.value.reshape(-1), dtype=np.float32)
+                policy_logits_batch = np.ascontiguousarray(network_output.policy_logits, dtype=np.float32)
+
+                # MCTS stage 3: Backup, which removes the virtual losses of the selected paths first.
+                tree_muzero.batch_backpropagate_with_virtual_loss(
+                    current_latent_state_index, discount_factor, reward_batch, value_batch, policy_logits_batch,
+                    virtual_loss, min_max_stats_lst, results, virtual_to_play_batch
+                )
+        return latent_state_batch_in_search_path
+
 
 class GumbelMuZeroMCTSCtree(object):
     """
     Overview:
         MCTSCtree for Gumbel MuZero. The core ``batch_traverse`` and ``batch_backpropagate`` function is implemented in C++.
     Interfaces:
-        __init__, roots, search
+        __init__, roots, reset_roots, search
         
     """
     config = dict(
@@ -376,6 +546,8 @@ class GumbelMuZeroMCTSCtree(object):
         self.inverse_scalar_transform_handle = InverseScalarTransform(
             self._cfg.model.support_scale, self._cfg.device, self._cfg.model.categorical_distribution
         )
+        # the roots of the searches of ``reset_roots``, whose node pool is kept from one search to the next
+        self._roots = None
     
     @classmethod
     def roots(cls: int, active_collect_env_num: int, legal_actions: List[Any]) -> "gmz_ctree":
@@ -389,6 +561,22 @@ class GumbelMuZeroMCTSCtree(object):
         from lzero.mcts.ctree.ctree_gumbel_muzero import gmz_tree as ctree
         return ctree.Roots(active_collect_env_num, legal_actions)
 
+    def reset_roots(self, active_collect_env_num: int, legal_actions: List[Any]) -> "gmz_ctree":
+        """
+        Overview:
+            Return the roots of the next search, i.e. the roots kept by this MCTS reset to the new root nodes, so the
+            node pool grown by the previous searches is reused instead of allocated again. The roots returned by the
+            previous call are reset, so they must not be used any more.
+        Arguments:
+            - root_num (:obj:`int`): the number of the current root.
+            - legal_action_list (:obj:`list`): the vector of the legal action of this root.
+        """
+        if self._roots is None:
+            self._roots = self.roots(active_collect_env_num, legal_actions)
+        else:
+            self._roots.reset(active_collect_env_num, legal_actions)
+        return self._roots
+
     def search(self, roots: Any, model: torch.nn.Module, latent_state_roots: List[Any], to_play_batch: Union[int,
                                                                                                           List[Any]]
     ) -> None:
@@ -406,10 +594,16 @@ class GumbelMuZeroMCTSCtree(object):
 
             # preparation some constant
             batch_size = roots.num
+            # preallocate the node pool of the whole search, in which every simulation expands one leaf node of each
+            # root, which is already done for the roots of ``reset_roots`` after the first search
+            roots.reserve((self._cfg.num_simulations + 1) * batch_size * self._cfg.model.action_space_size)
             device = self._cfg.device
             discount_factor = self._cfg.discount_factor
-            # the data storage of hidden states: storing the states of all the tree nodes
-            latent_state_batch_in_search_path = [latent_state_roots]
+            # the data storage of hidden states: storing the states of all the tree nodes, which is preallocated on the
+            # device of the model, where the states of the leaf nodes are gathered.
+            latent_state_batch_in_search_path = _latent_state_cache(
+                latent_state_roots, self._cfg.num_simulations, device
+            )
 
             # minimax value storage
             min_max_stats_lst = tree_gumbel_muzero.MinMaxStatsList(batch_size)
@@ -418,8 +612,6 @@ class GumbelMuZeroMCTSCtree(object):
             for simulation_index in range(self._cfg.num_simulations):
                 # In each simulation, we expanded a new node, so in one search, we have ``num_simulations`` num of nodes at most.
 
-                latent_states = []
-
                 # prepare a result wrapper to transport results between python and c++ parts
                 results = tree_gumbel_muzero.ResultsWrapper(num=batch_size)
 
@@ -438,10 +630,9 @@ class GumbelMuZeroMCTSCtree(object):
                 )
 
                 # obtain the states for leaf nodes
-                for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
-                    latent_states.append(latent_state_batch_in_search_path[ix][iy])
-
-                latent_states = torch.from_numpy(np.asarray(latent_states)).to(device).float()
+                ix = torch.as_tensor(latent_state_index_in_search_path, dtype=torch.long, device=device)
+                iy = torch.as_tensor(latent_state_index_in_batch, dtype=torch.long, device=device)
+                latent_states = latent_state_batch_in_search_path[ix, iy]
                 # .long() is only for discrete action
                 last_actions = torch.from_numpy(np.asarray(last_actions)).to(device).unsqueeze(1).long()
                 """
@@ -453,12 +644,11 @@ class GumbelMuZeroMCTSCtree(object):
                 """
                 network_output = model.recurrent_inference(latent_states, last_actions)
 
-                network_output.latent_state = to_detach_cpu_numpy(network_output.latent_state)
                 network_output.policy_logits = to_detach_cpu_numpy(network_output.policy_logits)
                 network_output.value = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.value))
                 network_output.reward = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.reward))
 
-                latent_state_batch_in_search_path.append(network_output.latent_state)
+                latent_state_batch_in_search_path[simulation_index + 1] = network_output.latent_state
                 # tolist() is to be compatible with cpp datatype.
                 reward_batch = network_output.reward.reshape(-1).tolist()
                 value_batch = network_output.value.reshape(-1).tolist()
@@ -265,8 +265,9 @@ class MuZeroMCTSPtree(object):
             roots: Any,
             model: torch.nn.Module,
             latent_state_roots: List[Any],
-            to_play: Union[int, List[Any]] = -1
-    ) -> None:
+            to_play: Union[int, List[Any]] = -1,
+            reused_latent_states: np.ndarray = None
+    ) -> List[np.ndarray]:
         """
         Overview:
             Do MCTS for the roots (a batch of root nodes in parallel). Parallel in model inference.
@@ -275,6 +276,12 @@ class MuZeroMCTSPtree(object):
             - roots (:obj:`Any`): a batch of expanded root nodes
             - latent_state_roots (:obj:`list`): the hidden states of the roots
             - to_play (:obj:`list`): the to_play list used in in self-play-mode board games
+            - reused_latent_states (:obj:`np.ndarray`): the latent states of the nodes reused by \
+                ``roots.reuse_subtree``, in shape (num_reused, batch_size, *state_shape), where the state of the \
+                reused node (x, y) is ``reused_latent_states[x - 1, y]``.
+        Returns:
+            - latent_state_batch_in_search_path (:obj:`list`): the latent states of all the nodes of the search, \
+                where the state of the node (x, y) is ``latent_state_batch_in_search_path[x][y]``.
         """
         with torch.no_grad():
             model.eval()
@@ -285,6 +292,9 @@ class MuZeroMCTSPtree(object):
 
             # the data storage of latent states: storing the latent state of all the nodes in one search.
             latent_state_batch_in_search_path = [latent_state_roots]
+            if reused_latent_states is not None:
+                latent_state_batch_in_search_path.extend(reused_latent_states)
+            num_reused = len(latent_state_batch_in_search_path) - 1
 
             # minimax value storage
             min_max_stats_lst = MinMaxStatsList(batch_size)
@@ -347,8 +357,9 @@ class MuZeroMCTSPtree(object):
                 # statistics.
 
                 # NOTE: simulation_index + 1 is very important, which is the depth of the current leaf node.
-                current_latent_state_index = simulation_index + 1
+                current_latent_state_index = num_reused + simulation_index + 1
                 tree_muzero.batch_backpropagate(
                     current_latent_state_index, discount_factor, reward_batch, value_batch, policy_logits_batch,
                     min_max_stats_lst, results, virtual_to_play
                 )
+        return latent_state_batch_in_search_path
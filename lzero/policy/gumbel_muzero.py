@@ -11,6 +11,7 @@ from torch.nn import L1Loss, KLDivLoss
 
 from lzero.mcts import GumbelMuZeroMCTSCtree as MCTSCtree
 from lzero.mcts import MuZeroMCTSPtree as MCTSPtree
+from lzero.mcts.buffer.reanalyze_cache import mark_target_model_loaded
 from lzero.model import ImageTransforms
 from lzero.policy import scalar_transform, InverseScalarTransform, cross_entropy_loss, phi_transform, \
     DiscreteSupport, to_torch_float_tensor, mz_network_output_unpack, select_action, negative_cosine_similarity, \
@@ -84,10 +85,16 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
         monitor_extra_statistics=True,
         # (int) The transition number of one ``GameSegment``.
         game_segment_length=200,
+        # (bool) Whether the collector stores the transitions in ``ColumnarGameSegment``, whose columns are preallocated
+        # typed arrays written in place, instead of the python lists of ``GameSegment``.
+        use_columnar_game_segment=False,
 
         # ****** observation ******
         # (bool) Whether to transform image to string to save memory.
         transform2string=False,
+        # (str) The codec of the observation frames stored in the game segments, e.g. 'lz4', 'zstd', 'zlib', 'delta' or
+        # 'jpeg', see ``lzero/mcts/buffer/obs_codec.py``. None to store the raw frames.
+        obs_codec=None,
         # (bool) Whether to use gray scale image.
         gray_scale=False,
         # (bool) Whether to use data augmentation.
@@ -532,7 +539,7 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
             ]
             if self._cfg.mcts_ctree:
                 # cpp mcts_tree
-                roots = MCTSCtree.roots(active_collect_env_num, legal_actions)
+                roots = self._mcts_collect.reset_roots(active_collect_env_num, legal_actions)
             else:
                 # python mcts_tree
                 roots = MCTSPtree.roots(active_collect_env_num, legal_actions)
@@ -632,7 +639,7 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
             legal_actions = [[i for i, x in enumerate(action_mask[j]) if x == 1] for j in range(active_eval_env_num)]
             if self._cfg.mcts_ctree:
                 # cpp mcts_tree
-                roots = MCTSCtree.roots(active_eval_env_num, legal_actions)
+                roots = self._mcts_eval.reset_roots(active_eval_env_num, legal_actions)
             else:
                 # python mcts_tree
                 roots = MCTSPtree.roots(active_eval_env_num, legal_actions)
@@ -731,6 +738,8 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
         """
         self._learn_model.load_state_dict(state_dict['model'])
         self._target_model.load_state_dict(state_dict['target_model'])
+        # the roots cached by the replay buffer were searched with the previous target weights
+        mark_target_model_loaded(self._target_model)
         self._optimizer.load_state_dict(state_dict['optimizer'])
 
     def _process_transition(self, obs, policy_output, timestep):
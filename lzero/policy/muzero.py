@@ -1,5 +1,5 @@
 import copy
-from typing import List, Dict, Any, Tuple, Union
+from typing import List, Dict, Any, Tuple, Union, Optional
 
 import numpy as np
 import torch
@@ -13,6 +13,7 @@ from torch.nn import L1Loss
 
 from lzero.mcts import MuZeroMCTSCtree as MCTSCtree
 from lzero.mcts import MuZeroMCTSPtree as MCTSPtree
+from lzero.mcts.buffer.reanalyze_cache import mark_target_model_loaded
 from lzero.model import ImageTransforms
 from lzero.policy import scalar_transform, InverseScalarTransform, cross_entropy_loss, phi_transform, \
     DiscreteSupport, to_torch_float_tensor, mz_network_output_unpack, select_action, negative_cosine_similarity, \
@@ -86,10 +87,16 @@ class MuZeroPolicy(Policy):
         monitor_extra_statistics=True,
         # (int) The transition number of one ``GameSegment``.
         game_segment_length=200,
+        # (bool) Whether the collector stores the transitions in ``ColumnarGameSegment``, whose columns are preallocated
+        # typed arrays written in place, instead of the python lists of ``GameSegment``.
+        use_columnar_game_segment=False,
 
         # ****** observation ******
         # (bool) Whether to transform image to string to save memory.
         transform2string=False,
+        # (str) The codec of the observation frames stored in the game segments, e.g. 'lz4', 'zstd', 'zlib', 'delta' or
+        # 'jpeg', see ``lzero/mcts/buffer/obs_codec.py``. None to store the raw frames.
+        obs_codec=None,
         # (bool) Whether to use gray scale image.
         gray_scale=False,
         # (bool) Whether to use data augmentation.
@@ -131,6 +138,9 @@ class MuZeroPolicy(Policy):
         n_episode=8,
         # (int) the number of simulations in MCTS.
         num_simulations=50,
+        # (bool) Whether to keep the subtree of the chosen action as the root of the next search of the env in collect
+        # mode, so that the next search starts from the visits of the previous one, on top of its ``num_simulations``.
+        reuse_subtree_in_collect=False,
         # (float) Discount factor (gamma) for returns.
         discount_factor=0.997,
         # (int) The number of steps for calculating target q_value.
@@ -507,6 +517,61 @@ class MuZeroPolicy(Policy):
             self._mcts_collect = MCTSPtree(self._cfg)
         self._collect_mcts_temperature = 1.
         self.collect_epsilon = 0.0
+        # the subtree kept for the next search of each env, i.e. (roots, root_index, action, latent_states)
+        self._collect_subtrees = {}
+
+    def _reset_collect(self, data_id: Optional[List[int]] = None) -> None:
+        """
+        Overview:
+            Reset the collect mode, i.e. drop the subtrees kept for the next searches of the envs in ``data_id`` (of
+            all the envs if ``data_id`` is None), e.g. at the end of their episodes.
+        Arguments:
+            - data_id (:obj:`Optional[List[int]]`): the ids of the envs to reset.
+        """
+        if not self._cfg.get('reuse_subtree_in_collect', False):
+            return
+        if data_id is None:
+            self._collect_subtrees.clear()
+        else:
+            for env_id in data_id:
+                self._collect_subtrees.pop(env_id, None)
+
+    def _reuse_collect_subtrees(self, roots: Any, ready_env_id: np.ndarray) -> Optional[Any]:
+        """
+        Overview:
+            Copy the subtrees kept by the previous searches of the ready envs, i.e. the subtrees of their chosen
+            actions, to the prepared ``roots``, and gather the latent states of the copied nodes from the previous
+            searches.
+        Arguments:
+            - roots (:obj:`Any`): the prepared roots of the ready envs.
+            - ready_env_id (:obj:`np.ndarray`): the ids of the ready envs, in the order of the roots.
+        Returns:
+            - reused_latent_states (:obj:`Optional[Any]`): the latent states of the copied nodes in shape \
+                (num_reused, batch_size, *state_shape), as the ``reused_latent_states`` of ``search``, or None if \
+                no node is copied.
+        """
+        reused_states = {}
+        for i, env_id in enumerate(ready_env_id):
+            if env_id not in self._collect_subtrees:
+                continue
+            previous_roots, root_index, action, latent_states = self._collect_subtrees.pop(env_id)
+            ix, iy = roots.reuse_subtree(i, previous_roots, root_index, action)
+            if len(ix) == 0:
+                continue
+            if isinstance(latent_states, torch.Tensor):
+                ix, iy = torch.as_tensor(ix, dtype=torch.long), torch.as_tensor(iy, dtype=torch.long)
+                reused_states[i] = latent_states[ix, iy]
+            else:
+                reused_states[i] = torch.from_numpy(np.stack([latent_states[x][y] for x, y in zip(ix, iy)]))
+        if len(reused_states) == 0:
+            return None
+
+        states = next(iter(reused_states.values()))
+        num_reused = max(len(states) for states in reused_states.values())
+        reused_latent_states = states.new_zeros((num_reused, len(ready_env_id), *states.shape[1:]))
+        for i, states in reused_states.items():
+            reused_latent_states[:len(states), i] = states
+        return reused_latent_states if self._cfg.mcts_ctree else reused_latent_states.numpy()
 
     def _forward_collect(
             self,
@@ -561,13 +626,26 @@ class MuZeroPolicy(Policy):
             ]
             if self._cfg.mcts_ctree:
                 # cpp mcts_tree
-                roots = MCTSCtree.roots(active_collect_env_num, legal_actions)
+                if self._cfg.reuse_subtree_in_collect:
+                    # the subtrees kept for the next searches live in the roots of the previous searches
+                    roots = MCTSCtree.roots(active_collect_env_num, legal_actions)
+                else:
+                    roots = self._mcts_collect.reset_roots(active_collect_env_num, legal_actions)
             else:
                 # python mcts_tree
                 roots = MCTSPtree.roots(active_collect_env_num, legal_actions)
 
+            if ready_env_id is None:
+                ready_env_id = np.arange(active_collect_env_num)
+
             roots.prepare(self._cfg.root_noise_weight, noises, reward_roots, policy_logits, to_play)
-            self._mcts_collect.search(roots, self._collect_model, latent_state_roots, to_play)
+            reused_latent_states = None
+            if self._cfg.reuse_subtree_in_collect:
+                # the roots start from the subtrees of the actions chosen by the previous searches of the envs
+                reused_latent_states = self._reuse_collect_subtrees(roots, ready_env_id)
+            latent_state_batch_in_search_path = self._mcts_collect.search(
+                roots, self._collect_model, latent_state_roots, to_play, reused_latent_states
+            )
 
             # list of list, shape: ``{list: batch_size} -> {list: action_space_size}``
             roots_visit_count_distributions = roots.get_distributions()
@@ -576,9 +654,6 @@ class MuZeroPolicy(Policy):
             data_id = [i for i in range(active_collect_env_num)]
             output = {i: None for i in data_id}
 
-            if ready_env_id is None:
-                ready_env_id = np.arange(active_collect_env_num)
-
             for i, env_id in enumerate(ready_env_id):
                 distributions, value = roots_visit_count_distributions[i], roots_values[i]
                 if self._cfg.eps.eps_greedy_exploration_in_collect:
@@ -598,6 +673,8 @@ class MuZeroPolicy(Policy):
                     )
                     # NOTE: Convert the ``action_index_in_legal_action_set`` to the corresponding ``action`` in the entire action set.
                     action = np.where(action_mask[i] == 1.0)[0][action_index_in_legal_action_set]
+                if self._cfg.reuse_subtree_in_collect:
+                    self._collect_subtrees[env_id] = (roots, i, action, latent_state_batch_in_search_path)
                 output[env_id] = {
                     'action': action,
                     'visit_count_distributions': distributions,
@@ -682,7 +759,7 @@ class MuZeroPolicy(Policy):
             legal_actions = [[i for i, x in enumerate(action_mask[j]) if x == 1] for j in range(active_eval_env_num)]
             if self._cfg.mcts_ctree:
                 # cpp mcts_tree
-                roots = MCTSCtree.roots(active_eval_env_num, legal_actions)
+                roots = self._mcts_eval.reset_roots(active_eval_env_num, legal_actions)
             else:
                 # python mcts_tree
                 roots = MCTSPtree.roots(active_eval_env_num, legal_actions)
@@ -771,6 +848,8 @@ class MuZeroPolicy(Policy):
         """
         self._learn_model.load_state_dict(state_dict['model'])
         self._target_model.load_state_dict(state_dict['target_model'])
+        # the roots cached by the replay buffer were searched with the previous target weights
+        mark_target_model_loaded(self._target_model)
         self._optimizer.load_state_dict(state_dict['optimizer'])
 
     def _process_transition(self, obs, policy_output, timestep):
@@ -13,6 +13,7 @@ from torch.nn import L1Loss
 
 from lzero.mcts import SampledEfficientZeroMCTSCtree as MCTSCtree
 from lzero.mcts import SampledEfficientZeroMCTSPtree as MCTSPtree
+from lzero.mcts.buffer.reanalyze_cache import mark_target_model_loaded
 from lzero.model import ImageTransforms
 from lzero.policy import scalar_transform, InverseScalarTransform, cross_entropy_loss, phi_transform, \
     DiscreteSupport, to_torch_float_tensor, ez_network_output_unpack, select_action, negative_cosine_similarity, \
@@ -90,10 +91,16 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
         monitor_extra_statistics=True,
         # (int) The transition number of one ``GameSegment``.
         game_segment_length=200,
+        # (bool) Whether the collector stores the transitions in ``ColumnarGameSegment``, whose columns are preallocated
+        # typed arrays written in place, instead of the python lists of ``GameSegment``.
+        use_columnar_game_segment=False,
 
         # ****** observation ******
         # (bool) Whether to transform image to string to save memory.
         transform2string=False,
+        # (str) The codec of the observation frames stored in the game segments, e.g. 'lz4', 'zstd', 'zlib', 'delta' or
+        # 'jpeg', see ``lzero/mcts/buffer/obs_codec.py``. None to store the raw frames.
+        obs_codec=None,
         # (bool) Whether to use gray scale image.
         gray_scale=False,
         # (bool) Whether to use data augmentation.
@@ -1147,6 +1154,8 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
         """
         self._learn_model.load_state_dict(state_dict['model'])
         self._target_model.load_state_dict(state_dict['target_model'])
+        # the roots cached by the replay buffer were searched with the previous target weights
+        mark_target_model_loaded(self._target_model)
         self._optimizer.load_state_dict(state_dict['optimizer'])
 
     def _process_transition(self, obs, policy_output, timestep):
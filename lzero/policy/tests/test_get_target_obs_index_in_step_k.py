@@ -8,7 +8,7 @@ args = ['conv', 'mlp']
 
 @pytest.mark.unittest
 @pytest.mark.parametrize('test_mode_type', args)
-def test_get_target_obs_index_in_step_k(test_mode_type):
+def test_get_target_obs_index_in_step_k(test_mode_type, tmp_path, monkeypatch):
     """
     Overview:
         Unit test for the _get_target_obs_index_in_step_k method.
@@ -16,6 +16,8 @@ def test_get_target_obs_index_in_step_k(test_mode_type):
     Arguments:
         - test_mode_type (:obj:`str`): The type of model to test, which can be 'conv' or 'mlp'.
     """
+    # the compiled config is saved into the experiment directory under the working directory
+    monkeypatch.chdir(tmp_path)
     # Import the relevant model and configuration
     from lzero.model.muzero_model import MuZeroModel as Model
     if test_mode_type == 'conv':
@@ -0,0 +1,53 @@
+import copy
+
+import numpy as np
+import pytest
+import torch
+from ding.config import compile_config
+from ding.policy import create_policy
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('mcts_ctree', [True, False])
+def test_muzero_subtree_reuse(mcts_ctree):
+    """
+    Overview:
+        Unit test for ``reuse_subtree_in_collect``, i.e. the searches of the collect mode start from the subtrees of
+        the actions chosen by the previous searches, until the envs are reset.
+    """
+    from lzero.model.muzero_model_mlp import MuZeroModelMLP as Model
+    from lzero.policy.tests.config.cartpole_muzero_config_for_test import cartpole_muzero_config, \
+        cartpole_muzero_create_config
+
+    cfg = copy.deepcopy(cartpole_muzero_config)
+    cfg.policy.update(cuda=False, device='cpu', mcts_ctree=mcts_ctree, reuse_subtree_in_collect=True)
+    cfg = compile_config(
+        cfg, seed=0, env=None, auto=True, create_cfg=copy.deepcopy(cartpole_muzero_create_config), save_cfg=False
+    )
+    policy = create_policy(cfg.policy, model=Model(**cfg.policy.model), enable_field=['learn', 'collect'])
+    num_simulations, env_num = cfg.policy.num_simulations, 3
+
+    def collect(ready_env_id):
+        output = policy.collect_mode.forward(
+            torch.randn(len(ready_env_id), 4),
+            action_mask=np.ones((len(ready_env_id), 2)),
+            # the low temperature chooses the actions of the large subtrees
+            temperature=0.25,
+            to_play=[-1] * len(ready_env_id),
+            epsilon=0.,
+            ready_env_id=ready_env_id
+        )
+        return {env_id: sum(output[env_id]['visit_count_distributions']) for env_id in ready_env_id}
+
+    assert collect(np.arange(env_num)) == {env_id: num_simulations for env_id in range(env_num)}
+    # the visits of the subtrees of the chosen actions are kept, also for the envs which were not ready
+    visit_counts = collect(np.array([1, 2]))
+    assert all(visit_counts[env_id] > num_simulations for env_id in [1, 2])
+    visit_counts = collect(np.arange(env_num))
+    assert all(visit_counts[env_id] > num_simulations for env_id in range(env_num))
+
+    policy.collect_mode.reset([0])
+    visit_counts = collect(np.arange(env_num))
+    assert visit_counts[0] == num_simulations and visit_counts[1] > num_simulations
+    policy.collect_mode.reset()
+    assert collect(np.arange(env_num)) == {env_id: num_simulations for env_id in range(env_num)}
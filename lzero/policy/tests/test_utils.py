@@ -11,6 +11,11 @@ from lzero.policy.utils import negative_cosine_similarity, to_torch_float_tensor
 @pytest.mark.unittest
 class TestVisualizationFunctions:
 
+    @pytest.fixture(autouse=True)
+    def run_in_tmp_path(self, tmp_path, monkeypatch):
+        # the plots are saved into the working directory
+        monkeypatch.chdir(tmp_path)
+
     def test_visualize_avg_softmax(self):
         """
         This test checks whether the visualize_avg_softmax function correctly
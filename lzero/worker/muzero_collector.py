@@ -11,6 +11,7 @@ from ding.utils import build_logger, EasyTimer, SERIAL_COLLECTOR_REGISTRY, one_t
 from ding.worker.collector.base_serial_collector import ISerialCollector
 from torch.nn import L1Loss
 
+from lzero.mcts.buffer.columnar_game_segment import ColumnarGameSegment
 from lzero.mcts.buffer.game_segment import GameSegment
 from lzero.mcts.utils import prepare_observation
 
@@ -78,6 +79,9 @@ class MuZeroCollector(ISerialCollector):
             self._tb_logger = None
 
         self.policy_config = policy_config
+        # the class of the collected game segments
+        self._game_segment_type = ColumnarGameSegment \
+            if self.policy_config.get('use_columnar_game_segment', False) else GameSegment
 
         self.reset(policy, env)
 
@@ -342,7 +346,7 @@ class MuZeroCollector(ISerialCollector):
             chance_dict = {i: to_ndarray(init_obs[i]['chance']) for i in range(env_nums)}
 
         game_segments = [
-            GameSegment(
+            self._game_segment_type(
                 self._env.action_space,
                 game_segment_length=self.policy_config.game_segment_length,
                 config=self.policy_config
@@ -546,7 +550,7 @@ class MuZeroCollector(ISerialCollector):
                         last_game_priorities[env_id] = priorities
 
                         # create new GameSegment
-                        game_segments[env_id] = GameSegment(
+                        game_segments[env_id] = self._game_segment_type(
                             self._env.action_space,
                             game_segment_length=self.policy_config.game_segment_length,
                             config=self.policy_config
@@ -624,7 +628,7 @@ class MuZeroCollector(ISerialCollector):
                         if self.policy_config.use_ture_chance_label_in_chance_encoder:
                             chance_dict[env_id] = to_ndarray(init_obs[env_id]['chance'])
 
-                        game_segments[env_id] = GameSegment(
+                        game_segments[env_id] = self._game_segment_type(
                             self._env.action_space,
                             game_segment_length=self.policy_config.game_segment_length,
                             config=self.policy_config